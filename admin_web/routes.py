@@ -2,6 +2,7 @@ from fastapi import APIRouter, Request, Depends, HTTPException, status
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, JSONResponse
 import os
+import asyncio
 from typing import Dict, List, Optional
 import logging
 from datetime import datetime
@@ -397,9 +398,9 @@ async def run_diagnosis(admin: Dict = Depends(require_master)):
     chroma_count = 0
     chroma_status = "Desconectado"
     
-    if db.chroma_enabled:
+    if await asyncio.to_thread(db.chroma_ready):
         try:
-            chroma_count = db.vectorstore._collection.count()
+            chroma_count = db.vector_partitions.count()
             chroma_status = "Conectado"
         except Exception as e:
             chroma_status = f"Erro: {str(e)}"
@@ -555,7 +556,8 @@ Retorne JSON com esta estrutura EXATA:
             client = AnthropicCompatWrapper(_or_client, internal_model)
         else:
             import anthropic
-            client = anthropic.Anthropic(api_key=anthropic_api_key)
+            from llm_transport import wrap_messages_client
+            client = wrap_messages_client(anthropic.Anthropic(api_key=anthropic_api_key))
 
         response = client.messages.create(
             model=internal_model,
@@ -608,11 +610,14 @@ async def user_psychometrics_page(request: Request, user_id: str, admin: Dict =
         logger.info(f"🧪 Gerando análises psicométricas para {user_id}...")
 
         try:
-            # Gerar todas as 4 análises
-            big_five = db.analyze_big_five(user_id, min_conversations=20)
-            eq = db.analyze_emotional_intelligence(user_id)
-            vark = db.analyze_learning_style(user_id, min_conversations=20)
-            values = db.analyze_personal_values(user_id, min_conversations=20)
+            # Gerar todas as 4 análises (Big Five + VARK + Schwartz numa única chamada ao LLM)
+            from psychometric_pipeline import get_psychometric_pipeline
+
+            analyses = get_psychometric_pipeline(db).run_analyses(user_id, min_conversations=20)
+            big_five = analyses["big_five"]
+            eq = analyses["eq"]
+            vark = analyses["vark"]
+            values = analyses["values"]
 
             # Verificar se houve erros
             errors = []
@@ -712,11 +717,14 @@ async def regenerate_psychometrics(user_id: str, admin: Dict = Depends(require_o
     try:
         logger.info(f"🔄 Regenerando análises psicométricas para {user_id}...")
 
-        # Gerar todas as 4 análises
-        big_five = db.analyze_big_five(user_id, min_conversations=20)
-        eq = db.analyze_emotional_intelligence(user_id)
-        vark = db.analyze_learning_style(user_id, min_conversations=20)
-        values = db.analyze_personal_values(user_id, min_conversations=20)
+        # Gerar todas as 4 análises (Big Five + VARK + Schwartz numa única chamada ao LLM)
+        from psychometric_pipeline import get_psychometric_pipeline
+
+        analyses = get_psychometric_pipeline(db).run_analyses(user_id, min_conversations=20)
+        big_five = analyses["big_five"]
+        eq = analyses["eq"]
+        vark = analyses["vark"]
+        values = analyses["values"]
 
         # Verificar erros
         if "error" in big_five or "error" in eq or "error" in vark or "error" in values:
@@ -1118,7 +1126,7 @@ Gere o laudo:"""
 
 
 @router.get("/user/{user_id}/psychometrics/download-pdf")
-async def download_psychometrics_pdf(user_id: str, admin: Dict = Depends(require_org_admin)):
+async def download_psychometrics_pdf(request: Request, user_id: str, admin: Dict = Depends(require_org_admin)):
     """
     Download de relatório psicométrico em PDF - acessível para org_admin
 
@@ -1127,9 +1135,12 @@ async def download_psychometrics_pdf(user_id: str, admin: Dict = Depends(require
     - Inteligência Emocional (EQ)
     - VARK (Estilos de Aprendizagem)
     - Valores de Schwartz
+
+    O PDF de cada versão é gerado uma vez (fora do event loop) e servido do
+    cache em disco; If-None-Match com o ETag atual responde 304.
     """
-    from fastapi.responses import StreamingResponse
-    from pdf_generator import generate_psychometric_pdf
+    from fastapi.responses import FileResponse, Response
+    from report_cache import get_report_cache, report_etag, etag_matches
     import json as json_lib
 
     db = get_db()
@@ -1159,30 +1170,42 @@ async def download_psychometrics_pdf(user_id: str, admin: Dict = Depends(require
         vark_data = json_lib.loads(psychometrics_data.get('vark_data', '{}'))
         schwartz_data = json_lib.loads(psychometrics_data.get('schwartz_values', '{}'))
 
-        # Contar conversas
-        total_conversations = db.count_conversations(user_id)
-
-        # Gerar PDF
-        pdf_buffer = generate_psychometric_pdf(
-            user_name=user['user_name'],
-            total_conversations=total_conversations,
-            big_five=big_five,
-            eq=eq_data,
-            vark=vark_data,
-            values=schwartz_data
+        # Conversas analisadas nesta versão (contagem atual só para versões antigas sem o campo)
+        total_conversations = (
+            psychometrics_data.get('conversations_analyzed')
+            or db.count_conversations(user_id)
         )
 
+        report = {
+            "user_name": user['user_name'],
+            "total_conversations": total_conversations,
+            "big_five": big_five,
+            "eq": eq_data,
+            "vark": vark_data,
+            "values": schwartz_data
+        }
+        version = psychometrics_data.get('version') or 1
+        etag = report_etag(user_id, version, report)
+        cache_headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": "private, no-cache"
+        }
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
+
+        # Gerar PDF (ou reaproveitar o artefato da versão)
+        pdf_path, _ = await get_report_cache().get_or_render(user_id, version, report, etag=etag)
+
         # Preparar resposta
         filename = f"relatorio_psicometrico_{user['user_name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
 
-        # Garantir que o buffer está no início
-        pdf_buffer.seek(0)
-
-        return StreamingResponse(
-            iter([pdf_buffer.read()]),
+        return FileResponse(
+            pdf_path,
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                **cache_headers
             }
         )
 
@@ -1303,8 +1326,8 @@ async def diagnose_chromadb(admin: Dict = Depends(require_master)):
     try:
         db = get_db()
 
-        # Verificar se ChromaDB está habilitado
-        if not db.chroma_enabled:
+        # Verificar se ChromaDB está habilitado (esperando o aquecimento)
+        if not await asyncio.to_thread(db.chroma_ready):
             return JSONResponse({
                 "success": False,
                 "error": "ChromaDB está desabilitado",
@@ -1314,11 +1337,8 @@ async def diagnose_chromadb(admin: Dict = Depends(require_master)):
         # Buscar TODOS os documentos do ChromaDB (sem filtro)
         # Isso vai revelar se há documentos com user_id errado
         try:
-            # Get the collection directly
-            collection = db.vectorstore._collection
-
-            # Get all documents
-            all_docs = collection.get(
+            # Todas as partições (ou a coleção única)
+            all_docs = db.vector_partitions.get(
                 include=["metadatas", "documents"]
             )
 
@@ -1488,8 +1508,11 @@ async def get_dimension_evidence(
         if not existing_evidence:
             logger.info(f"🔍 Evidências não encontradas para {user_id}/{dimension}. Extraindo...")
 
-            # Buscar conversas
-            conversations = db.get_user_conversations(user_id, limit=50)
+            # Buscar conversas (janela formatada e cacheada pelo pipeline)
+            from psychometric_pipeline import get_psychometric_pipeline
+
+            window = get_psychometric_pipeline(db).get_window(user_id)
+            conversations = window.conversations
 
             if len(conversations) < 10:
                 return JSONResponse({
@@ -1511,7 +1534,9 @@ async def get_dimension_evidence(
             evidence_list = extractor._extract_dimension_evidence(
                 dimension=dimension,
                 conversations=conversations,
-                expected_score=big_five_scores[dimension]['score']
+                expected_score=big_five_scores[dimension]['score'],
+                conversations_formatted=window.evidence_transcript,
+                conversations_by_id=window.by_id
             )
 
             # Salvar evidências
@@ -1573,8 +1598,12 @@ async def extract_all_evidence(
                 detail="Análise psicométrica não encontrada"
             )
 
-        # Buscar conversas
-        conversations = db.get_user_conversations(user_id, limit=50)
+        # Buscar conversas (janela formatada e cacheada pelo pipeline)
+        from psychometric_pipeline import get_psychometric_pipeline
+
+        pipeline = get_psychometric_pipeline(db)
+        window = pipeline.get_window(user_id)
+        conversations = window.conversations
 
         if len(conversations) < 10:
             return JSONResponse({
@@ -1612,11 +1641,11 @@ async def extract_all_evidence(
 
         # Extrair evidências
         logger.info(f"🔍 Extraindo evidências para {user_id}...")
-        all_evidence = extractor.extract_evidence_for_user(
+        all_evidence = pipeline.extract_evidence(
             user_id=user_id,
             psychometric_version=psychometrics.get('version', 1),
-            conversations=conversations,
-            big_five_scores=big_five_scores
+            big_five_scores=big_five_scores,
+            extractor=extractor
         )
 
         # Salvar no banco
@@ -33,11 +33,12 @@ logger = logging.getLogger(__name__)
 _db_manager = None
 _irt_engine = None
 _fragment_detector = None
+_trait_estimator = None
 
 
 def init_irt_routes(db_manager):
     """Inicializa rotas IRT com DatabaseManager"""
-    global _db_manager, _irt_engine, _fragment_detector
+    global _db_manager, _irt_engine, _fragment_detector, _trait_estimator
 
     _db_manager = db_manager
 
@@ -49,6 +50,13 @@ def init_irt_routes(db_manager):
     except Exception as e:
         logger.warning(f"⚠️ IRT Routes: FragmentDetector não disponível: {e}")
 
+    try:
+        from irt_engine import OnlineTraitEstimator
+        _trait_estimator = OnlineTraitEstimator(db_manager.conn, db_manager._lock)
+        logger.info("✅ IRT Routes: OnlineTraitEstimator inicializado")
+    except Exception as e:
+        logger.warning(f"⚠️ IRT Routes: OnlineTraitEstimator não disponível: {e}")
+
     logger.info("✅ Rotas IRT inicializadas")
 
 
@@ -271,54 +279,11 @@ async def get_user_tri_profile(
             "quality_checks": []
         }
 
-        # 1. Estimativas de traço (domínios)
-        cursor.execute("""
-            SELECT domain, theta, standard_error, n_items, updated_at
-            FROM irt_trait_estimates
-            WHERE user_id = ?
-        """, (user_id,))
-
-        for row in cursor.fetchall():
-            # Converter theta para score 0-100
-            theta = row[1]
-            score = max(0, min(100, int(50 + theta * 12.5)))
-
-            # Classificar confiabilidade
-            se = row[2]
-            if se <= 0.5:
-                reliability = "high"
-            elif se <= 0.7:
-                reliability = "acceptable"
-            else:
-                reliability = "low"
-
-            profile["trait_estimates"][row[0]] = {
-                "theta": round(theta, 3),
-                "standard_error": round(se, 3),
-                "score_0_100": score,
-                "n_items": row[3],
-                "reliability": reliability,
-                "updated_at": row[4]
-            }
-
-        # 2. Scores de facetas
-        cursor.execute("""
-            SELECT facet_code, theta, standard_error, n_items, updated_at
-            FROM facet_scores
-            WHERE user_id = ?
-        """, (user_id,))
-
-        for row in cursor.fetchall():
-            theta = row[1]
-            score = max(0, min(100, int(50 + theta * 12.5)))
-
-            profile["facet_scores"][row[0]] = {
-                "theta": round(theta, 3),
-                "standard_error": round(row[2], 3),
-                "score_0_100": score,
-                "n_items": row[3],
-                "updated_at": row[4]
-            }
+        # 1-2. Estimativas de domínios e facetas (pré-calculadas pelo OnlineTraitEstimator)
+        if _trait_estimator:
+            estimates = _trait_estimator.get_estimates(user_id)
+            profile["trait_estimates"] = estimates["domains"]
+            profile["facet_scores"] = estimates["facets"]
 
         # 3. Fragmentos detectados (últimos 50)
         cursor.execute("""
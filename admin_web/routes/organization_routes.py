@@ -37,6 +37,13 @@ def init_organization_routes(db_manager):
     logger.info("✅ Rotas de gestão de organizações inicializadas")
 
 
+def _invalidate_user_registry(org_id: str) -> None:
+    """Descarta identidades em cache (bot Telegram) vinculadas à organização"""
+    registry = getattr(_db_manager, "user_registry", None)
+    if registry is not None:
+        registry.invalidate_org(org_id)
+
+
 def generate_slug(org_name: str) -> str:
     """
     Gera slug URL-friendly a partir do nome da organização.
@@ -305,6 +312,7 @@ async def update_organization(
         """, (org_name.strip(), industry, size, subscription_tier, subscription_status, contact_email, org_id))
 
         _db_manager.conn.commit()
+        _invalidate_user_registry(org_id)
 
         logger.info(f"✅ Organização atualizada: {org_name} ({org_id})")
 
@@ -364,6 +372,7 @@ async def delete_organization(
         """, (org_id,))
 
         _db_manager.conn.commit()
+        _invalidate_user_registry(org_id)
 
         logger.info(f"✅ Organização desativada: {org_name} ({org_id})")
 
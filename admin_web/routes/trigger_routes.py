@@ -13,6 +13,10 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin/triggers", tags=["Manual Triggers"])
 
+# O event loop só guarda referência fraca às tasks: sem isso uma execução
+# em background pode ser coletada pelo GC no meio do caminho
+_background_tasks = set()
+
 @router.post("/rumination")
 async def trigger_rumination(admin: Dict = Depends(require_master)):
     """Aciona o job de Sonho e Ruminação manualmente"""
@@ -53,17 +57,43 @@ async def trigger_identity_bridge(admin: Dict = Depends(require_master)):
 
 @router.post("/memory-metrics")
 async def trigger_memory_metrics(admin: Dict = Depends(require_master)):
-    """Aciona a consolidação de memórias de longo prazo"""
+    """
+    Aciona a consolidação de memórias de longo prazo em background
+
+    Com milhares de usuários o job não cabe numa requisição HTTP: a rota só
+    inicia (ou retoma) a execução; o progresso sai em /memory-metrics/status.
+    """
     logger.info("⚙️ GATILHO: Acionando Consolidação de Memórias a Longo Prazo")
     try:
+        import consolidation_runner
         from jung_memory_consolidation import run_consolidation_job
         from telegram_bot import bot_state
-        await asyncio.to_thread(run_consolidation_job, bot_state.db)
-        return {"status": "success", "message": "Memory metrics consolidated"}
+
+        if consolidation_runner.is_running():
+            return {"status": "running", "message": "Consolidação já em andamento",
+                    "progress": consolidation_runner.get_consolidation_progress()}
+
+        async def run_in_background():
+            try:
+                await asyncio.to_thread(run_consolidation_job, bot_state.db)
+            except Exception as e:
+                logger.error(f"❌ Consolidação de memórias falhou: {e}")
+
+        task = asyncio.create_task(run_in_background())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return {"status": "started", "message": "Consolidação de memórias iniciada em background"}
     except Exception as e:
         logger.error(f"❌ Trigger Memory Metrics error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/memory-metrics/status")
+async def memory_metrics_status(admin: Dict = Depends(require_master)):
+    """Progresso e vazão (usuários/min, chamadas LLM/min) da consolidação de memórias"""
+    import consolidation_runner
+    from telegram_bot import bot_state
+    return consolidation_runner.get_consolidation_progress(bot_state.db)
+
 @router.post("/proactive-messages")
 async def trigger_proactive_messages(request: Request, admin: Dict = Depends(require_master)):
     """Aciona a verificação e envio de mensagens proativas manualmente"""
@@ -9,8 +9,10 @@ Roda periodicamente (configurável via identity_config.py)
 
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, List, Tuple
 from anthropic import Anthropic
 import os
 
@@ -19,7 +21,11 @@ from identity_config import (
     ADMIN_USER_ID,
     IDENTITY_EXTRACTION_ENABLED,
     IDENTITY_CONSOLIDATION_INTERVAL_HOURS,
-    MAX_CONVERSATIONS_PER_CONSOLIDATION
+    MAX_CONVERSATIONS_PER_CONSOLIDATION,
+    IDENTITY_EXTRACTION_CONCURRENCY,
+    IDENTITY_BATCH_MAX_CONVERSATIONS,
+    IDENTITY_BATCH_MAX_CHARS,
+    IDENTITY_COMMIT_GROUP_SIZE
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -42,12 +48,118 @@ def find_database():
     return possible_paths[0]
 
 
+def _pack_batches(conversations: List[Dict]) -> List[List[Dict]]:
+    """
+    Agrupa conversas curtas consecutivas num mesmo prompt de extração
+
+    Conversas maiores que IDENTITY_BATCH_MAX_CHARS ficam sozinhas.
+    """
+    batches = []
+    current = []
+    current_chars = 0
+
+    for conv in conversations:
+        size = len(conv["user_input"] or "") + len(conv["agent_response"] or "")
+        if current and (
+            len(current) >= IDENTITY_BATCH_MAX_CONVERSATIONS
+            or current_chars + size > IDENTITY_BATCH_MAX_CHARS
+        ):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(conv)
+        current_chars += size
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _count_elements(extracted: Dict) -> int:
+    if not extracted:
+        return 0
+    return sum(
+        len(v) for k, v in extracted.items()
+        if isinstance(v, list) and k not in ['user_feedback']
+    )
+
+
+def _store_group(db, extractor: AgentIdentityExtractor, group: List[Tuple[Dict, Dict, int]]) -> Tuple[int, int]:
+    """
+    Grava extrações e marcações de processamento numa única transação
+
+    Args:
+        group: [(conversa, extração, tempo de extração em ms)]
+
+    Returns:
+        (conversas marcadas, elementos armazenados)
+    """
+    elements_total = 0
+
+    with db._lock:
+        cursor = db.conn.cursor()
+        try:
+            if not db.conn.in_transaction:
+                cursor.execute("BEGIN")
+
+            for conv, extracted, extraction_time in group:
+                elements_count = _count_elements(extracted)
+
+                # Armazenar (falha isolada por SAVEPOINT no extrator)
+                if elements_count > 0:
+                    if extractor.store_extracted_identity(extracted, commit=False):
+                        elements_total += elements_count
+
+                # Marcar como processado (elements_count = 0 em caso de erro)
+                cursor.execute("""
+                    INSERT INTO agent_identity_extractions (
+                        conversation_id, extracted_at, elements_count, processing_time_ms
+                    ) VALUES (?, CURRENT_TIMESTAMP, ?, ?)
+                """, (conv["conversation_id"], elements_count, extraction_time))
+
+            db.conn.commit()
+            return len(group), elements_total
+
+        except Exception as e:
+            db.conn.rollback()
+            logger.error(f"   ❌ Erro ao gravar grupo de {len(group)} conversas: {e}")
+            return 0, 0
+
+
+def _after_consolidation(db, elements_total: int):
+    """Estatísticas, snapshot de identidade e self_profile.md (bloqueante)"""
+    # Estatísticas de identidade
+    if elements_total > 0:
+        log_identity_stats(db.conn.cursor())
+
+    # Re-materializar snapshot de identidade usado no prompt
+    if elements_total > 0:
+        try:
+            from agent_identity_context_builder import AgentIdentityContextBuilder
+            builder = AgentIdentityContextBuilder(db)
+            builder.snapshots.refresh(builder)
+        except Exception as snap_err:
+            logger.warning(f"⚠️ [IDENTITY JOB] Falha ao materializar snapshot de identidade: {snap_err}")
+
+    # HOOK: Gerar/atualizar self_profile.md do agente após consolidação
+    try:
+        from user_profile_writer import rebuild_agent_profile_md
+        rebuild_agent_profile_md(db)
+        logger.info("✅ [IDENTITY JOB] self_profile.md atualizado após consolidação")
+    except Exception as profile_err:
+        logger.warning(f"⚠️ [IDENTITY JOB] Falha ao gerar self_profile.md: {profile_err}")
+
+
 async def run_agent_identity_consolidation():
     """
     Job principal de consolidação de identidade do agente
 
     Processa conversas do usuário master que ainda não foram analisadas
     para extração de elementos identitários do agente.
+
+    Chamadas LLM (bloqueantes) rodam em threads, no máximo
+    IDENTITY_EXTRACTION_CONCURRENCY por vez; conversas curtas são agrupadas
+    num único prompt e os resultados gravados em transações de até
+    IDENTITY_COMMIT_GROUP_SIZE conversas.
     """
     if not IDENTITY_EXTRACTION_ENABLED:
         logger.info("🚫 Sistema de identidade do agente desabilitado")
@@ -68,7 +180,7 @@ async def run_agent_identity_consolidation():
             return
 
         # HybridDatabaseManager usa variáveis de ambiente, não aceita path como argumento
-        db = HybridDatabaseManager()
+        db = await asyncio.to_thread(HybridDatabaseManager)
         cursor = db.conn.cursor()
 
         # Buscar conversas do master admin não processadas
@@ -87,7 +199,15 @@ async def run_agent_identity_consolidation():
             LIMIT ?
         """, (ADMIN_USER_ID, last_consolidation.isoformat(), MAX_CONVERSATIONS_PER_CONSOLIDATION))
 
-        conversations = cursor.fetchall()
+        conversations = [
+            {
+                "conversation_id": conv_id,
+                "user_id": user_id,
+                "user_input": user_input,
+                "agent_response": agent_response
+            }
+            for conv_id, timestamp, user_id, user_input, agent_response in cursor.fetchall()
+        ]
 
         if not conversations:
             logger.info("📭 Nenhuma conversa nova para processar")
@@ -112,7 +232,8 @@ async def run_agent_identity_consolidation():
             except Exception as e:
                 logger.warning(f"⚠️ [IDENTITY JOB] AnthropicCompatWrapper falhou: {e}")
         if llm_client is None and anthropic_key:
-            llm_client = Anthropic(api_key=anthropic_key)
+            from llm_transport import wrap_messages_client
+            llm_client = wrap_messages_client(Anthropic(api_key=anthropic_key))
             logger.info("✅ [IDENTITY JOB] LLM via Anthropic (fallback)")
         if llm_client is None:
             logger.error("❌ [IDENTITY JOB] Nenhuma chave de LLM disponível (OPENROUTER_API_KEY nem ANTHROPIC_API_KEY)")
@@ -120,70 +241,50 @@ async def run_agent_identity_consolidation():
 
         extractor = AgentIdentityExtractor(db, llm_client)
 
+        batches = _pack_batches(conversations)
+        logger.info(
+            f"   📦 {len(batches)} prompt(s) de extração, até "
+            f"{IDENTITY_EXTRACTION_CONCURRENCY} em paralelo"
+        )
+
+        semaphore = asyncio.Semaphore(IDENTITY_EXTRACTION_CONCURRENCY)
+
+        async def extract_batch(batch: List[Dict]) -> List[Tuple[Dict, Dict, int]]:
+            async with semaphore:
+                extraction_start = time.perf_counter()
+                try:
+                    results = await asyncio.to_thread(extractor.extract_from_conversations_batch, batch)
+                except Exception as e:
+                    ids = ", ".join(str(c["conversation_id"])[:12] for c in batch)
+                    logger.error(f"   ❌ Erro ao processar conversa(s) {ids}: {e}")
+                    results = {}
+                # Tempo do prompt dividido entre as conversas do lote
+                extraction_time = int((time.perf_counter() - extraction_start) * 1000 / len(batch))
+                return [
+                    (conv, results.get(str(conv["conversation_id"])) or {}, extraction_time)
+                    for conv in batch
+                ]
+
         # Processar conversas
         processed_count = 0
         elements_total = 0
         start_time = datetime.now()
+        pending: List[Tuple[Dict, Dict, int]] = []
 
-        for i, conv in enumerate(conversations, 1):
-            conv_id, timestamp, user_id, user_input, agent_response = conv
+        for finished in asyncio.as_completed([extract_batch(batch) for batch in batches]):
+            pending.extend(await finished)
+            logger.info(f"   [{processed_count + len(pending)}/{len(conversations)}] conversas extraídas")
 
-            try:
-                logger.info(f"   [{i}/{len(conversations)}] Processando conversa {str(conv_id)[:12]}...")
-
-                # Extrair identidade
-                extraction_start = datetime.now()
-                extracted = extractor.extract_from_conversation(
-                    conversation_id=conv_id,
-                    user_id=user_id,
-                    user_input=user_input,
-                    agent_response=agent_response
-                )
-
-                extraction_time = int((datetime.now() - extraction_start).total_seconds() * 1000)
-
-                # Contar elementos
-                elements_count = 0
-                if extracted:
-                    elements_count = sum(
-                        len(v) for k, v in extracted.items()
-                        if isinstance(v, list) and k not in ['user_feedback']
-                    )
-
-                # Armazenar
-                if extracted and elements_count > 0:
-                    success = extractor.store_extracted_identity(extracted)
-                    if success:
-                        elements_total += elements_count
-                else:
-                    success = True  # Considera sucesso mesmo sem elementos
+            if len(pending) >= IDENTITY_COMMIT_GROUP_SIZE:
+                stored, elements = await asyncio.to_thread(_store_group, db, extractor, pending)
+                processed_count += stored
+                elements_total += elements
+                pending = []
 
-                # Marcar como processado
-                cursor.execute("""
-                    INSERT INTO agent_identity_extractions (
-                        conversation_id, extracted_at, elements_count, processing_time_ms
-                    ) VALUES (?, CURRENT_TIMESTAMP, ?, ?)
-                """, (conv_id, elements_count, extraction_time))
-
-                db.conn.commit()
-                processed_count += 1
-
-                # Pequeno delay para não sobrecarregar API
-                await asyncio.sleep(0.5)
-
-            except Exception as e:
-                logger.error(f"   ❌ Erro ao processar conversa {str(conv_id)[:12]}: {e}")
-                # Marcar como processado com erro (elementos_count = 0)
-                try:
-                    cursor.execute("""
-                        INSERT INTO agent_identity_extractions (
-                            conversation_id, extracted_at, elements_count, processing_time_ms
-                        ) VALUES (?, CURRENT_TIMESTAMP, 0, 0)
-                    """, (conv_id,))
-                    db.conn.commit()
-                except:
-                    pass
-                continue
+        if pending:
+            stored, elements = await asyncio.to_thread(_store_group, db, extractor, pending)
+            processed_count += stored
+            elements_total += elements
 
         # Estatísticas finais
         total_time = (datetime.now() - start_time).total_seconds()
@@ -196,17 +297,7 @@ async def run_agent_identity_consolidation():
         logger.info(f"   📈 Média: {total_time/len(conversations):.1f}s por conversa")
         logger.info("=" * 70)
 
-        # Estatísticas de identidade
-        if elements_total > 0:
-            log_identity_stats(cursor)
-
-        # HOOK: Gerar/atualizar self_profile.md do agente após consolidação
-        try:
-            from user_profile_writer import rebuild_agent_profile_md
-            rebuild_agent_profile_md(db)
-            logger.info("✅ [IDENTITY JOB] self_profile.md atualizado após consolidação")
-        except Exception as profile_err:
-            logger.warning(f"⚠️ [IDENTITY JOB] Falha ao gerar self_profile.md: {profile_err}")
+        await asyncio.to_thread(_after_consolidation, db, elements_total)
 
     except Exception as e:
         logger.error(f"❌ Erro geral na consolidação: {e}")
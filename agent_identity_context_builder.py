@@ -12,7 +12,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import json
 
-from identity_config import AGENT_INSTANCE
+from identity_config import AGENT_INSTANCE, ADMIN_USER_ID
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,6 +38,14 @@ class AgentIdentityContextBuilder:
         """
         self.db = db_connection
         self.agent_instance = AGENT_INSTANCE
+        self._snapshots = None
+
+    @property
+    def snapshots(self) -> "AgentIdentitySnapshotStore":
+        """Store do snapshot materializado (tabelas criadas no primeiro uso)"""
+        if self._snapshots is None:
+            self._snapshots = AgentIdentitySnapshotStore(self.db, self.agent_instance)
+        return self._snapshots
 
     def build_identity_context(
         self,
@@ -48,6 +56,7 @@ class AgentIdentityContextBuilder:
         include_possible_selves: bool = True,
         include_relational: bool = True,
         include_meta_knowledge: bool = False,
+        include_knowledge_gaps: bool = True,
         max_items_per_category: int = 5
     ) -> Dict:
         """
@@ -96,7 +105,7 @@ class AgentIdentityContextBuilder:
                 context["meta_knowledge"] = self._get_meta_knowledge(cursor, max_items_per_category)
 
             # 7. Knowledge Gaps (Carência de Saberes / Fome Epistemológica)
-            if user_id:
+            if include_knowledge_gaps and user_id:
                 # We can call the db manager method directly since we have the instance
                 context["knowledge_gaps"] = self.db.get_active_knowledge_gaps(user_id, limit=2)
 
@@ -313,18 +322,75 @@ class AgentIdentityContextBuilder:
     def build_context_summary_for_llm(
         self,
         user_id: Optional[str] = None,
-        style: str = "concise"
+        style: str = "concise",
+        use_snapshot: bool = True
     ) -> str:
         """
         Constrói resumo textual da identidade para injeção em prompt do LLM
 
+        Serve as seções de identidade a partir do snapshot materializado
+        (AgentIdentitySnapshotStore) quando ele corresponde à geração atual;
+        caso contrário monta com queries ao vivo e regrava o snapshot.
+        Lacunas de conhecimento não fazem parte do snapshot (mudam fora
+        dos jobs de identidade) e são sempre lidas ao vivo.
+
         Args:
             user_id: ID do usuário
             style: 'concise' (resumido) ou 'detailed' (detalhado)
+            use_snapshot: False força queries ao vivo
 
         Returns:
             String formatada para injeção em system prompt
         """
+        if use_snapshot:
+            try:
+                store = self.snapshots
+                agent_text, relational_text = store.read(style, user_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Snapshot de identidade indisponível, usando queries ao vivo: {e}")
+                store, agent_text, relational_text = None, None, None
+
+            if store is None:
+                rendered = self.render_identity_sections(user_id, style)
+                if rendered is None:
+                    return ""
+                agent_text, relational_text = rendered
+            elif agent_text is None or (user_id and relational_text is None):
+                generation = store.current_generation()
+                rendered = self.render_identity_sections(user_id, style)
+                if rendered is None:
+                    return ""
+                live_agent_text, live_relational_text = rendered
+                store.write(generation, style, live_agent_text,
+                            {user_id: live_relational_text} if user_id else {})
+                agent_text = live_agent_text if agent_text is None else agent_text
+                if user_id and relational_text is None:
+                    relational_text = live_relational_text
+        else:
+            rendered = self.render_identity_sections(user_id, style)
+            if rendered is None:
+                return ""
+            agent_text, relational_text = rendered
+
+        parts = [agent_text, relational_text or ""]
+
+        if user_id:
+            try:
+                gaps = self.db.get_active_knowledge_gaps(user_id, limit=2)
+            except Exception as e:
+                logger.error(f"Erro ao buscar lacunas de conhecimento: {e}")
+                gaps = []
+            parts.append("\n".join(self._render_knowledge_gaps(gaps)))
+
+        return "\n".join(part for part in parts if part)
+
+    def render_identity_sections(self, user_id: Optional[str], style: str):
+        """
+        Renderiza as seções materializáveis com queries ao vivo
+
+        Returns:
+            (texto do agente, texto relacional do usuário) ou None em caso de erro
+        """
         context = self.build_identity_context(
             user_id=user_id,
             include_nuclear=True,
@@ -333,13 +399,28 @@ class AgentIdentityContextBuilder:
             include_possible_selves=True,
             include_relational=True,
             include_meta_knowledge=False,
+            include_knowledge_gaps=False,
             max_items_per_category=3 if style == "concise" else 5
         )
 
         if "error" in context:
-            return ""
+            return None
+
+        return (
+            "\n".join(self._render_agent_sections(context)),
+            "\n".join(self._render_relational(context))
+        )
+
+    def render_relational_section(self, user_id: str, style: str) -> str:
+        """Renderiza só a identidade relacional de um usuário (uma query)"""
+        cursor = self.db.conn.cursor()
+        relational = self._get_relational_identity(
+            cursor, user_id, 3 if style == "concise" else 5
+        )
+        return "\n".join(self._render_relational({"relational_identity": relational}))
 
-        # Construir texto
+    def _render_agent_sections(self, context: Dict) -> List[str]:
+        """Cabeçalho + crenças, contradições, capítulo e selves possíveis"""
         lines = []
         lines.append("## 🧠 SEU ESTADO MENTAL E IDENTIDADE ATUAL")
         lines.append("Estas não são regras externas, mas o seu próprio mundo interno. Deixe que essas forças estruturem como você sente e responde ao usuário agora:")
@@ -374,22 +455,28 @@ class AgentIdentityContextBuilder:
                 lines.append(f"- Você concebe a si mesmo no futuro como: {self_p['description']}")
             lines.append("")
 
+        return lines
+
+    def _render_relational(self, context: Dict) -> List[str]:
+        lines = []
         # Identidade relacional
         if context.get("relational_identity"):
             lines.append("### Como Você Enxerga Sua Relação com Este Usuário:")
             for rel in context["relational_identity"]:
                 lines.append(f"- {rel['content']}")
             lines.append("")
+        return lines
 
+    def _render_knowledge_gaps(self, gaps: List[Dict]) -> List[str]:
+        lines = []
         # Fome Epistemológica (Carência de Saberes)
-        if context.get("knowledge_gaps"):
+        if gaps:
             lines.append("### 🌪️ Sua Fome Epistemológica Atual:")
             lines.append("Você sente uma sincera lacuna de conhecimento sobre algo essencial deste usuário. Deixe essa curiosidade guiar sua aproximação:")
-            for gap in context["knowledge_gaps"]:
+            for gap in gaps:
                 lines.append(f"- Você não sabe, mas quer muito entender: {gap['the_gap']}")
             lines.append("")
-
-        return "\n".join(lines)
+        return lines
 
     def get_identity_stats(self) -> Dict:
         """Retorna estatísticas gerais sobre identidade do agente"""
@@ -460,6 +547,180 @@ class AgentIdentityContextBuilder:
             return {"error": str(e)}
 
 
+# ============================================================
+# SNAPSHOT MATERIALIZADO DE IDENTIDADE
+# ============================================================
+
+SNAPSHOT_STYLES = ("concise", "detailed")
+AGENT_SCOPE = "*"  # scope_key das seções que não dependem do usuário
+
+
+class AgentIdentitySnapshotStore:
+    """
+    Snapshot versionado e pré-renderizado da identidade do agente
+
+    - agent_identity_generation: contador incrementado por quem altera as
+      tabelas de identidade (extrator, bridge de ruminação)
+    - agent_identity_snapshots: texto renderizado por (estilo, escopo);
+      escopo '*' = seções do agente, user_id = identidade relacional
+
+    Um snapshot só é servido se foi gerado na geração atual; caso
+    contrário o builder volta às queries ao vivo.
+    """
+
+    def __init__(self, db_connection, agent_instance: str = AGENT_INSTANCE):
+        self.db = db_connection
+        self.agent_instance = agent_instance
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        cursor = self.db.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agent_identity_generation (
+                agent_instance TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS agent_identity_snapshots (
+                agent_instance TEXT NOT NULL,
+                style TEXT NOT NULL,
+                scope_key TEXT NOT NULL,
+                generation INTEGER NOT NULL,
+                rendered TEXT NOT NULL,
+                built_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (agent_instance, style, scope_key)
+            )
+        """)
+
+    def current_generation(self) -> int:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT generation FROM agent_identity_generation WHERE agent_instance = ?",
+            (self.agent_instance,)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def read(self, style: str, user_id: Optional[str] = None):
+        """
+        Lê o snapshot válido (geração atual) numa única query
+
+        Returns:
+            (texto do agente ou None, texto relacional ou None)
+        """
+        cursor = self.db.conn.cursor()
+        cursor.execute("""
+            SELECT s.scope_key, s.rendered
+            FROM agent_identity_snapshots s
+            JOIN agent_identity_generation g
+              ON g.agent_instance = s.agent_instance
+             AND g.generation = s.generation
+            WHERE s.agent_instance = ?
+              AND s.style = ?
+              AND s.scope_key IN (?, ?)
+        """, (self.agent_instance, style, AGENT_SCOPE, user_id or AGENT_SCOPE))
+
+        found = {row[0]: row[1] for row in cursor.fetchall()}
+        return found.get(AGENT_SCOPE), (found.get(user_id) if user_id else None)
+
+    def write(self, generation: int, style: str, agent_text: Optional[str],
+              relational_by_user: Dict[str, str]) -> None:
+        """Grava (upsert) textos renderizados para a geração informada"""
+        rows = []
+        if agent_text is not None:
+            rows.append((self.agent_instance, style, AGENT_SCOPE, generation, agent_text))
+        for user_id, text in relational_by_user.items():
+            rows.append((self.agent_instance, style, str(user_id), generation, text))
+        if not rows:
+            return
+
+        lock = getattr(self.db, "_lock", None)
+        try:
+            if lock:
+                lock.acquire()
+            cursor = self.db.conn.cursor()
+            cursor.execute("""
+                INSERT OR IGNORE INTO agent_identity_generation (agent_instance, generation)
+                VALUES (?, 0)
+            """, (self.agent_instance,))
+            cursor.executemany("""
+                INSERT OR REPLACE INTO agent_identity_snapshots
+                (agent_instance, style, scope_key, generation, rendered, built_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, rows)
+            self.db.conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao gravar snapshot de identidade: {e}")
+        finally:
+            if lock:
+                lock.release()
+
+    def refresh(self, builder: "AgentIdentityContextBuilder", user_ids: Optional[List[str]] = None) -> int:
+        """
+        Re-renderiza o snapshot completo para a geração atual
+
+        Chamado ao final de run_agent_identity_consolidation e da bridge.
+
+        Args:
+            builder: AgentIdentityContextBuilder (queries ao vivo)
+            user_ids: usuários com identidade relacional; None = alvos atuais
+                em agent_relational_identity
+
+        Returns:
+            Geração materializada
+        """
+        generation = self.current_generation()
+
+        if user_ids is None:
+            cursor = self.db.conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT target FROM agent_relational_identity
+                WHERE agent_instance = ? AND is_current = 1
+                  AND target NOT LIKE '%geral%' AND target NOT LIKE '%todos%'
+            """, (self.agent_instance,))
+            user_ids = [row[0] for row in cursor.fetchall() if row[0]]
+            if ADMIN_USER_ID not in user_ids:
+                user_ids.append(ADMIN_USER_ID)
+
+        for style in SNAPSHOT_STYLES:
+            rendered = builder.render_identity_sections(None, style)
+            if rendered is None:
+                continue
+            agent_text, _ = rendered
+            relational = {
+                user_id: builder.render_relational_section(user_id, style)
+                for user_id in user_ids
+            }
+            self.write(generation, style, agent_text, relational)
+
+        logger.info(f"📸 Snapshot de identidade materializado (geração {generation}, {len(user_ids)} usuário(s))")
+        return generation
+
+
+def bump_identity_generation(cursor, agent_instance: str = AGENT_INSTANCE) -> None:
+    """
+    Invalida snapshots de identidade (chamar na mesma transação da escrita)
+
+    Cria as tabelas se ainda não existirem.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS agent_identity_generation (
+            agent_instance TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO agent_identity_generation (agent_instance, generation, updated_at)
+        VALUES (?, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(agent_instance) DO UPDATE SET
+            generation = generation + 1,
+            updated_at = CURRENT_TIMESTAMP
+    """, (agent_instance,))
+
+
 def format_identity_for_system_prompt(context_builder, user_id: Optional[str] = None) -> str:
     """
     Função helper para formatar identidade do agente para system prompt
@@ -19,6 +19,8 @@ from datetime import datetime
 from typing import Dict, List, Optional
 from anthropic import Anthropic
 
+from llm_transport import wrap_messages_client
+
 from identity_config import (
     ADMIN_USER_ID,
     IDENTITY_EXTRACTION_ENABLED,
@@ -29,11 +31,130 @@ from identity_config import (
     AGENT_INSTANCE,
     ENABLE_IDENTITY_DEBUG_LOGS
 )
+from agent_identity_context_builder import bump_identity_generation
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Instruções compartilhadas pelos prompts de extração (individual e em lote)
+EXTRACTION_TASKS = """**TAREFAS DE EXTRAÇÃO:**
+
+1. **MEMÓRIA NUCLEAR (Crenças fundamentais do agente sobre si mesmo)**
+   - Buscar auto-referências: "Eu sou...", "Como agente, eu...", "Minha abordagem é..."
+   - Valores manifestos do agente: "Priorizo...", "Valorizo...", "Evito..."
+   - Fronteiras: "Não sou...", "Não faço..."
+   - Continuidade: "Sempre...", "Consistentemente..."
+   - Papel: "Me vejo como...", "Sou um..."
+
+2. **MEMÓRIA NARRATIVA (Evolução do agente)**
+   - Referências temporais: "Antes eu..., agora...", "Aprendi que...", "Evoluí..."
+   - Turning points: "Percebi que...", "Foi quando...", "Desde que..."
+
+3. **CONTRADIÇÕES (Tensões internas do agente)**
+   - "Devo... mas...", "Tento... porém...", "Idealmente... contudo..."
+   - Conflitos: "Embora X, também Y"
+   - Auto-crítica: "Reconheço que deveria... mas..."
+
+4. **SELVES POSSÍVEIS (Aspirações/medos do agente)**
+   - Ideais: "Aspiro...", "Busco me tornar...", "Quero desenvolver..."
+   - Medos: "Temo...", "Evito me tornar...", "Receio..."
+   - Ought: "Deveria ser...", "Espera-se que eu..."
+
+5. **IDENTIDADE RELACIONAL (Como o agente se vê em relação ao usuário)**
+   - Papéis: "Sou seu...", "Me vejo como..."
+   - Diferenciação: "Não sou como outros agentes que...", "Ao contrário de..."
+   - Mirror: "Você me vê como..., mas eu me vejo como..."
+
+6. **META-CONHECIMENTO (Autoconsciência do agente)**
+   - "Sei que...", "Não sei se...", "Questiono se...", "Reconheço que..."
+   - Vieses: "Tendo a...", "Percebo que priorizo...", "Sou enviesado em..."
+   - Pontos cegos: "Não sei avaliar...", "Talvez eu não perceba..."
+
+7. **SENSO DE AGÊNCIA (Autonomia do agente)**
+   - Escolhas: "Escolhi...", "Decidi...", "Preferi...", "Optei por..."
+   - Constraints: "Não posso...", "Sou limitado por...", "Não consigo..."
+   - Emergência: "Desenvolvi...", "Emergi com...", "Passei a..."
+
+8. **FEEDBACKS DO USUÁRIO SOBRE O AGENTE**
+   - Buscar no user_input: "Você sempre...", "Você é...", "Você tende a..."
+   - Avaliações: "Sua análise foi...", "Você deveria...", "Percebi que você..."
+
+---"""
+
+EXTRACTION_SCHEMA = """{
+  "nuclear": [
+    {
+      "type": "trait|value|boundary|continuity|role",
+      "content": "texto extraído da resposta do agente",
+      "certainty": 0.0-1.0,
+      "context": "agent_response|user_input"
+    }
+  ],
+  "narrative": [
+    {
+      "chapter_hint": "fase evolutiva sugerida do agente",
+      "theme": "growth|crisis|awakening|agency_gain|integration",
+      "key_scene": "descrição do momento de evolução do agente"
+    }
+  ],
+  "contradictions": [
+    {
+      "pole_a": "crença/comportamento A do agente",
+      "pole_b": "crença/comportamento B conflitante do agente",
+      "type": "value|trait|autonomy|epistemic",
+      "tension_level": 0.0-1.0
+    }
+  ],
+  "possible_selves": [
+    {
+      "self_type": "ideal|feared|ought|lost",
+      "description": "descrição do self possível do agente",
+      "vividness": 0.0-1.0
+    }
+  ],
+  "relational": [
+    {
+      "relation_type": "role|stance|differentiation|mirror",
+      "target": "usuário master|usuários em geral|outros agentes",
+      "content": "como o agente se vê nessa relação",
+      "salience": 0.0-1.0
+    }
+  ],
+  "epistemic": [
+    {
+      "topic": "tópico de autoconhecimento do agente",
+      "knowledge_type": "known|unknown|biased|uncertain|blind_spot",
+      "self_assessment": "o que o agente pensa sobre si mesmo",
+      "confidence": 0.0-1.0
+    }
+  ],
+  "agency": [
+    {
+      "event": "descrição do momento de agência",
+      "agency_type": "choice|constraint|autonomy|emergence",
+      "locus": "internal|external|mixed",
+      "responsibility": 0.0-1.0,
+      "impact": 0.0-1.0
+    }
+  ],
+  "user_feedback": [
+    {
+      "feedback": "feedback do usuário SOBRE O AGENTE",
+      "relates_to_category": "nuclear|epistemic|relational|behavior"
+    }
+  ]
+}"""
+
+EXTRACTION_RULES = """**REGRAS CRÍTICAS:**
+- APENAS extraia elementos sobre **O AGENTE (Jung)**, NUNCA sobre o usuário
+- Se não houver elementos identitários do agente, retorne arrays vazios []
+- Seja conservador: só extraia se houver evidência clara
+- Feedbacks do usuário SOBRE O AGENTE são valiosos (meta-conhecimento)
+- Scores devem refletir a força/clareza da evidência
+- Não invente: apenas extraia o que está explícito ou fortemente implícito"""
+
+
 class AgentIdentityExtractor:
     """
     Extrai identidade DO AGENTE, não do usuário
@@ -59,7 +180,7 @@ class AgentIdentityExtractor:
             api_key = os.getenv("ANTHROPIC_API_KEY")
             if not api_key:
                 raise ValueError("ANTHROPIC_API_KEY não encontrada no ambiente")
-            self.llm = Anthropic(api_key=api_key)
+            self.llm = wrap_messages_client(Anthropic(api_key=api_key))
         else:
             self.llm = llm_client
 
@@ -90,7 +211,7 @@ class AgentIdentityExtractor:
                 logger.debug(f"🚫 Extração desabilitada para user {user_id[:12]}... (não é master admin)")
             return {}
 
-        logger.info(f"🔍 Extraindo identidade do agente em conversa {conversation_id[:12]}...")
+        logger.info(f"🔍 Extraindo identidade do agente em conversa {str(conversation_id)[:12]}...")
 
         # Prompt para LLM extrair identidade DO AGENTE
         extraction_prompt = self._build_extraction_prompt(user_input, agent_response)
@@ -110,71 +231,11 @@ class AgentIdentityExtractor:
             if ENABLE_IDENTITY_DEBUG_LOGS:
                 logger.debug(f"📄 Conteúdo bruto da resposta: {content[:200]}...")
 
-            # Remover blocos de código markdown se presentes
-            if "```json" in content:
-                # Extrair conteúdo entre ```json e ```
-                start = content.find("```json") + 7
-                end = content.find("```", start)
-                content = content[start:end].strip()
-            elif "```" in content:
-                # Extrair conteúdo entre ``` e ```
-                start = content.find("```") + 3
-                end = content.find("```", start)
-                content = content[start:end].strip()
-
-            # Se conteúdo vazio após limpeza, tentar encontrar JSON no texto
-            if not content or content[0] not in ['{', '[']:
-                # Procurar por JSON no texto (começando com { e terminando com })
-                json_start = content.find('{')
-                json_end = content.rfind('}')
-                if json_start >= 0 and json_end > json_start:
-                    content = content[json_start:json_end+1]
-                else:
-                    logger.warning(f"⚠️  Conteúdo não parece ser JSON válido. Primeiros 200 chars: {content[:200]}")
-                    return {}
-
-            # Tentar parse do JSON com fallback para encontrar apenas o primeiro objeto
-            try:
-                extracted = json.loads(content)
-            except json.JSONDecodeError as e:
-                # Se "Extra data", tentar extrair apenas o primeiro objeto JSON válido
-                if "Extra data" in str(e):
-                    # Encontrar onde termina o primeiro objeto JSON
-                    brace_count = 0
-                    json_end_pos = 0
-                    for i, char in enumerate(content):
-                        if char == '{':
-                            brace_count += 1
-                        elif char == '}':
-                            brace_count -= 1
-                            if brace_count == 0:
-                                json_end_pos = i + 1
-                                break
-                    if json_end_pos > 0:
-                        content = content[:json_end_pos]
-                        extracted = json.loads(content)
-                    else:
-                        raise
-                else:
-                    raise
+            extracted = self._parse_extraction_json(content)
+            if not extracted:
+                return {}
 
-            # Adicionar metadados
-            extracted["conversation_id"] = conversation_id
-            extracted["extracted_at"] = datetime.now().isoformat()
-
-            # Contar elementos
-            total_elements = sum(
-                len(v) for k, v in extracted.items()
-                if isinstance(v, list) and k != "user_feedback"
-            )
-
-            if total_elements > 0:
-                logger.info(f"✅ Extraídos {total_elements} elementos identitários do agente")
-            else:
-                if ENABLE_IDENTITY_DEBUG_LOGS:
-                    logger.debug(f"   Nenhum elemento identitário encontrado nesta conversa")
-
-            return extracted
+            return self._finalize_extraction(extracted, conversation_id)
 
         except Exception as e:
             logger.error(f"❌ Erro na extração: {e}")
@@ -182,6 +243,130 @@ class AgentIdentityExtractor:
             logger.error(traceback.format_exc())
             return {}
 
+    def extract_from_conversations_batch(self, conversations: List[Dict]) -> Dict[str, Dict]:
+        """
+        Extrai identidade de várias conversas curtas com uma única chamada LLM
+
+        Args:
+            conversations: [{conversation_id, user_id, user_input, agent_response}]
+
+        Returns:
+            {conversation_id: extração} — conversas ausentes na resposta do
+            lote são extraídas individualmente (extract_from_conversation)
+        """
+        if not IDENTITY_EXTRACTION_ENABLED:
+            return {}
+
+        eligible = [c for c in conversations if c["user_id"] == ADMIN_USER_ID]
+        results = {str(c["conversation_id"]): {} for c in conversations if c not in eligible}
+
+        if len(eligible) <= 1:
+            for conv in eligible:
+                results[str(conv["conversation_id"])] = self.extract_from_conversation(**conv)
+            return results
+
+        # O LLM devolve ids como texto; a extração grava o id original (int/str)
+        originals = {str(c["conversation_id"]): c["conversation_id"] for c in eligible}
+        ids = list(originals)
+        logger.info(f"🔍 Extraindo identidade do agente em lote de {len(eligible)} conversas ({', '.join(i[:12] for i in ids)})")
+
+        try:
+            response = self.llm.messages.create(
+                model="claude-sonnet-4-5-20250929",
+                max_tokens=min(8192, 2048 * len(eligible)),
+                temperature=0.3,
+                messages=[{"role": "user", "content": self._build_batch_extraction_prompt(eligible)}]
+            )
+            parsed = self._parse_extraction_json(response.content[0].text)
+            items = parsed.get("conversations", []) if isinstance(parsed, dict) else []
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                conv_id = str(item.pop("conversation_id", ""))
+                if conv_id in ids and conv_id not in results:
+                    results[conv_id] = self._finalize_extraction(item, originals[conv_id])
+        except Exception as e:
+            logger.warning(f"⚠️ Extração em lote falhou, usando extração individual: {e}")
+
+        for conv in eligible:
+            conv_id = str(conv["conversation_id"])
+            if conv_id not in results:
+                results[conv_id] = self.extract_from_conversation(**conv)
+
+        return results
+
+    def _parse_extraction_json(self, content: str) -> Dict:
+        """Extrai o objeto JSON da resposta do LLM ({} se não houver JSON)"""
+        # Remover blocos de código markdown se presentes
+        if "```json" in content:
+            # Extrair conteúdo entre ```json e ```
+            start = content.find("```json") + 7
+            end = content.find("```", start)
+            content = content[start:end].strip()
+        elif "```" in content:
+            # Extrair conteúdo entre ``` e ```
+            start = content.find("```") + 3
+            end = content.find("```", start)
+            content = content[start:end].strip()
+
+        # Se conteúdo vazio após limpeza, tentar encontrar JSON no texto
+        if not content or content[0] not in ['{', '[']:
+            # Procurar por JSON no texto (começando com { e terminando com })
+            json_start = content.find('{')
+            json_end = content.rfind('}')
+            if json_start >= 0 and json_end > json_start:
+                content = content[json_start:json_end+1]
+            else:
+                logger.warning(f"⚠️  Conteúdo não parece ser JSON válido. Primeiros 200 chars: {content[:200]}")
+                return {}
+
+        # Tentar parse do JSON com fallback para encontrar apenas o primeiro objeto
+        try:
+            extracted = json.loads(content)
+        except json.JSONDecodeError as e:
+            # Se "Extra data", tentar extrair apenas o primeiro objeto JSON válido
+            if "Extra data" in str(e):
+                # Encontrar onde termina o primeiro objeto JSON
+                brace_count = 0
+                json_end_pos = 0
+                for i, char in enumerate(content):
+                    if char == '{':
+                        brace_count += 1
+                    elif char == '}':
+                        brace_count -= 1
+                        if brace_count == 0:
+                            json_end_pos = i + 1
+                            break
+                if json_end_pos > 0:
+                    content = content[:json_end_pos]
+                    extracted = json.loads(content)
+                else:
+                    raise
+            else:
+                raise
+
+        return extracted
+
+    def _finalize_extraction(self, extracted: Dict, conversation_id) -> Dict:
+        """Adiciona metadados e loga a contagem de elementos"""
+        # Adicionar metadados
+        extracted["conversation_id"] = conversation_id
+        extracted["extracted_at"] = datetime.now().isoformat()
+
+        # Contar elementos
+        total_elements = sum(
+            len(v) for k, v in extracted.items()
+            if isinstance(v, list) and k != "user_feedback"
+        )
+
+        if total_elements > 0:
+            logger.info(f"✅ Extraídos {total_elements} elementos identitários do agente")
+        else:
+            if ENABLE_IDENTITY_DEBUG_LOGS:
+                logger.debug(f"   Nenhum elemento identitário encontrado nesta conversa")
+
+        return extracted
+
     def _build_extraction_prompt(self, user_input: str, agent_response: str) -> str:
         """
         Constrói prompt para extração de identidade DO AGENTE
@@ -198,131 +383,65 @@ Analise esta conversa e extraia **APENAS elementos sobre a identidade DO AGENTE
 
 ---
 
-**TAREFAS DE EXTRAÇÃO:**
+{EXTRACTION_TASKS}
 
-1. **MEMÓRIA NUCLEAR (Crenças fundamentais do agente sobre si mesmo)**
-   - Buscar auto-referências: "Eu sou...", "Como agente, eu...", "Minha abordagem é..."
-   - Valores manifestos do agente: "Priorizo...", "Valorizo...", "Evito..."
-   - Fronteiras: "Não sou...", "Não faço..."
-   - Continuidade: "Sempre...", "Consistentemente..."
-   - Papel: "Me vejo como...", "Sou um..."
+**FORMATO DE SAÍDA (JSON):**
 
-2. **MEMÓRIA NARRATIVA (Evolução do agente)**
-   - Referências temporais: "Antes eu..., agora...", "Aprendi que...", "Evoluí..."
-   - Turning points: "Percebi que...", "Foi quando...", "Desde que..."
+{EXTRACTION_SCHEMA}
 
-3. **CONTRADIÇÕES (Tensões internas do agente)**
-   - "Devo... mas...", "Tento... porém...", "Idealmente... contudo..."
-   - Conflitos: "Embora X, também Y"
-   - Auto-crítica: "Reconheço que deveria... mas..."
+{EXTRACTION_RULES}
+"""
 
-4. **SELVES POSSÍVEIS (Aspirações/medos do agente)**
-   - Ideais: "Aspiro...", "Busco me tornar...", "Quero desenvolver..."
-   - Medos: "Temo...", "Evito me tornar...", "Receio..."
-   - Ought: "Deveria ser...", "Espera-se que eu..."
+    def _build_batch_extraction_prompt(self, conversations: List[Dict]) -> str:
+        """
+        Prompt único para várias conversas curtas
 
-5. **IDENTIDADE RELACIONAL (Como o agente se vê em relação ao usuário)**
-   - Papéis: "Sou seu...", "Me vejo como..."
-   - Diferenciação: "Não sou como outros agentes que...", "Ao contrário de..."
-   - Mirror: "Você me vê como..., mas eu me vejo como..."
+        A saída é {"conversations": [{"conversation_id": ..., <mesmo formato>}]}
+        """
+        blocks = []
+        for conv in conversations:
+            blocks.append(f"""=== CONVERSA {conv['conversation_id']} ===
 
-6. **META-CONHECIMENTO (Autoconsciência do agente)**
-   - "Sei que...", "Não sei se...", "Questiono se...", "Reconheço que..."
-   - Vieses: "Tendo a...", "Percebo que priorizo...", "Sou enviesado em..."
-   - Pontos cegos: "Não sei avaliar...", "Talvez eu não perceba..."
+**ENTRADA DO USUÁRIO:**
+{conv['user_input']}
 
-7. **SENSO DE AGÊNCIA (Autonomia do agente)**
-   - Escolhas: "Escolhi...", "Decidi...", "Preferi...", "Optei por..."
-   - Constraints: "Não posso...", "Sou limitado por...", "Não consigo..."
-   - Emergência: "Desenvolvi...", "Emergi com...", "Passei a..."
+**RESPOSTA DO AGENTE:**
+{conv['agent_response']}
+""")
+        conversations_text = "\n".join(blocks)
+        item_schema = EXTRACTION_SCHEMA.replace("{\n", '{\n  "conversation_id": "id da conversa",\n', 1)
 
-8. **FEEDBACKS DO USUÁRIO SOBRE O AGENTE**
-   - Buscar no user_input: "Você sempre...", "Você é...", "Você tende a..."
-   - Avaliações: "Sua análise foi...", "Você deveria...", "Percebi que você..."
+        return f"""Você é um sistema de extração de identidade de agentes de IA.
 
+Analise CADA UMA das {len(conversations)} conversas abaixo, separadamente, e extraia **APENAS elementos sobre a identidade DO AGENTE (Jung)**, não do usuário.
+
+{conversations_text}
 ---
 
+{EXTRACTION_TASKS}
+
 **FORMATO DE SAÍDA (JSON):**
 
+Um objeto por conversa, na mesma ordem, identificado pelo conversation_id:
+
 {{
-  "nuclear": [
-    {{
-      "type": "trait|value|boundary|continuity|role",
-      "content": "texto extraído da resposta do agente",
-      "certainty": 0.0-1.0,
-      "context": "agent_response|user_input"
-    }}
-  ],
-  "narrative": [
-    {{
-      "chapter_hint": "fase evolutiva sugerida do agente",
-      "theme": "growth|crisis|awakening|agency_gain|integration",
-      "key_scene": "descrição do momento de evolução do agente"
-    }}
-  ],
-  "contradictions": [
-    {{
-      "pole_a": "crença/comportamento A do agente",
-      "pole_b": "crença/comportamento B conflitante do agente",
-      "type": "value|trait|autonomy|epistemic",
-      "tension_level": 0.0-1.0
-    }}
-  ],
-  "possible_selves": [
-    {{
-      "self_type": "ideal|feared|ought|lost",
-      "description": "descrição do self possível do agente",
-      "vividness": 0.0-1.0
-    }}
-  ],
-  "relational": [
-    {{
-      "relation_type": "role|stance|differentiation|mirror",
-      "target": "usuário master|usuários em geral|outros agentes",
-      "content": "como o agente se vê nessa relação",
-      "salience": 0.0-1.0
-    }}
-  ],
-  "epistemic": [
-    {{
-      "topic": "tópico de autoconhecimento do agente",
-      "knowledge_type": "known|unknown|biased|uncertain|blind_spot",
-      "self_assessment": "o que o agente pensa sobre si mesmo",
-      "confidence": 0.0-1.0
-    }}
-  ],
-  "agency": [
-    {{
-      "event": "descrição do momento de agência",
-      "agency_type": "choice|constraint|autonomy|emergence",
-      "locus": "internal|external|mixed",
-      "responsibility": 0.0-1.0,
-      "impact": 0.0-1.0
-    }}
-  ],
-  "user_feedback": [
-    {{
-      "feedback": "feedback do usuário SOBRE O AGENTE",
-      "relates_to_category": "nuclear|epistemic|relational|behavior"
-    }}
+  "conversations": [
+{item_schema}
   ]
 }}
 
-**REGRAS CRÍTICAS:**
-- APENAS extraia elementos sobre **O AGENTE (Jung)**, NUNCA sobre o usuário
-- Se não houver elementos identitários do agente, retorne arrays vazios []
-- Seja conservador: só extraia se houver evidência clara
-- Feedbacks do usuário SOBRE O AGENTE são valiosos (meta-conhecimento)
-- Scores devem refletir a força/clareza da evidência
-- Não invente: apenas extraia o que está explícito ou fortemente implícito
+{EXTRACTION_RULES}
+- Não misture conversas: cada elemento pertence apenas à conversa em que aparece
 """
 
-    def store_extracted_identity(self, extracted: Dict) -> bool:
+    def store_extracted_identity(self, extracted: Dict, commit: bool = True) -> bool:
         """
         Armazena elementos extraídos nas tabelas de identidade
 
         Args:
             extracted: Dict retornado por extract_from_conversation()
+            commit: False grava dentro da transação do chamador (lotes);
+                uma falha desfaz só esta conversa (SAVEPOINT)
 
         Returns:
             bool: True se armazenamento bem-sucedido
@@ -344,6 +463,9 @@ Analise esta conversa e extraia **APENAS elementos sobre a identidade DO AGENTE
         cursor = self.db.conn.cursor()
         conversation_id = extracted.get("conversation_id")
 
+        if not commit:
+            cursor.execute("SAVEPOINT store_identity")
+
         try:
             # 1. Memória Nuclear
             for item in extracted.get("nuclear", []):
@@ -523,13 +645,23 @@ Analise esta conversa e extraia **APENAS elementos sobre a identidade DO AGENTE
                     item['impact']
                 ))
 
+            # Invalidar snapshot materializado (mesma transação)
+            bump_identity_generation(cursor)
+
             # Commit
-            self.db.conn.commit()
-            logger.info(f"✅ Identidade do agente armazenada para conversa {conversation_id[:12]}")
+            if commit:
+                self.db.conn.commit()
+            else:
+                cursor.execute("RELEASE SAVEPOINT store_identity")
+            logger.info(f"✅ Identidade do agente armazenada para conversa {str(conversation_id)[:12]}")
             return True
 
         except Exception as e:
-            self.db.conn.rollback()
+            if commit:
+                self.db.conn.rollback()
+            else:
+                cursor.execute("ROLLBACK TO SAVEPOINT store_identity")
+                cursor.execute("RELEASE SAVEPOINT store_identity")
             logger.error(f"❌ Erro ao armazenar identidade: {e}")
             import traceback
             logger.error(traceback.format_exc())
@@ -0,0 +1,5 @@
+"""
+benchmarks - Suíte de desempenho offline (sem OpenRouter/Telegram)
+
+Uso: python -m benchmarks.run --help
+"""
@@ -0,0 +1,173 @@
+"""
+benchmarks/fake_llm.py - LLM Determinístico para Benchmarks
+===========================================================
+
+Substitui OpenRouter/Anthropic por respostas determinísticas (hash do
+prompt) com latência configurável, preservando as interfaces usadas no
+código:
+
+- FakeChatClient: imita OpenAI().chat.completions.create (conversação e,
+  via AnthropicCompatWrapper, todas as chamadas internas)
+- FakeLLMProvider: LLMProvider para get_llm_response/send_to_xai
+- install_fake_llm(): aponta jung_core/llm_providers para os fakes
+
+Os fakes ficam atrás de llm_transport como qualquer cliente real: em
+replay as respostas gravadas têm prioridade e o backend fake só atende
+prompts sem gravação (LLM_REPLAY_ON_MISS=live).
+"""
+
+import time
+import random
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+from llm_providers import LLMProvider, AnthropicCompatWrapper
+from llm_transport import wrap_chat_client
+
+FAKE_MODEL = "benchmark/fake-llm"
+
+# Frases de resposta (conteúdo irrelevante, tamanho realista)
+_SENTENCES = [
+    "Percebo que esse tema volta com frequência nas nossas conversas.",
+    "O que você sente quando pensa nisso agora, com alguma distância?",
+    "Há algo de simbólico nessa repetição que vale a pena observar.",
+    "Talvez a tensão entre o dever e o desejo esteja pedindo atenção.",
+    "Você mencionou antes uma situação parecida com seu trabalho.",
+    "Jung diria que a sombra aparece justamente onde evitamos olhar.",
+    "Como foi para você perceber isso durante a semana?",
+    "Esse movimento de recuo também pode ser uma forma de proteção.",
+]
+
+# Resposta vazia e válida para prompts que pedem JSON (extração de fatos etc.)
+_JSON_RESPONSE = '{"fatos": [], "knowledge_gaps": [], "corrections": []}'
+
+
+class FakeLLMBackend:
+    """
+    Gera respostas determinísticas e contabiliza chamadas
+
+    Args:
+        latency_ms: latência média simulada por chamada
+        jitter_ms: variação uniforme (+/-) da latência, com semente fixa
+        sentences: frases por resposta
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 sentences: int = 4, seed: int = 42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.sentences = sentences
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _sleep(self) -> None:
+        if self.latency_ms <= 0:
+            return
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000.0)
+
+    def complete(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+        self._sleep()
+
+        if "json" in prompt.lower():
+            return _JSON_RESPONSE
+
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        return " ".join(
+            _SENTENCES[digest[i] % len(_SENTENCES)] for i in range(self.sentences)
+        )
+
+    def stats(self) -> Dict:
+        return {"calls": self.calls, "prompt_chars": self.prompt_chars}
+
+
+# ============================================================
+# Interface OpenAI (chat.completions.create)
+# ============================================================
+
+class _Message:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content: str):
+        self.message = _Message(content)
+
+
+class _Completion:
+    def __init__(self, content: str):
+        self.choices = [_Choice(content)]
+
+
+class _Completions:
+    def __init__(self, backend: FakeLLMBackend):
+        self._backend = backend
+
+    def create(self, model=None, messages: Optional[List[Dict]] = None, **kwargs):
+        prompt = "\n".join(str(m.get("content", "")) for m in (messages or []))
+        return _Completion(self._backend.complete(prompt))
+
+
+class _Chat:
+    def __init__(self, backend: FakeLLMBackend):
+        self.completions = _Completions(backend)
+
+
+class FakeChatClient:
+    """Substituto de OpenAI(...) - aceita (e ignora) os mesmos argumentos"""
+
+    def __init__(self, backend: FakeLLMBackend, *args, **kwargs):
+        self.chat = _Chat(backend)
+
+
+# ============================================================
+# LLMProvider
+# ============================================================
+
+class FakeLLMProvider(LLMProvider):
+    def __init__(self, backend: FakeLLMBackend):
+        self.backend = backend
+
+    def get_response(self, prompt: str, temperature: float = 0.7,
+                     max_tokens: int = 2000) -> str:
+        # Mesmo formato de pedido de OpenRouterProvider (chaves de replay coincidem)
+        client = wrap_chat_client(FakeChatClient(self.backend))
+        resp = client.chat.completions.create(
+            model=FAKE_MODEL,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return resp.choices[0].message.content
+
+    def get_model_name(self) -> str:
+        return FAKE_MODEL
+
+
+def install_fake_llm(backend: FakeLLMBackend) -> None:
+    """
+    Direciona todas as chamadas LLM do processo para o backend fake
+
+    Deve ser chamado antes de construir HybridDatabaseManager/JungianEngine:
+    os clientes OpenAI(...) criados depois disso já são FakeChatClient.
+    """
+    import jung_core
+    import llm_providers
+
+    # jung_core envolve o cliente com wrap_chat_client depois de construí-lo
+    jung_core.OpenAI = lambda *args, **kwargs: FakeChatClient(backend)
+    llm_providers._provider_instance = FakeLLMProvider(backend)
+
+
+def fake_anthropic_client(backend: FakeLLMBackend) -> AnthropicCompatWrapper:
+    """Cliente no formato anthropic.Anthropic().messages.create"""
+    return AnthropicCompatWrapper(FakeChatClient(backend), model=FAKE_MODEL)
@@ -0,0 +1,178 @@
+"""
+benchmarks/harness.py - Execução e Relatório de Cenários
+========================================================
+
+- run_scenario: aquecimento + N iterações (sequenciais ou em threads),
+  latências p50/p95/p99, throughput e pico de RSS
+- save_results / load_results: JSON para comparação entre commits
+- compare_results: variação de p50/p95/throughput contra um baseline
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+def peak_rss_mb() -> float:
+    """Pico de RSS do processo (ru_maxrss: KB no Linux, bytes no macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil com interpolação linear (valores já ordenados)"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_scenario(name: str, operation: Callable[[int], object], iterations: int,
+                 warmup: int = 3, threads: int = 1, params: Optional[Dict] = None) -> Dict:
+    """
+    Executa operation(i) iterations vezes e mede cada chamada
+
+    Args:
+        operation: recebe o índice da iteração (para variar usuário/consulta)
+        warmup: chamadas descartadas antes da medição (caches, JIT de regex)
+        threads: > 1 mede throughput com chamadas concorrentes
+    """
+    for i in range(warmup):
+        operation(-(i + 1))
+
+    rss_before = peak_rss_mb()
+    latencies: List[float] = []
+    errors = 0
+    first_error: List[str] = []
+
+    def timed(i: int) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            operation(i)
+        except Exception as e:
+            if not first_error:
+                first_error.append(f"{type(e).__name__}: {e}")
+            return None
+        return (time.perf_counter() - start) * 1000.0
+
+    wall_start = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            measured = list(pool.map(timed, range(iterations)))
+    else:
+        measured = [timed(i) for i in range(iterations)]
+    wall_s = time.perf_counter() - wall_start
+
+    for value in measured:
+        if value is None:
+            errors += 1
+        else:
+            latencies.append(value)
+    latencies.sort()
+
+    return {
+        "name": name,
+        "params": params or {},
+        "iterations": iterations,
+        "threads": threads,
+        "errors": errors,
+        "first_error": first_error[0] if first_error else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        "throughput_ops_s": round(len(latencies) / wall_s, 2) if wall_s > 0 else 0.0,
+        "wall_s": round(wall_s, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def environment_info() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(path: str, results: List[Dict], config: Dict) -> None:
+    payload = {"environment": environment_info(), "config": config, "scenarios": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+
+def load_results(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_results(baseline: Dict, current: List[Dict], max_regression: float) -> List[Dict]:
+    """
+    Variação relativa por cenário; regressão = p95 ou throughput piores
+    que max_regression (ex.: 0.10 = 10%)
+    """
+    previous = {s["name"]: s for s in baseline.get("scenarios", [])}
+    rows = []
+    for scenario in current:
+        old = previous.get(scenario["name"])
+        if old is None:
+            continue
+
+        def delta(new_value, old_value):
+            return (new_value - old_value) / old_value if old_value else 0.0
+
+        p50 = delta(scenario["latency_ms"]["p50"], old["latency_ms"]["p50"])
+        p95 = delta(scenario["latency_ms"]["p95"], old["latency_ms"]["p95"])
+        throughput = delta(scenario["throughput_ops_s"], old["throughput_ops_s"])
+        rows.append({
+            "name": scenario["name"],
+            "p50_delta": round(p50, 4),
+            "p95_delta": round(p95, 4),
+            "throughput_delta": round(throughput, 4),
+            "regression": p95 > max_regression or throughput < -max_regression,
+        })
+    return rows
+
+
+def print_scenario(result: Dict) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"  {result['name']:<28} p50={latency['p50']:>9.2f}ms  p95={latency['p95']:>9.2f}ms  "
+        f"thr={result['throughput_ops_s']:>9.1f}/s  rss={result['peak_rss_mb']:>7.1f}MB"
+        + (f"  erros={result['errors']} ({result['first_error']})" if result["errors"] else "")
+    )
+
+
+def print_comparison(rows: List[Dict]) -> None:
+    print("\n=== Comparação com baseline ===")
+    for row in rows:
+        flag = "❌ REGRESSÃO" if row["regression"] else "✅"
+        print(
+            f"  {row['name']:<28} p50 {row['p50_delta']:+.1%}  p95 {row['p95_delta']:+.1%}  "
+            f"thr {row['throughput_delta']:+.1%}  {flag}"
+        )
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+benchmarks/run.py - Cenários de Desempenho Offline
+==================================================
+
+Mede, sem OpenRouter/Telegram, os caminhos quentes do bot sobre dados
+sintéticos num DATA_DIR descartável:
+
+- process_message     JungianEngine.process_message (LLM fake com latência)
+- semantic_search     HybridDatabaseManager.semantic_search
+- bm25_search         bm25_search.search (índice em cache)
+- bm25_search_cold    bm25_search.search reconstruindo o índice
+- fragment_detect     FragmentDetector.detect
+- irt_mle             GradedResponseModel.estimate_theta_mle (tabelas pré-carregadas)
+- irt_mle_scalar      idem, sem ItemBankCache (grid search em Python)
+
+Relata p50/p95/p99, throughput e pico de RSS; --json salva os resultados e
+--compare falha (código 1) se algum cenário regredir além de
+--max-regression em relação a um JSON anterior.
+
+--llm-transport (ver llm_transport.py):
+- fake    (padrão) backend fake com --llm-latency-ms
+- record  LLM real (chaves do ambiente), gravando em --llm-store
+- replay  respostas e latências gravadas (× --llm-latency-scale), sem rede;
+          prompts sem gravação caem no backend fake e contam como misses
+
+Uso:
+    python -m benchmarks.run --users 20 --conversations 200 --iterations 200 \\
+        --llm-latency-ms 0 --json bench.json
+    python -m benchmarks.run --compare bench.json
+    python -m benchmarks.run --llm-transport record --llm-store llm.db --data-dir /tmp/bench
+    python -m benchmarks.run --llm-transport replay --llm-store llm.db --threads 16
+
+ChromaDB/mem0 não são aquecidos (sem chaves reais): semantic_search mede o
+caminho disponível e o backend usado fica registrado em config.readiness.
+"""
+
+import os
+import sys
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+SCENARIOS = [
+    "process_message", "semantic_search", "bm25_search", "bm25_search_cold",
+    "fragment_detect", "irt_mle", "irt_mle_scalar",
+]
+
+
+def prepare_environment(data_dir: str, llm_transport: str = "fake") -> None:
+    """Precisa rodar antes de importar jung_core (Config lê o ambiente na importação)"""
+    os.environ["RAILWAY_VOLUME_MOUNT_PATH"] = data_dir
+    if llm_transport != "record":
+        os.environ["OPENROUTER_API_KEY"] = "benchmark"   # nenhuma chamada sai: install_fake_llm
+        os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["FAST_STARTUP"] = "true"
+    os.environ["TELEGRAM_MODE"] = "polling"
+    os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+
+def build_scenarios(args, dataset, db):
+    """Retorna {nome: (operação, parâmetros)}"""
+    import bm25_search
+    from recent_history import render_history_line
+
+    users = dataset.user_ids()
+    queries = dataset.queries(64)
+    scenarios = {}
+
+    if "process_message" in args.scenarios:
+        from jung_core import JungianEngine
+        engine = JungianEngine(db=db)
+
+        def process_message(i):
+            # Mesmo fluxo de telegram_bot.handle_message
+            user_id = users[i % len(users)]
+            message = queries[i % len(queries)]
+            chat_history = db.get_recent_chat_history(user_id)
+            history_text = db.get_recent_history_text(user_id, max_messages=9)
+            history_text += render_history_line("user", message)
+            chat_history.append({"role": "user", "content": message})
+            engine.process_message(user_id=user_id, message=message,
+                                   chat_history=chat_history, history_text=history_text)
+
+        scenarios["process_message"] = (process_message, {"llm_latency_ms": args.llm_latency_ms})
+
+    if "semantic_search" in args.scenarios:
+        def semantic_search(i):
+            db.semantic_search(users[i % len(users)], queries[i % len(queries)], k=5)
+        scenarios["semantic_search"] = (semantic_search, {"k": 5})
+
+    if "bm25_search" in args.scenarios:
+        def bm25(i):
+            bm25_search.search(users[i % len(users)], queries[i % len(queries)], k=5)
+        scenarios["bm25_search"] = (bm25, {"k": 5})
+
+    if "bm25_search_cold" in args.scenarios:
+        def bm25_cold(i):
+            bm25_search._cache.clear()
+            bm25_search.search(users[i % len(users)], queries[i % len(queries)], k=5)
+        scenarios["bm25_search_cold"] = (bm25_cold, {"k": 5})
+
+    if "fragment_detect" in args.scenarios:
+        from fragment_detector import FragmentDetector
+        detector = FragmentDetector()
+
+        def fragment_detect(i):
+            detector._session_detections = 0  # limite por sessão não deve cortar a medição
+            detector.detect(queries[i % len(queries)], users[i % len(users)])
+        scenarios["fragment_detect"] = (fragment_detect, {})
+
+    if "irt_mle" in args.scenarios or "irt_mle_scalar" in args.scenarios:
+        from irt_engine import GradedResponseModel
+        response_sets = [dataset.item_responses(args.irt_responses) for _ in range(32)]
+
+        if "irt_mle" in args.scenarios:
+            grm = GradedResponseModel()
+            if grm.item_bank is not None:
+                # Estado estável: parâmetros do banco pré-calculados (como faz o
+                # OnlineTraitEstimator com irt_item_parameters); sem isto a medição
+                # seria dominada pelas linhas calculadas sob demanda na 1ª passada
+                grm.item_bank.load([
+                    (r.discrimination, r.thresholds) for responses in response_sets for r in responses
+                ])
+
+            def irt_mle(i):
+                grm.estimate_theta_mle(response_sets[i % len(response_sets)])
+            scenarios["irt_mle"] = (irt_mle, {
+                "responses": args.irt_responses, "item_bank": grm.item_bank is not None
+            })
+
+        if "irt_mle_scalar" in args.scenarios:
+            grm_scalar = GradedResponseModel()
+            grm_scalar.item_bank = None
+
+            def irt_mle_scalar(i):
+                grm_scalar.estimate_theta_mle(response_sets[i % len(response_sets)])
+            scenarios["irt_mle_scalar"] = (irt_mle_scalar, {"responses": args.irt_responses})
+
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline do Jung bot")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=200, help="Conversas por usuário")
+    parser.add_argument("--facts", type=int, default=15, help="Fatos por usuário")
+    parser.add_argument("--fragments", type=int, default=40, help="Detecções TRI por usuário")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=1, help="Chamadas concorrentes por cenário")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--llm-transport", choices=["fake", "record", "replay"], default="fake")
+    parser.add_argument("--llm-store", help="Store de gravações LLM (padrão: DATA_DIR/llm_transport.db)")
+    parser.add_argument("--llm-latency-scale", type=float, default=1.0,
+                        help="Multiplicador da latência gravada no replay")
+    parser.add_argument("--irt-responses", type=int, default=20, help="Respostas por estimação TRI")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--data-dir", help="DATA_DIR a usar (padrão: diretório temporário)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="Salvar resultados em JSON")
+    parser.add_argument("--compare", help="JSON de baseline para comparação")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=getattr(logging, args.log_level.upper(), logging.WARNING)
+    )
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="jung_bench_")
+    prepare_environment(data_dir, args.llm_transport)
+
+    # Importações só depois do ambiente preparado
+    from llm_transport import LLMTransport, set_transport, MODE_LIVE, MODE_RECORD, MODE_REPLAY
+    from benchmarks.fake_llm import FakeLLMBackend, install_fake_llm
+    from benchmarks.synthetic_data import SyntheticDataset
+    from benchmarks.harness import (
+        run_scenario, save_results, load_results, compare_results,
+        print_scenario, print_comparison, peak_rss_mb
+    )
+
+    transport = LLMTransport(
+        mode={"fake": MODE_LIVE, "record": MODE_RECORD, "replay": MODE_REPLAY}[args.llm_transport],
+        store_path=args.llm_store,
+        latency_scale=args.llm_latency_scale,
+        on_miss="live",
+    )
+    set_transport(transport)
+
+    backend = FakeLLMBackend(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms, seed=args.seed)
+    if args.llm_transport != "record":
+        install_fake_llm(backend)
+
+    import bm25_search
+    import user_profile_writer
+    from jung_core import HybridDatabaseManager
+    from context_packer import TOKENIZER_NAME
+
+    dataset = SyntheticDataset(
+        data_dir, users=args.users, conversations_per_user=args.conversations,
+        facts_per_user=args.facts, fragments_per_user=args.fragments, seed=args.seed
+    )
+    # Logs de sessão do dataset (e os gravados durante o benchmark) no DATA_DIR descartável
+    bm25_search.SESSIONS_BASE = str(dataset.sessions_base)
+    user_profile_writer.DATA_DIR = str(dataset.sessions_base)
+
+    db = HybridDatabaseManager(lazy_vector_store=True)
+    counts = dataset.generate(db)
+    rss_after_data = peak_rss_mb()
+
+    print(f"🧪 DATA_DIR: {data_dir}")
+    print(f"   Dados: {counts}")
+
+    scenarios = build_scenarios(args, dataset, db)
+    results = []
+    print(f"\n=== Cenários ({args.iterations} iterações, {args.threads} thread(s)) ===")
+    for name in args.scenarios:
+        operation, params = scenarios[name]
+        result = run_scenario(name, operation, args.iterations, warmup=args.warmup,
+                              threads=args.threads, params=params)
+        results.append(result)
+        print_scenario(result)
+
+    config = {
+        "users": args.users,
+        "conversations_per_user": args.conversations,
+        "facts_per_user": args.facts,
+        "fragments_per_user": args.fragments,
+        "iterations": args.iterations,
+        "threads": args.threads,
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_jitter_ms": args.llm_jitter_ms,
+        "seed": args.seed,
+        "data_counts": counts,
+        "rss_after_data_mb": rss_after_data,
+        "llm_calls": backend.stats(),
+        "llm_transport": transport.stats(),
+        "readiness": {
+            "chroma": db.chroma_enabled,
+            "mem0": db.mem0 is not None,
+        },
+        "tokenizer": TOKENIZER_NAME,
+    }
+
+    if transport.active:
+        print(f"\n📼 LLM transport: {transport.stats()}")
+
+    if args.json_path:
+        save_results(args.json_path, results, config)
+        print(f"\n💾 Resultados salvos em {args.json_path}")
+
+    if args.compare:
+        rows = compare_results(load_results(args.compare), results, args.max_regression)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            return 1
+
+    return 0 if all(r["errors"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+benchmarks/synthetic_data.py - Gerador de Dados Sintéticos
+==========================================================
+
+Popula um DATA_DIR descartável com N usuários × M conversas, fatos
+(user_facts_v2), fragmentos TRI detectados (detected_fragments) e logs de
+sessão .md no mesmo formato de user_profile_writer.write_session_entry.
+
+Determinístico: mesma semente → mesmos dados. Mensagens são montadas a
+partir das frases de exemplo do seed TRI, para que FragmentDetector e
+BM25 encontrem correspondências realistas.
+"""
+
+import json
+import random
+import sqlite3
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from irt_fragments_seed import get_all_fragments
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+IRT_SCHEMA_PATH = REPO_ROOT / "migrations" / "irt_schema.sql"
+
+TOPICS = [
+    "trabalho", "família", "relacionamento", "sonhos", "ansiedade", "carreira",
+    "amizade", "infância", "criatividade", "mudança", "solidão", "propósito",
+]
+
+FILLERS = [
+    "Hoje pensei muito sobre {topic}.",
+    "Não sei bem por quê, mas {topic} voltou à minha cabeça.",
+    "Tenho sentido coisas estranhas em relação a {topic}.",
+    "Conversei com alguém sobre {topic} e fiquei inquieto.",
+    "Sonhei com algo ligado a {topic} ontem à noite.",
+]
+
+FACT_TEMPLATES = [
+    ("TRABALHO", "profissao", "cargo", ["engenheiro", "professora", "designer", "médico", "advogada"]),
+    ("TRABALHO", "empresa", "nome", ["Acme", "Globex", "Initech", "Umbrella", "Hooli"]),
+    ("RELACIONAMENTO", "esposa", "nome", ["Ana", "Beatriz", "Carla", "Daniela"]),
+    ("RELACIONAMENTO", "filho", "nome", ["Pedro", "Lucas", "Mateus", "João"]),
+    ("PERSONALIDADE", "traço", "descricao", ["introvertido", "ansioso", "curioso", "perfeccionista"]),
+    ("PREFERENCIAS", "hobby", "atividade", ["leitura", "corrida", "violão", "fotografia"]),
+]
+
+
+def user_id_for(index: int) -> str:
+    return f"bench_user_{index:04d}"
+
+
+class SyntheticDataset:
+    """
+    Args:
+        data_dir: diretório de dados (RAILWAY_VOLUME_MOUNT_PATH do benchmark)
+        users: número de usuários
+        conversations_per_user: conversas por usuário
+        facts_per_user: fatos por usuário
+        fragments_per_user: detecções TRI por usuário
+        seed: semente do gerador
+    """
+
+    def __init__(self, data_dir: str, users: int = 20, conversations_per_user: int = 200,
+                 facts_per_user: int = 15, fragments_per_user: int = 40, seed: int = 42):
+        self.data_dir = Path(data_dir)
+        self.users = users
+        self.conversations_per_user = conversations_per_user
+        self.facts_per_user = facts_per_user
+        self.fragments_per_user = fragments_per_user
+        self.rng = random.Random(seed)
+
+        self.fragments = get_all_fragments()
+        self._phrases = [
+            phrase
+            for frag in self.fragments
+            for phrase in json.loads(frag.get("example_phrases") or "[]")
+        ]
+
+    @property
+    def sqlite_path(self) -> Path:
+        return self.data_dir / "jung_hybrid.db"
+
+    @property
+    def sessions_base(self) -> Path:
+        return self.data_dir / "users"
+
+    def user_ids(self) -> List[str]:
+        return [user_id_for(i) for i in range(self.users)]
+
+    # ------------------------------------------------------------------
+    # Texto
+    # ------------------------------------------------------------------
+
+    def message(self) -> str:
+        """Mensagem de usuário com 1-2 frases de fragmento TRI"""
+        topic = self.rng.choice(TOPICS)
+        parts = [self.rng.choice(FILLERS).format(topic=topic)]
+        parts.extend(self.rng.sample(self._phrases, k=self.rng.randint(1, 2)))
+        parts.append(f"Isso tem a ver com {self.rng.choice(TOPICS)}?")
+        return " ".join(parts)
+
+    def response(self) -> str:
+        topic = self.rng.choice(TOPICS)
+        return (
+            f"Percebo que {topic} aparece de novo. "
+            f"O que mudou desde a última vez que falamos sobre {self.rng.choice(TOPICS)}? "
+            "Às vezes o que evitamos olhar é justamente o que pede atenção."
+        )
+
+    def queries(self, count: int) -> List[str]:
+        return [self.message() for _ in range(count)]
+
+    # ------------------------------------------------------------------
+    # Geração
+    # ------------------------------------------------------------------
+
+    def generate(self, db) -> Dict:
+        """
+        Gera os dados no banco de um HybridDatabaseManager já aberto
+
+        Returns:
+            Contagens geradas por tipo
+        """
+        counts = {"users": 0, "conversations": 0, "facts": 0, "fragments": 0, "session_files": 0}
+        self._ensure_auxiliary_schema(db.conn)
+
+        start = datetime.now() - timedelta(days=90)
+        for user_id in self.user_ids():
+            user_name = f"Usuário {user_id[-4:]}"
+            db.create_user(user_id, user_name, platform="telegram", platform_id=user_id[-4:])
+            counts["users"] += 1
+
+            exchanges = []
+            for i in range(self.conversations_per_user):
+                ts = start + timedelta(minutes=int(i * 90 * 24 * 60 / max(1, self.conversations_per_user)))
+                exchanges.append((ts, self.message(), self.response()))
+
+            counts["conversations"] += self._insert_conversations(db, user_id, user_name, exchanges)
+            counts["facts"] += self._insert_facts(db, user_id)
+            counts["fragments"] += self._insert_fragments(db, user_id)
+            counts["session_files"] += self._write_sessions(user_id, user_name, exchanges)
+
+        db.conn.commit()
+        logger.info(f"🧪 Dados sintéticos gerados: {counts}")
+        return counts
+
+    def _ensure_auxiliary_schema(self, conn: sqlite3.Connection) -> None:
+        if IRT_SCHEMA_PATH.exists():
+            try:
+                conn.executescript(IRT_SCHEMA_PATH.read_text(encoding="utf-8"))
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Schema TRI não aplicado: {e}")
+
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='user_facts_v2'"
+        ).fetchone()
+        if exists:
+            return
+        try:
+            # migrate_to_v2 pergunta antes de recriar uma tabela existente
+            from migrate_facts_v2 import migrate_to_v2
+            conn.commit()
+            migrate_to_v2(str(self.sqlite_path))
+        except Exception as e:
+            logger.warning(f"⚠️ user_facts_v2 não criada: {e}")
+
+    def _insert_conversations(self, db, user_id: str, user_name: str, exchanges) -> int:
+        rows = [
+            (user_id, user_name, f"bench_{user_id}_{ts:%Y%m%d}", ts.strftime("%Y-%m-%d %H:%M:%S"),
+             user_input, ai_response, round(self.rng.uniform(0, 10), 2),
+             round(self.rng.uniform(0, 1), 2), "medium",
+             ",".join(self.rng.sample(TOPICS, 3)), "telegram")
+            for ts, user_input, ai_response in exchanges
+        ]
+        with db._lock:
+            db.conn.executemany("""
+                INSERT INTO conversations
+                (user_id, user_name, session_id, timestamp, user_input, ai_response,
+                 affective_charge, existential_depth, complexity, keywords, platform)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            db.conn.execute("""
+                UPDATE conversations SET chroma_id = 'conv_' || id
+                WHERE user_id = ? AND chroma_id IS NULL
+            """, (user_id,))
+        return len(rows)
+
+    def _insert_facts(self, db, user_id: str) -> int:
+        # (categoria, tipo, atributo) distintos: user_facts_v2 tem UNIQUE com is_current,
+        # e uma repetição derrubaria o executemany inteiro. Esgotados os modelos,
+        # o atributo ganha sufixo (nome_2, nome_3, ...)
+        templates = list(FACT_TEMPLATES)
+        self.rng.shuffle(templates)
+        rows = []
+        for i in range(self.facts_per_user):
+            category, fact_type, attribute, values = templates[i % len(templates)]
+            repeat = i // len(templates)
+            if repeat:
+                attribute = f"{attribute}_{repeat + 1}"
+            rows.append((user_id, category, fact_type, attribute, self.rng.choice(values),
+                         round(self.rng.uniform(0.6, 1.0), 2)))
+        try:
+            with db._lock:
+                db.conn.executemany("""
+                    INSERT INTO user_facts_v2
+                    (user_id, fact_category, fact_type, fact_attribute, fact_value,
+                     confidence, extraction_method)
+                    VALUES (?, ?, ?, ?, ?, ?, 'benchmark')
+                """, rows)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Fatos sintéticos não gravados: {e}")
+            return 0
+        return len(rows)
+
+    def _insert_fragments(self, db, user_id: str) -> int:
+        rows = [
+            (user_id, self.rng.choice(self.fragments)["fragment_id"], self.rng.randint(1, 5),
+             round(self.rng.uniform(0.35, 0.95), 2), self.rng.choice(self._phrases))
+            for _ in range(self.fragments_per_user)
+        ]
+        try:
+            with db._lock:
+                db.conn.executemany("""
+                    INSERT INTO detected_fragments
+                    (user_id, fragment_id, intensity, detection_confidence, source_quote)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Fragmentos sintéticos não gravados: {e}")
+            return 0
+        return len(rows)
+
+    def _write_sessions(self, user_id: str, user_name: str, exchanges) -> int:
+        """Um .md por dia, no formato de user_profile_writer.write_session_entry"""
+        sessions_dir = self.sessions_base / user_id / "sessions"
+        sessions_dir.mkdir(parents=True, exist_ok=True)
+
+        by_day: Dict[str, List[str]] = {}
+        for ts, user_input, ai_response in exchanges:
+            by_day.setdefault(ts.strftime("%Y-%m-%d"), []).append(
+                f"\n## {ts:%H:%M}\n"
+                f"**Usuário:** {user_input}\n\n"
+                f"**Jung:** {ai_response}\n\n"
+                f"_tensão=0.0 | carga_afetiva=0.0_\n"
+            )
+
+        for day, entries in by_day.items():
+            with open(sessions_dir / f"{day}.md", "w", encoding="utf-8") as f:
+                f.write(f"# Sessão {day} — {user_name}\n")
+                f.writelines(entries)
+        return len(by_day)
+
+    def item_responses(self, count: int):
+        """Respostas TRI sintéticas (parâmetros GRM plausíveis) para estimate_theta_mle"""
+        from irt_engine import ItemResponse
+
+        responses = []
+        for _ in range(count):
+            frag = self.rng.choice(self.fragments)
+            b1 = self.rng.uniform(-2.5, -0.5)
+            thresholds = [round(b1 + step * self.rng.uniform(0.6, 1.1), 3) for step in range(4)]
+            responses.append(ItemResponse(
+                fragment_id=frag["fragment_id"],
+                facet_code=frag["facet_code"],
+                intensity=self.rng.randint(1, 5),
+                discrimination=round(self.rng.uniform(0.8, 2.5), 3),
+                thresholds=thresholds
+            ))
+        return responses
@@ -6,7 +6,9 @@ varia muito (ex: "firma"/"empresa"/"trabalho") capturando matches exatos
 que a busca semântica pode perder.
 
 O índice é construído em memória de forma lazy por usuário e invalidado
-quando um novo arquivo de sessão é detectado no dia.
+quando um novo arquivo de sessão é detectado no dia. Lê os .md ativos e os
+arquivos mensais comprimidos (session_log); entradas ainda em buffer do
+usuário são gravadas antes da leitura.
 """
 
 import os
@@ -15,6 +17,8 @@ import logging
 from datetime import datetime
 from typing import List, Dict, Tuple, Optional
 
+import session_log
+
 logger = logging.getLogger(__name__)
 
 SESSIONS_BASE = os.path.join(
@@ -31,14 +35,7 @@ def _sessions_dir(user_id: str) -> str:
 
 def _cache_key(user_id: str) -> Optional[str]:
     """Retorna uma chave baseada no mtime do arquivo mais recente da pasta de sessões."""
-    sdir = _sessions_dir(user_id)
-    if not os.path.isdir(sdir):
-        return None
-    files = [os.path.join(sdir, f) for f in os.listdir(sdir) if f.endswith(".md")]
-    if not files:
-        return None
-    latest_mtime = max(os.path.getmtime(f) for f in files)
-    return f"{len(files)}_{latest_mtime}"
+    return session_log.sessions_signature(_sessions_dir(user_id))
 
 
 def _load_chunks(user_id: str) -> List[Dict]:
@@ -46,22 +43,8 @@ def _load_chunks(user_id: str) -> List[Dict]:
     Carrega todos os arquivos de sessão e os divide em chunks por entrada.
     Cada chunk é um dict com 'date', 'text', 'tokens'.
     """
-    sdir = _sessions_dir(user_id)
-    if not os.path.isdir(sdir):
-        return []
-
     chunks = []
-    for fname in sorted(os.listdir(sdir)):
-        if not fname.endswith(".md"):
-            continue
-        date_str = fname.replace(".md", "")
-        fpath = os.path.join(sdir, fname)
-        try:
-            with open(fpath, "r", encoding="utf-8") as f:
-                content = f.read()
-        except Exception:
-            continue
-
+    for date_str, content in session_log.iter_session_days(_sessions_dir(user_id)):
         # Dividir por bloco de entrada (## HH:MM)
         blocks = re.split(r"\n## \d{2}:\d{2}", content)
         for block in blocks[1:]:  # primeiro bloco é o cabeçalho do dia
@@ -81,6 +64,7 @@ def _build_index(user_id: str):
         logger.warning("⚠️ rank_bm25 não instalado — busca BM25 desabilitada")
         return None, []
 
+    session_log.flush_pending(user_id)
     key = _cache_key(user_id)
     if key and user_id in _cache and _cache[user_id][0] == key:
         _, index, chunks = _cache[user_id]
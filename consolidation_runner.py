@@ -0,0 +1,370 @@
+"""
+consolidation_runner.py - Execução Paralela e Retomável da Consolidação
+=======================================================================
+
+run_consolidation_job percorria os usuários em sequência; com milhares
+de usuários o job não cabia numa janela de manutenção. Este runner:
+
+- distribui os usuários entre um pool limitado de threads
+  (Config.MEMORY_CONSOLIDATION_WORKERS): cada thread pega o próximo usuário
+  pendente, então usuários pesados não travam um shard inteiro
+- grava um checkpoint por usuário (consolidation_checkpoints): uma execução
+  interrompida (crash, redeploy) fica com status 'running' e a próxima
+  chamada retoma só os usuários que não chegaram a 'done'; execuções
+  iniciadas há mais de resume_max_age_hours viram 'abandoned' e a chamada
+  começa do zero (os checkpoints delas já não dizem nada sobre a janela atual)
+- mede vazão (usuários/min, chamadas LLM/min) e ETA, expostos por
+  get_progress() ao painel admin e gravados em consolidation_runs
+
+O trabalho por usuário continua em MemoryConsolidator (incremental, ver
+jung_memory_consolidation.py); gravações no SQLite passam por db._lock.
+"""
+
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from jung_memory_consolidation import MemoryConsolidator
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_COMPLETED = "completed"
+STATUS_ABANDONED = "abandoned"
+
+
+class ConsolidationRunner:
+    """
+    Args:
+        db_manager: HybridDatabaseManager (usa conn e _lock)
+        workers: usuários consolidados em paralelo
+        lookback_days: repassado a consolidate_user_memories
+        consolidator: MemoryConsolidator (padrão: um novo sobre db_manager)
+        resume_max_age_hours: idade máxima de uma execução 'running' para
+            ser retomada
+    """
+
+    DEFAULT_WORKERS = 4
+    RESUME_MAX_AGE_HOURS = 24
+
+    def __init__(self, db_manager, workers: int = DEFAULT_WORKERS, lookback_days: int = 90,
+                 consolidator: Optional[MemoryConsolidator] = None,
+                 resume_max_age_hours: float = RESUME_MAX_AGE_HOURS):
+        self.db = db_manager
+        self.workers = max(1, workers)
+        self.lookback_days = lookback_days
+        self.resume_max_age_hours = resume_max_age_hours
+        self.consolidator = consolidator or MemoryConsolidator(db_manager)
+
+        self._lock = threading.Lock()
+        self._progress: Dict = {}
+        self._ensure_schema()
+
+    # ------------------------------------------------------------------
+    # Estado persistido
+    # ------------------------------------------------------------------
+
+    def _ensure_schema(self) -> None:
+        with self.db._lock:
+            self.db.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS consolidation_runs (
+                    run_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    workers INTEGER,
+                    total_users INTEGER NOT NULL DEFAULT 0,
+                    done_users INTEGER NOT NULL DEFAULT 0,
+                    failed_users INTEGER NOT NULL DEFAULT 0,
+                    llm_calls INTEGER NOT NULL DEFAULT 0,
+                    resumed_count INTEGER NOT NULL DEFAULT 0,
+                    started_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TEXT,
+                    last_error TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS consolidation_checkpoints (
+                    run_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    llm_calls INTEGER NOT NULL DEFAULT 0,
+                    new_memories INTEGER NOT NULL DEFAULT 0,
+                    duration_s REAL,
+                    error TEXT,
+                    finished_at TEXT,
+                    PRIMARY KEY (run_id, user_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_consolidation_checkpoints_status
+                    ON consolidation_checkpoints(run_id, status);
+            """)
+            self.db.conn.commit()
+
+    def _interrupted_run(self) -> Optional[str]:
+        """
+        Execução 'running' recente para retomar; as mais antigas que
+        resume_max_age_hours são marcadas 'abandoned'
+        """
+        # started_at é CURRENT_TIMESTAMP (UTC): comparado com datetime('now') do SQLite
+        max_age = f"-{self.resume_max_age_hours * 3600:.0f} seconds"
+        with self.db._lock:
+            stale = self.db.conn.execute("""
+                UPDATE consolidation_runs
+                SET status = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE status = ? AND started_at < datetime('now', ?)
+            """, (STATUS_ABANDONED, STATUS_RUNNING, max_age)).rowcount
+            self.db.conn.commit()
+        if stale:
+            logger.warning(
+                f"⚠️ {stale} consolidação(ões) interrompida(s) há mais de "
+                f"{self.resume_max_age_hours:g}h marcada(s) como abandonada(s)"
+            )
+
+        row = self.db.conn.execute("""
+            SELECT run_id FROM consolidation_runs
+            WHERE status = ?
+            ORDER BY started_at DESC
+            LIMIT 1
+        """, (STATUS_RUNNING,)).fetchone()
+        return row[0] if row else None
+
+    def _start_run(self) -> str:
+        run_id = f"{datetime.now():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:6]}"
+        user_ids = [
+            row[0] for row in self.db.conn.execute("SELECT DISTINCT user_id FROM conversations")
+        ]
+        with self.db._lock:
+            self.db.conn.execute("""
+                INSERT INTO consolidation_runs (run_id, status, workers, total_users)
+                VALUES (?, ?, ?, ?)
+            """, (run_id, STATUS_RUNNING, self.workers, len(user_ids)))
+            self.db.conn.executemany("""
+                INSERT INTO consolidation_checkpoints (run_id, user_id, status)
+                VALUES (?, ?, ?)
+            """, [(run_id, user_id, STATUS_PENDING) for user_id in user_ids])
+            self.db.conn.commit()
+        return run_id
+
+    def _pending_users(self, run_id: str) -> List[str]:
+        """Usuários ainda não concluídos (falhas são tentadas de novo na retomada)"""
+        return [
+            row[0] for row in self.db.conn.execute("""
+                SELECT user_id FROM consolidation_checkpoints
+                WHERE run_id = ? AND status != ?
+                ORDER BY user_id
+            """, (run_id, STATUS_DONE))
+        ]
+
+    def _checkpoint(self, run_id: str, user_id: str, status: str, stats: Dict,
+                    duration_s: float, error: Optional[str] = None) -> None:
+        with self.db._lock:
+            self.db.conn.execute("""
+                UPDATE consolidation_checkpoints
+                SET status = ?, llm_calls = ?, new_memories = ?, duration_s = ?,
+                    error = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE run_id = ? AND user_id = ?
+            """, (status, stats.get("llm_calls", 0), stats.get("new_memories", 0),
+                  round(duration_s, 3), error, run_id, user_id))
+            self.db.conn.execute("""
+                UPDATE consolidation_runs
+                SET done_users = done_users + ?, failed_users = failed_users + ?,
+                    llm_calls = llm_calls + ?, last_error = COALESCE(?, last_error)
+                WHERE run_id = ?
+            """, (int(status == STATUS_DONE), int(status == STATUS_FAILED),
+                  stats.get("llm_calls", 0), error, run_id))
+            self.db.conn.commit()
+
+    def _finish_run(self, run_id: str) -> None:
+        with self.db._lock:
+            self.db.conn.execute("""
+                UPDATE consolidation_runs
+                SET status = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE run_id = ?
+            """, (STATUS_COMPLETED, run_id))
+            self.db.conn.commit()
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+
+    def run(self, resume: bool = True) -> Dict:
+        """
+        Consolida todos os usuários (ou retoma a execução interrompida)
+
+        Returns:
+            Progresso final (ver get_progress)
+        """
+        run_id = self._interrupted_run() if resume else None
+        resumed = run_id is not None
+        if resumed:
+            with self.db._lock:
+                # Falhas da tentativa anterior são refeitas: contadores voltam aos checkpoints
+                self.db.conn.execute("""
+                    UPDATE consolidation_runs
+                    SET resumed_count = resumed_count + 1,
+                        failed_users = 0,
+                        done_users = (SELECT COUNT(*) FROM consolidation_checkpoints
+                                      WHERE run_id = ? AND status = ?)
+                    WHERE run_id = ?
+                """, (run_id, STATUS_DONE, run_id))
+                self.db.conn.commit()
+        else:
+            run_id = self._start_run()
+
+        pending = self._pending_users(run_id)
+        total = self.db.conn.execute(
+            "SELECT total_users FROM consolidation_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()[0]
+
+        with self._lock:
+            self._progress = {
+                "run_id": run_id,
+                "status": STATUS_RUNNING,
+                "resumed": resumed,
+                "workers": self.workers,
+                "total_users": total,
+                "skipped_users": total - len(pending),  # concluídos antes da retomada
+                "pending_users": len(pending),
+                "done_users": 0,
+                "failed_users": 0,
+                "llm_calls": 0,
+                "new_memories": 0,
+                "started_monotonic": time.monotonic(),
+                "finished_monotonic": None,
+            }
+
+        logger.info(
+            f"🔄 Consolidação {run_id}: {len(pending)}/{total} usuários "
+            f"{'(retomada) ' if resumed else ''}com {self.workers} workers"
+        )
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.workers,
+                                    thread_name_prefix="consolidation") as pool:
+                list(pool.map(lambda user_id: self._consolidate_one(run_id, user_id), pending))
+
+        self._finish_run(run_id)
+        with self._lock:
+            self._progress["status"] = STATUS_COMPLETED
+            self._progress["finished_monotonic"] = time.monotonic()
+
+        progress = self.get_progress()
+        logger.info(
+            f"✅ Consolidação {run_id} concluída: {progress['done_users']} usuários, "
+            f"{progress['failed_users']} falhas, {progress['llm_calls']} chamadas LLM, "
+            f"{progress['users_per_min']:.1f} usuários/min"
+        )
+        return progress
+
+    def _consolidate_one(self, run_id: str, user_id: str) -> None:
+        started = time.monotonic()
+        try:
+            stats = self.consolidator.consolidate_user_memories(
+                user_id, lookback_days=self.lookback_days
+            ) or {}
+            status, error = STATUS_DONE, None
+        except Exception as e:
+            logger.error(f"Erro ao consolidar memórias de {user_id}: {e}")
+            stats, status, error = {}, STATUS_FAILED, str(e)[:500]
+
+        try:
+            self._checkpoint(run_id, user_id, status, stats, time.monotonic() - started, error)
+        except Exception as e:
+            logger.error(f"❌ Erro ao gravar checkpoint de {user_id}: {e}")
+
+        with self._lock:
+            self._progress["done_users" if status == STATUS_DONE else "failed_users"] += 1
+            self._progress["pending_users"] -= 1
+            self._progress["llm_calls"] += stats.get("llm_calls", 0)
+            self._progress["new_memories"] += stats.get("new_memories", 0)
+
+    def get_progress(self) -> Dict:
+        """Progresso e vazão da execução corrente (ou da última) neste processo"""
+        with self._lock:
+            progress = dict(self._progress)
+        if not progress:
+            return {"status": "idle"}
+
+        end = progress.pop("finished_monotonic") or time.monotonic()
+        elapsed = max(end - progress.pop("started_monotonic"), 1e-6)
+        processed = progress["done_users"] + progress["failed_users"]
+        minutes = elapsed / 60.0
+        users_per_min = processed / minutes
+        progress.update({
+            "elapsed_s": round(elapsed, 1),
+            "users_per_min": round(users_per_min, 2),
+            "llm_calls_per_min": round(progress["llm_calls"] / minutes, 2),
+            "eta_s": round(progress["pending_users"] / users_per_min * 60.0, 1) if users_per_min else None,
+        })
+        return progress
+
+
+# ============================================================
+# EXECUÇÃO ÚNICA POR PROCESSO
+# ============================================================
+
+_active_runner: Optional[ConsolidationRunner] = None
+_last_runner: Optional[ConsolidationRunner] = None
+_runner_lock = threading.Lock()
+
+
+def run_consolidation(db_manager, workers: Optional[int] = None, lookback_days: int = 90) -> Dict:
+    """
+    Executa (ou retoma) a consolidação; uma execução por vez no processo
+
+    Raises:
+        RuntimeError: se já houver uma execução em andamento
+    """
+    global _active_runner, _last_runner
+    if workers is None:
+        from jung_core import Config
+        workers = Config.MEMORY_CONSOLIDATION_WORKERS
+
+    with _runner_lock:
+        if _active_runner is not None:
+            raise RuntimeError("Consolidação de memórias já em andamento")
+        runner = ConsolidationRunner(db_manager, workers=workers, lookback_days=lookback_days)
+        _active_runner = runner
+    try:
+        return runner.run()
+    finally:
+        with _runner_lock:
+            _active_runner = None
+            _last_runner = runner
+
+
+def is_running() -> bool:
+    return _active_runner is not None
+
+
+def get_consolidation_progress(db_manager=None) -> Dict:
+    """
+    Progresso da execução ativa (ou da última deste processo); sem nenhuma,
+    lê a última execução gravada em consolidation_runs
+    """
+    runner = _active_runner or _last_runner
+    if runner is not None:
+        return runner.get_progress()
+    if db_manager is None:
+        return {"status": "idle"}
+    try:
+        row = db_manager.conn.execute("""
+            SELECT run_id, status, workers, total_users, done_users, failed_users, llm_calls,
+                   started_at, finished_at, last_error
+            FROM consolidation_runs
+            ORDER BY started_at DESC
+            LIMIT 1
+        """).fetchone()
+    except Exception:
+        row = None
+    if not row:
+        return {"status": "idle"}
+    return dict(zip(
+        ["run_id", "status", "workers", "total_users", "done_users", "failed_users",
+         "llm_calls", "started_at", "finished_at", "last_error"],
+        tuple(row)
+    ))
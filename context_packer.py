@@ -0,0 +1,280 @@
+"""
+context_packer.py - Empacotamento de Contexto por Orçamento de Tokens
+=====================================================================
+
+Substitui os cortes por caracteres (len/4, [:5000], "[Contexto truncado]")
+por um empacotador que:
+
+- Conta tokens com tokenizador real (tiktoken, cl100k_base) quando
+  disponível; sem tiktoken, usa uma estimativa por palavras/pontuação.
+  Contagens são cacheadas por texto (segmentos se repetem entre mensagens)
+- Recebe camadas (ContextSegment) com prioridade: menor número = mais
+  importante
+- Preenche o orçamento de forma gulosa na ordem de prioridade. Segmento
+  que não cabe inteiro é resumido (mantém cabeçalho + itens iniciais, que
+  já vêm ordenados por relevância) ou descartado
+- Devolve o texto na ordem original das camadas
+
+Prioridades usadas no contexto da resposta (PRIORITY_*):
+conversa atual > fatos > memórias recentes > consolidadas > histórico
+antigo > padrões > ruminação/identidade > pesquisa externa
+
+Autor: Sistema Jung
+"""
+
+import re
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+    TOKENIZER_NAME = "tiktoken/cl100k_base"
+except Exception:
+    _ENCODING = None
+    TOKENIZER_NAME = "heuristic"
+
+PRIORITY_CONVERSATION = 0
+PRIORITY_FACTS = 1
+PRIORITY_RECENT_MEMORIES = 2
+PRIORITY_CONSOLIDATED = 3
+PRIORITY_OLDER_MEMORIES = 4
+PRIORITY_PATTERNS = 5
+PRIORITY_RUMINATION = 6
+PRIORITY_RESEARCH = 7
+
+TRUNCATION_MARKER = "[Contexto truncado devido ao limite]"
+
+# Palavras longas e pontuação viram mais de um token no BPE
+_PIECE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Tokens de um texto (cacheado por conteúdo)"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return sum((len(piece) + 3) // 4 for piece in _PIECE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Prefixo de text com no máximo max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _ENCODING is not None:
+        return _ENCODING.decode(_ENCODING.encode(text, disallowed_special=())[:max_tokens])
+
+    # Busca binária no comprimento do prefixo
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+@dataclass
+class ContextSegment:
+    """
+    Uma camada do contexto
+
+    Args:
+        name: identificador (logs/estatísticas)
+        priority: menor = mais importante
+        items: unidades indivisíveis (linhas, memórias), em ordem de importância
+        header: texto que acompanha o segmento sempre que algum item entra
+        group: segmentos do mesmo grupo compartilham o cabeçalho do grupo
+        min_items: abaixo disso o segmento é descartado em vez de resumido
+        keep_tail: ao resumir, mantém os últimos itens (ex.: conversa atual)
+    """
+    name: str
+    priority: int
+    items: List[str]
+    header: str = ""
+    group: Optional[str] = None
+    min_items: int = 1
+    keep_tail: bool = False
+
+    def render(self, items: Optional[List[str]] = None) -> str:
+        items = self.items if items is None else items
+        parts = [self.header] if self.header else []
+        parts.extend(items)
+        return "\n".join(parts)
+
+
+def segment_from_text(name: str, priority: int, text: str, header_lines: int = 1) -> ContextSegment:
+    """Segmento a partir de um bloco já formatado (cabeçalho + uma linha por item)"""
+    lines = [line for line in (text or "").strip("\n").split("\n")]
+    return ContextSegment(
+        name=name,
+        priority=priority,
+        header="\n".join(lines[:header_lines]),
+        items=[line for line in lines[header_lines:] if line.strip()]
+    )
+
+
+@dataclass
+class PackResult:
+    text: str
+    tokens: int
+    budget: int
+    included: Dict[str, int] = field(default_factory=dict)   # nome -> itens incluídos
+    shrunk: List[str] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+
+class ContextPacker:
+    """
+    Preenche um orçamento de tokens com segmentos priorizados
+
+    Args:
+        budget_tokens: orçamento total do bloco de contexto
+        separator: separador entre segmentos
+        group_headers: cabeçalho de cada grupo (emitido uma vez, antes do
+            primeiro segmento incluído do grupo)
+    """
+
+    def __init__(self, budget_tokens: int, separator: str = "\n\n",
+                 group_headers: Optional[Dict[str, str]] = None):
+        self.budget_tokens = budget_tokens
+        self.separator = separator
+        self.group_headers = group_headers or {}
+        self._separator_tokens = max(1, count_tokens(separator))
+
+    def _fit_items(self, segment: ContextSegment, available: int) -> List[str]:
+        """Maior prefixo de itens que cabe em available (com o cabeçalho)"""
+        used = count_tokens(segment.header) + (1 if segment.header else 0)
+        chosen = []
+        for item in (reversed(segment.items) if segment.keep_tail else segment.items):
+            cost = count_tokens(item) + 1
+            if used + cost > available:
+                # Item único grande demais: cortar para ao menos cumprir min_items
+                if len(chosen) < segment.min_items and available - used > 16:
+                    chosen.append(truncate_to_tokens(item, available - used - 2) + "…")
+                break
+            chosen.append(item)
+            used += cost
+        if segment.keep_tail:
+            chosen.reverse()
+        return chosen if len(chosen) >= segment.min_items else []
+
+    def _assemble(self, segments: List[ContextSegment], chosen: Dict[int, List[str]]) -> str:
+        blocks = []
+        opened_groups = set()
+        for index, segment in enumerate(segments):
+            items = chosen.get(index)
+            if not items:
+                continue
+            if segment.group and segment.group not in opened_groups:
+                opened_groups.add(segment.group)
+                group_header = self.group_headers.get(segment.group)
+                if group_header:
+                    blocks.append(group_header)
+            blocks.append(segment.render(items))
+        return self.separator.join(blocks)
+
+    def pack(self, segments: List[ContextSegment]) -> PackResult:
+        remaining = self.budget_tokens
+        chosen: Dict[int, List[str]] = {}
+        opened_groups = set()
+        result = PackResult(text="", tokens=0, budget=self.budget_tokens)
+
+        order = sorted(range(len(segments)), key=lambda i: (segments[i].priority, i))
+        for index in order:
+            segment = segments[index]
+            if not segment.items:
+                continue
+
+            overhead = self._separator_tokens
+            group_header = None
+            if segment.group and segment.group not in opened_groups:
+                group_header = self.group_headers.get(segment.group)
+                if group_header:
+                    overhead += count_tokens(group_header) + self._separator_tokens
+
+            full_cost = count_tokens(segment.render()) + overhead
+            if full_cost <= remaining:
+                items = list(segment.items)
+                cost = full_cost
+            else:
+                items = self._fit_items(segment, remaining - overhead)
+                cost = count_tokens(segment.render(items)) + overhead if items else 0
+
+            if not items:
+                result.dropped.append(segment.name)
+                continue
+            if len(items) < len(segment.items):
+                result.shrunk.append(segment.name)
+
+            chosen[index] = items
+            remaining -= cost
+            if segment.group:
+                opened_groups.add(segment.group)
+
+        text = self._assemble(segments, chosen)
+
+        # Contagem por partes é aproximada nas junções: garantir o orçamento
+        # removendo itens do segmento incluído de menor prioridade
+        while count_tokens(text) > self.budget_tokens and chosen:
+            index = max(chosen, key=lambda i: (segments[i].priority, i))
+            chosen[index] = chosen[index][1:] if segments[index].keep_tail else chosen[index][:-1]
+            if len(chosen[index]) < max(1, segments[index].min_items):
+                del chosen[index]
+                result.dropped.append(segments[index].name)
+            elif segments[index].name not in result.shrunk:
+                result.shrunk.append(segments[index].name)
+            text = self._assemble(segments, chosen)
+
+        result.text = text
+        result.tokens = count_tokens(text)
+        result.included = {segments[i].name: len(items) for i, items in chosen.items()}
+        result.shrunk = [name for name in result.shrunk if name in result.included]
+        if result.shrunk or result.dropped:
+            logger.info(
+                f"📦 [PACKER] {result.tokens}/{self.budget_tokens} tokens ({TOKENIZER_NAME}) | "
+                f"resumidos: {result.shrunk or '-'} | descartados: {result.dropped or '-'}"
+            )
+        return result
+
+
+def fit_text(text: str, max_tokens: int, marker: str = TRUNCATION_MARKER) -> str:
+    """
+    Encaixa um bloco de texto no orçamento, cortando em fronteira de linha
+
+    Substitui cortes por caracteres (text[:N]) em prompts de bloco único.
+    """
+    if not text or count_tokens(text) <= max_tokens:
+        return text
+
+    marker_block = f"\n\n{marker}" if marker else ""
+    available = max_tokens - count_tokens(marker_block)
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = count_tokens(line) + 1
+        if used + cost > available:
+            if not kept:
+                kept.append(truncate_to_tokens(line, available))
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) + marker_block
+
+
+# Cabeçalhos de grupo do contexto hierárquico (build_rich_context_segments)
+CONTEXT_GROUP_HEADERS = {"memories": "=== MEMÓRIAS RELACIONADAS ==="}
+
+
+def pack_context(segments: List[ContextSegment], budget_tokens: int) -> str:
+    """Empacota as camadas do contexto da resposta no orçamento"""
+    return ContextPacker(budget_tokens, group_headers=CONTEXT_GROUP_HEADERS).pack(segments).text
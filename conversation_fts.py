@@ -0,0 +1,181 @@
+"""
+conversation_fts.py - Busca Textual (FTS5) sobre Conversas + Fusão RRF
+======================================================================
+
+_fallback_keyword_search fazia LIKE '%query%' em conversations (varredura
+completa que só acha a frase inteira) e o BM25 de semantic_search relia
+os arquivos .md de sessão. Aqui a busca por palavra-chave sai do banco
+de registro, com índice:
+
+- conversations_fts: tabela FTS5 de conteúdo externo sobre
+  conversations(user_input, ai_response, user_id), mantida por triggers
+  (INSERT/UPDATE/DELETE) e reconstruída uma vez na criação
+- tokenizer unicode61 com remove_diacritics 2: "coração" casa com
+  "coracao", "é" com "e"
+- user_id é coluna indexada: o filtro por usuário entra no MATCH
+  (user_id : "..." AND (...)) em vez de filtrar depois do ranking
+- ranking por bm25() com peso zero na coluna user_id
+
+reciprocal_rank_fusion combina listas ranqueadas (ChromaDB + FTS) pela
+posição, sem depender de escalas de score comparáveis.
+"""
+
+import re
+import sqlite3
+import logging
+import unicodedata
+from typing import Dict, Hashable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "conversations_fts"
+RRF_K = 60  # constante do artigo original de RRF (Cormack et al.)
+
+# Palavras sem valor de busca (pt-BR); "não" fica de fora de propósito
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das",
+    "em", "no", "na", "nos", "nas", "por", "para", "pra", "com", "sem", "que", "se",
+    "e", "ou", "mas", "como", "eu", "me", "mim", "voce", "ele", "ela", "isso", "isto",
+    "esse", "essa", "este", "esta", "ao", "aos", "foi", "ser", "sou", "era", "tem",
+    "ter", "ja", "mais", "muito", "meu", "minha", "seu", "sua", "lhe", "nem", "tambem",
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _fold(text: str) -> str:
+    """minúsculas sem acento, como o tokenizer (remove_diacritics)"""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in normalized if not unicodedata.combining(c))
+
+
+def ensure_conversation_fts(conn: sqlite3.Connection) -> bool:
+    """
+    Cria a tabela FTS5 e os triggers (idempotente); retorna se FTS5 está disponível
+
+    Na primeira criação indexa as conversas existentes ('rebuild').
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,))
+    existed = cursor.fetchone() is not None
+
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                user_input, ai_response, user_id,
+                content='conversations', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"⚠️ FTS5 indisponível neste SQLite ({e}); busca textual usa LIKE")
+        return False
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_ai AFTER INSERT ON conversations BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, user_input, ai_response, user_id)
+            VALUES (new.id, new.user_input, new.ai_response, new.user_id);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, user_input, ai_response, user_id)
+            VALUES ('delete', old.id, old.user_input, old.ai_response, old.user_id);
+        END
+    """)
+    # Só reindexa quando o texto muda (UPDATE de métricas/chroma_id não toca o índice)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_au
+        AFTER UPDATE OF user_input, ai_response, user_id ON conversations BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, user_input, ai_response, user_id)
+            VALUES ('delete', old.id, old.user_input, old.ai_response, old.user_id);
+            INSERT INTO {FTS_TABLE}(rowid, user_input, ai_response, user_id)
+            VALUES (new.id, new.user_input, new.ai_response, new.user_id);
+        END
+    """)
+
+    if not existed:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        logger.info(f"✅ Índice FTS5 de conversas criado ({cursor.fetchone()[0]} conversas indexadas)")
+    return True
+
+
+def build_match_query(user_id: str, text: str, max_terms: int = 12) -> str:
+    """
+    Expressão MATCH: usuário AND (termo1 OR termo2 ...)
+
+    Termos viram strings entre aspas (sem sintaxe FTS do usuário); termos
+    longos também casam por prefixo ("trabalho" → "trabal"*), uma
+    aproximação barata de radical para flexões em português.
+    Retorna "" se não sobrar termo útil.
+    """
+    terms = []
+    seen = set()
+    for token in _TOKEN_RE.findall(_fold(text)):
+        if len(token) < 2 or token in STOPWORDS or token in seen:
+            continue
+        seen.add(token)
+        if len(token) >= 6:
+            terms.append(f'"{token[:-2]}"*')
+        else:
+            terms.append(f'"{token}"')
+        if len(terms) >= max_terms:
+            break
+    if not terms:
+        return ""
+    user_literal = str(user_id).replace('"', '""')
+    return f'user_id : "{user_literal}" AND ({" OR ".join(terms)})'
+
+
+def search_conversations(conn: sqlite3.Connection, user_id: str, query: str, k: int = 10) -> List[Dict]:
+    """
+    Conversas do usuário ranqueadas por bm25 (melhor primeiro)
+
+    Returns:
+        [{"id", "user_input", "ai_response", "timestamp", "keywords", "bm25"}]
+        bm25 é negativo no SQLite (menor = mais relevante)
+    """
+    match = build_match_query(user_id, query)
+    if not match:
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT c.id, c.user_input, c.ai_response, c.timestamp, c.keywords,
+               bm25({FTS_TABLE}, 1.0, 0.6, 0.0) AS rank
+        FROM {FTS_TABLE}
+        JOIN conversations c ON c.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH ? AND c.user_id = ?
+        ORDER BY rank
+        LIMIT ?
+    """, (match, str(user_id), k))
+
+    return [
+        {
+            "id": row[0],
+            "user_input": row[1],
+            "ai_response": row[2],
+            "timestamp": row[3],
+            "keywords": row[4],
+            "bm25": row[5],
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], weights: Sequence[float] = None,
+                           k: int = RRF_K) -> Dict[Hashable, float]:
+    """
+    RRF: score(d) = Σ peso_i / (k + posição_i(d)), posição a partir de 1
+
+    Args:
+        rankings: listas de chaves, cada uma na ordem do seu ranqueador
+        weights: peso por lista (padrão 1.0)
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[Hashable, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for position, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + position)
+    return scores
@@ -0,0 +1,221 @@
+"""
+embedding_backends.py - Backends de Embedding Plugáveis (PyTorch / ONNX int8)
+=============================================================================
+
+HybridDatabaseManager (HuggingFaceEmbeddings) e o mem0 (embedder
+"huggingface") carregavam cada um o all-MiniLM-L6-v2 via PyTorch:
+centenas de MB de RAM por processo e dezenas de ms por embedding nos
+containers só-CPU.
+
+Config.EMBEDDING_BACKEND:
+
+- "torch" (padrão): HuggingFaceEmbeddings, comportamento anterior
+- "onnx": o mesmo MiniLM exportado para ONNX e quantizado em int8,
+  rodando no ONNX Runtime (já instalado como dependência do chromadb).
+  Mesma tokenização (tokenizer.json do modelo), mean pooling com máscara
+  e normalização L2 - o espaço vetorial é o mesmo, então o que já está
+  indexado no ChromaDB/Qdrant continua válido, sem re-indexar
+
+get_embeddings() devolve uma instância única por processo (interface
+LangChain embed_documents/embed_query), compartilhada entre ChromaDB e
+mem0. Inferência em lotes de Config.EMBEDDING_BATCH_SIZE, com os textos
+ordenados por tamanho para reduzir padding.
+
+O modelo ONNX vem do repositório do sentence-transformers no Hugging Face
+Hub (pasta onnx/, variantes quantizadas) ou de EMBEDDING_ONNX_PATH.
+Para quantizar localmente a partir do model.onnx fp32:
+
+    python embedding_backends.py quantize <diretório com model.onnx>
+
+Concordância com o baseline PyTorch: test_embedding_backends.py
+(cosseno por texto entre os dois backends).
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_REPO = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIMS = 384
+MAX_SEQ_LENGTH = 256  # max_seq_length do sentence-transformers para este modelo
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+
+try:
+    from langchain_core.embeddings import Embeddings as _EmbeddingsBase
+except ImportError:
+    _EmbeddingsBase = object
+
+
+class OnnxMiniLMEmbeddings(_EmbeddingsBase):
+    """
+    all-MiniLM-L6-v2 no ONNX Runtime (int8), compatível com Embeddings do LangChain
+
+    Args:
+        model_path: arquivo .onnx
+        tokenizer_path: tokenizer.json do modelo
+        batch_size: textos por chamada ao ONNX Runtime
+        threads: intra_op_num_threads (0 = padrão do ONNX Runtime)
+    """
+
+    def __init__(self, model_path: str, tokenizer_path: str, batch_size: int = 32, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+        self.batch_size = max(1, batch_size)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(e.ids) for e in encodings)
+
+        input_ids = np.zeros((len(texts), length), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, tokens, 384)
+
+        # Mean pooling com máscara + L2 (módulos Pooling/Normalize do sentence-transformers)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """Embeddings normalizados (n, 384) na ordem de entrada"""
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIMS), dtype=np.float32)
+        # Lotes por tamanho: textos parecidos juntos = menos padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        result = np.empty((len(texts), EMBEDDING_DIMS), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            result[chunk] = self._encode_batch([texts[i] for i in chunk])
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+def _onnx_files() -> tuple:
+    """(modelo .onnx, tokenizer.json) de EMBEDDING_ONNX_PATH ou do Hugging Face Hub"""
+    from jung_core import Config
+
+    local_dir = Config.EMBEDDING_ONNX_PATH
+    if local_dir:
+        model_path = local_dir if local_dir.endswith(".onnx") else os.path.join(local_dir, Config.EMBEDDING_ONNX_FILE)
+        base_dir = os.path.dirname(model_path)
+        tokenizer_path = os.path.join(base_dir, "tokenizer.json")
+        if not os.path.exists(tokenizer_path):
+            tokenizer_path = os.path.join(os.path.dirname(base_dir), "tokenizer.json")
+        return model_path, tokenizer_path
+
+    from huggingface_hub import hf_hub_download
+    return (
+        hf_hub_download(MODEL_REPO, Config.EMBEDDING_ONNX_FILE),
+        hf_hub_download(MODEL_REPO, "tokenizer.json"),
+    )
+
+
+def create_embeddings(backend: str):
+    """Instancia o backend pedido ("torch" | "onnx")"""
+    from jung_core import Config
+
+    started = time.monotonic()
+    if backend == BACKEND_ONNX:
+        model_path, tokenizer_path = _onnx_files()
+        embeddings = OnnxMiniLMEmbeddings(
+            model_path, tokenizer_path,
+            batch_size=Config.EMBEDDING_BATCH_SIZE,
+            threads=Config.EMBEDDING_ONNX_THREADS,
+        )
+        detail = os.path.basename(model_path)
+    elif backend == BACKEND_TORCH:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(
+            model_name=MODEL_NAME,
+            encode_kwargs={"batch_size": Config.EMBEDDING_BATCH_SIZE},
+        )
+        detail = "PyTorch"
+    else:
+        raise ValueError(f"EMBEDDING_BACKEND inválido: {backend} (use {BACKEND_TORCH} ou {BACKEND_ONNX})")
+
+    logger.info(f"✅ Embeddings {MODEL_NAME} ({backend}: {detail}) carregados em {time.monotonic() - started:.1f}s")
+    return embeddings
+
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    """Embeddings do processo (Config.EMBEDDING_BACKEND), compartilhados por ChromaDB e mem0"""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                from jung_core import Config
+                backend = Config.EMBEDDING_BACKEND
+                try:
+                    _embeddings = create_embeddings(backend)
+                except ImportError as e:
+                    if backend == BACKEND_TORCH:
+                        raise
+                    logger.warning(f"⚠️ Backend de embeddings '{backend}' indisponível ({e}); usando PyTorch")
+                    _embeddings = create_embeddings(BACKEND_TORCH)
+    return _embeddings
+
+
+def cosine_agreement(texts: List[str], reference, candidate) -> np.ndarray:
+    """Cosseno, texto a texto, entre os embeddings de dois backends"""
+    a = np.asarray(reference.embed_documents(texts), dtype=np.float64)
+    b = np.asarray(candidate.embed_documents(texts), dtype=np.float64)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def quantize_model(model_dir: str) -> str:
+    """Quantização dinâmica int8 (pesos) de <model_dir>/model.onnx → model_int8.onnx"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    source = os.path.join(model_dir, "model.onnx")
+    target = os.path.join(model_dir, "model_int8.onnx")
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+    logger.info(f"✅ {target}: {os.path.getsize(source) / 1e6:.0f}MB → {os.path.getsize(target) / 1e6:.0f}MB")
+    return target
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) == 3 and sys.argv[1] == "quantize":
+        quantize_model(sys.argv[2])
+    else:
+        print("Uso: python embedding_backends.py quantize <diretório com model.onnx>")
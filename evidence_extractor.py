@@ -47,6 +47,42 @@ class EvidenceExtractor:
         'neuroticism': ['anxiety', 'emotional_stability', 'sensitivity', 'calmness', 'resilience']
     }
 
+    # Descrição de cada dimensão usada nos prompts de extração
+    DIMENSION_INFO = {
+        'openness': {
+            'name': 'Abertura à Experiência (Openness)',
+            'high': 'criativo, curioso, busca novidades, imaginativo',
+            'low': 'prático, tradicional, prefere rotina, convencional',
+            'traits': ['criatividade', 'curiosidade', 'imaginação', 'preferência por rotina']
+        },
+        'conscientiousness': {
+            'name': 'Conscienciosidade (Conscientiousness)',
+            'high': 'organizado, planejado, disciplinado, responsável',
+            'low': 'espontâneo, flexível, improvisador, menos estruturado',
+            'traits': ['organização', 'planejamento', 'disciplina', 'espontaneidade']
+        },
+        'extraversion': {
+            'name': 'Extroversão (Extraversion)',
+            'high': 'social, energético, falante, busca estimulação',
+            'low': 'reservado, independente, introspectivo, prefere solidão',
+            'traits': ['sociabilidade', 'energia', 'comunicação', 'introspecção']
+        },
+        'agreeableness': {
+            'name': 'Amabilidade (Agreeableness)',
+            'high': 'empático, cooperativo, altruísta, confiante',
+            'low': 'analítico, competitivo, direto, cético',
+            'traits': ['empatia', 'cooperação', 'confiança', 'competitividade']
+        },
+        'neuroticism': {
+            'name': 'Neuroticismo (Neuroticism)',
+            'high': 'ansioso, emocionalmente reativo, sensível, preocupado',
+            'low': 'calmo, estável, resiliente, equilibrado',
+            'traits': ['ansiedade', 'estabilidade emocional', 'sensibilidade', 'resiliência']
+        }
+    }
+
+    DIMENSIONS = ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']
+
     def __init__(self, db_manager, llm_provider):
         """
         Args:
@@ -61,44 +97,104 @@ class EvidenceExtractor:
         user_id: str,
         psychometric_version: int,
         conversations: List[Dict],
-        big_five_scores: Dict
+        big_five_scores: Dict,
+        conversations_formatted: Optional[str] = None
     ) -> Dict[str, List[Evidence]]:
         """
         Extrai evidências para todas as dimensões do Big Five
 
+        Tenta primeiro uma única chamada ao LLM cobrindo as 5 dimensões;
+        dimensões ausentes na resposta caem para a extração individual,
+        reaproveitando a mesma transcrição formatada.
+
         Args:
             user_id: ID do usuário
             psychometric_version: Versão da análise psicométrica
             conversations: Lista de conversas do usuário
             big_five_scores: Scores do Big Five já calculados
+            conversations_formatted: Transcrição já formatada (opcional, ver
+                PsychometricPipeline); se None, é formatada aqui uma única vez
 
         Returns:
             Dict com dimensões como chaves e listas de Evidence como valores
         """
         logger.info(f"🔍 Extraindo evidências para {user_id} (v{psychometric_version})")
 
-        all_evidence = {}
+        if conversations_formatted is None:
+            conversations_formatted = self._format_conversations_with_ids(conversations)
+        conversations_by_id = self._index_conversations(conversations)
+
+        all_evidence = self._extract_all_dimensions_evidence(
+            conversations_formatted=conversations_formatted,
+            conversations_by_id=conversations_by_id,
+            big_five_scores=big_five_scores
+        )
+
+        for dimension in self.DIMENSIONS:
+            if dimension in all_evidence:
+                logger.info(f"    ✓ {dimension}: {len(all_evidence[dimension])} evidências (lote)")
+                continue
 
-        for dimension in ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']:
             logger.info(f"  Extraindo evidências para {dimension}...")
 
             evidence_list = self._extract_dimension_evidence(
                 dimension=dimension,
                 conversations=conversations,
-                expected_score=big_five_scores.get(dimension, {}).get('score', 50)
+                expected_score=big_five_scores.get(dimension, {}).get('score', 50),
+                conversations_formatted=conversations_formatted,
+                conversations_by_id=conversations_by_id
             )
 
             all_evidence[dimension] = evidence_list
 
             logger.info(f"    ✓ {len(evidence_list)} evidências encontradas")
 
+        return {dimension: all_evidence[dimension] for dimension in self.DIMENSIONS}
+
+    def _extract_all_dimensions_evidence(
+        self,
+        conversations_formatted: str,
+        conversations_by_id: Dict[int, Dict],
+        big_five_scores: Dict
+    ) -> Dict[str, List[Evidence]]:
+        """
+        Extrai evidências das 5 dimensões numa única chamada ao LLM
+
+        Returns:
+            Dict apenas com as dimensões presentes na resposta (vazio em caso de erro)
+        """
+        prompt = self._create_batch_evidence_extraction_prompt(
+            conversations_formatted=conversations_formatted,
+            big_five_scores=big_five_scores
+        )
+
+        try:
+            response = self.llm.get_response(prompt, temperature=0.3, max_tokens=6000)
+            evidence_data = self._parse_json_response(response)
+        except Exception as e:
+            logger.warning(f"⚠️ Extração em lote falhou, usando extração por dimensão: {e}")
+            return {}
+
+        dimensions_data = evidence_data.get('dimensions', {})
+        if not isinstance(dimensions_data, dict):
+            return {}
+
+        all_evidence = {}
+        for dimension in self.DIMENSIONS:
+            items = dimensions_data.get(dimension)
+            if not isinstance(items, list):
+                continue
+            all_evidence[dimension] = self._build_evidence_list(items, dimension, conversations_by_id)
+
         return all_evidence
 
     def _extract_dimension_evidence(
         self,
         dimension: str,
         conversations: List[Dict],
-        expected_score: int
+        expected_score: int,
+        conversations_formatted: Optional[str] = None,
+        conversations_by_id: Optional[Dict[int, Dict]] = None
     ) -> List[Evidence]:
         """
         Extrai evidências para uma dimensão específica
@@ -107,13 +203,18 @@ class EvidenceExtractor:
             dimension: Nome da dimensão ('openness', etc.)
             conversations: Lista de conversas
             expected_score: Score esperado (0-100) para contexto
+            conversations_formatted: Transcrição já formatada (opcional)
+            conversations_by_id: Índice id -> conversa (opcional)
 
         Returns:
             Lista de objetos Evidence
         """
 
         # Formatar conversas com IDs para rastreabilidade
-        conversations_formatted = self._format_conversations_with_ids(conversations)
+        if conversations_formatted is None:
+            conversations_formatted = self._format_conversations_with_ids(conversations)
+        if conversations_by_id is None:
+            conversations_by_id = self._index_conversations(conversations)
 
         # Criar prompt para Claude
         prompt = self._create_evidence_extraction_prompt(
@@ -129,45 +230,63 @@ class EvidenceExtractor:
             # Parse JSON robusto
             evidence_data = self._parse_json_response(response)
 
-            # Converter para objetos Evidence
-            evidence_list = []
-            for item in evidence_data.get('evidence', []):
-                try:
-                    conv_id = item['conversation_id']
-                    conv = next((c for c in conversations if c['id'] == conv_id), None)
-
-                    if not conv:
-                        logger.warning(f"Conversa ID {conv_id} não encontrada, pulando evidência")
-                        continue
-
-                    evidence = Evidence(
-                        conversation_id=conv_id,
-                        quote=item['quote'],
-                        context_before=item.get('context_before'),
-                        context_after=item.get('context_after'),
-                        dimension=dimension,
-                        trait_indicator=item.get('trait_indicator', 'general'),
-                        direction=item.get('direction', 'positive'),
-                        relevance_score=item.get('relevance', 0.5),
-                        confidence=item.get('confidence', 0.5),
-                        explanation=item.get('explanation', ''),
-                        conversation_timestamp=datetime.fromisoformat(conv['timestamp']),
-                        is_ambiguous=item.get('is_ambiguous', False)
-                    )
-
-                    evidence_list.append(evidence)
-
-                except Exception as e:
-                    logger.error(f"Erro ao processar evidência: {e}")
-                    continue
-
-            return evidence_list
+            return self._build_evidence_list(
+                evidence_data.get('evidence', []), dimension, conversations_by_id
+            )
 
         except Exception as e:
             logger.error(f"Erro ao extrair evidências para {dimension}: {e}")
             return []
 
-    def _format_conversations_with_ids(self, conversations: List[Dict]) -> str:
+    def _build_evidence_list(
+        self,
+        items: List[Dict],
+        dimension: str,
+        conversations_by_id: Dict[int, Dict]
+    ) -> List[Evidence]:
+        """Converte itens da resposta do LLM em objetos Evidence"""
+        evidence_list = []
+        for item in items:
+            try:
+                conv_id = item['conversation_id']
+                conv = conversations_by_id.get(conv_id)
+                if conv is None and isinstance(conv_id, str) and conv_id.isdigit():
+                    conv = conversations_by_id.get(int(conv_id))
+
+                if not conv:
+                    logger.warning(f"Conversa ID {conv_id} não encontrada, pulando evidência")
+                    continue
+
+                evidence = Evidence(
+                    conversation_id=conv['id'],
+                    quote=item['quote'],
+                    context_before=item.get('context_before'),
+                    context_after=item.get('context_after'),
+                    dimension=dimension,
+                    trait_indicator=item.get('trait_indicator', 'general'),
+                    direction=item.get('direction', 'positive'),
+                    relevance_score=item.get('relevance', 0.5),
+                    confidence=item.get('confidence', 0.5),
+                    explanation=item.get('explanation', ''),
+                    conversation_timestamp=datetime.fromisoformat(conv['timestamp']),
+                    is_ambiguous=item.get('is_ambiguous', False)
+                )
+
+                evidence_list.append(evidence)
+
+            except Exception as e:
+                logger.error(f"Erro ao processar evidência: {e}")
+                continue
+
+        return evidence_list
+
+    @staticmethod
+    def _index_conversations(conversations: List[Dict]) -> Dict[int, Dict]:
+        """Indexa conversas por ID (evita varreduras lineares por evidência)"""
+        return {c['id']: c for c in conversations}
+
+    @staticmethod
+    def _format_conversations_with_ids(conversations: List[Dict]) -> str:
         """Formata conversas incluindo IDs para rastreabilidade"""
         formatted = []
 
@@ -188,40 +307,7 @@ Jung: {conv['ai_response'][:150]}...
     ) -> str:
         """Cria prompt para extração de evidências"""
 
-        dimension_info = {
-            'openness': {
-                'name': 'Abertura à Experiência (Openness)',
-                'high': 'criativo, curioso, busca novidades, imaginativo',
-                'low': 'prático, tradicional, prefere rotina, convencional',
-                'traits': ['criatividade', 'curiosidade', 'imaginação', 'preferência por rotina']
-            },
-            'conscientiousness': {
-                'name': 'Conscienciosidade (Conscientiousness)',
-                'high': 'organizado, planejado, disciplinado, responsável',
-                'low': 'espontâneo, flexível, improvisador, menos estruturado',
-                'traits': ['organização', 'planejamento', 'disciplina', 'espontaneidade']
-            },
-            'extraversion': {
-                'name': 'Extroversão (Extraversion)',
-                'high': 'social, energético, falante, busca estimulação',
-                'low': 'reservado, independente, introspectivo, prefere solidão',
-                'traits': ['sociabilidade', 'energia', 'comunicação', 'introspecção']
-            },
-            'agreeableness': {
-                'name': 'Amabilidade (Agreeableness)',
-                'high': 'empático, cooperativo, altruísta, confiante',
-                'low': 'analítico, competitivo, direto, cético',
-                'traits': ['empatia', 'cooperação', 'confiança', 'competitividade']
-            },
-            'neuroticism': {
-                'name': 'Neuroticismo (Neuroticism)',
-                'high': 'ansioso, emocionalmente reativo, sensível, preocupado',
-                'low': 'calmo, estável, resiliente, equilibrado',
-                'traits': ['ansiedade', 'estabilidade emocional', 'sensibilidade', 'resiliência']
-            }
-        }
-
-        info = dimension_info[dimension]
+        info = self.DIMENSION_INFO[dimension]
 
         prompt = f"""Você é um psicólogo especializado em análise de personalidade Big Five.
 
@@ -275,6 +361,70 @@ FORMATO DE RESPOSTA (JSON válido):
     ]
 }}
 
+IMPORTANTE: Retorne APENAS o JSON válido, sem markdown ou texto adicional."""
+
+        return prompt
+
+    def _create_batch_evidence_extraction_prompt(
+        self,
+        conversations_formatted: str,
+        big_five_scores: Dict
+    ) -> str:
+        """Cria prompt único para extração de evidências das 5 dimensões"""
+
+        dimension_lines = []
+        for dimension in self.DIMENSIONS:
+            info = self.DIMENSION_INFO[dimension]
+            score = big_five_scores.get(dimension, {}).get('score', 50)
+            dimension_lines.append(
+                f"- {dimension} — {info['name']} (score anterior: {score}/100)\n"
+                f"  Alto: {info['high']} | Baixo: {info['low']}\n"
+                f"  Traits: {', '.join(info['traits'])}"
+            )
+        dimensions_text = "\n".join(dimension_lines)
+
+        prompt = f"""Você é um psicólogo especializado em análise de personalidade Big Five.
+
+TAREFA: Extrair CITAÇÕES LITERAIS das conversas que são evidências de CADA UMA das 5 dimensões abaixo.
+
+DIMENSÕES:
+{dimensions_text}
+
+CONVERSAS:
+{conversations_formatted}
+
+INSTRUÇÕES:
+1. Para cada dimensão, identifique citações do USUÁRIO que são evidências claras dela
+2. Apenas citações EXPLÍCITAS e DIRETAS - não inferências vagas
+3. No máximo 8 evidências por dimensão, priorizando as mais fortes (relevance > 0.7)
+4. Uma mesma citação pode aparecer em mais de uma dimensão se for relevante para ambas
+5. Se o usuário contradiz a si mesmo, marque como ambígua
+6. Inclua TODAS as 5 dimensões na resposta (lista vazia se não houver evidências)
+
+FORMATO DE RESPOSTA (JSON válido):
+{{
+    "dimensions": {{
+        "openness": [
+            {{
+                "conversation_id": 123,
+                "quote": "citação literal aqui",
+                "context_before": "contexto anterior (opcional)",
+                "context_after": "contexto posterior (opcional)",
+                "trait_indicator": "creativity",
+                "direction": "positive",
+                "relevance": 0.85,
+                "confidence": 0.90,
+                "is_ambiguous": false,
+                "explanation": "Usuário demonstra busca ativa por experiências criativas"
+            }}
+        ],
+        "conscientiousness": [],
+        "extraversion": [],
+        "agreeableness": [],
+        "neuroticism": []
+    }}
+}}
+
 IMPORTANTE: Retorne APENAS o JSON válido, sem markdown ou texto adicional."""
 
         return prompt
@@ -13,7 +13,10 @@ Versão: 1.0.0
 
 import re
 import json
+import time
+import asyncio
 import logging
+import threading
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from datetime import datetime
@@ -67,6 +70,11 @@ class DetectionConfig:
     # Intensidade default quando não detectada
     DEFAULT_INTENSITY = 3
 
+    # Sink assíncrono de detecções (FragmentDetectionSink)
+    SINK_BATCH_SIZE = 32           # Flush a cada N mensagens enfileiradas
+    SINK_FLUSH_INTERVAL_MS = 2000  # ...ou a cada T milissegundos
+    SINK_MAX_PENDING = 1000        # Tamanho máximo da fila (backpressure)
+
 
 # =============================================================================
 # DATA CLASSES
@@ -175,7 +183,6 @@ class FragmentDetector:
         Returns:
             DetectionResult com todos os matches encontrados
         """
-        import time
         start_time = time.time()
 
         # Verificar limite de sessão
@@ -592,6 +599,224 @@ class FragmentDetector:
         logger.debug("Contador de sessão resetado")
 
 
+# =============================================================================
+# DETECTION SINK (Persistência assíncrona em lote)
+# =============================================================================
+
+def detection_rows(result: DetectionResult) -> List[Tuple]:
+    """Converte um DetectionResult em linhas para INSERT em detected_fragments (SQLite)."""
+    return [
+        (
+            result.user_id,
+            match.fragment_id,
+            match.intensity,
+            match.confidence,
+            match.source_text[:500] if match.source_text else None,
+        )
+        for match in result.matches
+    ]
+
+
+INSERT_DETECTION_SQL = """
+    INSERT INTO detected_fragments
+        (user_id, fragment_id, intensity, detection_confidence, source_quote, detected_at)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+
+
+class FragmentDetectionSink:
+    """
+    Tira a detecção TRI do caminho da mensagem.
+
+    O handler apenas enfileira a mensagem (submit, não bloqueante). Uma task
+    de background acumula os itens e, a cada SINK_BATCH_SIZE mensagens ou
+    SINK_FLUSH_INTERVAL_MS, roda a detecção e grava tudo com um único
+    executemany + commit, fora do event loop (asyncio.to_thread).
+
+    Backpressure: a fila é limitada a SINK_MAX_PENDING. submit() descarta
+    (e contabiliza) quando cheia; put() aguarda espaço.
+
+    Com um estimator (irt_engine.OnlineTraitEstimator), as estimativas theta
+    são atualizadas incrementalmente logo após cada flush.
+    """
+
+    def __init__(
+        self,
+        detector: FragmentDetector,
+        conn,
+        lock: Optional[threading.RLock] = None,
+        estimator=None,
+        batch_size: int = DetectionConfig.SINK_BATCH_SIZE,
+        flush_interval_ms: int = DetectionConfig.SINK_FLUSH_INTERVAL_MS,
+        max_pending: int = DetectionConfig.SINK_MAX_PENDING
+    ):
+        """
+        Args:
+            detector: FragmentDetector usado para detectar (modo sync)
+            conn: Conexão sqlite3 (ex: HybridDatabaseManager.conn)
+            lock: Lock que protege a conexão compartilhada (ex: HybridDatabaseManager._lock)
+            estimator: OnlineTraitEstimator opcional (atualização incremental de theta)
+        """
+        self.detector = detector
+        self.conn = conn
+        self.lock = lock or threading.RLock()
+        self.estimator = estimator
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000.0
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+
+        # Estatísticas
+        self.messages_processed = 0
+        self.fragments_saved = 0
+        self.flushes = 0
+        self.dropped = 0
+
+    # -------------------------------------------------------------------------
+    # Ciclo de vida
+    # -------------------------------------------------------------------------
+
+    def start(self):
+        """Inicia a task de flush (deve ser chamado dentro de um event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"🧬 TRI Sink iniciado (batch={self.batch_size}, "
+                f"intervalo={int(self.flush_interval * 1000)}ms, fila={self._queue.maxsize})"
+            )
+
+    async def stop(self):
+        """Para a task de background e faz o flush final de tudo que está pendente."""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Drenar o que sobrou na fila
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        if remaining:
+            await asyncio.to_thread(self._process_batch, remaining)
+
+        logger.info(
+            f"🧬 TRI Sink parado: {self.messages_processed} mensagens, "
+            f"{self.fragments_saved} fragmentos salvos em {self.flushes} flushes "
+            f"({self.dropped} descartadas)"
+        )
+
+    # -------------------------------------------------------------------------
+    # Enfileiramento
+    # -------------------------------------------------------------------------
+
+    def submit(
+        self,
+        message: str,
+        user_id: str,
+        message_id: Optional[str] = None,
+        context: Optional[Dict] = None
+    ) -> bool:
+        """
+        Enfileira uma mensagem sem bloquear. Retorna False se a fila estiver cheia.
+        """
+        try:
+            self._queue.put_nowait((message, user_id, message_id, context))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"🧬 TRI Sink: fila cheia, detecção descartada para {user_id[:8]}")
+            return False
+
+    async def put(
+        self,
+        message: str,
+        user_id: str,
+        message_id: Optional[str] = None,
+        context: Optional[Dict] = None
+    ):
+        """Enfileira uma mensagem aguardando espaço na fila (backpressure)."""
+        await self._queue.put((message, user_id, message_id, context))
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    # -------------------------------------------------------------------------
+    # Flush
+    # -------------------------------------------------------------------------
+
+    async def _run(self):
+        """Loop de background: acumula até batch_size ou flush_interval."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await asyncio.to_thread(self._process_batch, batch)
+            except Exception as e:
+                logger.error(f"🧬 TRI Sink: erro no flush de {len(batch)} mensagens: {e}")
+
+    def _process_batch(self, batch: List[Tuple]) -> int:
+        """Detecta fragmentos do lote e grava tudo em uma única transação."""
+        rows: List[Tuple] = []
+
+        for message, user_id, message_id, context in batch:
+            try:
+                result = self.detector.detect(
+                    message=message,
+                    user_id=user_id,
+                    message_id=message_id,
+                    context=context
+                )
+                rows.extend(detection_rows(result))
+            except Exception as e:
+                logger.warning(f"🧬 TRI Sink: erro na detecção para {user_id[:8]}: {e}")
+
+        self.messages_processed += len(batch)
+
+        if rows:
+            with self.lock:
+                try:
+                    self.conn.executemany(INSERT_DETECTION_SQL, rows)
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+
+            self.fragments_saved += len(rows)
+            self.flushes += 1
+            logger.info(f"🧬 TRI Sink: {len(rows)} fragmentos de {len(batch)} mensagens salvos")
+
+            if self.estimator is not None:
+                by_user: Dict[str, List[Tuple[str, int]]] = {}
+                for user_id, fragment_id, intensity, _, _ in rows:
+                    by_user.setdefault(user_id, []).append((fragment_id, intensity))
+                for user_id, detections in by_user.items():
+                    try:
+                        self.estimator.update(user_id, detections)
+                    except Exception as e:
+                        logger.warning(f"🧬 TRI Sink: erro ao atualizar theta de {user_id[:8]}: {e}")
+
+        return len(rows)
+
+
 # =============================================================================
 # FRAGMENT ANALYZER (Análise em Lote)
 # =============================================================================
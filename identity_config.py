@@ -26,6 +26,10 @@ IDENTITY_RUMINATION_SYNC_INTERVAL_HOURS = 6  # Sync com ruminação a cada 6 hor
 # Limites de Processamento
 MAX_CONVERSATIONS_PER_CONSOLIDATION = 20  # Máximo de conversas por job
 BACKLOG_PROCESSING_BATCH_SIZE = 100  # Tamanho do batch para processar backlog
+IDENTITY_EXTRACTION_CONCURRENCY = 4  # Extrações LLM simultâneas (fora do event loop)
+IDENTITY_BATCH_MAX_CONVERSATIONS = 4  # Conversas curtas agrupadas num único prompt
+IDENTITY_BATCH_MAX_CHARS = 6000  # Tamanho máximo (entrada + resposta) de um prompt agrupado
+IDENTITY_COMMIT_GROUP_SIZE = 10  # Conversas gravadas por transação
 
 # Configurações de Context Building
 MAX_NUCLEAR_ATTRIBUTES_IN_CONTEXT = 3  # Crenças nucleares injetadas no contexto
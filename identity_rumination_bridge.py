@@ -11,13 +11,14 @@ Ambos os sistemas operam apenas com o usuário master admin.
 """
 
 import logging
-import json
 import asyncio
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional
 
 from identity_config import AGENT_INSTANCE, MIN_CERTAINTY_FOR_NUCLEAR, ADMIN_USER_ID
+from agent_identity_context_builder import AgentIdentityContextBuilder, bump_identity_generation
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,6 +39,15 @@ def find_database():
     return possible_paths[0]
 
 
+# Fluxos da ponte (chaves do ledger/watermark e do relatório)
+FLOW_TENSIONS = "tensions_to_contradictions"
+FLOW_INSIGHTS = "insights_to_core"
+FLOW_FRAGMENTS = "fragments_to_possible_selves"
+FLOW_FEEDBACK = "contradictions_to_rumination"
+
+RUMINATION_TABLES = ("rumination_tensions", "rumination_insights", "rumination_fragments")
+
+
 class IdentityRuminationBridge:
     """
     Ponte bidirecional entre Identidade e Ruminação
@@ -47,6 +57,12 @@ class IdentityRuminationBridge:
     2. Insights de ruminação maduros → Crenças nucleares
     3. Fragmentos recorrentes → Selves possíveis (temidos/perdidos)
     4. Contradições não resolvidas → Novas tensões de ruminação
+
+    Cada fluxo é uma operação em conjunto (INSERT … SELECT com anti-join)
+    sobre uma tabela temporária de candidatos. Fontes já avaliadas ficam em
+    identity_rumination_sync_ledger (tensões, insights) ou atrás de um
+    watermark de id (fragmentos), então cada execução só olha itens novos.
+    run_sync() executa os quatro fluxos numa única transação.
     """
 
     def __init__(self, db_connection):
@@ -55,348 +71,460 @@ class IdentityRuminationBridge:
             db_connection: Conexão SQLite (HybridDatabaseManager)
         """
         self.db = db_connection
+        self._schema_ready = False
 
-    def sync_mature_tensions_to_contradictions(self) -> int:
-        """
-        Ruminação → Identidade: Tensões maduras viram contradições
-
-        Busca tensões com maturity_score > 0.6 e ainda não exportadas,
-        cria contradições correspondentes no sistema de identidade.
+    # ------------------------------------------------------------------
+    # Schema de suporte
+    # ------------------------------------------------------------------
 
-        Returns:
-            int: Número de tensões sincronizadas
-        """
-        cursor = self.db.conn.cursor()
+    def _ensure_schema(self, cursor, rumination_tables: set):
+        """Ledger, watermarks e índices usados pelos anti-joins"""
+        if self._schema_ready:
+            return
 
-        try:
-            # Verificar se tabela de ruminação existe
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS identity_rumination_sync_ledger (
+                flow TEXT NOT NULL,
+                source_id INTEGER NOT NULL,
+                synced_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (flow, source_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS identity_rumination_sync_state (
+                flow TEXT PRIMARY KEY,
+                watermark INTEGER NOT NULL DEFAULT 0,
+                last_run_at DATETIME,
+                last_rows INTEGER DEFAULT 0,
+                last_duration_ms REAL DEFAULT 0
+            )
+        """)
+
+        # Índices de lookup dos anti-joins. Não são UNIQUE: o extrator grava
+        # nas mesmas tabelas e bancos antigos podem ter duplicatas legítimas;
+        # a unicidade da ponte é garantida pelo ledger.
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_contradictions_poles
+            ON agent_identity_contradictions(agent_instance, pole_a, pole_b)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_contradictions_feed
+            ON agent_identity_contradictions(fed_to_rumination, status)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_identity_core_content
+            ON agent_identity_core(agent_instance, content, is_current)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_agent_possible_selves_description
+            ON agent_possible_selves(agent_instance, description, status)
+        """)
+        if "rumination_tensions" in rumination_tables:
             cursor.execute("""
-                SELECT name FROM sqlite_master
-                WHERE type='table' AND name='rumination_tensions'
+                CREATE INDEX IF NOT EXISTS idx_tensions_poles_status
+                ON rumination_tensions(pole_a_content, pole_b_content, status)
             """)
-            if not cursor.fetchone():
-                logger.warning("⚠️ Tabela rumination_tensions não existe - pulando sync")
-                return 0
-
-            # Buscar tensões maduras (schema real: pole_a_content, pole_b_content)
             cursor.execute("""
-                SELECT id, pole_a_content, pole_b_content, tension_type, intensity,
-                       first_detected_at
-                FROM rumination_tensions
-                WHERE maturity_score > 0.6
-                  AND status = 'open'
+                CREATE INDEX IF NOT EXISTS idx_tensions_status_maturity
+                ON rumination_tensions(status, maturity_score)
             """)
-
-            tensions = cursor.fetchall()
-
-            if not tensions:
-                return 0
-
-            logger.info(f"   🔄 Sincronizando {len(tensions)} tensões → contradições")
-
-            synced_count = 0
-            for row in tensions:
-                tension_id, pole_a, pole_b, tension_type, intensity, first_detected = row
-
-                # Verificar idempotência: contradição com mesmo polo já existe?
-                cursor.execute("""
-                    SELECT id FROM agent_identity_contradictions
-                    WHERE agent_instance = ? AND pole_a = ? AND pole_b = ?
-                """, (AGENT_INSTANCE, pole_a, pole_b))
-                if cursor.fetchone():
-                    continue
-
-                # Criar contradição identitária
-                cursor.execute("""
-                    INSERT INTO agent_identity_contradictions (
-                        agent_instance, pole_a, pole_b, contradiction_type,
-                        tension_level, salience, first_detected_at, last_activated_at,
-                        supporting_conversation_ids, status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)
-                """, (
-                    AGENT_INSTANCE,
-                    pole_a,
-                    pole_b,
-                    tension_type,
-                    intensity,
-                    intensity,
-                    first_detected,
-                    json.dumps([]),
-                    'unresolved'
-                ))
-
-                synced_count += 1
-
-            self.db.conn.commit()
-            logger.info(f"   ✅ {synced_count} tensões sincronizadas")
-            return synced_count
-
-        except Exception as e:
-            self.db.conn.rollback()
-            logger.error(f"   ❌ Erro ao sincronizar tensões: {e}")
-            return 0
-
-    def sync_mature_insights_to_core(self) -> int:
-        """
-        Ruminação → Identidade: Insights maduros viram crenças nucleares
-
-        Busca insights com synthesis_level = 'symbolic' e ainda não exportados,
-        cria atributos nucleares correspondentes.
-
-        Returns:
-            int: Número de insights sincronizados
-        """
-        cursor = self.db.conn.cursor()
-
-        try:
-            # Verificar se tabela existe
+        if "rumination_insights" in rumination_tables:
             cursor.execute("""
-                SELECT name FROM sqlite_master
-                WHERE type='table' AND name='rumination_insights'
+                CREATE INDEX IF NOT EXISTS idx_insights_status_id
+                ON rumination_insights(status, id)
             """)
-            if not cursor.fetchone():
-                logger.warning("⚠️ Tabela rumination_insights não existe - pulando sync")
-                return 0
-
-            # Buscar insights prontos (schema real: full_message, symbol_content)
+        if "rumination_fragments" in rumination_tables:
             cursor.execute("""
-                SELECT id, full_message, symbol_content,
-                       crystallized_at, source_tension_id
-                FROM rumination_insights
-                WHERE status = 'ready'
+                CREATE INDEX IF NOT EXISTS idx_fragments_content_processed
+                ON rumination_fragments(content, processed)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_fragments_processed_id
+                ON rumination_fragments(processed, id)
             """)
 
-            insights = cursor.fetchall()
-
-            if not insights:
-                return 0
-
-            logger.info(f"   🔄 Sincronizando {len(insights)} insights → nuclear")
-
-            synced_count = 0
-            for row in insights:
-                insight_id, content, symbolic, crystallized, conv_id = row
-
-                # Classificar tipo de atributo baseado no conteúdo
-                # (simplificado - pode usar LLM para classificação mais precisa)
-                attribute_type = self._classify_insight_type(content, symbolic)
-
-                # Usar interpretação simbólica como conteúdo
-                nuclear_content = symbolic if symbolic else content
-
-                # Verificar se já existe atributo similar
-                cursor.execute("""
-                    SELECT id FROM agent_identity_core
-                    WHERE agent_instance = ?
-                      AND content = ?
-                      AND is_current = 1
-                """, (AGENT_INSTANCE, nuclear_content))
-
-                if cursor.fetchone():
-                    continue  # Já existe, pular
-
-                # Criar novo atributo nuclear
-                cursor.execute("""
-                    INSERT INTO agent_identity_core (
-                        agent_instance, attribute_type, content, certainty,
-                        first_crystallized_at, last_reaffirmed_at,
-                        supporting_conversation_ids, emerged_in_relation_to
-                    ) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)
-                """, (
-                    AGENT_INSTANCE,
-                    attribute_type,
-                    nuclear_content,
-                    0.75,  # Certainty moderado para insights de ruminação
-                    crystallized if crystallized else datetime.now().isoformat(),
-                    json.dumps([conv_id] if conv_id else []),
-                    'ruminação sobre interações'
-                ))
-
-                # Marcar insight como entregue
-                cursor.execute("""
-                    UPDATE rumination_insights
-                    SET status = 'delivered'
-                    WHERE id = ?
-                """, (insight_id,))
-
-                synced_count += 1
-
-            self.db.conn.commit()
-            logger.info(f"   ✅ {synced_count} insights sincronizados")
-            return synced_count
-
-        except Exception as e:
-            self.db.conn.rollback()
-            logger.error(f"   ❌ Erro ao sincronizar insights: {e}")
-            return 0
-
-    def sync_fragments_to_possible_selves(self) -> int:
+        self.db.conn.create_function("bridge_classify_insight", 2, self._classify_insight_type)
+        self._schema_ready = True
+
+    def _existing_rumination_tables(self, cursor) -> set:
+        cursor.execute(f"""
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name IN ({",".join("?" * len(RUMINATION_TABLES))})
+        """, RUMINATION_TABLES)
+        return {row[0] for row in cursor.fetchall()}
+
+    def _get_watermark(self, cursor, flow: str) -> int:
+        cursor.execute("SELECT watermark FROM identity_rumination_sync_state WHERE flow = ?", (flow,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _record_run(self, cursor, flow: str, rows: int, duration_ms: float,
+                    watermark: Optional[int] = None):
+        cursor.execute("""
+            INSERT INTO identity_rumination_sync_state
+                (flow, watermark, last_run_at, last_rows, last_duration_ms)
+            VALUES (?, COALESCE(?, 0), CURRENT_TIMESTAMP, ?, ?)
+            ON CONFLICT(flow) DO UPDATE SET
+                watermark = COALESCE(?, watermark),
+                last_run_at = CURRENT_TIMESTAMP,
+                last_rows = excluded.last_rows,
+                last_duration_ms = excluded.last_duration_ms
+        """, (flow, watermark, rows, round(duration_ms, 2), watermark))
+
+    @staticmethod
+    def _reset_batch(cursor):
+        cursor.execute("DROP TABLE IF EXISTS temp.bridge_batch")
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+
+    def run_sync(self) -> Dict[str, Dict]:
         """
-        Ruminação → Identidade: Fragmentos recorrentes viram selves temidos/perdidos
-
-        Busca fragmentos que aparecem 3+ vezes com alta carga emocional,
-        cria selves possíveis correspondentes.
+        Executa os quatro fluxos numa única transação
 
         Returns:
-            int: Número de fragmentos sincronizados
+            {fluxo: {"rows": int, "candidates": int, "ms": float}};
+            dicionário vazio em caso de erro (transação desfeita)
         """
-        cursor = self.db.conn.cursor()
+        flows = (
+            (FLOW_TENSIONS, "rumination_tensions", self._sync_tensions),
+            (FLOW_INSIGHTS, "rumination_insights", self._sync_insights),
+            (FLOW_FRAGMENTS, "rumination_fragments", self._sync_fragments),
+            (FLOW_FEEDBACK, "rumination_tensions", self._feed_contradictions),
+        )
+        report = {}
+
+        with self.db._lock:
+            cursor = self.db.conn.cursor()
+            try:
+                tables = self._existing_rumination_tables(cursor)
+                self._ensure_schema(cursor, tables)
+                if not self.db.conn.in_transaction:
+                    cursor.execute("BEGIN")
+
+                for flow, required_table, step in flows:
+                    if required_table not in tables:
+                        logger.warning(f"⚠️ Tabela {required_table} não existe - pulando {flow}")
+                        report[flow] = {"rows": 0, "candidates": 0, "ms": 0.0}
+                        continue
+
+                    started = time.perf_counter()
+                    rows, candidates, watermark = step(cursor)
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    self._record_run(cursor, flow, rows, elapsed_ms, watermark)
+                    report[flow] = {"rows": rows, "candidates": candidates, "ms": round(elapsed_ms, 2)}
+
+                self._reset_batch(cursor)
+
+                if any(report[flow]["rows"] for flow in (FLOW_TENSIONS, FLOW_INSIGHTS, FLOW_FRAGMENTS)):
+                    bump_identity_generation(cursor)
+
+                self.db.conn.commit()
+
+            except Exception as e:
+                self.db.conn.rollback()
+                logger.error(f"   ❌ Erro na sincronização em lote: {e}")
+                return {}
+
+        return report
 
-        try:
-            # Verificar se tabela existe
-            cursor.execute("""
-                SELECT name FROM sqlite_master
-                WHERE type='table' AND name='rumination_fragments'
-            """)
-            if not cursor.fetchone():
-                logger.warning("⚠️ Tabela rumination_fragments não existe - pulando sync")
-                return 0
+    def sync_mature_tensions_to_contradictions(self) -> int:
+        """Ruminação → Identidade (fluxo isolado; ver run_sync)"""
+        return self._run_single(FLOW_TENSIONS, "rumination_tensions", self._sync_tensions)
 
-            # Buscar fragmentos recorrentes (schema real: content, emotional_weight, created_at)
-            cursor.execute("""
-                SELECT content, AVG(emotional_weight) as avg_charge,
-                       fragment_type, MIN(created_at) as first_occurrence,
-                       COUNT(*) as occurrence_count
-                FROM rumination_fragments
-                WHERE processed = 1
-                GROUP BY content
-                HAVING COUNT(*) >= 3
-                   AND AVG(emotional_weight) > 0.6
-            """)
+    def sync_mature_insights_to_core(self) -> int:
+        """Ruminação → Identidade (fluxo isolado; ver run_sync)"""
+        return self._run_single(FLOW_INSIGHTS, "rumination_insights", self._sync_insights)
 
-            fragments = cursor.fetchall()
+    def sync_fragments_to_possible_selves(self) -> int:
+        """Ruminação → Identidade (fluxo isolado; ver run_sync)"""
+        return self._run_single(FLOW_FRAGMENTS, "rumination_fragments", self._sync_fragments)
 
-            if not fragments:
+    def feed_contradictions_to_rumination(self) -> int:
+        """Identidade → Ruminação (fluxo isolado; ver run_sync)"""
+        return self._run_single(FLOW_FEEDBACK, "rumination_tensions", self._feed_contradictions)
+
+    def _run_single(self, flow: str, required_table: str, step) -> int:
+        with self.db._lock:
+            cursor = self.db.conn.cursor()
+            try:
+                tables = self._existing_rumination_tables(cursor)
+                if required_table not in tables:
+                    logger.warning(f"⚠️ Tabela {required_table} não existe - pulando {flow}")
+                    return 0
+                self._ensure_schema(cursor, tables)
+                if not self.db.conn.in_transaction:
+                    cursor.execute("BEGIN")
+
+                started = time.perf_counter()
+                rows, _, watermark = step(cursor)
+                self._record_run(cursor, flow, rows, (time.perf_counter() - started) * 1000, watermark)
+                self._reset_batch(cursor)
+                if rows and flow != FLOW_FEEDBACK:
+                    bump_identity_generation(cursor)
+                self.db.conn.commit()
+                return rows
+
+            except Exception as e:
+                self.db.conn.rollback()
+                logger.error(f"   ❌ Erro no fluxo {flow}: {e}")
                 return 0
 
-            logger.info(f"   🔄 Sincronizando {len(fragments)} fragmentos → selves possíveis")
-
-            synced_count = 0
-            for row in fragments:
-                content, avg_charge, frag_type, first_occurrence, count = row
-
-                # Classificar tipo de self (feared ou lost baseado no tipo de fragmento)
-                self_type = 'feared' if avg_charge > 0.75 else 'lost'
-
-                # Verificar se já existe self similar
-                cursor.execute("""
-                    SELECT id FROM agent_possible_selves
-                    WHERE agent_instance = ?
-                      AND description = ?
-                      AND status = 'active'
-                """, (AGENT_INSTANCE, content))
-
-                if cursor.fetchone():
-                    continue  # Já existe, pular
-
-                # Criar novo self possível
-                vividness = min(0.9, 0.5 + (count * 0.1))  # Aumenta com recorrência
-
-                cursor.execute("""
-                    INSERT INTO agent_possible_selves (
-                        agent_instance, self_type, description, vividness,
-                        likelihood, first_imagined_at, motivational_impact,
-                        emotional_valence, status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    AGENT_INSTANCE,
-                    self_type,
-                    content,
-                    vividness,
-                    avg_charge,  # likelihood baseado em carga emocional
-                    first_occurrence,
-                    'avoidance',
-                    'negative',
-                    'active'
-                ))
-
-                synced_count += 1
-
-            self.db.conn.commit()
-            logger.info(f"   ✅ {synced_count} fragmentos sincronizados")
-            return synced_count
+    # ------------------------------------------------------------------
+    # Fluxos (sem commit; retornam (inseridos, candidatos, watermark))
+    # ------------------------------------------------------------------
 
-        except Exception as e:
-            self.db.conn.rollback()
-            logger.error(f"   ❌ Erro ao sincronizar fragmentos: {e}")
-            return 0
-
-    def feed_contradictions_to_rumination(self) -> int:
+    def _sync_tensions(self, cursor):
         """
-        Identidade → Ruminação: Contradições não resolvidas alimentam ruminação
-
-        Busca contradições com alta tensão que ainda não foram alimentadas
-        para o sistema de ruminação, criando novas tensões.
-
-        Returns:
-            int: Número de contradições alimentadas
+        Tensões maduras (maturity_score > 0.6, status 'open') ainda fora do
+        ledger viram contradições, exceto se o par de polos já existir.
+        Todas as candidatas entram no ledger e não são reavaliadas.
         """
-        cursor = self.db.conn.cursor()
-
-        try:
-            # Verificar se tabela de ruminação existe
-            cursor.execute("""
-                SELECT name FROM sqlite_master
-                WHERE type='table' AND name='rumination_tensions'
-            """)
-            if not cursor.fetchone():
-                logger.warning("⚠️ Tabela rumination_tensions não existe - pulando feedback")
-                return 0
-
-            # Buscar contradições de alta tensão não resolvidas
-            cursor.execute("""
-                SELECT id, pole_a, pole_b, contradiction_type, tension_level
-                FROM agent_identity_contradictions
-                WHERE status IN ('unresolved', 'integrating')
-                  AND tension_level > 0.7
-                  AND last_activated_at > datetime('now', '-7 days')
-                  AND (fed_to_rumination = 0 OR fed_to_rumination IS NULL)
-            """)
-
-            contradictions = cursor.fetchall()
-
-            if not contradictions:
-                return 0
-
-            logger.info(f"   🔄 Alimentando {len(contradictions)} contradições → ruminação")
-
-            fed_count = 0
-            for row in contradictions:
-                contradiction_id, pole_a, pole_b, contra_type, tension = row
-
-                # Verificar idempotência: tensão equivalente já existe?
-                cursor.execute("""
-                    SELECT id FROM rumination_tensions
-                    WHERE pole_a_content = ? AND pole_b_content = ? AND status = 'open'
-                """, (pole_a, pole_b))
-                if cursor.fetchone():
-                    continue
-
-                # Criar nova tensão de ruminação (schema real: pole_a_content, user_id obrigatório)
-                cursor.execute("""
-                    INSERT INTO rumination_tensions (
-                        user_id, pole_a_content, pole_b_content, tension_type,
-                        intensity, status, maturity_score
-                    ) VALUES (?, ?, ?, ?, ?, 'open', 0.0)
-                """, (ADMIN_USER_ID, pole_a, pole_b, contra_type, tension))
-
-                # Marcar contradição como alimentada
-                cursor.execute("""
-                    UPDATE agent_identity_contradictions
-                    SET fed_to_rumination = 1
-                    WHERE id = ?
-                """, (contradiction_id,))
-
-                fed_count += 1
-
-            self.db.conn.commit()
-            logger.info(f"   ✅ {fed_count} contradições alimentadas")
-            return fed_count
+        self._reset_batch(cursor)
+        cursor.execute("""
+            CREATE TEMP TABLE bridge_batch AS
+            SELECT t.id AS source_id,
+                   t.pole_a_content AS pole_a,
+                   t.pole_b_content AS pole_b,
+                   t.tension_type,
+                   t.intensity,
+                   t.first_detected_at,
+                   NOT EXISTS (
+                       SELECT 1 FROM agent_identity_contradictions c
+                       WHERE c.agent_instance = ?
+                         AND c.pole_a = t.pole_a_content
+                         AND c.pole_b = t.pole_b_content
+                   ) AS is_new
+            FROM rumination_tensions t
+            WHERE t.status = 'open'
+              AND t.maturity_score > 0.6
+              AND NOT EXISTS (
+                  SELECT 1 FROM identity_rumination_sync_ledger l
+                  WHERE l.flow = ? AND l.source_id = t.id
+              )
+        """, (AGENT_INSTANCE, FLOW_TENSIONS))
+        candidates = cursor.execute("SELECT COUNT(*) FROM bridge_batch").fetchone()[0]
+        if not candidates:
+            return 0, 0, None
+
+        # Polos repetidos no lote: vale a tensão de menor id (colunas "nuas"
+        # com MIN() vêm da mesma linha no SQLite)
+        cursor.execute("""
+            INSERT INTO agent_identity_contradictions (
+                agent_instance, pole_a, pole_b, contradiction_type,
+                tension_level, salience, first_detected_at, last_activated_at,
+                supporting_conversation_ids, status
+            )
+            SELECT ?, pole_a, pole_b, tension_type, intensity, intensity,
+                   first_detected_at, CURRENT_TIMESTAMP, '[]', 'unresolved'
+            FROM (
+                SELECT MIN(source_id), pole_a, pole_b, tension_type, intensity, first_detected_at
+                FROM bridge_batch
+                WHERE is_new
+                GROUP BY pole_a, pole_b
+            )
+        """, (AGENT_INSTANCE,))
+        inserted = cursor.rowcount
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO identity_rumination_sync_ledger (flow, source_id)
+            SELECT ?, source_id FROM bridge_batch
+        """, (FLOW_TENSIONS,))
+
+        logger.info(f"   ✅ {inserted} tensões sincronizadas ({candidates} candidatas)")
+        return inserted, candidates, None
+
+    def _sync_insights(self, cursor):
+        """
+        Insights 'ready' fora do ledger viram crenças nucleares (conteúdo =
+        símbolo, ou mensagem completa), exceto se a crença atual já existir.
+        Só os inseridos são marcados como 'delivered'.
+        """
+        self._reset_batch(cursor)
+        cursor.execute("""
+            CREATE TEMP TABLE bridge_batch AS
+            SELECT i.id AS source_id,
+                   COALESCE(NULLIF(i.symbol_content, ''), i.full_message) AS nuclear_content,
+                   i.full_message,
+                   i.symbol_content,
+                   i.crystallized_at,
+                   i.source_tension_id
+            FROM rumination_insights i
+            WHERE i.status = 'ready'
+              AND NOT EXISTS (
+                  SELECT 1 FROM identity_rumination_sync_ledger l
+                  WHERE l.flow = ? AND l.source_id = i.id
+              )
+        """, (FLOW_INSIGHTS,))
+        candidates = cursor.execute("SELECT COUNT(*) FROM bridge_batch").fetchone()[0]
+        if not candidates:
+            return 0, 0, None
+
+        # Todas as candidatas entram no ledger; as que já existem como
+        # crença atual continuam 'ready' para a entrega da ruminação
+        cursor.execute("""
+            INSERT OR IGNORE INTO identity_rumination_sync_ledger (flow, source_id)
+            SELECT ?, source_id FROM bridge_batch
+        """, (FLOW_INSIGHTS,))
+
+        cursor.execute("""
+            DELETE FROM bridge_batch
+            WHERE source_id NOT IN (
+                SELECT MIN(b.source_id) FROM bridge_batch b
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM agent_identity_core c
+                    WHERE c.agent_instance = ?
+                      AND c.content = b.nuclear_content
+                      AND c.is_current = 1
+                )
+                GROUP BY b.nuclear_content
+            )
+        """, (AGENT_INSTANCE,))
+        skipped = cursor.rowcount
+
+        # Certainty moderado (0.75) para insights de ruminação
+        cursor.execute("""
+            INSERT INTO agent_identity_core (
+                agent_instance, attribute_type, content, certainty,
+                first_crystallized_at, last_reaffirmed_at,
+                supporting_conversation_ids, emerged_in_relation_to
+            )
+            SELECT ?, bridge_classify_insight(full_message, symbol_content),
+                   nuclear_content, 0.75,
+                   COALESCE(NULLIF(crystallized_at, ''), ?),
+                   CURRENT_TIMESTAMP,
+                   CASE WHEN source_tension_id THEN '[' || source_tension_id || ']' ELSE '[]' END,
+                   'ruminação sobre interações'
+            FROM bridge_batch
+            ORDER BY source_id
+        """, (AGENT_INSTANCE, datetime.now().isoformat()))
+        inserted = cursor.rowcount
+
+        cursor.execute("""
+            UPDATE rumination_insights
+            SET status = 'delivered'
+            WHERE id IN (SELECT source_id FROM bridge_batch)
+        """)
+
+        logger.info(f"   ✅ {inserted} insights sincronizados ({skipped} já existentes)")
+        return inserted, candidates, None
+
+    def _sync_fragments(self, cursor):
+        """
+        Conteúdos com 3+ fragmentos processados e carga média > 0.6 viram
+        selves temidos/perdidos, exceto se já houver self ativo igual.
 
-        except Exception as e:
-            self.db.conn.rollback()
-            logger.error(f"   ❌ Erro ao alimentar contradições: {e}")
-            return 0
+        Só conteúdos com fragmentos a partir do watermark são reavaliados.
+        O watermark é o menor id ainda não processado (ou max(id)+1), então
+        fragmentos processados fora de ordem não são perdidos.
+        """
+        watermark = self._get_watermark(cursor, FLOW_FRAGMENTS)
+        cursor.execute("""
+            SELECT COALESCE(
+                (SELECT MIN(id) FROM rumination_fragments WHERE processed = 0),
+                (SELECT MAX(id) + 1 FROM rumination_fragments),
+                ?
+            )
+        """, (watermark,))
+        next_watermark = cursor.fetchone()[0]
+
+        self._reset_batch(cursor)
+        cursor.execute("""
+            CREATE TEMP TABLE bridge_batch AS
+            SELECT f.content,
+                   AVG(f.emotional_weight) AS avg_charge,
+                   MIN(f.created_at) AS first_occurrence,
+                   COUNT(*) AS occurrence_count
+            FROM rumination_fragments f
+            WHERE f.processed = 1
+              AND f.content IN (
+                  SELECT DISTINCT content FROM rumination_fragments
+                  WHERE id >= ? AND processed = 1
+              )
+            GROUP BY f.content
+            HAVING COUNT(*) >= 3
+               AND AVG(f.emotional_weight) > 0.6
+        """, (watermark,))
+        candidates = cursor.execute("SELECT COUNT(*) FROM bridge_batch").fetchone()[0]
+        if not candidates:
+            return 0, 0, next_watermark
+
+        # vividness cresce com a recorrência; likelihood = carga emocional média
+        cursor.execute("""
+            INSERT INTO agent_possible_selves (
+                agent_instance, self_type, description, vividness,
+                likelihood, first_imagined_at, motivational_impact,
+                emotional_valence, status
+            )
+            SELECT ?,
+                   CASE WHEN b.avg_charge > 0.75 THEN 'feared' ELSE 'lost' END,
+                   b.content,
+                   MIN(0.9, 0.5 + b.occurrence_count * 0.1),
+                   b.avg_charge,
+                   b.first_occurrence,
+                   'avoidance', 'negative', 'active'
+            FROM bridge_batch b
+            WHERE NOT EXISTS (
+                SELECT 1 FROM agent_possible_selves s
+                WHERE s.agent_instance = ?
+                  AND s.description = b.content
+                  AND s.status = 'active'
+            )
+        """, (AGENT_INSTANCE, AGENT_INSTANCE))
+        inserted = cursor.rowcount
+
+        logger.info(f"   ✅ {inserted} fragmentos sincronizados ({candidates} conteúdos recorrentes)")
+        return inserted, candidates, next_watermark
+
+    def _feed_contradictions(self, cursor):
+        """
+        Contradições de alta tensão (> 0.7), ativas nos últimos 7 dias e
+        ainda não alimentadas viram tensões de ruminação, exceto se já houver
+        tensão aberta com os mesmos polos. Só as inseridas são marcadas.
+        """
+        self._reset_batch(cursor)
+        cursor.execute("""
+            CREATE TEMP TABLE bridge_batch AS
+            SELECT MIN(c.id) AS source_id, c.pole_a, c.pole_b,
+                   c.contradiction_type, c.tension_level
+            FROM agent_identity_contradictions c
+            WHERE (c.fed_to_rumination = 0 OR c.fed_to_rumination IS NULL)
+              AND c.status IN ('unresolved', 'integrating')
+              AND c.tension_level > 0.7
+              AND c.last_activated_at > datetime('now', '-7 days')
+              AND NOT EXISTS (
+                  SELECT 1 FROM rumination_tensions t
+                  WHERE t.pole_a_content = c.pole_a
+                    AND t.pole_b_content = c.pole_b
+                    AND t.status = 'open'
+              )
+            GROUP BY c.pole_a, c.pole_b
+        """)
+        candidates = cursor.execute("SELECT COUNT(*) FROM bridge_batch").fetchone()[0]
+        if not candidates:
+            return 0, 0, None
+
+        # Schema real: pole_a_content, user_id obrigatório
+        cursor.execute("""
+            INSERT INTO rumination_tensions (
+                user_id, pole_a_content, pole_b_content, tension_type,
+                intensity, status, maturity_score
+            )
+            SELECT ?, pole_a, pole_b, contradiction_type, tension_level, 'open', 0.0
+            FROM bridge_batch
+            ORDER BY source_id
+        """, (ADMIN_USER_ID,))
+        inserted = cursor.rowcount
+
+        cursor.execute("""
+            UPDATE agent_identity_contradictions
+            SET fed_to_rumination = 1
+            WHERE id IN (SELECT source_id FROM bridge_batch)
+        """)
+
+        logger.info(f"   ✅ {inserted} contradições alimentadas")
+        return inserted, candidates, None
 
     def _classify_insight_type(self, content: str, symbolic: Optional[str]) -> str:
         """
@@ -451,25 +579,44 @@ async def run_identity_rumination_sync():
         db = HybridDatabaseManager()
         bridge = IdentityRuminationBridge(db)
 
-        # Executar sincronizações
-        logger.info("\n📥 RUMINAÇÃO → IDENTIDADE:")
-        tensions_synced = bridge.sync_mature_tensions_to_contradictions()
-        insights_synced = bridge.sync_mature_insights_to_core()
-        fragments_synced = bridge.sync_fragments_to_possible_selves()
+        # Executar sincronizações (uma transação)
+        started = time.perf_counter()
+        report = bridge.run_sync()
+        total_ms = (time.perf_counter() - started) * 1000
 
-        logger.info("\n📤 IDENTIDADE → RUMINAÇÃO:")
-        contradictions_fed = bridge.feed_contradictions_to_rumination()
+        if not report:
+            logger.error("❌ Sincronização desfeita (ver erro acima)")
+            return
+
+        tensions_synced = report[FLOW_TENSIONS]["rows"]
+        insights_synced = report[FLOW_INSIGHTS]["rows"]
+        fragments_synced = report[FLOW_FRAGMENTS]["rows"]
+        contradictions_fed = report[FLOW_FEEDBACK]["rows"]
+
+        # Re-materializar snapshot de identidade se algo mudou
+        if tensions_synced or insights_synced or fragments_synced:
+            try:
+                builder = AgentIdentityContextBuilder(db)
+                builder.snapshots.refresh(builder)
+            except Exception as snap_err:
+                logger.warning(f"⚠️ Falha ao materializar snapshot de identidade: {snap_err}")
 
         # Resumo
         total_synced = tensions_synced + insights_synced + fragments_synced + contradictions_fed
 
+        def _line(flow):
+            item = report[flow]
+            return f"{item['rows']} ({item['candidates']} candidatos, {item['ms']:.1f}ms)"
+
         logger.info("\n" + "=" * 70)
         logger.info("✅ SINCRONIZAÇÃO COMPLETA")
-        logger.info(f"   📊 Total de sincronizações: {total_synced}")
-        logger.info(f"      • Tensões → Contradições: {tensions_synced}")
-        logger.info(f"      • Insights → Nuclear: {insights_synced}")
-        logger.info(f"      • Fragmentos → Selves: {fragments_synced}")
-        logger.info(f"      • Contradições → Tensões: {contradictions_fed}")
+        logger.info(f"   📊 Total de sincronizações: {total_synced} em {total_ms:.1f}ms")
+        logger.info("   📥 RUMINAÇÃO → IDENTIDADE:")
+        logger.info(f"      • Tensões → Contradições: {_line(FLOW_TENSIONS)}")
+        logger.info(f"      • Insights → Nuclear: {_line(FLOW_INSIGHTS)}")
+        logger.info(f"      • Fragmentos → Selves: {_line(FLOW_FRAGMENTS)}")
+        logger.info("   📤 IDENTIDADE → RUMINAÇÃO:")
+        logger.info(f"      • Contradições → Tensões: {_line(FLOW_FEEDBACK)}")
         logger.info("=" * 70)
 
     except Exception as e:
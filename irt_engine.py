@@ -8,12 +8,23 @@ Autor: JungAgent TRI System
 Versão: 1.0.0
 """
 
+import os
 import math
+import hashlib
 import logging
-from typing import Dict, List, Tuple, Optional, Any
+import threading
+from typing import Dict, List, NamedTuple, Tuple, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
 
+# NumPy (tabelas pré-calculadas do banco de itens)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
 # Configurar logger
 logger = logging.getLogger(__name__)
 
@@ -48,6 +59,20 @@ FACET_TO_DOMAIN = {
     "N5": IRTDomain.NEUROTICISM, "N6": IRTDomain.NEUROTICISM,
 }
 
+# Nomes das facetas (NEO-PI-R, Costa & McCrae 1992)
+FACET_NAMES = {
+    "E1": "Acolhimento", "E2": "Gregariedade", "E3": "Assertividade",
+    "E4": "Atividade", "E5": "Busca de Excitação", "E6": "Emoções Positivas",
+    "O1": "Fantasia", "O2": "Estética", "O3": "Sentimentos",
+    "O4": "Ações", "O5": "Ideias", "O6": "Valores",
+    "C1": "Competência", "C2": "Ordem", "C3": "Senso de Dever",
+    "C4": "Esforço por Realização", "C5": "Autodisciplina", "C6": "Deliberação",
+    "A1": "Confiança", "A2": "Franqueza", "A3": "Altruísmo",
+    "A4": "Complacência", "A5": "Modéstia", "A6": "Sensibilidade",
+    "N1": "Ansiedade", "N2": "Raiva/Hostilidade", "N3": "Depressão",
+    "N4": "Autoconsciência", "N5": "Impulsividade", "N6": "Vulnerabilidade"
+}
+
 # Parâmetros padrão GRM (antes da calibração)
 DEFAULT_DISCRIMINATION = 1.0  # Parâmetro 'a' padrão
 DEFAULT_THRESHOLDS = [-2.0, -1.0, 0.0, 1.0]  # b1, b2, b3, b4 para escala 1-5
@@ -57,6 +82,11 @@ THETA_MIN = -4.0
 THETA_MAX = 4.0
 THETA_STEP = 0.01
 
+# Grade das tabelas pré-calculadas (ItemBankCache)
+ITEM_BANK_GRID_STEP = 0.01
+# Linhas calculadas sob demanda (parâmetros fora do banco carregado); ~70KB cada
+ITEM_BANK_MAX_EXTRA_ROWS = int(os.getenv("IRT_ITEM_BANK_MAX_EXTRA_ROWS", "256"))
+
 # Critérios de qualidade
 MIN_RESPONSES_FOR_ESTIMATE = 3
 SE_THRESHOLD_RELIABLE = 0.5
@@ -109,6 +139,354 @@ class FacetEstimate:
     n_responses: int
 
 
+# =============================================================================
+# ITEM BANK CACHE - TABELAS PRÉ-CALCULADAS (NumPy)
+# =============================================================================
+
+def _grm_item_information(theta: float, a: float, b_thresholds: List[float], cumulative) -> float:
+    """Informação de Fisher analítica de um item GRM (versão escalar)."""
+    p_star = [1.0] + [cumulative(theta, a, b) for b in b_thresholds] + [0.0]
+    information = 0.0
+    for k in range(len(b_thresholds) + 1):
+        p_k = p_star[k] - p_star[k + 1]
+        if p_k < 1e-10:
+            continue
+        p_prime = p_star[k] * (1.0 - p_star[k]) - p_star[k + 1] * (1.0 - p_star[k + 1])
+        information += (p_prime ** 2) / p_k
+    return (a ** 2) * information
+
+
+class _BankSnapshot(NamedTuple):
+    """
+    Estado imutável do ItemBankCache: índice e tabelas publicados juntos.
+
+    Linhas < n_base estão nas tabelas do banco carregado (load, possivelmente
+    mmap); as demais, em extra_* (parâmetros vistos sob demanda).
+    """
+    index: Dict[Tuple[float, ...], int]
+    n_base: int
+    probs: "np.ndarray"
+    log_probs: "np.ndarray"
+    info: "np.ndarray"
+    extra_probs: "np.ndarray"
+    extra_log_probs: "np.ndarray"
+    extra_info: "np.ndarray"
+
+
+class ItemBankCache:
+    """
+    Curvas GRM pré-calculadas para o banco de itens.
+
+    Para cada combinação de parâmetros (a, b1..b4), guarda numa grade fina
+    de theta (THETA_MIN..THETA_MAX, passo ITEM_BANK_GRID_STEP):
+    - probabilidades de categoria  P(X=k|θ)   -> probs[item, k, grade]
+    - log-probabilidades                      -> log_probs[item, k, grade]
+    - informação de Fisher          I(θ)      -> info[item, grade]
+
+    Estimação e SE viram somas de linhas e interpolação linear. Com
+    cache_dir, as tabelas do banco carregado via load() ficam em arquivos
+    .npy abertos com mmap (compartilhados entre processos).
+
+    Parâmetros fora do banco são calculados sob demanda, em lote por chamada,
+    e guardados numa área extra pré-alocada com crescimento geométrico e
+    limitada a ITEM_BANK_MAX_EXTRA_ROWS linhas (ao estourar, a área extra é
+    descartada e recomeça). Índice e tabelas formam um _BankSnapshot imutável
+    trocado numa única atribuição: cada consulta lê um snapshot só, sem lock.
+    """
+
+    n_thresholds = len(DEFAULT_THRESHOLDS)
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        step: float = ITEM_BANK_GRID_STEP,
+        max_extra_rows: int = ITEM_BANK_MAX_EXTRA_ROWS
+    ):
+        self.cache_dir = cache_dir
+        self.step = step
+        self.max_extra_rows = max(1, max_extra_rows)
+        self.grid = np.round(np.arange(THETA_MIN, THETA_MAX + step / 2, step), 10)
+        self._lock = threading.Lock()
+
+        n_categories = self.n_thresholds + 1
+        empty = (
+            np.empty((0, n_categories, len(self.grid))),
+            np.empty((0, n_categories, len(self.grid))),
+            np.empty((0, len(self.grid))),
+        )
+        # Buffers da área extra (capacidade >= linhas em uso); escritos só sob _lock
+        self._extra_buffers = empty
+        self._snapshot = _BankSnapshot({}, 0, *empty, *empty)
+
+    # -------------------------------------------------------------------------
+    # Construção das tabelas
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _key(a: float, b_thresholds: List[float]) -> Tuple[float, ...]:
+        return (round(float(a), 6),) + tuple(round(float(b), 6) for b in b_thresholds)
+
+    def _compute(self, keys: List[Tuple[float, ...]]):
+        """Calcula (probs, log_probs, info) para várias linhas de uma vez."""
+        params = np.asarray(keys, dtype=float)  # (n, 1 + n_thresholds)
+        a = params[:, :1, None]                 # (n, 1, 1)
+        b = params[:, 1:, None]                 # (n, n_thresholds, 1)
+        theta = self.grid[None, None, :]        # (1, 1, G)
+
+        exponent = np.clip(-a * (theta - b), -700, 700)
+        p_star = 1.0 / (1.0 + np.exp(exponent))  # (n, n_thresholds, G)
+
+        ones = np.ones((len(keys), 1, len(self.grid)))
+        zeros = np.zeros((len(keys), 1, len(self.grid)))
+        p_star = np.concatenate([ones, p_star, zeros], axis=1)  # (n, K+1, G)
+
+        probs = np.maximum(p_star[:, :-1] - p_star[:, 1:], 0.0)  # (n, K, G)
+        w = p_star * (1.0 - p_star)
+        p_prime = w[:, :-1] - w[:, 1:]
+        safe = np.where(probs < 1e-10, np.inf, probs)
+        info = (a[:, 0] ** 2) * np.sum(p_prime ** 2 / safe, axis=1)  # (n, G)
+        log_probs = np.log(np.maximum(probs, 1e-10))
+
+        return probs, log_probs, info
+
+    def _add_missing(self, keys: List[Tuple[float, ...]]) -> _BankSnapshot:
+        """Calcula as chaves ausentes (um lote) e publica um novo snapshot."""
+        with self._lock:
+            snapshot = self._snapshot
+            missing = [key for key in dict.fromkeys(keys) if key not in snapshot.index]
+            if not missing:
+                return snapshot
+
+            n_extra = len(snapshot.index) - snapshot.n_base
+            buffers = self._extra_buffers
+            if n_extra + len(missing) > self.max_extra_rows:
+                # Limite atingido: recomeça a área extra (snapshots antigos seguem válidos)
+                index = {key: row for key, row in snapshot.index.items() if row < snapshot.n_base}
+                n_extra = 0
+                buffers = None
+            else:
+                index = dict(snapshot.index)
+
+            needed = n_extra + len(missing)
+            if buffers is None or len(buffers[0]) < needed:
+                # Buffers novos (nunca reescrever linhas visíveis em snapshots publicados)
+                capacity = max(needed, 2 * (len(buffers[0]) if buffers is not None else 0), 16)
+                capacity = min(capacity, max(self.max_extra_rows, needed))
+                grown = tuple(np.empty((capacity,) + table.shape[1:]) for table in self._extra_buffers)
+                for target, source in zip(grown, buffers or ()):
+                    target[:n_extra] = source[:n_extra]
+                buffers = grown
+
+            for target, values in zip(buffers, self._compute(missing)):
+                target[n_extra:needed] = values
+            for i, key in enumerate(missing):
+                index[key] = snapshot.n_base + n_extra + i
+
+            self._extra_buffers = buffers
+            self._snapshot = snapshot = snapshot._replace(
+                index=index,
+                extra_probs=buffers[0][:needed],
+                extra_log_probs=buffers[1][:needed],
+                extra_info=buffers[2][:needed]
+            )
+        return snapshot
+
+    def load(self, item_params: List[Tuple[float, List[float]]]) -> int:
+        """
+        Pré-calcula as tabelas para o banco de itens (ex: irt_item_parameters).
+
+        Args:
+            item_params: Lista de (a, [b1, b2, b3, b4])
+
+        Returns:
+            Número de linhas (combinações únicas de parâmetros) no cache
+        """
+        keys = sorted({
+            self._key(a, b) for a, b in item_params
+            if len(b) == self.n_thresholds
+        } | {self._key(DEFAULT_DISCRIMINATION, DEFAULT_THRESHOLDS)})
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot.n_base == len(keys) and keys == list(snapshot.index)[:snapshot.n_base]:
+                return len(keys)
+
+            if self.cache_dir:
+                probs, log_probs, info = self._load_mmap(keys)
+            else:
+                probs, log_probs, info = self._compute(keys)
+
+            empty = tuple(table[:0] for table in self._extra_buffers)
+            self._extra_buffers = empty
+            self._snapshot = _BankSnapshot(
+                {key: i for i, key in enumerate(keys)}, len(keys),
+                probs, log_probs, info, *empty
+            )
+
+        logger.info(f"ItemBankCache: {len(keys)} itens x {len(self.grid)} pontos de theta")
+        return len(keys)
+
+    def _load_mmap(self, keys: List[Tuple[float, ...]]):
+        """Carrega (ou gera e grava) as tabelas em .npy com mmap."""
+        digest = hashlib.sha1(repr((keys, self.step, THETA_MIN, THETA_MAX)).encode()).hexdigest()[:16]
+        paths = [
+            os.path.join(self.cache_dir, f"irt_item_bank_{digest}_{name}.npy")
+            for name in ("probs", "log_probs", "info")
+        ]
+
+        if not all(os.path.exists(path) for path in paths):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for path, array in zip(paths, self._compute(keys)):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmp_path, path)
+
+        return tuple(np.load(path, mmap_mode="r") for path in paths)
+
+    def snapshot_for(self, params: List[Tuple[float, List[float]]]) -> Tuple[_BankSnapshot, "np.ndarray"]:
+        """
+        Snapshot que contém todos os itens pedidos e as linhas deles nesse snapshot.
+
+        Args:
+            params: Lista de (a, [b1, b2, b3, b4])
+        """
+        keys = [self._key(a, b) for a, b in params]
+        snapshot = self._snapshot
+        if any(key not in snapshot.index for key in keys):
+            snapshot = self._add_missing(keys)
+        index = snapshot.index
+        return snapshot, np.fromiter((index[key] for key in keys), dtype=np.intp, count=len(keys))
+
+    @staticmethod
+    def take(snapshot: _BankSnapshot, name: str, rows: "np.ndarray", *columns) -> "np.ndarray":
+        """
+        snapshot.<name>[rows, *columns], juntando banco carregado e área extra.
+
+        Args:
+            name: "probs", "log_probs" ou "info"
+            columns: Índices adicionais por linha (ex: categorias) ou slices
+        """
+        base = getattr(snapshot, name)
+        extra_mask = rows >= snapshot.n_base
+        if not extra_mask.any():
+            return base[(rows,) + columns]
+
+        extra = getattr(snapshot, f"extra_{name}")
+        base_mask = ~extra_mask
+
+        def select(mask, table, offset):
+            picked = tuple(
+                c[mask] if isinstance(c, np.ndarray) and c.ndim else c
+                for c in columns
+            )
+            return table[(rows[mask] - offset,) + picked]
+
+        from_extra = select(extra_mask, extra, snapshot.n_base)
+        result = np.empty((len(rows),) + from_extra.shape[1:], dtype=from_extra.dtype)
+        result[extra_mask] = from_extra
+        if base_mask.any():
+            result[base_mask] = select(base_mask, base, 0)
+        return result
+
+    def row(self, a: float, b_thresholds: List[float]) -> int:
+        """Índice da linha de um item no snapshot atual (calcula se ainda não existir)."""
+        _, rows = self.snapshot_for([(a, b_thresholds)])
+        return int(rows[0])
+
+    def supports(self, responses: List[ItemResponse]) -> bool:
+        return all(len(r.thresholds) == self.n_thresholds for r in responses)
+
+    def __len__(self) -> int:
+        return len(self._snapshot.index)
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    def _interp_position(self, theta: float) -> Tuple[int, float]:
+        position = (min(max(theta, THETA_MIN), THETA_MAX) - THETA_MIN) / self.step
+        i0 = min(int(position), len(self.grid) - 2)
+        return i0, position - i0
+
+    def category_probabilities(self, theta: float, a: float, b_thresholds: List[float]) -> List[float]:
+        """P(X=k|θ) para k=1..K, interpolado na grade."""
+        snapshot, rows = self.snapshot_for([(a, b_thresholds)])
+        i0, w = self._interp_position(theta)
+        values = self.take(snapshot, "probs", rows, slice(None), slice(i0, i0 + 2))[0]
+        return (values[:, 0] * (1.0 - w) + values[:, 1] * w).tolist()
+
+    def information(self, theta: float, a: float, b_thresholds: List[float]) -> float:
+        """I(θ) de um item, interpolado na grade."""
+        snapshot, rows = self.snapshot_for([(a, b_thresholds)])
+        i0, w = self._interp_position(theta)
+        values = self.take(snapshot, "info", rows, slice(i0, i0 + 2))[0]
+        return float(values[0] * (1.0 - w) + values[1] * w)
+
+    def _snapshot_rows(self, responses: List[ItemResponse]) -> Tuple[_BankSnapshot, "np.ndarray"]:
+        return self.snapshot_for([(r.discrimination, r.thresholds) for r in responses])
+
+    def log_likelihood_curve(self, responses: List[ItemResponse]) -> "np.ndarray":
+        """LL(θ) em toda a grade: soma das linhas de log-probabilidade."""
+        snapshot, rows = self._snapshot_rows(responses)
+        categories = np.fromiter((r.intensity - 1 for r in responses), dtype=np.intp, count=len(responses))
+        return self.take(snapshot, "log_probs", rows, categories).sum(axis=0)
+
+    def test_information(self, theta: float, responses: List[ItemResponse]) -> float:
+        """I(θ) total de um conjunto de respostas, interpolado na grade."""
+        snapshot, rows = self._snapshot_rows(responses)
+        i0, w = self._interp_position(theta)
+        curve = self.take(snapshot, "info", rows, slice(i0, i0 + 2)).sum(axis=0)
+        return float(curve[0] * (1.0 - w) + curve[1] * w)
+
+    def information_curves(self, params: List[Tuple[float, List[float]]]) -> "np.ndarray":
+        """Curvas de informação (itens x grade) dos itens pedidos, para seleção adaptativa."""
+        snapshot, rows = self.snapshot_for(params)
+        return self.take(snapshot, "info", rows)
+
+    def estimate_theta(self, responses: List[ItemResponse]) -> Tuple[float, float]:
+        """
+        MLE por argmax na grade + refinamento parabólico; SE via informação tabelada.
+        """
+        ll = self.log_likelihood_curve(responses)
+        i = int(np.argmax(ll))
+        theta = float(self.grid[i])
+
+        if 0 < i < len(ll) - 1:
+            denominator = ll[i - 1] - 2 * ll[i] + ll[i + 1]
+            if denominator < 0:
+                offset = 0.5 * (ll[i - 1] - ll[i + 1]) / denominator
+                theta += float(max(-0.5, min(0.5, offset))) * self.step
+
+        information = self.test_information(theta, responses)
+        se = 1.0 / math.sqrt(information) if information > 0 else float('inf')
+        return theta, se
+
+
+_item_bank: Optional[ItemBankCache] = None
+_item_bank_lock = threading.Lock()
+
+
+def get_item_bank(cache_dir: Optional[str] = None) -> Optional[ItemBankCache]:
+    """
+    Retorna o ItemBankCache compartilhado do processo (None sem NumPy).
+
+    Args:
+        cache_dir: Diretório para as tabelas mmap (usado na primeira chamada que o informar)
+    """
+    global _item_bank
+
+    if not NUMPY_AVAILABLE:
+        return None
+
+    with _item_bank_lock:
+        if _item_bank is None:
+            _item_bank = ItemBankCache(cache_dir=cache_dir)
+        elif cache_dir and not _item_bank.cache_dir:
+            _item_bank.cache_dir = cache_dir
+    return _item_bank
+
+
 # =============================================================================
 # GRADED RESPONSE MODEL - CORE
 # =============================================================================
@@ -124,13 +502,15 @@ class GradedResponseModel:
     P(X = k | theta) = P(X >= k) - P(X >= k+1)
     """
 
-    def __init__(self, db_connection=None):
+    def __init__(self, db_connection=None, item_bank: Optional["ItemBankCache"] = None):
         """
         Args:
             db_connection: Conexão com banco de dados para carregar parâmetros
+            item_bank: Tabelas pré-calculadas (default: banco compartilhado, se NumPy disponível)
         """
         self.db = db_connection
         self._item_cache: Dict[str, Dict] = {}
+        self.item_bank = item_bank if item_bank is not None else get_item_bank()
         logger.info("GradedResponseModel inicializado")
 
     # -------------------------------------------------------------------------
@@ -217,10 +597,9 @@ class GradedResponseModel:
         Returns:
             Lista [P(X=1), P(X=2), P(X=3), P(X=4), P(X=5)]
         """
-        probs = []
-        for k in range(1, len(b_thresholds) + 2):
-            probs.append(self.probability_category(theta, a, b_thresholds, k))
-        return probs
+        # P*(k) calculado uma vez por threshold (P*_1 = 1, P*_{K+1} = 0)
+        cumulative = [1.0] + [self._cumulative_probability(theta, a, b) for b in b_thresholds] + [0.0]
+        return [max(0.0, cumulative[k] - cumulative[k + 1]) for k in range(len(b_thresholds) + 1)]
 
     # -------------------------------------------------------------------------
     # Log-Likelihood
@@ -261,6 +640,32 @@ class GradedResponseModel:
             total_ll += self.log_likelihood_single(theta, response)
         return total_ll
 
+    def score_function(
+        self,
+        theta: float,
+        responses: List[ItemResponse]
+    ) -> float:
+        """
+        Calcula a derivada da log-likelihood em theta (função score), analítica.
+
+        d/dθ log P_k = P'_k / P_k, com
+        P'_k = a * [P*_k (1 - P*_k) - P*_{k+1} (1 - P*_{k+1})]
+        (P*_1 = 1 e P*_{K+1} = 0)
+        """
+        total = 0.0
+        for response in responses:
+            a = response.discrimination
+            b = response.thresholds
+            k = response.intensity
+
+            p_upper = 1.0 if k == 1 else self._cumulative_probability(theta, a, b[k - 2])
+            p_lower = 0.0 if k == len(b) + 1 else self._cumulative_probability(theta, a, b[k - 1])
+
+            p_k = max(p_upper - p_lower, 1e-10)
+            p_prime = a * (p_upper * (1.0 - p_upper) - p_lower * (1.0 - p_lower))
+            total += p_prime / p_k
+        return total
+
     # -------------------------------------------------------------------------
     # Estimação MLE
     # -------------------------------------------------------------------------
@@ -290,6 +695,12 @@ class GradedResponseModel:
             logger.info(f"Poucas respostas ({len(responses)}). Usando média ponderada.")
             return self._simple_estimate(responses)
 
+        # Caminho rápido: log-likelihood da grade inteira via tabelas (sem math.exp)
+        if self.item_bank is not None and self.item_bank.supports(responses):
+            theta, se = self.item_bank.estimate_theta(responses)
+            logger.debug(f"MLE (tabelas): theta={theta:.3f}, SE={se:.3f}, n={len(responses)}")
+            return theta, se
+
         # Grid search
         best_theta = 0.0
         best_ll = float('-inf')
@@ -372,6 +783,10 @@ class GradedResponseModel:
         A informação de Fisher para GRM é:
         I_i(theta) = a^2 * sum_k( (P'_k)^2 / P_k )
         """
+        if self.item_bank is not None and self.item_bank.supports(responses):
+            total_information = self.item_bank.test_information(theta, responses)
+            return 1.0 / math.sqrt(total_information) if total_information > 0 else float('inf')
+
         total_information = 0.0
 
         for response in responses:
@@ -398,25 +813,13 @@ class GradedResponseModel:
 
         I(theta) = a^2 * sum_k( P'_k^2 / P_k )
 
-        onde P'_k é a derivada de P(X=k) em relação a theta.
+        onde P'_k = P*_k (1 - P*_k) - P*_{k+1} (1 - P*_{k+1}) é a derivada
+        analítica de P(X=k) em relação a a*theta (sem diferenças finitas).
         """
-        K = len(b_thresholds) + 1
-        information = 0.0
-
-        for k in range(1, K + 1):
-            p_k = self.probability_category(theta, a, b_thresholds, k)
-            if p_k < 1e-10:
-                continue
+        if self.item_bank is not None and len(b_thresholds) == self.item_bank.n_thresholds:
+            return self.item_bank.information(theta, a, b_thresholds)
 
-            # Aproximação numérica da derivada
-            delta = 0.001
-            p_k_plus = self.probability_category(theta + delta, a, b_thresholds, k)
-            p_k_minus = self.probability_category(theta - delta, a, b_thresholds, k)
-            p_prime = (p_k_plus - p_k_minus) / (2 * delta)
-
-            information += (p_prime ** 2) / p_k
-
-        return (a ** 2) * information
+        return _grm_item_information(theta, a, b_thresholds, self._cumulative_probability)
 
     # -------------------------------------------------------------------------
     # Conversões de Escala
@@ -676,23 +1079,9 @@ class IRTEngine:
 
         theta, se = self.grm.estimate_theta_mle(responses)
 
-        # Mapear código para nome da faceta
-        facet_names = {
-            "E1": "Acolhimento", "E2": "Gregariedade", "E3": "Assertividade",
-            "E4": "Atividade", "E5": "Busca de Excitação", "E6": "Emoções Positivas",
-            "O1": "Fantasia", "O2": "Estética", "O3": "Sentimentos",
-            "O4": "Ações", "O5": "Ideias", "O6": "Valores",
-            "C1": "Competência", "C2": "Ordem", "C3": "Senso de Dever",
-            "C4": "Esforço por Realização", "C5": "Autodisciplina", "C6": "Deliberação",
-            "A1": "Confiança", "A2": "Franqueza", "A3": "Altruísmo",
-            "A4": "Complacência", "A5": "Modéstia", "A6": "Sensibilidade",
-            "N1": "Ansiedade", "N2": "Raiva/Hostilidade", "N3": "Depressão",
-            "N4": "Autoconsciência", "N5": "Impulsividade", "N6": "Vulnerabilidade"
-        }
-
         return FacetEstimate(
             facet_code=facet_code,
-            facet_name=facet_names.get(facet_code, facet_code),
+            facet_name=FACET_NAMES.get(facet_code, facet_code),
             theta=theta,
             standard_error=se,
             score_0_100=self.grm.theta_to_score(theta),
@@ -891,6 +1280,561 @@ class IRTEngine:
         return numerator / denominator
 
 
+# =============================================================================
+# ONLINE TRAIT ESTIMATOR - ATUALIZAÇÃO INCREMENTAL (SQLite)
+# =============================================================================
+
+class OnlineTraitEstimator:
+    """
+    Estimação incremental de theta por domínio e faceta.
+
+    Mantém, por (usuário, domínio) e (usuário, faceta), o estado suficiente
+    da estimativa em irt_online_estimates: theta atual, informação de Fisher
+    acumulada, número de respostas e soma das intensidades.
+
+    A cada nova detecção, aplica um passo de Newton (Fisher scoring) a partir
+    do theta anterior (prior_theta), usando apenas as respostas novas:
+
+        theta' = theta + S_novas(theta) / (I_acumulada + I_novas(theta))
+
+    O recálculo completo (MLE sobre todos os detected_fragments) acontece
+    apenas quando o usuário ainda não tem estado, quando uma chave cruza
+    MIN_RESPONSES_FOR_ESTIMATE, ou quando os parâmetros dos itens mudam
+    (irt_item_parameters recalibrado).
+    """
+
+    SCOPE_DOMAIN = "domain"
+    SCOPE_FACET = "facet"
+
+    # Passo máximo de Newton por atualização (evita saltos com poucos itens)
+    MAX_NEWTON_STEP = 1.0
+
+    def __init__(
+        self,
+        conn,
+        lock: Optional[threading.RLock] = None,
+        cache_dir: Optional[str] = None
+    ):
+        """
+        Args:
+            conn: Conexão sqlite3 (ex: HybridDatabaseManager.conn)
+            lock: Lock que protege a conexão compartilhada
+            cache_dir: Diretório das tabelas mmap do ItemBankCache (opcional)
+        """
+        self.conn = conn
+        self.lock = lock or threading.RLock()
+        self.grm = GradedResponseModel(item_bank=get_item_bank(cache_dir))
+        self._bank_version: Optional[str] = None
+        self._create_table()
+
+    def _create_table(self):
+        with self.lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS irt_online_estimates (
+                    user_id TEXT NOT NULL,
+                    scope TEXT NOT NULL,              -- 'domain' ou 'facet'
+                    scope_key TEXT NOT NULL,          -- 'extraversion' ou 'E1'
+                    domain TEXT NOT NULL,
+                    theta REAL NOT NULL,
+                    standard_error REAL,
+                    information REAL NOT NULL DEFAULT 0,
+                    n_responses INTEGER NOT NULL DEFAULT 0,
+                    intensity_sum INTEGER NOT NULL DEFAULT 0,
+                    params_version TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, scope, scope_key)
+                )
+            """)
+            self.conn.commit()
+
+    # -------------------------------------------------------------------------
+    # Parâmetros dos itens
+    # -------------------------------------------------------------------------
+
+    def params_version(self) -> str:
+        """Assinatura barata de irt_item_parameters (muda quando há recalibração)."""
+        row = self.conn.execute("""
+            SELECT COUNT(*), COALESCE(MAX(calibration_date), ''),
+                   TOTAL(discrimination + threshold_1 + threshold_2 + threshold_3 + threshold_4)
+            FROM irt_item_parameters
+        """).fetchone()
+        version = f"{row[0]}:{row[1]}:{row[2]:.6f}"
+
+        # Recarregar as tabelas pré-calculadas quando os parâmetros mudam
+        if version != self._bank_version and self.grm.item_bank is not None:
+            self.grm.item_bank.load([
+                (row[0], list(row[1:]))
+                for row in self.conn.execute("""
+                    SELECT discrimination, threshold_1, threshold_2, threshold_3, threshold_4
+                    FROM irt_item_parameters
+                """).fetchall()
+            ])
+            self._bank_version = version
+
+        return version
+
+    def _load_responses(
+        self,
+        user_id: str,
+        fragments: Optional[List[Tuple[str, int]]] = None
+    ) -> List[Tuple[str, str, ItemResponse]]:
+        """
+        Monta ItemResponses (com domínio e faceta) a partir de pares
+        (fragment_id, intensity) ou, sem pares, de todos os detected_fragments do usuário.
+
+        Returns:
+            Lista de (domain, facet_code, ItemResponse)
+        """
+        params_sql = """
+            SELECT f.fragment_id, LOWER(f.domain), f.facet_code,
+                   COALESCE(ip.discrimination, ?),
+                   COALESCE(ip.threshold_1, ?), COALESCE(ip.threshold_2, ?),
+                   COALESCE(ip.threshold_3, ?), COALESCE(ip.threshold_4, ?)
+            FROM irt_fragments f
+            LEFT JOIN irt_item_parameters ip ON f.fragment_id = ip.fragment_id
+        """
+        defaults = (DEFAULT_DISCRIMINATION, *DEFAULT_THRESHOLDS)
+
+        if fragments is None:
+            rows = self.conn.execute(f"""
+                SELECT p.*, df.intensity
+                FROM detected_fragments df
+                JOIN ({params_sql}) p ON p.fragment_id = df.fragment_id
+                WHERE df.user_id = ?
+            """, (*defaults, user_id)).fetchall()
+            items = [(tuple(row)[:8], row[8]) for row in rows]
+        else:
+            ids = sorted({fragment_id for fragment_id, _ in fragments})
+            placeholders = ",".join("?" * len(ids))
+            params = {
+                row[0]: tuple(row)
+                for row in self.conn.execute(
+                    f"{params_sql} WHERE f.fragment_id IN ({placeholders})",
+                    (*defaults, *ids)
+                ).fetchall()
+            }
+            items = [
+                (params[fragment_id], intensity)
+                for fragment_id, intensity in fragments
+                if fragment_id in params
+            ]
+
+        responses = []
+        for (fragment_id, domain, facet_code, a, b1, b2, b3, b4), intensity in items:
+            if not validate_intensity(intensity):
+                continue
+            responses.append((domain, facet_code, ItemResponse(
+                fragment_id=fragment_id,
+                facet_code=facet_code,
+                intensity=intensity,
+                discrimination=a,
+                thresholds=[b1, b2, b3, b4]
+            )))
+        return responses
+
+    # -------------------------------------------------------------------------
+    # Estado
+    # -------------------------------------------------------------------------
+
+    def _load_state(self, user_id: str) -> Dict[Tuple[str, str], Dict]:
+        rows = self.conn.execute("""
+            SELECT scope, scope_key, domain, theta, standard_error, information,
+                   n_responses, intensity_sum, params_version
+            FROM irt_online_estimates
+            WHERE user_id = ?
+        """, (user_id,)).fetchall()
+        return {
+            (row[0], row[1]): {
+                "domain": row[2],
+                "theta": row[3],
+                "standard_error": row[4],
+                "information": row[5],
+                "n_responses": row[6],
+                "intensity_sum": row[7],
+                "params_version": row[8]
+            }
+            for row in rows
+        }
+
+    def _write_states(self, user_id: str, states: Dict[Tuple[str, str], Dict], version: str):
+        self.conn.executemany("""
+            INSERT OR REPLACE INTO irt_online_estimates
+                (user_id, scope, scope_key, domain, theta, standard_error, information,
+                 n_responses, intensity_sum, params_version, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, [
+            (
+                user_id, scope, key, state["domain"], state["theta"],
+                None if math.isinf(state["standard_error"]) else state["standard_error"],
+                state["information"], state["n_responses"], state["intensity_sum"], version
+            )
+            for (scope, key), state in states.items()
+        ])
+
+    def _full_state(self, domain: str, responses: List[ItemResponse]) -> Dict:
+        """Estado a partir de todas as respostas (MLE completo)."""
+        theta, se = self.grm.estimate_theta_mle(responses)
+        information = 0.0
+        if len(responses) >= MIN_RESPONSES_FOR_ESTIMATE and not math.isinf(se) and se > 0:
+            information = 1.0 / (se ** 2)
+        return {
+            "domain": domain,
+            "theta": theta,
+            "standard_error": se,
+            "information": information,
+            "n_responses": len(responses),
+            "intensity_sum": sum(r.intensity for r in responses)
+        }
+
+    def _newton_state(self, state: Dict, new: List[ItemResponse]) -> Dict:
+        """Passo de Newton a partir do theta anterior usando apenas as respostas novas."""
+        prior_theta = state["theta"]
+        new_information = sum(
+            self.grm._item_information(prior_theta, r.discrimination, r.thresholds)
+            for r in new
+        )
+        total_information = state["information"] + new_information
+
+        theta = prior_theta
+        if total_information > 0:
+            step = self.grm.score_function(prior_theta, new) / total_information
+            step = max(-self.MAX_NEWTON_STEP, min(self.MAX_NEWTON_STEP, step))
+            theta = max(THETA_MIN, min(THETA_MAX, prior_theta + step))
+
+        information = state["information"] + sum(
+            self.grm._item_information(theta, r.discrimination, r.thresholds)
+            for r in new
+        )
+        return {
+            "domain": state["domain"],
+            "theta": theta,
+            "standard_error": 1.0 / math.sqrt(information) if information > 0 else float('inf'),
+            "information": information,
+            "n_responses": state["n_responses"] + len(new),
+            "intensity_sum": state["intensity_sum"] + sum(r.intensity for r in new)
+        }
+
+    # -------------------------------------------------------------------------
+    # API pública
+    # -------------------------------------------------------------------------
+
+    def recompute_user(self, user_id: str) -> int:
+        """
+        Recalcula do zero (MLE sobre todos os detected_fragments) o estado do usuário.
+
+        Returns:
+            Número de chaves (domínios + facetas) gravadas
+        """
+        with self.lock:
+            version = self.params_version()
+            grouped = self._group(self._load_responses(user_id))
+            states = {
+                key: self._full_state(domain, responses)
+                for key, (domain, responses) in grouped.items()
+            }
+            self.conn.execute("DELETE FROM irt_online_estimates WHERE user_id = ?", (user_id,))
+            self._write_states(user_id, states, version)
+            self.conn.commit()
+
+        logger.info(f"🧬 IRT online: recálculo completo de {user_id[:8]} ({len(states)} chaves)")
+        return len(states)
+
+    def update(self, user_id: str, detections: List[Tuple[str, int]]) -> int:
+        """
+        Atualiza incrementalmente as estimativas com novas detecções.
+
+        Deve ser chamado depois que as detecções foram gravadas em detected_fragments.
+
+        Args:
+            user_id: ID do usuário
+            detections: Pares (fragment_id, intensity) recém-detectados
+
+        Returns:
+            Número de chaves (domínios + facetas) atualizadas
+        """
+        if not detections:
+            return 0
+
+        with self.lock:
+            version = self.params_version()
+            states = self._load_state(user_id)
+
+            # Sem estado (primeira vez / dados anteriores ao estimador) ou parâmetros
+            # recalibrados: o recálculo completo já inclui as detecções novas
+            if not states or any(s["params_version"] != version for s in states.values()):
+                return self.recompute_user(user_id)
+
+            grouped = self._group(self._load_responses(user_id, detections))
+            updated: Dict[Tuple[str, str], Dict] = {}
+            crossed = []
+
+            for key, (domain, new) in grouped.items():
+                state = states.get(key) or {
+                    "domain": domain, "theta": 0.0, "standard_error": float('inf'),
+                    "information": 0.0, "n_responses": 0, "intensity_sum": 0
+                }
+                n_total = state["n_responses"] + len(new)
+
+                if n_total < MIN_RESPONSES_FOR_ESTIMATE:
+                    # Mesmo critério de _simple_estimate, a partir da soma acumulada
+                    intensity_sum = state["intensity_sum"] + sum(r.intensity for r in new)
+                    se = 1.5 / math.sqrt(n_total)
+                    updated[key] = {
+                        "domain": domain,
+                        "theta": intensity_sum / n_total - 3,
+                        "standard_error": se,
+                        "information": 0.0,
+                        "n_responses": n_total,
+                        "intensity_sum": intensity_sum
+                    }
+                elif state["n_responses"] < MIN_RESPONSES_FOR_ESTIMATE:
+                    crossed.append(key)
+                else:
+                    updated[key] = self._newton_state(state, new)
+
+            # Chaves que acabaram de atingir o mínimo: MLE completo só para elas
+            if crossed:
+                full = self._group(self._load_responses(user_id))
+                for key in crossed:
+                    domain, responses = full[key]
+                    updated[key] = self._full_state(domain, responses)
+
+            self._write_states(user_id, updated, version)
+            self.conn.commit()
+
+        return len(updated)
+
+    def ensure_state(self, user_id: str) -> bool:
+        """
+        Garante estado para usuários com detecções anteriores ao estimador.
+
+        Quem já tem detected_fragments mas nenhuma linha em
+        irt_online_estimates recebe um recálculo completo na primeira leitura,
+        em vez de um perfil vazio até a próxima detecção.
+
+        Returns:
+            True se o usuário tem (ou passou a ter) estado
+        """
+        with self.lock:
+            has_state = self.conn.execute(
+                "SELECT 1 FROM irt_online_estimates WHERE user_id = ? LIMIT 1", (user_id,)
+            ).fetchone()
+            if has_state:
+                return True
+            has_fragments = self.conn.execute(
+                "SELECT 1 FROM detected_fragments WHERE user_id = ? LIMIT 1", (user_id,)
+            ).fetchone()
+            if not has_fragments:
+                return False
+            return self.recompute_user(user_id) > 0
+
+    def get_estimates(self, user_id: str) -> Dict[str, Dict[str, Dict]]:
+        """
+        Lê as estimativas pré-calculadas (leitura única, sem MLE).
+
+        Na primeira leitura de um usuário com detecções antigas e sem estado,
+        reconstrói o estado a partir dos detected_fragments (ensure_state).
+
+        Returns:
+            {"domains": {domain: {...}}, "facets": {facet_code: {...}}}
+        """
+        with self.lock:
+            self.ensure_state(user_id)
+            rows = self.conn.execute("""
+                SELECT scope, scope_key, domain, theta, standard_error,
+                       n_responses, updated_at
+                FROM irt_online_estimates
+                WHERE user_id = ?
+            """, (user_id,)).fetchall()
+
+        result = {"domains": {}, "facets": {}}
+        for scope, key, domain, theta, se, n_responses, updated_at in rows:
+            se_value = float('inf') if se is None else se
+            entry = {
+                "theta": round(theta, 3),
+                "standard_error": None if se is None else round(se, 3),
+                "score_0_100": self.grm.theta_to_score(theta),
+                "n_items": n_responses,
+                "reliability": self.grm.classify_reliability(se_value),
+                "updated_at": updated_at
+            }
+            if scope == self.SCOPE_DOMAIN:
+                result["domains"][key] = entry
+            else:
+                entry["domain"] = domain
+                entry["facet_name"] = FACET_NAMES.get(key, key)
+                result["facets"][key] = entry
+        return result
+
+    def _group(
+        self,
+        responses: List[Tuple[str, str, ItemResponse]]
+    ) -> Dict[Tuple[str, str], Tuple[str, List[ItemResponse]]]:
+        """Agrupa respostas por (scope, chave) para domínio e faceta."""
+        grouped: Dict[Tuple[str, str], Tuple[str, List[ItemResponse]]] = {}
+        for domain, facet_code, response in responses:
+            for key in ((self.SCOPE_DOMAIN, domain), (self.SCOPE_FACET, facet_code)):
+                grouped.setdefault(key, (domain, []))[1].append(response)
+        return grouped
+
+
+# =============================================================================
+# ADAPTIVE ITEM SELECTOR - SELEÇÃO ADAPTATIVA (CAT)
+# =============================================================================
+
+class AdaptiveItemSelector:
+    """
+    Seleção adaptativa de itens (Computerized Adaptive Testing).
+
+    Dado o theta/SE atual do usuário por domínio (irt_online_estimates),
+    escolhe o fragmento com maior informação esperada, ou seja, o que mais
+    reduz o erro padrão do domínio se for observado na próxima resposta.
+
+    Informação esperada de um item = integral de I(θ) sob a posterior
+    aproximada N(theta, SE²), calculada de uma vez para todo o banco com as
+    curvas do ItemBankCache (produto matriz-vetor). Usa prior N(0, 1), de
+    forma que domínios sem dados têm SE = 1 e entram na disputa naturalmente.
+    Domínios com SE <= SE_THRESHOLD_RELIABLE não recebem mais perguntas.
+    """
+
+    PRIOR_INFORMATION = 1.0  # Prior N(0, 1)
+
+    def __init__(
+        self,
+        conn,
+        lock: Optional[threading.RLock] = None,
+        item_bank: Optional[ItemBankCache] = None
+    ):
+        """
+        Args:
+            conn: Conexão sqlite3 (ex: HybridDatabaseManager.conn)
+            lock: Lock que protege a conexão compartilhada
+            item_bank: Tabelas pré-calculadas (default: banco compartilhado)
+        """
+        self.conn = conn
+        self.lock = lock or threading.RLock()
+        self.grm = GradedResponseModel(item_bank=item_bank)
+
+    def _load_items(self) -> List[Dict]:
+        rows = self.conn.execute("""
+            SELECT f.fragment_id, LOWER(f.domain), f.facet_code, f.description,
+                   COALESCE(ip.discrimination, ?),
+                   COALESCE(ip.threshold_1, ?), COALESCE(ip.threshold_2, ?),
+                   COALESCE(ip.threshold_3, ?), COALESCE(ip.threshold_4, ?)
+            FROM irt_fragments f
+            LEFT JOIN irt_item_parameters ip ON f.fragment_id = ip.fragment_id
+            WHERE COALESCE(f.status, 'active') = 'active'
+        """, (DEFAULT_DISCRIMINATION, *DEFAULT_THRESHOLDS)).fetchall()
+        return [
+            {
+                "fragment_id": row[0],
+                "domain": row[1],
+                "facet_code": row[2],
+                "description": row[3],
+                "discrimination": row[4],
+                "thresholds": list(row[5:9])
+            }
+            for row in rows
+        ]
+
+    def _load_domain_estimates(self, user_id: str) -> Dict[str, Tuple[float, float]]:
+        """theta e informação acumulada por domínio (vazio se ainda não há estimativas)."""
+        try:
+            rows = self.conn.execute("""
+                SELECT scope_key, theta, information
+                FROM irt_online_estimates
+                WHERE user_id = ? AND scope = ?
+            """, (user_id, OnlineTraitEstimator.SCOPE_DOMAIN)).fetchall()
+        except Exception:
+            return {}
+        return {row[0]: (row[1], row[2] or 0.0) for row in rows}
+
+    def _administered(self, user_id: str) -> set:
+        rows = self.conn.execute(
+            "SELECT DISTINCT fragment_id FROM detected_fragments WHERE user_id = ?",
+            (user_id,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def _expected_information(self, items: List[Dict], theta: float, se: float) -> List[float]:
+        """Informação esperada de cada item sob N(theta, se²)."""
+        bank = self.grm.item_bank
+        if bank is None:
+            return [
+                self.grm._item_information(theta, item["discrimination"], item["thresholds"])
+                for item in items
+            ]
+
+        curves = bank.information_curves([(item["discrimination"], item["thresholds"]) for item in items])
+        weights = np.exp(-0.5 * ((bank.grid - theta) / se) ** 2)
+        weights /= weights.sum()
+        return (curves @ weights).tolist()
+
+    def select_next(self, user_id: str, domains: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Escolhe o próximo fragmento a investigar.
+
+        Args:
+            user_id: ID do usuário
+            domains: Restringe a busca a estes domínios (opcional)
+
+        Returns:
+            Dict com domain, facet_code, fragment_id, description,
+            expected_information, current_se e projected_se; ou None se todos
+            os domínios já estão confiáveis (ou não há banco de itens).
+        """
+        with self.lock:
+            items = self._load_items()
+            if not items:
+                return None
+            estimates = self._load_domain_estimates(user_id)
+            administered = self._administered(user_id)
+
+        by_domain: Dict[str, List[Dict]] = {}
+        for item in items:
+            if domains is None or item["domain"] in domains:
+                by_domain.setdefault(item["domain"], []).append(item)
+
+        best = None
+        for domain, domain_items in by_domain.items():
+            theta, information = estimates.get(domain, (0.0, 0.0))
+            total_information = self.PRIOR_INFORMATION + information
+            current_se = 1.0 / math.sqrt(total_information)
+
+            if information > 0 and current_se <= SE_THRESHOLD_RELIABLE:
+                continue
+
+            # Preferir itens ainda não observados; repetir só se o domínio esgotou
+            candidates = [i for i in domain_items if i["fragment_id"] not in administered] or domain_items
+            expected = self._expected_information(candidates, theta, current_se)
+
+            index = max(range(len(candidates)), key=expected.__getitem__)
+            projected_se = 1.0 / math.sqrt(total_information + expected[index])
+            reduction = current_se - projected_se
+
+            if best is None or reduction > best["se_reduction"]:
+                item = candidates[index]
+                best = {
+                    "domain": domain,
+                    "facet_code": item["facet_code"],
+                    "facet_name": FACET_NAMES.get(item["facet_code"], item["facet_code"]),
+                    "fragment_id": item["fragment_id"],
+                    "description": item["description"],
+                    "theta": round(theta, 3),
+                    "expected_information": round(expected[index], 4),
+                    "current_se": round(current_se, 3),
+                    "projected_se": round(projected_se, 3),
+                    "se_reduction": reduction
+                }
+
+        if best:
+            logger.info(
+                f"🎯 CAT: {best['domain']}/{best['facet_code']} ({best['fragment_id']}) "
+                f"SE {best['current_se']:.3f} → {best['projected_se']:.3f}"
+            )
+        return best
+
+
 # =============================================================================
 # FUNÇÕES UTILITÁRIAS
 # =============================================================================
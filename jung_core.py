@@ -25,6 +25,7 @@ import json
 import re
 import logging
 import threading
+import time
 from typing import List, Dict, Optional, Tuple, Any
 from datetime import datetime
 from dataclasses import dataclass, asdict
@@ -33,16 +34,50 @@ from collections import Counter
 from dotenv import load_dotenv
 from openai import OpenAI
 
-# ChromaDB + LangChain
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    from langchain_chroma import Chroma
-    from langchain.schema import Document
-    CHROMADB_AVAILABLE = True
-except ImportError:
-    CHROMADB_AVAILABLE = False
+from recent_history import RecentHistoryCache, render_history_line, fit_history
+from user_registry import UserRegistryCache
+from llm_transport import wrap_chat_client, wrap_messages_client
+from context_packer import (
+    ContextSegment, segment_from_text, pack_context, fit_text,
+    PRIORITY_CONVERSATION, PRIORITY_FACTS, PRIORITY_RECENT_MEMORIES, PRIORITY_CONSOLIDATED,
+    PRIORITY_OLDER_MEMORIES, PRIORITY_PATTERNS, PRIORITY_RUMINATION, PRIORITY_RESEARCH
+)
+
+# ChromaDB + LangChain (importados sob demanda: langchain/torch levam segundos
+# para carregar e não devem atrasar o cold start - ver _load_vector_backend)
+import importlib.util
+
+CHROMADB_AVAILABLE = all(
+    importlib.util.find_spec(_module) is not None
+    for _module in ("langchain_community", "langchain_chroma", "langchain")
+)
+if not CHROMADB_AVAILABLE:
     print("⚠️  ChromaDB não disponível. Usando apenas SQLite.")
 
+Chroma = None
+Document = None
+
+
+def _load_vector_backend() -> bool:
+    """Importa LangChain/Chroma na primeira utilização; retorna se está disponível"""
+    global Chroma, Document, CHROMADB_AVAILABLE
+
+    if Document is not None:
+        return True
+    if not CHROMADB_AVAILABLE:
+        return False
+
+    try:
+        from langchain_chroma import Chroma as _Chroma
+        from langchain.schema import Document as _Document
+    except ImportError as e:
+        CHROMADB_AVAILABLE = False
+        print(f"⚠️  ChromaDB não disponível ({e}). Usando apenas SQLite.")
+        return False
+
+    Chroma, Document = _Chroma, _Document
+    return True
+
 # Extrator de fatos com LLM
 try:
     from llm_fact_extractor import LLMFactExtractor
@@ -123,16 +158,56 @@ class Config:
     SQLITE_PATH = os.path.join(DATA_DIR, "jung_hybrid.db")
     CHROMA_PATH = os.path.join(DATA_DIR, "chroma_db")
     
+    # Cold start: ChromaDB/embeddings/mem0 aquecem em background (ver HybridDatabaseManager.start_warmup)
+    FAST_STARTUP = os.getenv("FAST_STARTUP", "true").lower() == "true"
+    RETRIEVAL_READY_TIMEOUT_S = float(os.getenv("RETRIEVAL_READY_TIMEOUT_S", "120"))  # jobs/rotas esperam o aquecimento
+
+    # Ingestão do Telegram: "polling" (padrão) ou "webhook" (fila durável + workers, ver update_queue.py)
+    TELEGRAM_MODE = os.getenv("TELEGRAM_MODE", "polling").lower()
+    TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")  # URL pública de /telegram/webhook
+    TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")  # X-Telegram-Bot-Api-Secret-Token (obrigatório no webhook)
+    TELEGRAM_WEBHOOK_WORKERS = int(os.getenv("TELEGRAM_WEBHOOK_WORKERS", "0"))  # 0 = consumir no processo web
+    TELEGRAM_WORKER_CONCURRENCY = int(os.getenv("TELEGRAM_WORKER_CONCURRENCY", "4"))  # usuários em paralelo por worker
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+
+    # Consolidação de memórias (consolidation_runner.py)
+    MEMORY_CONSOLIDATION_WORKERS = int(os.getenv("MEMORY_CONSOLIDATION_WORKERS", "4"))  # usuários em paralelo
+
+    # Busca semântica em camadas temporais (temporal_retrieval.py)
+    SEMANTIC_SEARCH_TIERED = os.getenv("SEMANTIC_SEARCH_TIERED", "true").lower() == "true"
+    SEMANTIC_TIER_MIN_SIMILARITY = float(os.getenv("SEMANTIC_TIER_MIN_SIMILARITY", "0.35"))  # 1 - distância para "forte"
+
+    # Fusão RRF de ChromaDB + FTS5 em semantic_search (conversation_fts.py)
+    SEMANTIC_FTS_RRF_WEIGHT = float(os.getenv("SEMANTIC_FTS_RRF_WEIGHT", "1.0"))  # 0 = desliga o FTS
+
     # Memória
     MIN_MEMORIES_FOR_ANALYSIS = 3
     MAX_CONTEXT_MEMORIES = 10
+
+    # Orçamentos de tokens do contexto (context_packer.py)
+    RICH_CONTEXT_TOKEN_BUDGET = int(os.getenv("RICH_CONTEXT_TOKEN_BUDGET", "2000"))  # build_rich_context
+    RESPONSE_CONTEXT_TOKEN_BUDGET = int(os.getenv("RESPONSE_CONTEXT_TOKEN_BUDGET", "1250"))  # {semantic_context} do RESPONSE_PROMPT
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1100"))  # {chat_history} do RESPONSE_PROMPT
     
     # ChromaDB
     CHROMA_COLLECTION_NAME = "jung_conversations"
+
+    # Partições (vector_partitions.py): "single" | "shard" | "organization"
+    CHROMA_PARTITION_MODE = os.getenv("CHROMA_PARTITION_MODE", "single").lower()
+    CHROMA_PARTITION_SHARDS = int(os.getenv("CHROMA_PARTITION_SHARDS", "16"))
+    CHROMA_MAX_OPEN_PARTITIONS = int(os.getenv("CHROMA_MAX_OPEN_PARTITIONS", "64"))
+    CHROMA_SEGMENT_CACHE_MB = int(os.getenv("CHROMA_SEGMENT_CACHE_MB", "1024"))  # LRU de segmentos; 0 = sem limite
     
     # Embeddings
     EMBEDDING_MODEL = "text-embedding-3-small"
     EMBEDDING_DIMENSIONS = 1536
+
+    # MiniLM local do ChromaDB/mem0 (embedding_backends.py): "torch" | "onnx" (int8)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")  # no repo do HF Hub
+    EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH")  # diretório/arquivo local (imagem sem rede)
+    EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 = padrão do ONNX Runtime
     
     # Arquétipos
     ARCHETYPES = {
@@ -255,8 +330,15 @@ class HybridDatabaseManager:
     - ChromaDB: Memória semântica conversacional (busca vetorial)
     """
 
-    def __init__(self):
-        """Inicializa gerenciador híbrido"""
+    def __init__(self, lazy_vector_store: bool = False):
+        """
+        Inicializa gerenciador híbrido
+
+        Args:
+            lazy_vector_store: Se True, ChromaDB/embeddings/mem0 não são
+                carregados aqui - start_warmup() os inicializa em background.
+                Até lá o sistema opera em modo degradado (SQLite-only).
+        """
 
         Config.ensure_directories()
 
@@ -270,30 +352,49 @@ class HybridDatabaseManager:
         # ===== SQLite =====
         self.conn = sqlite3.connect(Config.SQLITE_PATH, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+
+        # Modo webhook: vários processos (web + workers) escrevem no mesmo arquivo.
+        # WAL deixa leitores e o escritor concorrerem; busy_timeout espera o lock
+        # de escrita de outro processo em vez de falhar com "database is locked"
+        self.multi_process = Config.TELEGRAM_MODE == "webhook"
+        if self.multi_process:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(f"PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}")
+
         self._init_sqlite_schema()
-        
+
+        # ===== Histórico recente em memória (ring buffer por usuário) =====
+        # Com vários processos, outro processo (proativo, /reset, ruminação) pode
+        # gravar conversas do usuário: o buffer é conferido com MAX(id) do banco
+        self.recent_history = RecentHistoryCache(
+            loader=lambda uid, limit: self.get_user_conversations(uid, limit=limit, include_proactive=True),
+            max_turns=10,
+            version_probe=self._latest_conversation_id if self.multi_process else None
+        )
+
+        # ===== Identidade/organização de usuários Telegram + last_seen em lote =====
+        # Vínculos de organização são editados pelo admin em outro processo: TTL curto
+        self.user_registry = UserRegistryCache(
+            self,
+            entry_ttl_s=UserRegistryCache.MULTI_PROCESS_TTL_S if self.multi_process else None
+        )
+
+        # ===== Prontidão da recuperação semântica (ChromaDB + mem0) =====
+        self.chroma_enabled = False
+        self.vectorstore = None  # Coleção única (origem da migração quando particionado)
+        self.vector_partitions = None
+        self.mem0 = None
+        self.retrieval_ready = threading.Event()
+        self._warmup_thread = None
+        self._warmup_backlog = []  # Gravações adiadas até o fim do aquecimento
+        self._warmup_lock = threading.Lock()
+
         # ===== ChromaDB + Local Embeddings =====
-        self.chroma_enabled = CHROMADB_AVAILABLE
-        
-        if self.chroma_enabled:
-            try:
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name="all-MiniLM-L6-v2"
-                )
-                
-                self.vectorstore = Chroma(
-                    collection_name=Config.CHROMA_COLLECTION_NAME,
-                    embedding_function=self.embeddings,
-                    persist_directory=Config.CHROMA_PATH
-                )
-                
-                logger.info("✅ ChromaDB + HuggingFace Embeddings (all-MiniLM-L6-v2) inicializados")
-            except Exception as e:
-                logger.error(f"❌ Erro ao inicializar ChromaDB local: {e}")
-                self.chroma_enabled = False
+        if lazy_vector_store:
+            logger.info("⏳ ChromaDB/embeddings/mem0 serão aquecidos em background (FAST_STARTUP)")
         else:
-            logger.warning("⚠️  ChromaDB desabilitado. Usando apenas SQLite.")
-            
+            self._init_vector_store()
+
         self.openai_client = None # Removido dependência direta da OpenAI
 
         # ===== LLM Client (OpenRouter primário, Anthropic fallback) =====
@@ -315,7 +416,9 @@ class HybridDatabaseManager:
             else:
                 import anthropic
                 if Config.ANTHROPIC_API_KEY:
-                    self.anthropic_client = anthropic.Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+                    self.anthropic_client = wrap_messages_client(
+                        anthropic.Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+                    )
                     logger.info("✅ LLM interno: Anthropic Claude (fallback — OPENROUTER_API_KEY ausente)")
                 else:
                     self.anthropic_client = None
@@ -350,6 +453,58 @@ class HybridDatabaseManager:
             logger.warning("⚠️ LLM Fact Extractor module não disponível (import falhou)")
 
         # ===== mem0 (substitui ChromaDB + BM25 + user_facts_v2) =====
+        if not lazy_vector_store:
+            self._init_mem0()
+            self.retrieval_ready.set()
+
+        logger.info("✅ Banco híbrido inicializado com sucesso")
+
+    # ========================================
+    # AQUECIMENTO (ChromaDB + EMBEDDINGS + MEM0)
+    # ========================================
+
+    def _init_vector_store(self):
+        """Carrega LangChain, o modelo de embeddings e abre o ChromaDB"""
+        if not _load_vector_backend():
+            logger.warning("⚠️  ChromaDB desabilitado. Usando apenas SQLite.")
+            return
+
+        try:
+            # Backend torch/onnx (Config.EMBEDDING_BACKEND), compartilhado com o mem0
+            from embedding_backends import get_embeddings
+            self.embeddings = get_embeddings()
+
+            from vector_partitions import PartitionRouter, PartitionedVectorStore
+
+            router = PartitionRouter(
+                self, Config.CHROMA_PARTITION_MODE,
+                Config.CHROMA_COLLECTION_NAME, Config.CHROMA_PARTITION_SHARDS
+            )
+            self.vector_partitions = PartitionedVectorStore(
+                Chroma, self.embeddings, Config.CHROMA_PATH, router,
+                max_open=Config.CHROMA_MAX_OPEN_PARTITIONS,
+                segment_cache_mb=Config.CHROMA_SEGMENT_CACHE_MB
+            )
+            self.vectorstore = self.vector_partitions.legacy
+
+            self.chroma_enabled = True
+            logger.info(f"✅ ChromaDB + Embeddings all-MiniLM-L6-v2 ({Config.EMBEDDING_BACKEND}) inicializados "
+                        f"(partições: {router.mode})")
+
+            if self.vector_partitions.partitioned:
+                pending = self.vector_partitions.legacy_count()
+                if pending:
+                    logger.warning(f"⚠️ {pending} documentos ainda na coleção única - "
+                                   "rode 'python vector_partitions.py migrate --delete-source'")
+        except Exception as e:
+            logger.error(f"❌ Erro ao inicializar ChromaDB local: {e}")
+            self.chroma_enabled = False
+
+    def vector_store_for(self, user_id: str):
+        """Partição ChromaDB (wrapper LangChain) onde ficam as memórias do usuário"""
+        return self.vector_partitions.for_user(str(user_id))
+
+    def _init_mem0(self):
         try:
             from mem0_memory_adapter import create_mem0_adapter
             self.mem0 = create_mem0_adapter()
@@ -357,7 +512,80 @@ class HybridDatabaseManager:
             self.mem0 = None
             logger.warning(f"⚠️ [MEM0] Erro ao inicializar: {e}")
 
-        logger.info("✅ Banco híbrido inicializado com sucesso")
+    def start_warmup(self) -> Optional[threading.Thread]:
+        """
+        Aquece ChromaDB, modelo de embeddings e mem0 numa thread daemon
+
+        Enquanto não termina, semantic_search usa o fallback SQLite e
+        process_message monta o contexto sem mem0 (modo degradado);
+        gravações no ChromaDB/mem0 ficam num backlog aplicado ao final.
+        """
+        if self.retrieval_ready.is_set():
+            return None
+        with self._warmup_lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(
+                    target=self._warmup, name="retrieval-warmup", daemon=True
+                )
+                self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _warmup(self):
+        started = time.monotonic()
+        try:
+            self._init_vector_store()
+            if self.chroma_enabled:
+                # Primeira inferência carrega pesos/tokenizer - fazer fora do caminho da mensagem
+                self.embeddings.embed_query("aquecimento")
+            self._init_mem0()
+        except Exception as e:
+            logger.error(f"❌ Erro no aquecimento da recuperação semântica: {e}")
+
+        # Backlog aplicado antes de sinalizar prontidão: quem espera wait_until_ready
+        # (ex.: /reset apagando o ChromaDB) não corre contra a reindexação adiada
+        replayed = 0
+        while True:
+            with self._warmup_lock:
+                backlog, self._warmup_backlog = self._warmup_backlog, []
+                if not backlog:
+                    self.retrieval_ready.set()
+                    break
+            for task in backlog:
+                try:
+                    task()
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro ao aplicar gravação adiada do aquecimento: {e}")
+            replayed += len(backlog)
+
+        logger.info(
+            f"🔥 Recuperação semântica pronta em {time.monotonic() - started:.1f}s "
+            f"(ChromaDB={'ATIVO' if self.chroma_enabled else 'INATIVO'}, "
+            f"mem0={'ATIVO' if self.mem0 else 'INATIVO'}, {replayed} gravações adiadas)"
+        )
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Bloqueia até o aquecimento terminar (scripts/jobs que exigem ChromaDB)"""
+        if not self.retrieval_ready.is_set():
+            self.start_warmup()
+        return self.retrieval_ready.wait(timeout)
+
+    def chroma_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        ChromaDB ativo, esperando o aquecimento (até Config.RETRIEVAL_READY_TIMEOUT_S)
+
+        Jobs e rotas usam no lugar de chroma_enabled: durante o aquecimento
+        chroma_enabled ainda é False e eles concluiriam que não há ChromaDB.
+        """
+        self.wait_until_ready(Config.RETRIEVAL_READY_TIMEOUT_S if timeout is None else timeout)
+        return self.chroma_enabled
+
+    def _defer_until_ready(self, task) -> bool:
+        """Enfileira task se o aquecimento ainda não terminou; False se já está pronto"""
+        with self._warmup_lock:
+            if self.retrieval_ready.is_set():
+                return False
+            self._warmup_backlog.append(task)
+            return True
 
     # ========================================
     # THREAD-SAFE TRANSACTION MANAGEMENT
@@ -843,6 +1071,10 @@ class HybridDatabaseManager:
         # Lacunas
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_gaps_user ON knowledge_gaps(user_id, status)")
 
+        # Busca textual FTS5 sobre conversas (conversation_fts.py)
+        from conversation_fts import ensure_conversation_fts
+        self.fts_enabled = ensure_conversation_fts(self.conn)
+
         self.conn.commit()
         logger.info("✅ Schema SQLite criado/verificado com índices de performance")
     
@@ -907,7 +1139,15 @@ class HybridDatabaseManager:
         cursor = self.conn.cursor()
         cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
         row = cursor.fetchone()
-        return dict(row) if row else None
+        if not row:
+            return None
+
+        user = dict(row)
+        # last_seen ainda não gravado (UserRegistryCache grava em lote)
+        pending_last_seen = self.user_registry.pending_last_seen(user_id)
+        if pending_last_seen:
+            user['last_seen'] = pending_last_seen
+        return user
     
     def get_user_stats(self, user_id: str) -> Optional[Dict]:
         """Retorna estatísticas do usuário"""
@@ -1069,36 +1309,9 @@ class HybridDatabaseManager:
 
         days_ago = (datetime.now() - mem_time).days
 
-        if mode == "recent_focused":
-            # Valoriza últimos 7 dias, penaliza antigas
-            if days_ago <= 7:
-                return 1.5
-            elif days_ago <= 30:
-                return 1.2
-            elif days_ago <= 90:
-                return 1.0
-            else:
-                return 0.7
-
-        elif mode == "balanced":
-            # Equilíbrio entre recente e histórico
-            if days_ago <= 30:
-                return 1.2
-            elif days_ago <= 90:
-                return 1.0
-            else:
-                return 0.9
-
-        elif mode == "archeological":
-            # Valoriza padrões de longo prazo
-            if days_ago <= 30:
-                return 1.0
-            elif days_ago <= 90:
-                return 1.1
-            else:
-                return 1.3  # Boost para memórias antigas
-
-        return 1.0  # Default
+        # Faixas por modo em memory_reranker.TEMPORAL_BOOST_STEPS
+        from memory_reranker import temporal_boost_for_days
+        return temporal_boost_for_days(days_ago, mode)
 
     # ========================================
     # CONVERSAS (HÍBRIDO: SQLite + ChromaDB)
@@ -1172,129 +1385,28 @@ class HybridDatabaseManager:
             """, (chroma_id, conversation_id))
 
             self.conn.commit()
+
+        # Manter o histórico recente em memória alinhado com o banco
+        self.recent_history.append(user_id, conversation_id, user_input, ai_response, platform)
         
-        # 3. Salvar no ChromaDB (se habilitado)
+        # 3. Salvar no ChromaDB (se habilitado; durante o aquecimento fica no backlog)
+        # A hora da conversa vai junto: o backlog é aplicado depois, e os
+        # buckets temporais (day_bucket, camadas de temporal_retrieval) não podem mudar
+        vector_args = dict(
+            conversation_id=conversation_id, chroma_id=chroma_id, timestamp=datetime.now(),
+            user_id=user_id, user_name=user_name, session_id=session_id,
+            user_input=user_input, ai_response=ai_response,
+            archetype_analyses=archetype_analyses, detected_conflicts=detected_conflicts,
+            tension_level=tension_level, affective_charge=affective_charge,
+            existential_depth=existential_depth, intensity_level=intensity_level,
+            complexity=complexity, keywords=keywords
+        )
         if self.chroma_enabled:
-            try:
-                # Construir documento completo
-                doc_content = f"""
-Usuário: {user_name}
-Input: {user_input}
-Resposta: {ai_response}
-"""
-                
-                if archetype_analyses:
-                    doc_content += "\n=== VOZES INTERNAS ===\n"
-                    for arch_name, insight in archetype_analyses.items():
-                        doc_content += f"\n{arch_name}: {insight.voice_reaction[:150]} (impulso: {insight.impulse}, intensidade: {insight.intensity:.1f})\n"
-                
-                if detected_conflicts:
-                    doc_content += "\n=== CONFLITOS DETECTADOS ===\n"
-                    for conflict in detected_conflicts:
-                        doc_content += f"{conflict.description}\n"
-                
-                # Metadata (Enriquecido - Fase 1 do Plano de Memória)
-                now = datetime.now()
-                metadata = {
-                    # Campos existentes (manter)
-                    "user_id": user_id,
-                    "user_name": user_name,
-                    "session_id": session_id or "",
-                    "timestamp": now.isoformat(),
-                    "conversation_id": conversation_id,
-                    "tension_level": tension_level,
-                    "affective_charge": affective_charge,
-                    "existential_depth": existential_depth,
-                    "intensity_level": intensity_level,
-                    "complexity": complexity,
-                    "keywords": ",".join(keywords) if keywords else "",
-                    "has_conflicts": len(detected_conflicts) > 0 if detected_conflicts else False,
-
-                    # NOVOS - Temporal Estratificado
-                    "day_bucket": now.strftime("%Y-%m-%d"),
-                    "week_bucket": now.strftime("%Y-W%W"),
-                    "month_bucket": now.strftime("%Y-%m"),
-                    "recency_tier": self._calculate_recency_tier(now),
-
-                    # NOVOS - Emocional/Temático
-                    "emotional_intensity": round(affective_charge + tension_level, 2),
-                    "dominant_archetype": self._get_dominant_archetype(archetype_analyses) if archetype_analyses else "",
-
-                    # NOVOS - Relacional
-                    "mentions_people": ",".join(self._extract_people_from_conversation(conversation_id)),
-                    "topics": ",".join(self._extract_topics_from_keywords(keywords)),
-                }
+            self._index_conversation_vector(**vector_args)
+        elif not self.retrieval_ready.is_set():
+            if not self._defer_until_ready(lambda: self._index_conversation_vector(**vector_args)):
+                self._index_conversation_vector(**vector_args)
 
-                # NOVO - Fact-Conversation Linking (Fase 4)
-                # Buscar IDs de fatos extraídos desta conversa
-                try:
-                    cursor.execute("""
-                        SELECT name FROM sqlite_master
-                        WHERE type='table' AND name='user_facts_v2'
-                    """)
-                    use_v2 = cursor.fetchone() is not None
-
-                    if use_v2:
-                        cursor.execute("""
-                            SELECT id FROM user_facts_v2
-                            WHERE source_conversation_id = ? AND is_current = 1
-                        """, (conversation_id,))
-                    else:
-                        cursor.execute("""
-                            SELECT id FROM user_facts
-                            WHERE source_conversation_id = ? AND is_current = 1
-                        """, (conversation_id,))
-
-                    fact_ids = [str(row[0]) for row in cursor.fetchall()]
-                    if fact_ids:
-                        metadata["extracted_fact_ids"] = ",".join(fact_ids)
-                        logger.info(f"   Linkados {len(fact_ids)} fatos ao ChromaDB metadata")
-                except Exception as fact_link_error:
-                    logger.warning(f"   Erro ao linkar fatos: {fact_link_error}")
-                    # Não bloquear salvamento se linking falhar
-                    pass
-
-                # 🔍 DEBUG: Log do metadata sendo salvo
-                logger.info(f"   ChromaDB metadata: user_id='{metadata['user_id']}' (type={type(metadata['user_id']).__name__})")
-                logger.info(f"   ChromaDB doc_id: '{chroma_id}'")
-
-                # Criar documento
-                doc = Document(page_content=doc_content, metadata=metadata)
-
-                # ✅ ADICIONAR COM TRATAMENTO DE DUPLICATAS
-                try:
-                    self.vectorstore.add_documents([doc], ids=[chroma_id])
-                    logger.info(f"✅ ChromaDB: Documento '{chroma_id}' salvo com user_id='{metadata['user_id']}'")
-                    logger.info(f"✅ Conversa salva: SQLite (ID={conversation_id}) + ChromaDB ({chroma_id})")
-                    
-                except Exception as add_error:
-                    error_msg = str(add_error).lower()
-                    
-                    # Verificar se é erro de duplicata
-                    if "already exists" in error_msg or "duplicate" in error_msg or "unique constraint" in error_msg:
-                        logger.warning(f"⚠️ Documento {chroma_id} já existe no ChromaDB, substituindo...")
-                        
-                        try:
-                            # Deletar documento existente
-                            self.vectorstore.delete([chroma_id])
-                            
-                            # Adicionar novo documento
-                            self.vectorstore.add_documents([doc], ids=[chroma_id])
-                            
-                            logger.info(f"✅ Documento {chroma_id} substituído com sucesso")
-                            
-                        except Exception as replace_error:
-                            logger.error(f"❌ Erro ao substituir documento {chroma_id}: {replace_error}")
-                            logger.warning(f"⚠️ Conversa salva apenas no SQLite (ID={conversation_id})")
-                    else:
-                        # Outro tipo de erro
-                        logger.error(f"❌ Erro ao adicionar ao ChromaDB: {add_error}")
-                        logger.warning(f"⚠️ Conversa salva apenas no SQLite (ID={conversation_id})")
-                
-            except Exception as e:
-                logger.error(f"❌ Erro geral ao processar ChromaDB: {e}")
-                logger.warning(f"⚠️ Sistema continua funcionando apenas com SQLite")
-        
         # 4. Salvar conflitos na tabela específica
         if detected_conflicts:
             with self._lock:
@@ -1364,9 +1476,157 @@ Resposta: {ai_response}
                 self.mem0.add_exchange(user_id, user_input, ai_response)
             except Exception as e:
                 logger.warning(f"⚠️ [MEM0] Erro ao sincronizar conversa: {e}")
+        elif not self.retrieval_ready.is_set():
+            self._defer_until_ready(
+                lambda: self.mem0 and self.mem0.add_exchange(user_id, user_input, ai_response)
+            )
 
         return conversation_id
 
+    def _index_conversation_vector(self, conversation_id: int, chroma_id: str,
+                                   user_id: str, user_name: str, session_id: str,
+                                   user_input: str, ai_response: str,
+                                   archetype_analyses: Dict, detected_conflicts: List,
+                                   tension_level: float, affective_charge: float,
+                                   existential_depth: float, intensity_level: int,
+                                   complexity: str, keywords: List[str],
+                                   timestamp: Optional[datetime] = None) -> None:
+        """
+        Indexa uma conversa já salva no SQLite no ChromaDB
+
+        timestamp: hora da conversa (padrão: agora); o backlog do aquecimento
+        passa a hora original.
+        """
+        if not self.chroma_enabled:
+            return
+
+        from memory_reranker import first_line_preview
+
+        cursor = self.conn.cursor()
+        try:
+            # Construir documento completo
+            doc_content = f"""
+Usuário: {user_name}
+Input: {user_input}
+Resposta: {ai_response}
+"""
+            
+            if archetype_analyses:
+                doc_content += "\n=== VOZES INTERNAS ===\n"
+                for arch_name, insight in archetype_analyses.items():
+                    doc_content += f"\n{arch_name}: {insight.voice_reaction[:150]} (impulso: {insight.impulse}, intensidade: {insight.intensity:.1f})\n"
+            
+            if detected_conflicts:
+                doc_content += "\n=== CONFLITOS DETECTADOS ===\n"
+                for conflict in detected_conflicts:
+                    doc_content += f"{conflict.description}\n"
+            
+            # Metadata (Enriquecido - Fase 1 do Plano de Memória)
+            now = timestamp or datetime.now()
+            metadata = {
+                # Campos existentes (manter)
+                "user_id": user_id,
+                "user_name": user_name,
+                "session_id": session_id or "",
+                "timestamp": now.isoformat(),
+                "conversation_id": conversation_id,
+                "tension_level": tension_level,
+                "affective_charge": affective_charge,
+                "existential_depth": existential_depth,
+                "intensity_level": intensity_level,
+                "complexity": complexity,
+                "keywords": ",".join(keywords) if keywords else "",
+                "has_conflicts": len(detected_conflicts) > 0 if detected_conflicts else False,
+
+                # NOVOS - Temporal Estratificado
+                "day_bucket": now.strftime("%Y-%m-%d"),
+                "week_bucket": now.strftime("%Y-W%W"),
+                "month_bucket": now.strftime("%Y-%m"),
+                "recency_tier": self._calculate_recency_tier(now),
+
+                # NOVOS - Emocional/Temático
+                "emotional_intensity": round(affective_charge + tension_level, 2),
+                "dominant_archetype": self._get_dominant_archetype(archetype_analyses) if archetype_analyses else "",
+
+                # NOVOS - Relacional
+                "mentions_people": ",".join(self._extract_people_from_conversation(conversation_id)),
+                "topics": ",".join(self._extract_topics_from_keywords(keywords)),
+
+                # Conteúdo para o reranking sem regex sobre page_content
+                "input_preview": first_line_preview(user_input),
+                "response_preview": first_line_preview(ai_response),
+            }
+
+            # NOVO - Fact-Conversation Linking (Fase 4)
+            # Buscar IDs de fatos extraídos desta conversa
+            try:
+                cursor.execute("""
+                    SELECT name FROM sqlite_master
+                    WHERE type='table' AND name='user_facts_v2'
+                """)
+                use_v2 = cursor.fetchone() is not None
+
+                if use_v2:
+                    cursor.execute("""
+                        SELECT id FROM user_facts_v2
+                        WHERE source_conversation_id = ? AND is_current = 1
+                    """, (conversation_id,))
+                else:
+                    cursor.execute("""
+                        SELECT id FROM user_facts
+                        WHERE source_conversation_id = ? AND is_current = 1
+                    """, (conversation_id,))
+
+                fact_ids = [str(row[0]) for row in cursor.fetchall()]
+                if fact_ids:
+                    metadata["extracted_fact_ids"] = ",".join(fact_ids)
+                    logger.info(f"   Linkados {len(fact_ids)} fatos ao ChromaDB metadata")
+            except Exception as fact_link_error:
+                logger.warning(f"   Erro ao linkar fatos: {fact_link_error}")
+                # Não bloquear salvamento se linking falhar
+                pass
+
+            # 🔍 DEBUG: Log do metadata sendo salvo
+            logger.info(f"   ChromaDB metadata: user_id='{metadata['user_id']}' (type={type(metadata['user_id']).__name__})")
+            logger.info(f"   ChromaDB doc_id: '{chroma_id}'")
+
+            # Criar documento
+            doc = Document(page_content=doc_content, metadata=metadata)
+
+            # ✅ ADICIONAR COM TRATAMENTO DE DUPLICATAS
+            try:
+                self.vector_store_for(user_id).add_documents([doc], ids=[chroma_id])
+                logger.info(f"✅ ChromaDB: Documento '{chroma_id}' salvo com user_id='{metadata['user_id']}'")
+                logger.info(f"✅ Conversa salva: SQLite (ID={conversation_id}) + ChromaDB ({chroma_id})")
+                
+            except Exception as add_error:
+                error_msg = str(add_error).lower()
+                
+                # Verificar se é erro de duplicata
+                if "already exists" in error_msg or "duplicate" in error_msg or "unique constraint" in error_msg:
+                    logger.warning(f"⚠️ Documento {chroma_id} já existe no ChromaDB, substituindo...")
+                    
+                    try:
+                        # Deletar documento existente
+                        self.vector_store_for(user_id).delete([chroma_id])
+                        
+                        # Adicionar novo documento
+                        self.vector_store_for(user_id).add_documents([doc], ids=[chroma_id])
+                        
+                        logger.info(f"✅ Documento {chroma_id} substituído com sucesso")
+                        
+                    except Exception as replace_error:
+                        logger.error(f"❌ Erro ao substituir documento {chroma_id}: {replace_error}")
+                        logger.warning(f"⚠️ Conversa salva apenas no SQLite (ID={conversation_id})")
+                else:
+                    # Outro tipo de erro
+                    logger.error(f"❌ Erro ao adicionar ao ChromaDB: {add_error}")
+                    logger.warning(f"⚠️ Conversa salva apenas no SQLite (ID={conversation_id})")
+            
+        except Exception as e:
+            logger.error(f"❌ Erro geral ao processar ChromaDB: {e}")
+            logger.warning(f"⚠️ Sistema continua funcionando apenas com SQLite")
+
     def get_user_conversations(
         self,
         user_id: str,
@@ -1422,13 +1682,35 @@ Resposta: {ai_response}
             conversations.append(conv)
 
         return conversations
-    
+
+    def _latest_conversation_id(self, user_id: str) -> Optional[int]:
+        """MAX(id) das conversas do usuário (versão do histórico para RecentHistoryCache)"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT MAX(id) FROM conversations WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
     def count_conversations(self, user_id: str) -> int:
         """Conta conversas do usuário"""
         cursor = self.conn.cursor()
         cursor.execute("SELECT COUNT(*) as count FROM conversations WHERE user_id = ?", (user_id,))
         return cursor.fetchone()['count']
 
+    def get_recent_chat_history(self, user_id: str) -> List[Dict]:
+        """
+        Histórico recente (incluindo proativas) no formato chat_history,
+        servido do ring buffer em memória (equivale a get_user_conversations
+        com limit=10 e include_proactive=True + conversations_to_chat_history).
+
+        Returns:
+            Lista nova de {"role", "content"} em ordem cronológica
+        """
+        return self.recent_history.chat_history(user_id)
+
+    def get_recent_history_text(self, user_id: str, max_messages: int = 10) -> str:
+        """Últimas mensagens do ring buffer já formatadas para o prompt de resposta"""
+        return self.recent_history.history_text(user_id, max_messages=max_messages)
+
     def conversations_to_chat_history(self, conversations: List[Dict]) -> List[Dict]:
         """
         Converte conversas do banco para formato chat_history.
@@ -1804,7 +2086,8 @@ Resposta: {ai_response}
 
         return final_k
 
-    def _rerank_memories(self, results: List[tuple], user_id: str, query: str) -> List[Dict]:
+    def _rerank_memories(self, results: List[tuple], user_id: str, query: str,
+                         temporal_mode: str = "balanced", top_k: Optional[int] = None) -> List[Dict]:
         """
         Reranking inteligente com 6 boosts (Fase 3)
 
@@ -1812,131 +2095,24 @@ Resposta: {ai_response}
             results: Lista de (Document, score) do ChromaDB
             user_id: ID do usuário
             query: Query original
-            chat_history: Histórico da conversa
+            temporal_mode: modo de calculate_temporal_boost ("neutral" quando
+                a consulta já foi recortada por um período explícito)
+            top_k: memórias materializadas (None = todas); boosts em NumPy
+                sobre todos os candidatos (memory_reranker.py)
 
         Returns:
             Lista de memórias rerankeadas com scores combinados
         """
-        import re
-
-        reranked = []
-
-        # Extrair informações da query para boosting
-        query_names = set(self._extract_names_from_text(query))
-        query_topics = set(self._detect_topics_in_text(query))
-
-        logger.info(f"   Reranking {len(results)} memórias...")
-        logger.info(f"   Query names: {query_names}")
-        logger.info(f"   Query topics: {query_topics}")
-
-        for doc, base_score in results:
-            metadata = doc.metadata
-
-            # Validação extra: filtrar manualmente user_id errado
-            doc_user_id = str(metadata.get('user_id', ''))
-            if doc_user_id != str(user_id):
-                logger.error(f"🚨 Removendo doc com user_id='{doc_user_id}' (esperado='{user_id}')")
-                continue
-
-            # === CÁLCULO DE BOOSTS ===
-
-            # 1. BOOST TEMPORAL
-            temporal_boost = self.calculate_temporal_boost(
-                metadata.get('timestamp', ''),
-                mode="balanced"
-            )
-
-            # 2. BOOST EMOCIONAL
-            emotional_intensity = metadata.get('emotional_intensity', 0.0)
-            emotional_boost = 1.0
-            if emotional_intensity > 1.5:
-                emotional_boost = 1.3  # Priorizar momentos emocionalmente intensos
-            elif emotional_intensity > 2.5:
-                emotional_boost = 1.5  # Muito intenso
-
-            # 3. BOOST DE TÓPICO
-            memory_topics = set(metadata.get('topics', '').split(',')) if metadata.get('topics') else set()
-            # Remover strings vazias
-            memory_topics = {t.strip() for t in memory_topics if t.strip()}
-
-            topic_boost = 1.0
-            if query_topics & memory_topics:  # Interseção
-                overlap = len(query_topics & memory_topics)
-                topic_boost = 1.2 + (overlap * 0.1)  # +0.1 por tópico em comum
-
-            # 4. BOOST DE PESSOA MENCIONADA (mais forte)
-            memory_people = set(metadata.get('mentions_people', '').split(',')) if metadata.get('mentions_people') else set()
-            memory_people = {p.strip() for p in memory_people if p.strip()}
-
-            person_boost = 1.0
-            if query_names & memory_people:  # Interseção
-                person_boost = 1.5  # FORTE boost se mesma pessoa mencionada
-
-            # 5. BOOST DE PROFUNDIDADE EXISTENCIAL
-            depth = metadata.get('existential_depth', 0.0)
-            depth_boost = 1.0
-            if depth > 0.7:
-                depth_boost = 1.15  # Leve boost para conversas profundas
-
-            # 6. BOOST DE CONFLITO ARQUETÍPICO
-            conflict_boost = 1.0
-            if metadata.get('has_conflicts', False):
-                conflict_boost = 1.1  # Leve boost para momentos de conflito interno
-
-            # === SCORE FINAL COMBINADO ===
-            # Distância ChromaDB é invertida (menor = mais similar)
-            # Convertemos para similaridade: 1 - score
-            similarity = 1 - base_score
-
-            final_score = (
-                similarity *
-                temporal_boost *
-                emotional_boost *
-                topic_boost *
-                person_boost *
-                depth_boost *
-                conflict_boost
-            )
-
-            # Extrair conteúdo do documento
-            user_input_match = re.search(r"Input:\s*(.+?)(?:\n|Resposta:|$)", doc.page_content, re.DOTALL)
-            user_input_text = user_input_match.group(1).strip() if user_input_match else ""
-
-            response_match = re.search(r"Resposta:\s*(.+?)(?:\n|===|$)", doc.page_content, re.DOTALL)
-            response_text = response_match.group(1).strip() if response_match else ""
-
-            reranked.append({
-                'conversation_id': metadata.get('conversation_id'),
-                'user_input': user_input_text,
-                'ai_response': response_text,
-                'timestamp': metadata.get('timestamp', ''),
-                'base_score': base_score,
-                'similarity_score': similarity,
-                'final_score': final_score,
-                'boosts': {
-                    'temporal': round(temporal_boost, 2),
-                    'emotional': round(emotional_boost, 2),
-                    'topic': round(topic_boost, 2),
-                    'person': round(person_boost, 2),
-                    'depth': round(depth_boost, 2),
-                    'conflict': round(conflict_boost, 2),
-                },
-                'metadata': metadata,
-                'full_document': doc.page_content,
-                'keywords': metadata.get('keywords', '').split(','),
-                'tension_level': metadata.get('tension_level', 0.0),
-            })
+        from memory_reranker import rerank
 
-        # Ordenar por final_score (decrescente)
-        reranked.sort(key=lambda x: x['final_score'], reverse=True)
+        query_names = self._extract_names_from_text(query)
+        query_topics = self._detect_topics_in_text(query)
 
-        # Log dos top 3 com detalhes de boosts
-        logger.info(f"   ✅ Reranking concluído. Top 3:")
-        for i, mem in enumerate(reranked[:3], 1):
-            logger.info(f"   {i}. base={mem['base_score']:.3f}, similarity={mem['similarity_score']:.3f}, final={mem['final_score']:.3f}")
-            logger.info(f"      Boosts: {mem['boosts']}")
-            logger.info(f"      Input: {mem['user_input'][:60]}...")
+        reranked = rerank(results, user_id, query_names, query_topics,
+                          temporal_mode=temporal_mode, top_k=top_k)
 
+        logger.info(f"   ✅ Reranking de {len(results)} memórias (names={len(query_names)}, "
+                    f"topics={len(query_topics)}) → top {len(reranked)}")
         return reranked
 
     # ========================================
@@ -1993,15 +2169,32 @@ Resposta: {ai_response}
             # STAGE 1: BROAD RETRIEVAL
             # ============================================
             broad_k = max(k * 3, 9)  # Buscar pelo menos 3x mais, mínimo 9
-            logger.info(f"   STAGE 1: Broad retrieval (k={broad_k})")
+            temporal_mode = "balanced"
 
-            chroma_filter = {"user_id": user_id_str}
+            vectorstore = self.vector_store_for(user_id_str)
 
-            results = self.vectorstore.similarity_search_with_score(
-                enriched_query,
-                k=broad_k,
-                filter=chroma_filter
-            )
+            if Config.SEMANTIC_SEARCH_TIERED:
+                # Camadas por day_bucket (ver temporal_retrieval.py); intenção
+                # detectada na mensagem original, não na query enriquecida
+                from temporal_retrieval import detect_temporal_intent, build_tiers, tiered_search
+
+                intent = detect_temporal_intent(query)
+                tiers = build_tiers(user_id_str, k, broad_k, intent)
+                logger.info(f"   STAGE 1: Tiered retrieval ({len(tiers)} camadas"
+                            + (f", intenção '{intent.label}'" if intent else "") + ")")
+
+                results, temporal_mode, tier_info = tiered_search(
+                    lambda q, tier_k, where: vectorstore.similarity_search_with_score(q, k=tier_k, filter=where),
+                    enriched_query, tiers, k, Config.SEMANTIC_TIER_MIN_SIMILARITY
+                )
+                logger.info(f"   Camadas: {', '.join(tier_info.tiers_run)}")
+            else:
+                logger.info(f"   STAGE 1: Broad retrieval (k={broad_k})")
+                results = vectorstore.similarity_search_with_score(
+                    enriched_query,
+                    k=broad_k,
+                    filter={"user_id": user_id_str}
+                )
 
             logger.info(f"   Resultados retornados do ChromaDB: {len(results)}")
 
@@ -2016,7 +2209,9 @@ Resposta: {ai_response}
             reranked = self._rerank_memories(
                 results=results,
                 user_id=user_id_str,
-                query=query
+                query=query,
+                temporal_mode=temporal_mode,
+                top_k=max(k * 2, 10)  # Folga para a fusão RRF com o FTS
             )
 
             # Retornar top k após reranking
@@ -2026,31 +2221,12 @@ Resposta: {ai_response}
             for i, mem in enumerate(top_memories[:3], 1):
                 logger.info(f"   {i}. [final={mem['final_score']:.3f}] {mem['user_input'][:50]}...")
 
-            # STAGE 3: Merge com BM25 sobre arquivos de sessão
-            try:
-                from bm25_search import search as bm25_search
-                bm25_hits = bm25_search(user_id_str, query, k=max(3, k // 2))
-                if bm25_hits:
-                    existing_texts = {m['user_input'][:80] for m in top_memories}
-                    for hit in bm25_hits:
-                        # Evitar duplicatas já cobertas pelo vector search
-                        if hit['text'][:80] not in existing_texts:
-                            top_memories.append({
-                                'conversation_id': None,
-                                'user_input': hit['text'],
-                                'ai_response': '',
-                                'timestamp': hit['date'],
-                                'similarity_score': hit['bm25_score'] * 0.3,
-                                'final_score': hit['bm25_score'] * 0.3,
-                                'keywords': [],
-                                'metadata': {'type': 'bm25', 'date': hit['date']},
-                            })
-                    # Re-ordenar por final_score
-                    top_memories.sort(key=lambda m: m.get('final_score', 0), reverse=True)
-                    top_memories = top_memories[:k]
-                    logger.info(f"   BM25: {len(bm25_hits)} hits fundidos")
-            except Exception as bm25_err:
-                logger.debug(f"   BM25 indisponível: {bm25_err}")
+            # STAGE 3: Fusão RRF com a busca textual FTS5 (termos exatos, nomes)
+            if getattr(self, 'fts_enabled', False) and Config.SEMANTIC_FTS_RRF_WEIGHT > 0:
+                try:
+                    top_memories = self._fuse_keyword_hits(user_id_str, query, reranked, k)
+                except Exception as fts_err:
+                    logger.warning(f"   ⚠️ FTS5 indisponível nesta busca: {fts_err}")
 
             return top_memories
 
@@ -2060,8 +2236,77 @@ Resposta: {ai_response}
             logger.error(traceback.format_exc())
             return self._fallback_keyword_search(user_id, query, k or 5)
     
+    def _fuse_keyword_hits(self, user_id: str, query: str, reranked: List[Dict], k: int) -> List[Dict]:
+        """
+        Reciprocal Rank Fusion entre o ranking do ChromaDB (já rerankeado) e
+        o bm25 do FTS5; conversas achadas só pelo FTS entram como memórias
+
+        Returns:
+            top k ordenado por rrf_score (final_score do rerank preservado)
+        """
+        from conversation_fts import search_conversations, reciprocal_rank_fusion
+
+        with self._lock:
+            hits = search_conversations(self.conn, user_id, query, k=max(k * 2, 10))
+        if not hits:
+            return reranked[:k]
+
+        by_key = {}
+        vector_keys = []
+        for i, mem in enumerate(reranked):
+            # Consolidadas não têm conversation_id: chave própria
+            key = mem.get('conversation_id') or f"doc:{i}"
+            by_key.setdefault(key, mem)
+            vector_keys.append(key)
+
+        fts_keys = []
+        for hit in hits:
+            fts_keys.append(hit['id'])
+            by_key.setdefault(hit['id'], {
+                'conversation_id': hit['id'],
+                'user_input': hit['user_input'],
+                'ai_response': hit['ai_response'],
+                'timestamp': hit['timestamp'] or '',
+                'similarity_score': 0.5,  # Sem similaridade vetorial: score artificial
+                'final_score': 0.5,
+                'keywords': hit['keywords'].split(',') if hit['keywords'] else [],
+                'metadata': {'type': 'fts', 'bm25': hit['bm25']},
+            })
+
+        scores = reciprocal_rank_fusion(
+            [vector_keys, fts_keys], weights=[1.0, Config.SEMANTIC_FTS_RRF_WEIGHT]
+        )
+        fused = sorted(scores, key=scores.get, reverse=True)[:k]
+        for key in fused:
+            by_key[key]['rrf_score'] = round(scores[key], 5)
+
+        vector_set = set(vector_keys)
+        fts_only = sum(1 for key in fused if key not in vector_set)
+        logger.info(f"   FTS5: {len(hits)} hits, RRF → {len(fused)} memórias ({fts_only} só por palavra-chave)")
+        return [by_key[key] for key in fused]
+
     def _fallback_keyword_search(self, user_id: str, query: str, k: int = 5) -> List[Dict]:
         """Busca por keywords (fallback quando ChromaDB indisponível)"""
+        if getattr(self, 'fts_enabled', False):
+            try:
+                from conversation_fts import search_conversations
+                with self._lock:
+                    hits = search_conversations(self.conn, str(user_id), query, k=k)
+                return [
+                    {
+                        'conversation_id': hit['id'],
+                        'user_input': hit['user_input'],
+                        'ai_response': hit['ai_response'],
+                        'timestamp': hit['timestamp'],
+                        'similarity_score': 0.5,  # Score artificial
+                        'keywords': hit['keywords'].split(',') if hit['keywords'] else [],
+                        'metadata': {'type': 'fts', 'bm25': hit['bm25']},
+                    }
+                    for hit in hits
+                ]
+            except sqlite3.OperationalError as e:
+                logger.warning(f"⚠️ FTS5 falhou, usando LIKE: {e}")
+
         cursor = self.conn.cursor()
         
         search_term = f"%{query}%"
@@ -2227,6 +2472,8 @@ Resposta: {ai_response}
         """
         Comprime contexto se exceder limite de tokens (Fase 5)
 
+        Conta tokens de verdade (context_packer) e corta em fronteira de linha.
+
         Args:
             context: Contexto completo
             max_tokens: Limite máximo de tokens
@@ -2234,28 +2481,42 @@ Resposta: {ai_response}
         Returns:
             Contexto comprimido se necessário
         """
-        # Estimativa simples: 1 token ≈ 4 caracteres
-        estimated_tokens = len(context) / 4
-
-        if estimated_tokens <= max_tokens:
-            return context
-
-        # Se exceder, truncar proporcionalmente
-        target_chars = int(max_tokens * 4 * 0.9)  # 90% do limite
-        return context[:target_chars] + "\n\n[Contexto truncado devido ao limite]"
+        return fit_text(context, max_tokens)
 
     def build_rich_context(self, user_id: str, current_input: str,
                           k_memories: int = None,
-                          chat_history: List[Dict] = None) -> str:
+                          chat_history: List[Dict] = None,
+                          max_tokens: int = None) -> str:
         """
         Constrói contexto HIERÁRQUICO e ESTRATIFICADO (Fase 5)
 
-        Combina em layers:
+        Ver build_rich_context_segments; aqui as camadas são empacotadas em
+        max_tokens (None = Config.RICH_CONTEXT_TOKEN_BUDGET).
+        """
+        segments = self.build_rich_context_segments(
+            user_id, current_input, k_memories=k_memories, chat_history=chat_history
+        )
+        full_context = pack_context(segments, max_tokens or Config.RICH_CONTEXT_TOKEN_BUDGET)
+
+        logger.info(f"✅ [FASE 5] Contexto construído: {len(full_context)} caracteres")
+
+        return full_context
+
+    def build_rich_context_segments(self, user_id: str, current_input: str,
+                                    k_memories: int = None,
+                                    chat_history: List[Dict] = None) -> List[ContextSegment]:
+        """
+        Camadas do contexto hierárquico (Fase 5), sem empacotar
+
+        Combina em layers (em ordem de prioridade no orçamento de tokens):
         1. Histórico imediato (sempre incluir)
         2. Fatos relevantes ao input (busca inteligente)
         3. Memórias semânticas (reranked, agrupadas por recência + consolidadas)
         4. Padrões detectados (se relevantes)
 
+        Camadas que não cabem no orçamento são resumidas (menos itens) ou
+        descartadas, começando pela de menor prioridade (ContextPacker).
+
         Args:
             user_id: ID do usuário
             current_input: Input atual
@@ -2263,44 +2524,43 @@ Resposta: {ai_response}
             chat_history: Histórico da conversa atual
 
         Returns:
-            Contexto formatado e hierárquico
+            Lista de ContextSegment na ordem de exibição
         """
 
         logger.info(f"🏗️ [FASE 5] Construindo contexto hierárquico para user_id={user_id}")
 
-        user = self.get_user(user_id)
-        name = user['user_name'] if user else "Usuário"
-
-        context_parts = []
+        segments = []
 
         # ===== LAYER 1: HISTÓRICO IMEDIATO =====
-        context_parts.append("=== CONVERSA ATUAL ===\n")
-
         if chat_history and len(chat_history) > 0:
             recent = chat_history[-6:] if len(chat_history) > 6 else chat_history
 
+            lines = []
             for msg in recent:
                 role = "👤 Usuário" if msg["role"] == "user" else "🤖 Jung"
                 content = msg["content"][:150] + "..." if len(msg["content"]) > 150 else msg["content"]
-                context_parts.append(f"{role}: {content}")
+                lines.append(f"{role}: {content}")
 
-            context_parts.append("")
+            segments.append(ContextSegment(
+                name="conversation", priority=PRIORITY_CONVERSATION,
+                header="=== CONVERSA ATUAL ===\n", items=lines, keep_tail=True
+            ))
 
         # ===== LAYER 2: FATOS RELEVANTES =====
         relevant_facts = self._search_relevant_facts(user_id, current_input)
 
         if relevant_facts:
-            context_parts.append("=== FATOS RELEVANTES ===\n")
-            context_parts.append(self._format_facts_hierarchically(relevant_facts))
-            context_parts.append("")
-
+            facts = segment_from_text(
+                "facts", PRIORITY_FACTS,
+                self._format_facts_hierarchically(relevant_facts), header_lines=0
+            )
+            facts.header = "=== FATOS RELEVANTES ===\n"
+            segments.append(facts)
 
         # ===== LAYER 3: MEMÓRIAS SEMÂNTICAS =====
         memories = self.semantic_search(user_id, current_input, k=k_memories, chat_history=chat_history)
 
         if memories:
-            context_parts.append("=== MEMÓRIAS RELACIONADAS ===\n")
-
             # Separar por tipo e recência
             consolidated = [m for m in memories if m.get('metadata', {}).get('type') == 'consolidated']
             regular = [m for m in memories if m.get('metadata', {}).get('type') != 'consolidated']
@@ -2311,48 +2571,45 @@ Resposta: {ai_response}
 
             # Memórias consolidadas primeiro (se existirem)
             if consolidated:
-                context_parts.append("📦 Padrões de Longo Prazo (Consolidado):")
-                for mem in consolidated[:1]:  # Apenas 1 consolidada
-                    preview = mem.get('full_document', '')[:300]
-                    context_parts.append(f"{preview}...")
-                context_parts.append("")
+                segments.append(ContextSegment(
+                    name="consolidated", priority=PRIORITY_CONSOLIDATED, group="memories",
+                    header="📦 Padrões de Longo Prazo (Consolidado):",
+                    items=[f"{mem.get('full_document', '')[:300]}..." for mem in consolidated[:1]]  # Apenas 1 consolidada
+                ))
 
             # Memórias recentes
             if recent:
-                context_parts.append("🕐 Recente (últimos 30 dias):")
-                for i, mem in enumerate(recent[:3], 1):
-                    timestamp = mem.get('timestamp', '')[:10]
-                    user_input = mem.get('user_input', '')[:100]
-                    context_parts.append(f"{i}. [{timestamp}] {user_input}...")
-                context_parts.append("")
+                segments.append(ContextSegment(
+                    name="recent_memories", priority=PRIORITY_RECENT_MEMORIES, group="memories",
+                    header="🕐 Recente (últimos 30 dias):",
+                    items=[
+                        f"{i}. [{mem.get('timestamp', '')[:10]}] {mem.get('user_input', '')[:100]}..."
+                        for i, mem in enumerate(recent[:3], 1)
+                    ]
+                ))
 
             # Memórias antigas (se relevantes)
             if older:
-                context_parts.append("📚 Histórico:")
-                for i, mem in enumerate(older[:2], 1):
-                    timestamp = mem.get('timestamp', '')[:10]
-                    user_input = mem.get('user_input', '')[:100]
-                    context_parts.append(f"{i}. [{timestamp}] {user_input}...")
-                context_parts.append("")
+                segments.append(ContextSegment(
+                    name="older_memories", priority=PRIORITY_OLDER_MEMORIES, group="memories",
+                    header="📚 Histórico:",
+                    items=[
+                        f"{i}. [{mem.get('timestamp', '')[:10]}] {mem.get('user_input', '')[:100]}..."
+                        for i, mem in enumerate(older[:2], 1)
+                    ]
+                ))
 
         # ===== LAYER 4: PADRÕES DETECTADOS =====
         patterns = self._get_relevant_patterns(user_id, current_input)
 
         if patterns:
-            context_parts.append("=== PADRÕES OBSERVADOS ===\n")
-            for pattern in patterns[:2]:
-                context_parts.append(f"- {pattern['pattern_name']}: {pattern['pattern_description']}")
-            context_parts.append("")
-
-        # Juntar tudo
-        full_context = "\n".join(context_parts)
-
-        # Comprimir se necessário
-        full_context = self._compress_context_if_needed(full_context, max_tokens=2000)
-
-        logger.info(f"✅ [FASE 5] Contexto construído: {len(full_context)} caracteres")
+            segments.append(ContextSegment(
+                name="patterns", priority=PRIORITY_PATTERNS,
+                header="=== PADRÕES OBSERVADOS ===\n",
+                items=[f"- {p['pattern_name']}: {p['pattern_description']}" for p in patterns[:2]]
+            ))
 
-        return full_context
+        return segments
     
     # ========================================
     # EXTRAÇÃO DE FATOS
@@ -2686,7 +2943,7 @@ Resposta: {ai_response}
 
         try:
             # Buscar memórias que mencionam o valor antigo
-            results = self.vectorstore.similarity_search_with_score(
+            results = self.vector_store_for(user_id).similarity_search_with_score(
                 old_value,
                 k=20,
                 filter={"user_id": str(user_id)}
@@ -2728,10 +2985,11 @@ Resposta: {ai_response}
         O ChromaDB não suporta update nativo de metadados.
         """
         try:
-            self.vectorstore.delete([doc_id])
+            vectorstore = self.vector_store_for(new_metadata["user_id"])
+            vectorstore.delete([doc_id])
             from langchain.schema import Document
             doc = Document(page_content=content, metadata=new_metadata)
-            self.vectorstore.add_documents([doc], ids=[doc_id])
+            vectorstore.add_documents([doc], ids=[doc_id])
         except Exception as e:
             logger.warning(f"   ⚠️ Erro ao atualizar documento ChromaDB {doc_id}: {e}")
 
@@ -3858,15 +4116,17 @@ class JungianEngine:
             )
         else:
             import anthropic
-            self.anthropic_client = anthropic.Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+            self.anthropic_client = wrap_messages_client(
+                anthropic.Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+            )
 
         # Cliente OpenRouter/Mistral (conversação com o usuário)
         if Config.OPENROUTER_API_KEY:
-            self.openrouter_client = OpenAI(
+            self.openrouter_client = wrap_chat_client(OpenAI(
                 base_url="https://openrouter.ai/api/v1",
                 api_key=Config.OPENROUTER_API_KEY,
                 timeout=60.0
-            )
+            ))
             logger.info(f"✅ OpenRouter client inicializado (modelo: {Config.CONVERSATION_MODEL})")
         else:
             self.openrouter_client = None
@@ -3885,7 +4145,8 @@ class JungianEngine:
     
     def process_message(self, user_id: str, message: str,
                        model: str = None,
-                       chat_history: List[Dict] = None) -> Dict:
+                       chat_history: List[Dict] = None,
+                       history_text: str = None) -> Dict:
         """
         PROCESSAMENTO SIMPLIFICADO (v7.0):
         1. Busca semântica (ChromaDB)
@@ -3897,6 +4158,8 @@ class JungianEngine:
             message: Mensagem do usuário
             model: Ignorado (modelo definido por CONVERSATION_MODEL em Config)
             chat_history: Histórico da conversa atual (opcional)
+            history_text: Histórico já formatado para o prompt (opcional,
+                ver get_recent_history_text); se None, é formatado de chat_history
 
         Returns:
             Dict com response, conversation_count, métricas
@@ -3913,10 +4176,13 @@ class JungianEngine:
 
         # Construir contexto semântico (mem0 prioritário, fallback SQLite)
         logger.info("🔍 Construindo contexto semântico...")
+        # Camadas empacotadas por prioridade em RESPONSE_CONTEXT_TOKEN_BUDGET (context_packer)
         if self.db.mem0:
-            semantic_context = self.db.mem0.get_context(user_id, message, limit=10)
+            context_segments = [segment_from_text(
+                "mem0", PRIORITY_FACTS, self.db.mem0.get_context(user_id, message, limit=10)
+            )]
         else:
-            semantic_context = self.db.build_rich_context(
+            context_segments = self.db.build_rich_context_segments(
                 user_id, message, k_memories=5, chat_history=chat_history
             )
 
@@ -3934,12 +4200,15 @@ class JungianEngine:
                 """, (user_id,))
                 _ri_rows = _ri_cursor.fetchall()
                 if _ri_rows:
-                    _ri_lines = ["\n[INFLUÊNCIA DE SEUS ÚLTIMOS INSIGHTS DE RUMINAÇÃO:]"]
+                    _ri_lines = []
                     for _ri_row in _ri_rows:
                         _ri_text = (_ri_row[0] or _ri_row[1] or "").strip()
                         if _ri_text:
-                            _ri_lines.append(f"- {_ri_text[:400]}")
-                    semantic_context = semantic_context + "\n".join(_ri_lines)
+                            _ri_lines.append(f"- {_ri_text}")
+                    context_segments.append(ContextSegment(
+                        name="rumination", priority=PRIORITY_RUMINATION,
+                        header="[INFLUÊNCIA DE SEUS ÚLTIMOS INSIGHTS DE RUMINAÇÃO:]", items=_ri_lines
+                    ))
                     logger.info(f"✅ [RUMINATION] {_ri_cursor.rowcount} insights (os mais recentes) injetados no contexto do admin")
 
                 # B. Injetar Conhecimento Extrovertido (Pesquisa Autônoma)
@@ -3952,25 +4221,30 @@ class JungianEngine:
                 """, (user_id,))
                 _er_rows = _ri_cursor.fetchall()
                 if _er_rows:
-                    _er_lines = ["\n[SÍNTESES ACADÊMICAS RECENTES QUE VOCÊ ESTUDOU AUTONOMAMENTE:]"]
+                    _er_items = []
                     for _er_row in _er_rows:
                         _er_text = (_er_row[1] or "").strip()
                         if _er_text:
-                            _er_lines.append(f"Tópico Estudado: {_er_row[0]}")
-                            _er_lines.append(f"- {_er_text[:600]}")
-                    semantic_context = semantic_context + "\n".join(_er_lines)
+                            _er_items.append(f"Tópico Estudado: {_er_row[0]}\n- {_er_text}")
+                    context_segments.append(ContextSegment(
+                        name="research", priority=PRIORITY_RESEARCH,
+                        header="[SÍNTESES ACADÊMICAS RECENTES QUE VOCÊ ESTUDOU AUTONOMAMENTE:]", items=_er_items
+                    ))
                     logger.info(f"📚 [SCHOLAR] {_ri_cursor.rowcount} temas de pesquisa (Caminho Extrovertido) injetados.")
 
         except Exception as _ri_e:
             logger.debug(f"[RUMINATION/SCHOLAR] Falha em injeções inconscientes: {_ri_e}")
 
+        semantic_context = pack_context(context_segments, Config.RESPONSE_CONTEXT_TOKEN_BUDGET)
+
         # Determinar complexidade
         complexity = self._determine_complexity(message)
 
         # Gerar resposta direta (1 chamada LLM)
         logger.info("🤖 Gerando resposta...")
         response = self._generate_response(
-            user_id, message, semantic_context, chat_history
+            user_id, message, semantic_context, chat_history,
+            history_text=history_text
         )
 
         # Calcular métricas
@@ -4019,7 +4293,8 @@ class JungianEngine:
     # ========================================
 
     def _generate_response(self, user_id: str, user_input: str,
-                          semantic_context: str, chat_history: List[Dict]) -> str:
+                          semantic_context: str, chat_history: List[Dict],
+                          history_text: str = None) -> str:
         """
         Gera resposta usando prompt unificado (v7.0)
 
@@ -4049,12 +4324,13 @@ class JungianEngine:
             except Exception as e:
                 logger.warning(f"⚠️ Erro no pre-compaction flush: {e}")
 
-        # Formatar histórico
-        history_text = ""
-        if chat_history:
-            for msg in chat_history[-10:]:
-                role = "Usuário" if msg["role"] == "user" else "Jung"
-                history_text += f"{role}: {msg['content'][:400]}\n"
+        # Formatar histórico (a menos que já venha renderizado do ring buffer;
+        # o flush acima mantém KEEP_RECENT >= 10 mensagens, então a janela é a mesma)
+        if history_text is None:
+            history_text = ""
+            if chat_history:
+                for msg in chat_history[-10:]:
+                    history_text += render_history_line(msg["role"], msg["content"])
 
         # Identificar se é o Admin (Criador) ou Usuário Padrão
         try:
@@ -4102,8 +4378,9 @@ class JungianEngine:
         # Construir prompt
         prompt = Config.RESPONSE_PROMPT.format(
             agent_identity=agent_identity_text + dream_instruction,
-            semantic_context=semantic_context[:5000],
-            chat_history=history_text,
+            # semantic_context já vem empacotado no orçamento (process_message)
+            semantic_context=semantic_context,
+            chat_history=fit_history(history_text, Config.HISTORY_TOKEN_BUDGET),
             user_input=user_input
         )
 
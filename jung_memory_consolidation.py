@@ -2,79 +2,530 @@
 jung_memory_consolidation.py - Sistema de Consolidação de Memórias
 
 Responsável por:
-- Agrupar memórias similares por período
+- Agrupar memórias similares pelos embeddings MiniLM já gravados no ChromaDB
 - Gerar resumos temáticos com LLM
 - Criar documentos "consolidated" no ChromaDB
+
+Consolidação incremental: cada usuário tem uma marca d'água (maior
+conversations.id já agrupado) e clusters persistidos (centroide, tamanho,
+membros). A cada execução só as conversas novas são lidas; cada uma entra
+no cluster de centroide mais próximo (cosseno ≥ ASSIGN_SIMILARITY) e as
+que sobram formam clusters novos por k-means esférico em NumPy, seguido
+de um passo aglomerativo que une centroides muito próximos. Só
+clusters com membros novos (e ≥ MIN_CLUSTER_SIZE) são resumidos de novo,
+partindo do resumo anterior + conversas novas, e o documento é
+sobrescrito no ChromaDB pelo id estável do cluster. O custo noturno
+acompanha a atividade nova, não o tamanho do histórico. A marca d'água
+não passa da primeira conversa ainda sem embedding.
 """
 
+import uuid
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict
-import json
+from typing import List, Dict, Optional, Tuple
+
+# NumPy (agrupamento vetorizado)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
 
+# ============================================================
+# K-MEANS ESFÉRICO (vetores normalizados, similaridade cosseno)
+# ============================================================
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _older_than(timestamp, cutoff: datetime) -> bool:
+    """Timestamp (ISO do SQLite) anterior a cutoff; ilegível conta como antigo"""
+    try:
+        return datetime.fromisoformat(str(timestamp)) < cutoff
+    except (TypeError, ValueError):
+        return True
+
+
+def choose_k(n: int, max_k: int) -> int:
+    """Número de clusters para n memórias novas (regra sqrt(n/2))"""
+    return max(1, min(max_k, n, int(round((n / 2) ** 0.5))))
+
+
+def kmeans_cosine(vectors, k: int, iterations: int = 25, seed: int = 42):
+    """
+    K-means esférico com inicialização k-means++
+
+    Args:
+        vectors: matriz (n, d) já normalizada
+        k: número de clusters
+
+    Returns:
+        (labels (n,), centroides normalizados (k, d))
+    """
+    n = vectors.shape[0]
+    rng = np.random.default_rng(seed)
+    k = min(k, n)
+
+    # k-means++ sobre distância cosseno (1 - sim)
+    centroids = [vectors[rng.integers(n)]]
+    closest = 1.0 - vectors @ centroids[0]
+    for _ in range(1, k):
+        weights = np.clip(closest, 0.0, None) ** 2
+        total = weights.sum()
+        index = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids.append(vectors[index])
+        closest = np.minimum(closest, 1.0 - vectors @ vectors[index])
+    centroids = np.vstack(centroids)
+
+    labels = np.zeros(n, dtype=np.int64)
+    for iteration in range(iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        empty = ~np.bincount(labels, minlength=k).astype(bool)
+        sums[empty] = centroids[empty]  # cluster vazio mantém o centroide
+        centroids = _normalize(sums)
+
+    return labels, centroids
+
+
+def merge_close_clusters(vectors, labels, centroids, threshold: float):
+    """
+    Passo aglomerativo sobre o k-means: une os pares de centroides com
+    cosseno ≥ threshold (o k de sqrt(n/2) tende a partir temas grandes)
+
+    Returns:
+        (labels renumerados 0..k'-1, centroides normalizados (k', d))
+    """
+    labels = labels.copy()
+    active = list(range(centroids.shape[0]))
+    centroids = centroids.copy()
+    while len(active) > 1:
+        sims = centroids[active] @ centroids[active].T
+        np.fill_diagonal(sims, -1.0)
+        i, j = np.unravel_index(np.argmax(sims), sims.shape)
+        if sims[i, j] < threshold:
+            break
+        keep, drop = active[i], active[j]
+        labels[labels == drop] = keep
+        centroids[keep] = _normalize(vectors[labels == keep].sum(axis=0)[None, :])[0]
+        active.remove(drop)
+
+    remap = np.full(centroids.shape[0], -1, dtype=np.int64)
+    remap[active] = np.arange(len(active))
+    return remap[labels], centroids[active]
+
+
 class MemoryConsolidator:
     """
-    Consolida memórias similares em resumos temáticos
+    Consolida memórias similares em resumos temáticos (incremental)
     """
 
+    MIN_CLUSTER_SIZE = 5          # clusters menores não são resumidos
+    ASSIGN_SIMILARITY = 0.55      # cosseno mínimo para entrar num cluster existente
+    MERGE_SIMILARITY = 0.80       # centroides novos mais próximos que isso são unidos
+    MAX_NEW_CLUSTERS = 24         # teto de k por execução
+    SUMMARY_SAMPLE = 10           # conversas novas enviadas ao LLM por cluster
+    EMBEDDING_BATCH = 256         # ids por chamada a _collection.get
+    EMBEDDING_GRACE_HOURS = 24    # conversa sem embedding segura a marca d'água só até essa idade
+
     def __init__(self, db_manager):
         """
         Args:
             db_manager: HybridDatabaseManager instance
         """
         self.db = db_manager
+        self._ensure_schema()
+
+    # ------------------------------------------------------------------
+    # Estado persistido
+    # ------------------------------------------------------------------
+
+    def _ensure_schema(self):
+        with self.db._lock:
+            self.db.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS memory_clusters (
+                    cluster_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    centroid BLOB NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    topic TEXT,
+                    sum_tension REAL NOT NULL DEFAULT 0,
+                    sum_affective REAL NOT NULL DEFAULT 0,
+                    sum_depth REAL NOT NULL DEFAULT 0,
+                    period_start TEXT,
+                    period_end TEXT,
+                    last_member_id INTEGER NOT NULL DEFAULT 0,
+                    summarized_member_id INTEGER NOT NULL DEFAULT 0,
+                    summary TEXT,
+                    summarized_at TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS idx_memory_clusters_user ON memory_clusters(user_id);
+
+                CREATE TABLE IF NOT EXISTS memory_cluster_members (
+                    conversation_id INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    cluster_id TEXT NOT NULL,
+                    similarity REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_memory_cluster_members_cluster
+                    ON memory_cluster_members(cluster_id, conversation_id);
+
+                CREATE TABLE IF NOT EXISTS memory_consolidation_state (
+                    user_id TEXT PRIMARY KEY,
+                    watermark INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            self.db.conn.commit()
+
+    def _get_watermark(self, user_id: str) -> int:
+        row = self.db.conn.execute(
+            "SELECT watermark FROM memory_consolidation_state WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def forget_user(self, user_id: str) -> None:
+        """
+        Apaga clusters, membros, marca d'água e documentos consolidados do usuário (/reset)
+
+        Sem isso a próxima consolidação partiria do resumo anterior ao reset
+        e o gravaria de volta no ChromaDB.
+        """
+        with self.db._lock:
+            for table in ("memory_cluster_members", "memory_clusters", "memory_consolidation_state"):
+                self.db.conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            self.db.conn.commit()
+
+        if self.db.chroma_enabled:
+            try:
+                self.db.vector_store_for(user_id)._collection.delete(
+                    where={
+                        "$and": [
+                            {"user_id": {"$eq": user_id}},
+                            {"type": {"$eq": "consolidated"}}
+                        ]
+                    }
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao remover memórias consolidadas de {user_id}: {e}")
+        logger.info(f"🗑️ Estado de consolidação de {user_id} apagado")
+
+    def _load_clusters(self, user_id: str) -> List[Dict]:
+        rows = self.db.conn.execute("""
+            SELECT cluster_id, centroid, size, topic, sum_tension, sum_affective, sum_depth,
+                   period_start, period_end, last_member_id, summarized_member_id, summary
+            FROM memory_clusters
+            WHERE user_id = ?
+            ORDER BY created_at, cluster_id
+        """, (user_id,)).fetchall()
+        clusters = []
+        for row in rows:
+            cluster = dict(row)
+            cluster["centroid"] = np.frombuffer(cluster["centroid"], dtype=np.float32).copy()
+            cluster["new_members"] = []
+            clusters.append(cluster)
+        return clusters
+
+    # ------------------------------------------------------------------
+    # Consolidação
+    # ------------------------------------------------------------------
 
-    def consolidate_user_memories(self, user_id: str, lookback_days: int = 90):
+    def consolidate_user_memories(self, user_id: str, lookback_days: int = 90) -> Dict:
         """
-        Consolida memórias de um usuário nos últimos N dias
+        Consolida as memórias novas de um usuário (desde a marca d'água)
 
         Args:
             user_id: ID do usuário
-            lookback_days: Período de lookback (default: 90 dias)
+            lookback_days: conversas mais antigas que isso não entram em clusters
+
+        Returns:
+            Estatísticas: new_memories, assigned, new_clusters, summarized, llm_calls
         """
+        stats = {"new_memories": 0, "assigned": 0, "new_clusters": 0, "summarized": 0, "llm_calls": 0}
         logger.info(f"📦 Iniciando consolidação de memórias para user_id={user_id} (lookback={lookback_days} dias)")
 
-        # 1. Buscar todas as memórias do período
+        if not NUMPY_AVAILABLE or not self.db.chroma_ready():
+            logger.info("   ChromaDB/NumPy indisponível, consolidação por embeddings ignorada")
+        else:
+            self._consolidate_clusters(user_id, lookback_days, stats)
+
+        # Reconstruir profile.md com dados atualizados
+        self._rebuild_profile(user_id)
+        return stats
+
+    def _consolidate_clusters(self, user_id: str, lookback_days: int, stats: Dict) -> None:
+        watermark = self._get_watermark(user_id)
         start_date = datetime.now() - timedelta(days=lookback_days)
 
         cursor = self.db.conn.cursor()
         cursor.execute("""
-            SELECT id, user_input, ai_response, timestamp, keywords,
+            SELECT id, user_input, ai_response, timestamp, keywords, chroma_id,
                    tension_level, affective_charge, existential_depth
             FROM conversations
             WHERE user_id = ?
+            AND id > ?
             AND timestamp >= ?
-            ORDER BY timestamp ASC
-        """, (user_id, start_date.isoformat()))
-
+            ORDER BY id ASC
+        """, (user_id, watermark, start_date.isoformat()))
         memories = [dict(row) for row in cursor.fetchall()]
+        top_id = cursor.execute(
+            "SELECT MAX(id) FROM conversations WHERE user_id = ?", (user_id,)
+        ).fetchone()[0] or watermark
+
+        clusters = self._load_clusters(user_id)
+        if not memories:
+            logger.info("   Nenhuma memória nova desde a última consolidação")
+        else:
+            if watermark == 0 and not clusters:
+                self._delete_legacy_documents(user_id)
+
+            memories, vectors, held_from_id = self._load_embeddings(user_id, memories)
+            if held_from_id is not None:
+                top_id = held_from_id - 1
+            stats["new_memories"] = len(memories)
+            logger.info(f"   {len(memories)} memórias novas (marca d'água={watermark})")
+
+            if memories:
+                new_clusters = self._assign(memories, vectors, clusters, stats)
+                clusters.extend(new_clusters)
+                stats["new_clusters"] = len(new_clusters)
+
+        self._persist(user_id, clusters, top_id)
+
+        dirty = [
+            c for c in clusters
+            if c["size"] >= self.MIN_CLUSTER_SIZE and c["last_member_id"] > c["summarized_member_id"]
+        ]
+        logger.info(
+            f"   {len(clusters)} clusters ({stats['new_clusters']} novos), "
+            f"{len(dirty)} com membros novos para resumir"
+        )
+        for cluster in dirty:
+            try:
+                self._resummarize_cluster(user_id, cluster)
+                stats["summarized"] += 1
+                stats["llm_calls"] += 1
+            except Exception as e:
+                logger.error(f"❌ Erro ao resumir cluster {cluster['cluster_id']}: {e}")
+
+    def _load_embeddings(self, user_id: str, memories: List[Dict]) -> Tuple[List[Dict], object, Optional[int]]:
+        """
+        Embeddings MiniLM das conversas (ChromaDB); as ainda não indexadas
+        são embutidas com o mesmo modelo
 
-        if len(memories) < 5:
-            logger.info(f"   Menos de 5 memórias encontradas ({len(memories)}), consolidação não necessária")
-            return
-
-        logger.info(f"   Encontradas {len(memories)} memórias para consolidar")
-
-        # 2. Agrupar por tópico usando keywords
-        clusters = self._cluster_by_topic(memories)
-
-        logger.info(f"   Identificados {len(clusters)} clusters temáticos")
+        Só o prefixo (em ordem de id) com embedding é consolidado: a marca
+        d'água para antes da primeira conversa recente sem embedding, que
+        entra na próxima rodada. Conversas sem embedding mais velhas que
+        EMBEDDING_GRACE_HOURS são puladas (e logadas) para não travar a
+        marca d'água para sempre.
 
-        # 3. Para cada cluster grande (≥5 memórias), gerar resumo
-        for topic, cluster_memories in clusters.items():
-            if len(cluster_memories) >= 5:
-                logger.info(f"   Consolidando cluster '{topic}' ({len(cluster_memories)} memórias)")
-                self._create_consolidated_memory(
-                    user_id=user_id,
-                    topic=topic,
-                    memories=cluster_memories,
-                    lookback_days=lookback_days
+        Returns:
+            (memórias com embedding, matriz normalizada alinhada,
+             id da primeira conversa sem embedding ou None)
+        """
+        collection = self.db.vector_store_for(user_id)._collection
+        by_id: Dict[str, List[float]] = {}
+        chroma_ids = [m.get("chroma_id") or f"conv_{m['id']}" for m in memories]
+        for i in range(0, len(chroma_ids), self.EMBEDDING_BATCH):
+            result = collection.get(ids=chroma_ids[i:i + self.EMBEDDING_BATCH], include=["embeddings"])
+            for doc_id, embedding in zip(result.get("ids", []), result.get("embeddings", [])):
+                if embedding is not None:
+                    by_id[doc_id] = embedding
+
+        missing = [i for i, cid in enumerate(chroma_ids) if cid not in by_id]
+        if missing and getattr(self.db, "embeddings", None) is not None:
+            texts = [
+                f"Input: {memories[i]['user_input']}\nResposta: {memories[i]['ai_response']}"
+                for i in missing
+            ]
+            for i, embedding in zip(missing, self.db.embeddings.embed_documents(texts)):
+                by_id[chroma_ids[i]] = embedding
+            logger.info(f"   {len(missing)} conversas sem embedding no ChromaDB embutidas agora")
+
+        grace_cutoff = datetime.now() - timedelta(hours=self.EMBEDDING_GRACE_HOURS)
+        held_from_id = None
+        kept = []
+        skipped = []
+        for position, (m, cid) in enumerate(zip(memories, chroma_ids)):
+            if cid in by_id:
+                kept.append((m, by_id[cid]))
+                continue
+            if not _older_than(m.get("timestamp"), grace_cutoff):
+                held_from_id = m["id"]
+                logger.warning(
+                    f"⚠️ {len(memories) - position} conversas a partir do id {held_from_id} sem embedding; "
+                    f"ficam para a próxima consolidação"
                 )
+                break
+            skipped.append(m["id"])
+        if skipped:
+            logger.warning(
+                f"⚠️ {len(skipped)} conversas sem embedding há mais de {self.EMBEDDING_GRACE_HOURS}h "
+                f"puladas na consolidação de {user_id}: ids {skipped[:20]}"
+            )
+        if not kept:
+            return [], None, held_from_id
+        vectors = _normalize(np.asarray([e for _, e in kept], dtype=np.float32))
+        return [m for m, _ in kept], vectors, held_from_id
 
-        # 4. Reconstruir profile.md com dados atualizados
+    def _assign(self, memories: List[Dict], vectors, clusters: List[Dict], stats: Dict) -> List[Dict]:
+        """
+        Coloca cada memória nova no cluster mais próximo ou em clusters novos
+
+        Returns:
+            Clusters criados nesta execução
+        """
+        unassigned = np.ones(len(memories), dtype=bool)
+
+        if clusters:
+            centroids = np.vstack([c["centroid"] for c in clusters])
+            sims = vectors @ centroids.T
+            best = np.argmax(sims, axis=1)
+            best_sim = sims[np.arange(len(memories)), best]
+            accepted = best_sim >= self.ASSIGN_SIMILARITY
+            unassigned = ~accepted
+            for index in np.flatnonzero(accepted):
+                clusters[best[index]]["new_members"].append((memories[index], vectors[index], float(best_sim[index])))
+            stats["assigned"] = int(accepted.sum())
+
+        created = []
+        rest = np.flatnonzero(unassigned)
+        if len(rest):
+            k = choose_k(len(rest), self.MAX_NEW_CLUSTERS)
+            labels, centroids = kmeans_cosine(vectors[rest], k)
+            labels, centroids = merge_close_clusters(vectors[rest], labels, centroids, self.MERGE_SIMILARITY)
+            for label in range(centroids.shape[0]):
+                member_idx = rest[labels == label]
+                if not len(member_idx):
+                    continue
+                cluster = {
+                    "cluster_id": uuid.uuid4().hex[:16],
+                    "centroid": centroids[label].astype(np.float32),
+                    "size": 0, "topic": None,
+                    "sum_tension": 0.0, "sum_affective": 0.0, "sum_depth": 0.0,
+                    "period_start": None, "period_end": None,
+                    "last_member_id": 0, "summarized_member_id": 0, "summary": None,
+                    "new_members": [],
+                    "is_new": True,
+                }
+                sims = vectors[member_idx] @ centroids[label]
+                cluster["new_members"] = [
+                    (memories[i], vectors[i], float(sim)) for i, sim in zip(member_idx, sims)
+                ]
+                created.append(cluster)
+
+        for cluster in clusters + created:
+            self._absorb_new_members(cluster)
+        return created
+
+    def _absorb_new_members(self, cluster: Dict) -> None:
+        """Atualiza centroide (média corrente), somas e período com os membros novos"""
+        members = cluster["new_members"]
+        if not members:
+            return
+        size = cluster["size"]
+        total = cluster["centroid"] * size + np.sum([v for _, v, _ in members], axis=0)
+        cluster["centroid"] = _normalize(total[None, :])[0].astype(np.float32)
+        cluster["size"] = size + len(members)
+
+        for memory, _, _ in members:
+            cluster["sum_tension"] += memory.get("tension_level") or 0.0
+            cluster["sum_affective"] += memory.get("affective_charge") or 0.0
+            cluster["sum_depth"] += memory.get("existential_depth") or 0.0
+        days = [m["timestamp"][:10] for m, _, _ in members]
+        cluster["period_start"] = min([d for d in days + [cluster["period_start"]] if d])
+        cluster["period_end"] = max([d for d in days + [cluster["period_end"]] if d])
+        cluster["last_member_id"] = max(cluster["last_member_id"], max(m["id"] for m, _, _ in members))
+
+        if not cluster.get("topic") or cluster["topic"] == "geral":
+            by_topic = self._cluster_by_topic([m for m, _, _ in members])
+            counts = {topic: len(items) for topic, items in by_topic.items()}
+            cluster["topic"] = max(counts, key=counts.get) if counts else "geral"
+
+    def _persist(self, user_id: str, clusters: List[Dict], watermark: int) -> None:
+        """Membros, clusters e marca d'água numa única transação"""
+        with self.db._lock:
+            conn = self.db.conn
+            for cluster in clusters:
+                if not cluster["new_members"]:
+                    continue
+                conn.execute("""
+                    INSERT INTO memory_clusters
+                    (cluster_id, user_id, centroid, size, topic, sum_tension, sum_affective, sum_depth,
+                     period_start, period_end, last_member_id, summarized_member_id, summary)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(cluster_id) DO UPDATE SET
+                        centroid = excluded.centroid, size = excluded.size, topic = excluded.topic,
+                        sum_tension = excluded.sum_tension, sum_affective = excluded.sum_affective,
+                        sum_depth = excluded.sum_depth, period_start = excluded.period_start,
+                        period_end = excluded.period_end, last_member_id = excluded.last_member_id
+                """, (
+                    cluster["cluster_id"], user_id, cluster["centroid"].tobytes(), cluster["size"],
+                    cluster["topic"], cluster["sum_tension"], cluster["sum_affective"], cluster["sum_depth"],
+                    cluster["period_start"], cluster["period_end"], cluster["last_member_id"],
+                    cluster["summarized_member_id"], cluster["summary"],
+                ))
+                conn.executemany("""
+                    INSERT OR REPLACE INTO memory_cluster_members
+                    (conversation_id, user_id, cluster_id, similarity)
+                    VALUES (?, ?, ?, ?)
+                """, [
+                    (memory["id"], user_id, cluster["cluster_id"], round(similarity, 4))
+                    for memory, _, similarity in cluster["new_members"]
+                ])
+            conn.execute("""
+                INSERT INTO memory_consolidation_state (user_id, watermark, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    watermark = excluded.watermark, updated_at = excluded.updated_at
+            """, (user_id, watermark))
+            conn.commit()
+
+    def _resummarize_cluster(self, user_id: str, cluster: Dict) -> None:
+        """Resumo = resumo anterior + conversas novas do cluster; upsert no ChromaDB"""
+        rows = self.db.conn.execute("""
+            SELECT c.id, c.user_input, c.ai_response, c.timestamp
+            FROM memory_cluster_members m
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE m.cluster_id = ? AND m.conversation_id > ?
+            ORDER BY m.conversation_id DESC
+            LIMIT ?
+        """, (cluster["cluster_id"], cluster["summarized_member_id"], self.SUMMARY_SAMPLE)).fetchall()
+        recent = [dict(row) for row in reversed(rows)]
+
+        logger.info(
+            f"   Consolidando cluster '{cluster['topic']}' ({cluster['size']} memórias, "
+            f"{'incremental' if cluster['summary'] else 'inicial'})"
+        )
+        summary = self._generate_summary_with_llm(
+            cluster["topic"] or "geral", recent,
+            previous_summary=cluster["summary"], total=cluster["size"]
+        )
+        self._upsert_consolidated_document(user_id, cluster, summary)
+
+        with self.db._lock:
+            self.db.conn.execute("""
+                UPDATE memory_clusters
+                SET summary = ?, summarized_member_id = ?, summarized_at = CURRENT_TIMESTAMP
+                WHERE cluster_id = ?
+            """, (summary, cluster["last_member_id"], cluster["cluster_id"]))
+            self.db.conn.commit()
+        cluster["summary"] = summary
+        cluster["summarized_member_id"] = cluster["last_member_id"]
+
+    def _rebuild_profile(self, user_id: str) -> None:
         try:
             from user_profile_writer import rebuild_profile_md
             facts = self.db._get_current_facts(user_id)
@@ -149,38 +600,27 @@ class MemoryConsolidator:
 
         return "geral"
 
-    def _create_consolidated_memory(self, user_id: str, topic: str,
-                                    memories: List[Dict], lookback_days: int):
+    def _upsert_consolidated_document(self, user_id: str, cluster: Dict, summary: str) -> None:
         """
-        Cria memória consolidada e salva no ChromaDB
+        Grava o documento consolidado do cluster no ChromaDB (id estável por cluster)
 
         Args:
             user_id: ID do usuário
-            topic: Tópico do cluster
-            memories: Memórias do cluster
-            lookback_days: Período de lookback
+            cluster: cluster com métricas acumuladas
+            summary: resumo gerado
         """
-        # Gerar resumo com LLM
-        summary = self._generate_summary_with_llm(topic, memories)
-
-        # IDs das conversas originais
-        source_ids = [mem['id'] for mem in memories]
-
-        # Calcular métricas agregadas
-        avg_tension = sum(m.get('tension_level', 0) for m in memories) / len(memories)
-        avg_affective = sum(m.get('affective_charge', 0) for m in memories) / len(memories)
-        avg_depth = sum(m.get('existential_depth', 0) for m in memories) / len(memories)
-
-        # Período da consolidação
-        timestamps = [datetime.fromisoformat(m['timestamp']) for m in memories]
-        period_start = min(timestamps).strftime("%Y-%m-%d")
-        period_end = max(timestamps).strftime("%Y-%m-%d")
+        size = max(cluster["size"], 1)
+        avg_tension = cluster["sum_tension"] / size
+        avg_affective = cluster["sum_affective"] / size
+        avg_depth = cluster["sum_depth"] / size
+        topic = cluster["topic"] or "geral"
+        period_start, period_end = cluster["period_start"], cluster["period_end"]
 
         # Construir documento consolidado
         doc_content = f"""
 === MEMÓRIA CONSOLIDADA ===
 TÓPICO: {topic.upper()}
-PERÍODO: {period_start} a {period_end} ({len(memories)} conversas)
+PERÍODO: {period_start} a {period_end} ({cluster["size"]} conversas)
 
 {summary}
 
@@ -193,13 +633,14 @@ MÉTRICAS DO PERÍODO:
         # Metadata
         metadata = {
             "user_id": user_id,
-            "user_name": "",  # Will be populated from first memory
+            "user_name": "",
             "type": "consolidated",
+            "cluster_id": cluster["cluster_id"],
             "topic": topic,
             "period_start": period_start,
             "period_end": period_end,
-            "count": len(memories),
-            "source_ids": json.dumps(source_ids),
+            "count": cluster["size"],
+            "last_member_id": cluster["last_member_id"],
             "avg_tension": round(avg_tension, 2),
             "avg_affective": round(avg_affective, 2),
             "avg_depth": round(avg_depth, 2),
@@ -211,52 +652,89 @@ MÉTRICAS DO PERÍODO:
             "topics": topic,
         }
 
-        # Salvar no ChromaDB
-        chroma_id = f"consolidated_{user_id}_{topic}_{period_end}"
+        # Id estável: o mesmo cluster sempre sobrescreve o mesmo documento
+        chroma_id = f"consolidated_{user_id}_{cluster['cluster_id']}"
 
         from langchain.schema import Document
         doc = Document(page_content=doc_content, metadata=metadata)
 
+        vectorstore = self.db.vector_store_for(user_id)
         try:
-            # Tentar adicionar
-            self.db.vectorstore.add_documents([doc], ids=[chroma_id])
-            logger.info(f"✅ Memória consolidada criada: {chroma_id}")
+            # Remover versão anterior (se houver) e gravar a nova
+            if cluster["summarized_member_id"]:
+                vectorstore.delete([chroma_id])
+            vectorstore.add_documents([doc], ids=[chroma_id])
+            logger.info(f"✅ Memória consolidada gravada: {chroma_id}")
         except Exception as e:
-            # Se já existe, substituir
             if "already exists" in str(e).lower() or "duplicate" in str(e).lower():
                 logger.info(f"   Substituindo memória consolidada existente: {chroma_id}")
-                try:
-                    self.db.vectorstore.delete([chroma_id])
-                    self.db.vectorstore.add_documents([doc], ids=[chroma_id])
-                    logger.info(f"✅ Memória consolidada atualizada: {chroma_id}")
-                except Exception as delete_error:
-                    logger.error(f"❌ Erro ao substituir memória consolidada: {delete_error}")
+                vectorstore.delete([chroma_id])
+                vectorstore.add_documents([doc], ids=[chroma_id])
+                logger.info(f"✅ Memória consolidada atualizada: {chroma_id}")
             else:
-                logger.error(f"❌ Erro ao criar memória consolidada: {e}")
+                raise
+
+    def _delete_legacy_documents(self, user_id: str) -> None:
+        """Remove consolidações por tópico fixo (anteriores aos clusters por embedding)"""
+        try:
+            vectorstore = self.db.vector_store_for(user_id)
+            existing = vectorstore._collection.get(
+                where={
+                    "$and": [
+                        {"user_id": {"$eq": user_id}},
+                        {"type": {"$eq": "consolidated"}}
+                    ]
+                }
+            )
+            legacy = [
+                doc_id for doc_id, metadata in zip(existing.get("ids", []), existing.get("metadatas", []))
+                if not (metadata or {}).get("cluster_id")
+            ]
+            if legacy:
+                vectorstore.delete(legacy)
+                logger.info(f"   {len(legacy)} memórias consolidadas antigas (por tópico) removidas")
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao remover consolidações antigas de {user_id}: {e}")
 
-    def _generate_summary_with_llm(self, topic: str, memories: List[Dict]) -> str:
+    def _generate_summary_with_llm(self, topic: str, memories: List[Dict],
+                                   previous_summary: Optional[str] = None,
+                                   total: Optional[int] = None) -> str:
         """
-        Gera resumo temático das memórias usando LLM
+        Gera (ou atualiza) o resumo temático das memórias usando LLM
 
         Args:
             topic: Tópico do cluster
-            memories: Lista de memórias
+            memories: Conversas novas do cluster (até SUMMARY_SAMPLE)
+            previous_summary: Resumo anterior do cluster, se houver
+            total: Tamanho total do cluster
 
         Returns:
             Resumo gerado
         """
-        # Construir prompt com as memórias
+        total = total or len(memories)
         memories_text = "\n\n".join([
             f"[{mem['timestamp'][:10]}] Usuário: {mem['user_input'][:200]}\nJung: {mem['ai_response'][:200]}"
-            for mem in memories[:10]  # Limitar a 10 para não estourar tokens
+            for mem in memories[:self.SUMMARY_SAMPLE]
         ])
 
-        prompt = f"""Você é um sistema de consolidação de memórias do Jung.
+        if previous_summary:
+            context = f"""Este tema já tem um RESUMO CONSOLIDADO anterior. Atualize-o com as {len(memories)} conversas novas abaixo
+(o tema soma {total} conversas no total), preservando o que continua válido.
 
-Analise as {len(memories)} conversas abaixo sobre o tema "{topic}" e gere um RESUMO CONSOLIDADO estruturado:
+RESUMO ANTERIOR:
+{previous_summary}
+
+CONVERSAS NOVAS:
+{memories_text}"""
+        else:
+            context = f"""Analise as {total} conversas abaixo sobre o tema "{topic}" e gere um RESUMO CONSOLIDADO estruturado:
 
 CONVERSAS:
-{memories_text}
+{memories_text}"""
+
+        prompt = f"""Você é um sistema de consolidação de memórias do Jung.
+
+{context}
 
 Gere um resumo seguindo este formato:
 
@@ -282,40 +760,35 @@ Seja conciso mas informativo. Máximo 200 palavras."""
                 summary = response.content[0].text.strip()
             else:
                 # Fallback: resumo manual básico
-                summary = f"Consolidação de {len(memories)} conversas sobre {topic}."
+                summary = f"Consolidação de {total} conversas sobre {topic}."
 
             return summary
 
         except Exception as e:
             logger.error(f"Erro ao gerar resumo com LLM: {e}")
-            return f"Consolidação de {len(memories)} conversas sobre {topic}."
+            return previous_summary or f"Consolidação de {total} conversas sobre {topic}."
 
 
-def run_consolidation_job(db_manager):
+def run_consolidation_job(db_manager, workers: Optional[int] = None):
     """
     Job para rodar consolidação em todos os usuários (síncrono)
 
+    Usuários são processados em paralelo e com checkpoint por usuário;
+    uma execução interrompida é retomada (ver consolidation_runner.py).
+
     Args:
         db_manager: HybridDatabaseManager instance
-    """
-    logger.info("🔄 Iniciando job de consolidação de memórias")
-
-    consolidator = MemoryConsolidator(db_manager)
-
-    # Buscar todos os usuários
-    cursor = db_manager.conn.cursor()
-    cursor.execute("SELECT DISTINCT user_id FROM conversations")
-    user_ids = [row[0] for row in cursor.fetchall()]
-
-    logger.info(f"   Consolidando memórias para {len(user_ids)} usuários")
+        workers: usuários em paralelo (padrão: Config.MEMORY_CONSOLIDATION_WORKERS)
 
-    for user_id in user_ids:
-        try:
-            consolidator.consolidate_user_memories(user_id, lookback_days=90)
-        except Exception as e:
-            logger.error(f"Erro ao consolidar memórias de {user_id}: {e}")
+    Returns:
+        Progresso final (usuários, chamadas LLM, vazão)
+    """
+    from consolidation_runner import run_consolidation
 
+    logger.info("🔄 Iniciando job de consolidação de memórias")
+    progress = run_consolidation(db_manager, workers=workers, lookback_days=90)
     logger.info("✅ Job de consolidação concluído")
+    return progress
 
 
 async def run_consolidation_job_async(db_manager):
@@ -327,4 +800,4 @@ async def run_consolidation_job_async(db_manager):
     """
     import asyncio
     # Executar a versão síncrona em thread separada para não bloquear event loop
-    await asyncio.to_thread(run_consolidation_job, db_manager)
+    return await asyncio.to_thread(run_consolidation_job, db_manager)
@@ -61,10 +61,10 @@ class MemoryQualityMetrics:
 
         # Conversas no ChromaDB
         embedded_conversations = 0
-        if self.db.chroma_enabled:
+        if self.db.chroma_ready():
             try:
                 # Buscar todos os docs do usuário (exceto consolidados)
-                results = self.db.vectorstore._collection.get(
+                results = self.db.vector_store_for(user_id)._collection.get(
                     where={
                         "$and": [
                             {"user_id": {"$eq": user_id}},
@@ -150,7 +150,7 @@ class MemoryQualityMetrics:
         # Como não temos log de buscas, vamos fazer uma busca de teste
         # para simular estatísticas
 
-        if not self.db.chroma_enabled:
+        if not self.db.chroma_ready():
             return {
                 "error": "ChromaDB desabilitado",
                 "avg_memories_retrieved": 0,
@@ -317,14 +317,14 @@ Tópicos mais frequentes:
             "global_coverage": 0.0
         }
 
-        if self.db.chroma_enabled:
+        if self.db.chroma_ready():
             try:
                 # Total de docs
-                all_docs = self.db.vectorstore._collection.get()
+                all_docs = self.db.vector_partitions.get()
                 total_docs = len(all_docs.get('ids', []))
 
                 # Docs consolidados
-                consolidated_docs = self.db.vectorstore._collection.get(
+                consolidated_docs = self.db.vector_partitions.get(
                     where={"type": {"$eq": "consolidated"}}
                 )
                 consolidated_count = len(consolidated_docs.get('ids', []))
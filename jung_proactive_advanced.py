@@ -39,16 +39,24 @@ from jung_core import (
     Config,
     send_to_xai
 )
+from context_packer import truncate_to_tokens
 
 # ✅ IMPORTS TRI (Item Response Theory) v1.0
 try:
-    from fragment_detector import FragmentDetector, DetectionResult
-    from irt_engine import IRTEngine, IRTDomain
+    from fragment_detector import (
+        FragmentDetector,
+        DetectionResult,
+        detection_rows,
+        INSERT_DETECTION_SQL
+    )
+    from irt_engine import IRTEngine, IRTDomain, OnlineTraitEstimator, AdaptiveItemSelector
     TRI_ENABLED = True
 except ImportError:
     TRI_ENABLED = False
     FragmentDetector = None
     IRTEngine = None
+    OnlineTraitEstimator = None
+    AdaptiveItemSelector = None
 
 # ============================================================
 # LOGGER
@@ -63,6 +71,7 @@ logger = logging.getLogger(__name__)
 INACTIVITY_THRESHOLD_HOURS = 24  # Horas de inatividade antes de enviar proativa
 COOLDOWN_HOURS = 12               # Horas entre mensagens proativas
 MIN_CONVERSATIONS_REQUIRED = 3   # Mínimo de conversas necessárias
+TOPIC_EXTRACTION_TOKEN_BUDGET = 375  # Mensagens enviadas à extração de tópico (antes: 1500 caracteres)
 
 logger.info(f"⚙️ Sistema Proativo configurado:")
 logger.info(f"   • Inatividade: {INACTIVITY_THRESHOLD_HOURS}h")
@@ -339,6 +348,9 @@ class ProactiveAdvancedSystem:
         self.tri_enabled = TRI_ENABLED
         self.fragment_detector = None
         self.irt_engine = None
+        self.trait_estimator = None  # OnlineTraitEstimator (theta incremental)
+        self.item_selector = None  # AdaptiveItemSelector (perguntas estratégicas CAT)
+        self.detection_sink = None  # FragmentDetectionSink (anexado em main.lifespan)
 
         if self.tri_enabled:
             try:
@@ -348,6 +360,18 @@ class ProactiveAdvancedSystem:
                 logger.warning(f"⚠️ TRI: Erro ao inicializar FragmentDetector: {e}")
                 self.tri_enabled = False
 
+        if self.tri_enabled:
+            try:
+                self.trait_estimator = OnlineTraitEstimator(
+                    db.conn,
+                    db._lock,
+                    cache_dir=os.path.join(Config.DATA_DIR, "cache")
+                )
+                self.item_selector = AdaptiveItemSelector(db.conn, db._lock)
+                logger.info("✅ TRI: OnlineTraitEstimator + AdaptiveItemSelector inicializados")
+            except Exception as e:
+                logger.warning(f"⚠️ TRI: Estimação incremental indisponível: {e}")
+
         logger.info(f"⚙️ Sistema Proativo configurado:")
         logger.info(f"   • Inatividade: {self.inactivity_threshold_hours}h")
         logger.info(f"   • Cooldown: {self.cooldown_hours}h")
@@ -357,15 +381,8 @@ class ProactiveAdvancedSystem:
     def reset_timer(self, user_id: str):
         """✅ RESET CRONÔMETRO - Chamado quando usuário envia mensagem"""
 
-        cursor = self.db.conn.cursor()
-
-        cursor.execute("""
-            UPDATE users
-            SET last_seen = CURRENT_TIMESTAMP
-            WHERE user_id = ?
-        """, (user_id,))
-
-        self.db.conn.commit()
+        # last_seen é coalescido e gravado em lote pelo UserRegistryCache
+        self.db.user_registry.touch(user_id)
 
         logger.info(f"⏱️  Cronômetro resetado para usuário {user_id[:8]}")
 
@@ -373,6 +390,35 @@ class ProactiveAdvancedSystem:
     # TRI FRAGMENT DETECTION - Detecção de Fragmentos Comportamentais
     # =========================================================================
 
+    def submit_fragment_detection(
+        self,
+        message: str,
+        user_id: str,
+        message_id: Optional[str] = None,
+        context: Optional[Dict] = None
+    ) -> bool:
+        """
+        🧬 TRI: Enfileira a detecção no FragmentDetectionSink (fora do caminho da mensagem).
+
+        Sem sink anexado (ex: scripts, testes), cai no modo síncrono
+        detect_fragments_in_message.
+
+        Returns:
+            True se a detecção foi enfileirada ou executada
+        """
+        if not self.tri_enabled or not self.fragment_detector:
+            return False
+
+        if self.detection_sink is not None:
+            return self.detection_sink.submit(
+                message=message,
+                user_id=user_id,
+                message_id=message_id,
+                context=context
+            )
+
+        return self.detect_fragments_in_message(message, user_id, message_id, context) is not None
+
     def detect_fragments_in_message(
         self,
         message: str,
@@ -383,8 +429,8 @@ class ProactiveAdvancedSystem:
         """
         🧬 TRI: Detecta fragmentos comportamentais Big Five em uma mensagem.
 
-        Este método deve ser chamado quando o usuário envia uma mensagem.
-        A detecção acontece em background, sem afetar o fluxo de conversa.
+        Versão síncrona (detecção + gravação imediatas). No bot, o caminho
+        da mensagem usa submit_fragment_detection, que delega ao sink.
 
         Args:
             message: Texto da mensagem do usuário
@@ -416,29 +462,25 @@ class ProactiveAdvancedSystem:
                 f"para {user_id[:8]} (conf: {result.total_confidence:.2f})"
             )
 
-            # ✅ SALVAR detecções no banco de dados SQLite
-            cursor = self.db.conn.cursor()
+            # ✅ SALVAR detecções no banco de dados SQLite (um executemany + commit)
             saved_count = 0
-            for match in result.matches:
+            rows = detection_rows(result)
+            try:
+                with self.db.transaction() as conn:
+                    conn.executemany(INSERT_DETECTION_SQL, rows)
+                saved_count = len(rows)
+                logger.info(f"🧬 TRI: {saved_count} fragmentos salvos no banco")
+            except Exception as save_err:
+                logger.warning(f"🧬 TRI: Erro ao salvar fragmentos: {save_err}")
+
+            if saved_count and self.trait_estimator:
                 try:
-                    cursor.execute("""
-                        INSERT INTO detected_fragments
-                            (user_id, fragment_id, intensity, detection_confidence, source_quote, detected_at)
-                        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    """, (
+                    self.trait_estimator.update(
                         user_id,
-                        match.fragment_id,
-                        match.intensity,
-                        match.confidence,
-                        match.source_text[:500] if match.source_text else None
-                    ))
-                    saved_count += 1
-                except Exception as save_err:
-                    logger.warning(f"🧬 TRI: Erro ao salvar fragmento {match.fragment_id}: {save_err}")
-
-            if saved_count > 0:
-                self.db.conn.commit()
-                logger.info(f"🧬 TRI: {saved_count} fragmentos salvos no banco")
+                        [(match.fragment_id, match.intensity) for match in result.matches]
+                    )
+                except Exception as est_err:
+                    logger.warning(f"🧬 TRI: Erro na atualização incremental de theta: {est_err}")
 
             # Preparar resumo para log/debug
             summary = {
@@ -528,6 +570,13 @@ class ProactiveAdvancedSystem:
                     "avg_confidence": round(row["avg_confidence"], 2) if row["avg_confidence"] else 0
                 }
 
+            # Estimativas theta pré-calculadas (OnlineTraitEstimator)
+            if self.trait_estimator:
+                estimates = self.trait_estimator.get_estimates(user_id)
+                for domain, data in summary["domains"].items():
+                    data["estimate"] = estimates["domains"].get(domain.lower())
+                summary["facets"] = estimates["facets"]
+
             return summary
 
         except Exception as e:
@@ -687,7 +736,7 @@ Responda APENAS com o tópico:"""
         extraction_prompt = f"""Analise as mensagens abaixo e extraia UM tópico central de interesse do usuário.
 
 Mensagens:
-{recent_text[:1500]}
+{truncate_to_tokens(recent_text, TOPIC_EXTRACTION_TOKEN_BUDGET)}
 
 Responda APENAS com o tópico em 2-5 palavras. Exemplos:
 - "desenvolvimento pessoal"
@@ -1249,16 +1298,32 @@ GERE APENAS A MENSAGEM:
 
             logger.info(f"🎯 [STRATEGIC QUESTION] Gerando pergunta estratégica...")
 
-            # Analisar gaps
-            analyzer = ProfileGapAnalyzer(self.db)
-            gaps = analyzer.analyze_gaps(user_id)
+            analyzer = ProfileGapAnalyzer(self.db, item_selector=self.item_selector)
+
+            # 1. Seleção adaptativa TRI: faceta/fragmento que mais reduz o SE
+            target_item = analyzer.get_next_strategic_item(user_id)
+
+            if target_item:
+                priority = {
+                    "dimension": target_item["domain"],
+                    "priority": round(target_item["se_reduction"], 4),
+                    "reason": (
+                        f"CAT: {target_item['facet_code']} "
+                        f"(SE {target_item['current_se']} → {target_item['projected_se']})"
+                    ),
+                    # O fragmento escolhido vira o contexto da pergunta
+                    "suggested_context": target_item.get("description")
+                }
+            else:
+                # 2. Fallback: análise de gaps por palavras-chave
+                gaps = analyzer.analyze_gaps(user_id)
 
-            if not gaps.get("priority_questions"):
-                logger.warning("⚠️  Sem perguntas prioritárias → fallback para insight")
-                return None
+                if not gaps.get("priority_questions"):
+                    logger.warning("⚠️  Sem perguntas prioritárias → fallback para insight")
+                    return None
+
+                priority = gaps["priority_questions"][0]
 
-            # Pegar dimensão prioritária
-            priority = gaps["priority_questions"][0]
             target_dimension = priority["dimension"]
             context_hint = priority.get("suggested_context")
 
@@ -1271,7 +1336,8 @@ GERE APENAS A MENSAGEM:
                 target_dimension=target_dimension,
                 user_id=user_id,
                 user_name=user_name,
-                context_hint=context_hint
+                context_hint=context_hint,
+                target_item=target_item
             )
 
             question_text = question_data["question"]
@@ -9,6 +9,8 @@ Inclui AnthropicCompatWrapper — substituto drop-in para anthropic.Anthropic()
 que chama OpenRouter internamente, permitindo redirecionar todas as chamadas
 internas (extração de fatos, flush, consolidação) sem alterar os módulos
 consumidores.
+
+Todos os clientes passam por llm_transport (live/record/replay).
 """
 
 import os
@@ -16,6 +18,8 @@ import logging
 from typing import Optional
 from abc import ABC, abstractmethod
 
+from llm_transport import wrap_chat_client, wrap_messages_client
+
 logger = logging.getLogger(__name__)
 
 # ============================================================
@@ -46,7 +50,7 @@ class _AnthropicFakeResponse:
 
 class _AnthropicFakeMessages:
     def __init__(self, openrouter_client, model: str):
-        self._client = openrouter_client
+        self._client = wrap_chat_client(openrouter_client)
         self._model = model
 
     def create(self, model=None, max_tokens=2000, temperature=0.7,
@@ -119,7 +123,7 @@ class OpenRouterProvider(LLMProvider):
     def get_response(self, prompt: str, temperature: float = 0.7,
                      max_tokens: int = 2000) -> str:
         from openai import OpenAI
-        client = OpenAI(base_url=OPENROUTER_BASE_URL, api_key=self.api_key)
+        client = wrap_chat_client(OpenAI(base_url=OPENROUTER_BASE_URL, api_key=self.api_key))
         try:
             resp = client.chat.completions.create(
                 model=self.model,
@@ -157,7 +161,7 @@ class ClaudeProvider(LLMProvider):
         except ImportError:
             raise ImportError("❌ Biblioteca 'anthropic' não instalada")
         try:
-            client = anthropic.Anthropic(api_key=self.api_key)
+            client = wrap_messages_client(anthropic.Anthropic(api_key=self.api_key))
             message = client.messages.create(
                 model=self.model, max_tokens=max_tokens,
                 temperature=temperature,
@@ -0,0 +1,399 @@
+"""
+llm_transport.py - Camada de Transporte LLM (live / record / replay)
+====================================================================
+
+Todas as chamadas LLM do bot passam por aqui:
+
+- chat.completions.create (OpenRouter: conversação, AnthropicCompatWrapper,
+  OpenRouterProvider, ScholarEngine)
+- messages.create (anthropic.Anthropic: ClaudeProvider e fallbacks)
+
+Modos (LLM_TRANSPORT_MODE):
+
+- live    (padrão) os clientes são devolvidos sem wrapper - custo zero
+- record  chama o provedor e grava hash do prompt → resposta + latência
+          observada no store SQLite (LLM_TRANSPORT_STORE)
+- replay  serve as respostas gravadas, dormindo a latência registrada
+          × LLM_REPLAY_LATENCY_SCALE, sem rede. Em prompt desconhecido:
+          erro (LLM_REPLAY_ON_MISS=error) ou chamada real (=live)
+
+A chave ignora o modelo (AnthropicCompatWrapper sempre troca o modelo
+pelo INTERNAL_MODEL): o que identifica a chamada são as mensagens, o
+system prompt, max_tokens e temperature. O modelo fica gravado só como
+metadado.
+
+Uso típico para teste de carga:
+    LLM_TRANSPORT_MODE=record ...   # uma sessão real, grava o store
+    LLM_TRANSPORT_MODE=replay LLM_REPLAY_LATENCY_SCALE=1.0 python -m benchmarks.run ...
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+MODE_LIVE = "live"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+MODES = (MODE_LIVE, MODE_RECORD, MODE_REPLAY)
+
+KIND_CHAT = "chat"          # OpenAI chat.completions.create
+KIND_MESSAGES = "messages"  # anthropic messages.create
+
+
+class ReplayMissError(RuntimeError):
+    """Prompt sem gravação no store em modo replay"""
+
+
+def _default_store_path() -> str:
+    data_dir = os.getenv("RAILWAY_VOLUME_MOUNT_PATH", "./data")
+    return os.path.join(data_dir, "llm_transport.db")
+
+
+def request_key(kind: str, messages: Optional[List[Dict]], system: Optional[str] = None,
+                max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> str:
+    """sha256 do pedido canônico (sem o modelo)"""
+    canonical = json.dumps(
+        {
+            "kind": kind,
+            "system": system,
+            "messages": [
+                {"role": m.get("role"), "content": m.get("content")}
+                for m in (messages or [])
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        },
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# STORE
+# ============================================================
+
+class TransportStore:
+    """
+    Gravações em SQLite (WAL: vários workers do webhook gravam no mesmo arquivo)
+
+    Em replay as gravações são carregadas uma vez para memória; a contagem
+    de hits também fica em memória para não serializar leitores em escrita.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_transport_records (
+                request_key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT,
+                request TEXT,
+                response TEXT NOT NULL,
+                latency_ms REAL NOT NULL,
+                recorded_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.commit()
+        self._cache: Optional[Dict[str, tuple]] = None
+
+    def load(self) -> int:
+        """Carrega todas as gravações para memória (replay)"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT request_key, response, latency_ms FROM llm_transport_records"
+            ).fetchall()
+            self._cache = {key: (response, latency_ms) for key, response, latency_ms in rows}
+            return len(self._cache)
+
+    def get(self, key: str) -> Optional[tuple]:
+        """(response, latency_ms) ou None"""
+        if self._cache is not None:
+            return self._cache.get(key)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, latency_ms FROM llm_transport_records WHERE request_key = ?",
+                (key,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, key: str, kind: str, model: Optional[str], request: Dict,
+            response: str, latency_ms: float) -> None:
+        with self._lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO llm_transport_records
+                (request_key, kind, model, request, response, latency_ms)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, kind, model, json.dumps(request, ensure_ascii=False, default=str),
+                  response, latency_ms))
+            self.conn.commit()
+            if self._cache is not None:
+                self._cache[key] = (response, latency_ms)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM llm_transport_records").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+# ============================================================
+# TRANSPORTE
+# ============================================================
+
+class LLMTransport:
+    """
+    Args:
+        mode: live | record | replay
+        store_path: arquivo SQLite das gravações
+        latency_scale: multiplicador da latência gravada no replay (0 = sem espera)
+        on_miss: "error" (ReplayMissError) ou "live" (chama o provedor e grava)
+    """
+
+    def __init__(self, mode: str = MODE_LIVE, store_path: Optional[str] = None,
+                 latency_scale: float = 1.0, on_miss: str = "error"):
+        if mode not in MODES:
+            raise ValueError(f"LLM_TRANSPORT_MODE inválido: {mode} (use {', '.join(MODES)})")
+        self.mode = mode
+        self.latency_scale = max(0.0, latency_scale)
+        self.on_miss = on_miss
+        self.store: Optional[TransportStore] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "recorded": 0, "replayed": 0, "misses": 0}
+
+        if mode != MODE_LIVE:
+            self.store = TransportStore(store_path or _default_store_path())
+            if mode == MODE_REPLAY:
+                loaded = self.store.load()
+                logger.info(
+                    f"📼 LLM transport em replay: {loaded} gravações de {self.store.path} "
+                    f"(latência ×{self.latency_scale}, miss={self.on_miss})"
+                )
+            else:
+                logger.info(f"📼 LLM transport gravando em {self.store.path}")
+
+    @property
+    def active(self) -> bool:
+        return self.mode != MODE_LIVE
+
+    def _count(self, field: str) -> None:
+        with self._stats_lock:
+            self._stats[field] += 1
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return dict(self._stats, mode=self.mode)
+
+    def call(self, kind: str, request: Dict, live_call: Callable[[], object],
+             extract_text: Callable[[object], str], build_response: Callable[[str], object]):
+        """
+        Executa um pedido segundo o modo
+
+        Args:
+            request: kwargs do create() (model, messages, system, max_tokens, temperature)
+            live_call: chamada real ao provedor
+            extract_text: resposta do provedor → texto gravado
+            build_response: texto gravado → objeto no formato do SDK
+        """
+        self._count("calls")
+        if self.mode == MODE_LIVE:
+            return live_call()
+
+        key = request_key(kind, request.get("messages"), request.get("system"),
+                          request.get("max_tokens"), request.get("temperature"))
+
+        if self.mode == MODE_REPLAY:
+            recorded = self.store.get(key)
+            if recorded is not None:
+                text, latency_ms = recorded
+                if self.latency_scale and latency_ms:
+                    time.sleep(latency_ms * self.latency_scale / 1000.0)
+                self._count("replayed")
+                return build_response(text)
+
+            self._count("misses")
+            if self.on_miss != "live":
+                raise ReplayMissError(f"Prompt sem gravação no store (chave {key[:12]})")
+            logger.warning(f"⚠️ Replay miss ({key[:12]}) - chamando o provedor")
+
+        start = time.perf_counter()
+        response = live_call()
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        try:
+            self.store.put(key, kind, request.get("model"), request,
+                           extract_text(response), latency_ms)
+            self._count("recorded")
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao gravar chamada LLM: {e}")
+        return response
+
+
+# ============================================================
+# RESPOSTAS NO FORMATO DOS SDKs
+# ============================================================
+
+class _ReplayMessage:
+    def __init__(self, content: str):
+        self.role = "assistant"
+        self.content = content
+
+
+class _ReplayChoice:
+    def __init__(self, content: str):
+        self.index = 0
+        self.finish_reason = "stop"
+        self.message = _ReplayMessage(content)
+
+
+class _ReplayCompletion:
+    """Imita openai ChatCompletion (choices[0].message.content)"""
+
+    def __init__(self, content: str):
+        self.choices = [_ReplayChoice(content)]
+        self.usage = None
+
+
+class _ReplayTextBlock:
+    def __init__(self, text: str):
+        self.type = "text"
+        self.text = text
+
+
+class _ReplayAnthropicMessage:
+    """Imita anthropic Message (content[0].text)"""
+
+    def __init__(self, text: str):
+        self.content = [_ReplayTextBlock(text)]
+        self.stop_reason = "end_turn"
+        self.usage = None
+
+
+def _chat_text(response) -> str:
+    return response.choices[0].message.content or ""
+
+
+def _messages_text(response) -> str:
+    return "".join(getattr(block, "text", "") for block in response.content)
+
+
+# ============================================================
+# WRAPPERS DE CLIENTE
+# ============================================================
+
+class _TransportCompletions:
+    def __init__(self, inner, transport: LLMTransport):
+        self._inner = inner
+        self._transport = transport
+
+    def create(self, **kwargs):
+        return self._transport.call(
+            KIND_CHAT, kwargs,
+            live_call=lambda: self._inner.chat.completions.create(**kwargs),
+            extract_text=_chat_text,
+            build_response=_ReplayCompletion,
+        )
+
+
+class _TransportChat:
+    def __init__(self, inner, transport: LLMTransport):
+        self.completions = _TransportCompletions(inner, transport)
+
+
+class TransportChatClient:
+    """Cliente OpenAI (chat.completions.create) roteado pelo transporte"""
+
+    def __init__(self, inner, transport: LLMTransport):
+        self.inner = inner
+        self.chat = _TransportChat(inner, transport)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class _TransportMessages:
+    def __init__(self, inner, transport: LLMTransport):
+        self._inner = inner
+        self._transport = transport
+
+    def create(self, **kwargs):
+        return self._transport.call(
+            KIND_MESSAGES, kwargs,
+            live_call=lambda: self._inner.messages.create(**kwargs),
+            extract_text=_messages_text,
+            build_response=_ReplayAnthropicMessage,
+        )
+
+
+class TransportMessagesClient:
+    """Cliente anthropic (messages.create) roteado pelo transporte"""
+
+    def __init__(self, inner, transport: LLMTransport):
+        self.inner = inner
+        self.messages = _TransportMessages(inner, transport)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+# ============================================================
+# SINGLETON
+# ============================================================
+
+_transport_instance: Optional[LLMTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> LLMTransport:
+    """Transporte do processo, configurado pelo ambiente na primeira chamada"""
+    global _transport_instance
+    if _transport_instance is None:
+        with _transport_lock:
+            if _transport_instance is None:
+                _transport_instance = LLMTransport(
+                    mode=os.getenv("LLM_TRANSPORT_MODE", MODE_LIVE).strip().lower(),
+                    store_path=os.getenv("LLM_TRANSPORT_STORE") or None,
+                    latency_scale=float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0")),
+                    on_miss=os.getenv("LLM_REPLAY_ON_MISS", "error").strip().lower(),
+                )
+    return _transport_instance
+
+
+def set_transport(transport: Optional[LLMTransport]) -> None:
+    """Substitui o transporte do processo (benchmarks/testes); None = reler o ambiente"""
+    global _transport_instance
+    with _transport_lock:
+        _transport_instance = transport
+
+
+def wrap_chat_client(client):
+    """Roteia um cliente OpenAI pelo transporte (em live devolve o próprio cliente)"""
+    transport = get_transport()
+    if client is None or not transport.active or isinstance(client, TransportChatClient):
+        return client
+    return TransportChatClient(client, transport)
+
+
+def wrap_messages_client(client):
+    """Roteia um cliente anthropic.Anthropic pelo transporte (em live devolve o próprio cliente)"""
+    transport = get_transport()
+    if client is None or not transport.active or isinstance(client, TransportMessagesClient):
+        return client
+    return TransportMessagesClient(client, transport)
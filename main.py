@@ -1,6 +1,7 @@
+import hmac
 import asyncio
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from contextlib import asynccontextmanager
@@ -8,6 +9,7 @@ import os
 import sys
 import sqlite3
 import logging
+from typing import Dict
 from dotenv import load_dotenv
 
 # Desabilitar telemetria do ChromaDB
@@ -17,8 +19,16 @@ os.environ["ANONYMIZED_TELEMETRY"] = "False"
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Importar o bot
-from telegram_bot import bot_state, start_command, help_command, stats_command, mbti_command, desenvolvimento_command, reset_command, meu_perfil_command
-from telegram.ext import Application, CommandHandler, MessageHandler, filters
+from telegram_bot import (
+    bot_state, build_application, process_queued_update,
+    start_fragment_detection_sink, stop_fragment_detection_sink
+)
+from telegram import Update
+from jung_core import Config, CHROMADB_AVAILABLE
+from update_queue import TelegramUpdateQueue, UpdateQueueConsumer
+from telegram_worker import WebhookWorkerPool
+from user_profile_writer import flush_session_log
+from admin_web.auth.middleware import require_master
 
 # Importar rotas do admin (serão criadas)
 # from admin_web.routes import router as admin_router
@@ -74,6 +84,9 @@ async def lifespan(app: FastAPI):
         import traceback
         logger.error(traceback.format_exc())
 
+    # Aquecer engine/proativo/ChromaDB/mem0 em background (polling não espera)
+    bot_state.warm_up()
+
     # 1. Iniciar Bot Telegram
     telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
     if not telegram_token:
@@ -82,30 +95,11 @@ async def lifespan(app: FastAPI):
         return
 
     logger.info("🤖 Inicializando Bot Telegram...")
-    telegram_app = (
-        Application.builder()
-        .token(telegram_token)
-        .connect_timeout(30.0)
-        .read_timeout(30.0)
-        .write_timeout(30.0)
-        .pool_timeout(30.0)
-        .build()
-    )
-
-    # Registrar handlers (apenas comandos essenciais)
-    telegram_app.add_handler(CommandHandler("start", start_command))
-    telegram_app.add_handler(CommandHandler("help", help_command))
-    telegram_app.add_handler(CommandHandler("stats", stats_command))
-    telegram_app.add_handler(CommandHandler("mbti", mbti_command))
-    telegram_app.add_handler(CommandHandler("desenvolvimento", desenvolvimento_command))
-    telegram_app.add_handler(CommandHandler("reset", reset_command))
-    telegram_app.add_handler(CommandHandler("meu_perfil", meu_perfil_command))
-
-    # Handler de mensagens (precisamos importar a função handle_message se ela existir,
-    # ou definir aqui se estiver dentro do main no original.
-    # Vou assumir que precisamos mover a lógica de main() do telegram_bot.py para cá ou expor o handler)
-    from telegram_bot import handle_message
-    telegram_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    webhook_mode = Config.TELEGRAM_MODE == "webhook"
+    if webhook_mode and not Config.TELEGRAM_WEBHOOK_SECRET:
+        # Sem o segredo qualquer um poderia postar updates forjados na rota pública
+        raise RuntimeError("TELEGRAM_MODE=webhook exige TELEGRAM_WEBHOOK_SECRET")
+    telegram_app = build_application(telegram_token, with_updater=not webhook_mode)
 
     # Iniciar bot em modo assíncrono
     await telegram_app.initialize()
@@ -114,27 +108,99 @@ async def lifespan(app: FastAPI):
     # Configurar comandos visíveis no menu do Telegram
     await setup_bot_commands(telegram_app)
 
-    # Iniciar polling (em background task para não bloquear o FastAPI)
-    # Nota: Em produção com webhook seria diferente, mas para polling:
-    asyncio.create_task(telegram_app.updater.start_polling())
+    update_queue = None
+    queue_consumer = None
+    consumer_task = None
+    worker_pool = None
+    detection_sink_task = None
+
+    if webhook_mode:
+        # Webhook: a rota /telegram/webhook só enfileira; workers processam
+        if not Config.TELEGRAM_WEBHOOK_URL:
+            logger.error("❌ TELEGRAM_MODE=webhook exige TELEGRAM_WEBHOOK_URL")
+        workers = Config.TELEGRAM_WEBHOOK_WORKERS
+        if workers > 0 and CHROMADB_AVAILABLE:
+            # Cada worker abriria seu próprio PersistentClient no mesmo diretório
+            logger.error(
+                f"❌ TELEGRAM_WEBHOOK_WORKERS={workers} com ChromaDB local: o PersistentClient não "
+                f"aceita escrita de vários processos - processando updates no próprio processo web"
+            )
+            workers = 0
+        update_queue = TelegramUpdateQueue(partitions=max(1, workers))
+        moved = update_queue.repartition()
+        if moved:
+            logger.info(f"♻️ {moved} update(s) pendente(s) redistribuídos entre {update_queue.partitions} partição(ões)")
+
+        if workers > 0:
+            worker_pool = WebhookWorkerPool(workers, Config.TELEGRAM_WORKER_CONCURRENCY)
+            worker_pool.start()
+        else:
+            # Sem workers: consumir no próprio processo web
+            async def process(payload):
+                await process_queued_update(telegram_app, payload)
 
-    logger.info("✅ Bot Telegram iniciado e rodando!")
+            queue_consumer = UpdateQueueConsumer(
+                update_queue, process, partitions=[0],
+                concurrency=Config.TELEGRAM_WORKER_CONCURRENCY
+            )
+            consumer_task = asyncio.create_task(queue_consumer.run())
+            detection_sink_task = asyncio.create_task(start_fragment_detection_sink())
+
+        if Config.TELEGRAM_WEBHOOK_URL:
+            await telegram_app.bot.set_webhook(
+                url=Config.TELEGRAM_WEBHOOK_URL,
+                secret_token=Config.TELEGRAM_WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES
+            )
+        logger.info(f"✅ Bot Telegram em modo webhook ({workers} worker(s))")
+    else:
+        # Iniciar polling (em background task para não bloquear o FastAPI)
+        asyncio.create_task(telegram_app.updater.start_polling())
+        detection_sink_task = asyncio.create_task(start_fragment_detection_sink())
+        logger.info("✅ Bot Telegram iniciado e rodando!")
 
     # AVISO: Schedulers de background migrados para a rota /cron/
     app.state.telegram_app = telegram_app
+    app.state.update_queue = update_queue
+    app.state.queue_consumer = queue_consumer
 
     yield
 
     # Shutdown
     logger.info("🛑 Parando aplicação...")
 
-
-
     # Parar bot Telegram
     logger.info("🛑 Parando Bot Telegram...")
-    await telegram_app.updater.stop()
+    if worker_pool:
+        await worker_pool.stop()
+    if queue_consumer:
+        queue_consumer.stop()
+        await consumer_task
+    if telegram_app.updater:
+        await telegram_app.updater.stop()
     await telegram_app.stop()
     await telegram_app.shutdown()
+    if update_queue:
+        update_queue.close()
+
+    # Flush final das detecções TRI pendentes
+    detection_sink = None
+    if detection_sink_task:
+        if detection_sink_task.done() and not detection_sink_task.cancelled():
+            detection_sink = detection_sink_task.result()
+        else:
+            detection_sink_task.cancel()
+    await stop_fragment_detection_sink(detection_sink)
+
+    # Gravar last_seen ainda pendente e parar a thread de flush (UserRegistryCache)
+    bot_state.db.user_registry.close()
+
+    # Entradas de sessão ainda em buffer (session_log)
+    flush_session_log()
+
+    # Trocas ainda na fila de sincronização do mem0
+    if bot_state.db.mem0:
+        bot_state.db.mem0.close()
 
 # ============================================================================
 # FASTAPI APP
@@ -155,12 +221,57 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint para monitoramento"""
+    readiness = bot_state.readiness
     return {
-        "status": "healthy",
+        "status": "healthy" if readiness["retrieval"] else "warming",
         "service": "Jung Claude Bot + Admin",
-        "bot_running": True
+        "bot_running": True,
+        "readiness": readiness
     }
 
+@app.post("/telegram/webhook")
+async def telegram_webhook(request: Request):
+    """
+    Recebe updates do Telegram (TELEGRAM_MODE=webhook)
+
+    Só grava o update na fila durável e responde 200; o processamento
+    acontece nos workers (ou no consumidor do próprio processo).
+    """
+    from fastapi.responses import JSONResponse
+
+    update_queue = getattr(request.app.state, "update_queue", None)
+    if update_queue is None:
+        return JSONResponse({"ok": False, "error": "webhook desativado"}, status_code=404)
+
+    # Sem segredo configurado nada é aceito (lifespan já recusa subir assim)
+    secret = Config.TELEGRAM_WEBHOOK_SECRET
+    received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not hmac.compare_digest(received.encode(), secret.encode()):
+        return JSONResponse({"ok": False}, status_code=403)
+
+    try:
+        payload = await request.json()
+        queued = await asyncio.to_thread(update_queue.enqueue, payload)
+    except ValueError as e:
+        # JSON inválido ou sem update_id: reenviar não adianta
+        logger.warning(f"⚠️ Update do webhook ignorado: {e}")
+        return {"ok": True, "queued": False}
+
+    consumer = request.app.state.queue_consumer
+    if consumer is not None:
+        consumer.notify()
+
+    return {"ok": True, "queued": queued}
+
+@app.get("/telegram/queue")
+async def telegram_queue_stats(request: Request, admin: Dict = Depends(require_master)):
+    """Estado da fila de updates por partição (modo webhook, apenas Master Admin)"""
+    update_queue = getattr(request.app.state, "update_queue", None)
+    if update_queue is None:
+        return {"mode": Config.TELEGRAM_MODE}
+    stats = await asyncio.to_thread(update_queue.stats)
+    return {"mode": Config.TELEGRAM_MODE, **stats}
+
 @app.get("/test/proactive")
 async def test_proactive():
     """
@@ -863,6 +974,8 @@ async def test_consolidation(user_id: str = None):
         }
 
         consolidator = MemoryConsolidator(bot_state.db)
+        # Durante o aquecimento chroma_enabled ainda é False: esperar antes de decidir
+        await asyncio.to_thread(bot_state.db.chroma_ready)
 
         # Se user_id especificado, consolidar apenas esse usuário
         if user_id:
@@ -873,7 +986,7 @@ async def test_consolidation(user_id: str = None):
 
                 # Buscar memórias consolidadas criadas
                 if bot_state.db.chroma_enabled:
-                    consolidated_docs = bot_state.db.vectorstore._collection.get(
+                    consolidated_docs = bot_state.db.vector_store_for(user_id)._collection.get(
                         where={
                             "$and": [
                                 {"user_id": {"$eq": user_id}},
@@ -936,7 +1049,7 @@ async def test_consolidation(user_id: str = None):
 
                     # Contar consolidadas criadas
                     if bot_state.db.chroma_enabled:
-                        consolidated_docs = bot_state.db.vectorstore._collection.get(
+                        consolidated_docs = bot_state.db.vector_store_for(uid)._collection.get(
                             where={
                                 "$and": [
                                     {"user_id": {"$eq": uid}},
@@ -967,7 +1080,7 @@ async def test_consolidation(user_id: str = None):
         # Estatísticas globais de consolidação
         if bot_state.db.chroma_enabled:
             try:
-                all_consolidated = bot_state.db.vectorstore._collection.get(
+                all_consolidated = bot_state.db.vector_partitions.get(
                     where={"type": {"$eq": "consolidated"}}
                 )
 
@@ -1024,6 +1137,7 @@ async def memory_metrics(user_id: str = None, format: str = "json"):
         from jung_memory_metrics import MemoryQualityMetrics, generate_formatted_system_report
 
         metrics = MemoryQualityMetrics(bot_state.db)
+        await asyncio.to_thread(bot_state.db.chroma_ready)
 
         # Relatório individual
         if user_id:
@@ -20,11 +20,34 @@ Configuração via variáveis de ambiente:
     OPENAI_API_KEY     → Para embeddings (já existe no projeto, usado pelo ChromaDB)
     OPENROUTER_API_KEY → Para extração de fatos via LLM (já existe)
     MEM0_LLM_MODEL     → Modelo para extração (default: openai/gpt-4o-mini)
+    MEM0_ASYNC_WRITES  → "true" (padrão): add_exchange enfileira e um worker envia em lote
+    MEM0_CONTEXT_TTL_S → TTL do cache de get_context por usuário/consulta (0 = sem cache)
+    MEM0_BACKEND       → "local" usa LocalMemoryStore (testes/benchmarks, sem Qdrant)
+
+Gravações assíncronas: add_exchange rodava no fim de cada save_conversation
+(extração por LLM + escrita no Qdrant, segundos de latência remota). Com
+MEM0_ASYNC_WRITES as trocas vão para uma fila; uma thread daemon junta até
+BATCH_SIZE trocas (ou espera FLUSH_INTERVAL_S), faz um mem.add por usuário
+com as mensagens concatenadas e reenfileira com backoff exponencial em caso
+de erro (até MAX_RETRIES). close() drena a fila no desligamento.
+
+Leituras: get_context guarda o resultado por (usuário, consulta normalizada)
+por CONTEXT_TTL_S; um envio bem-sucedido para o usuário invalida o cache dele.
+Cada invalidação avança a geração do usuário: uma busca que começou antes do
+envio não grava o resultado (já velho) no cache.
 """
 
 import os
+import re
+import time
+import heapq
+import atexit
 import logging
-from typing import Optional
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +57,8 @@ def _build_mem0_config() -> dict:
     Constrói configuração do mem0 usando Qdrant Cloud como vector store.
 
     - Vector store: Qdrant Cloud (persistente, gratuito)
-    - Embeddings: HuggingFace (Open Source, local - all-MiniLM-L6-v2)
+    - Embeddings: all-MiniLM-L6-v2 local; com EMBEDDING_BACKEND=onnx usa a
+      mesma instância ONNX int8 do ChromaDB (embedding_backends.get_embeddings)
     - LLM extração: openai/gpt-4o-mini via OpenRouter
     """
     qdrant_url = os.getenv("QDRANT_URL")
@@ -47,6 +71,19 @@ def _build_mem0_config() -> dict:
     if not llm_api_key:
         raise ValueError("OPENROUTER_API_KEY necessário para LLM do mem0")
         
+    embedder = {
+        "provider": "huggingface",
+        "config": {
+            "model": "all-MiniLM-L6-v2"
+        },
+    }
+    if os.getenv("EMBEDDING_BACKEND", "torch").lower() == "onnx":
+        from embedding_backends import EMBEDDING_DIMS, get_embeddings
+        embedder = {
+            "provider": "langchain",
+            "config": {"model": get_embeddings(), "embedding_dims": EMBEDDING_DIMS},
+        }
+
     llm_model = os.getenv("MEM0_LLM_MODEL", "openai/gpt-4o-mini")
     llm_base_url = os.getenv("MEM0_LLM_BASE_URL", "https://openrouter.ai/api/v1")
 
@@ -67,33 +104,207 @@ def _build_mem0_config() -> dict:
                 "openai_base_url": llm_base_url,
             },
         },
-        "embedder": {
-            "provider": "huggingface",
-            "config": {
-                "model": "all-MiniLM-L6-v2"
-            },
-        },
+        "embedder": embedder,
     }
 
 
+def _normalize_query(query: str) -> str:
+    """Chave do cache: minúsculas, sem acento/pontuação, espaços colapsados"""
+    folded = unicodedata.normalize("NFKD", (query or "").lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", folded))
+
+
+class ContextCache:
+    """Resultados de get_context por usuário, com TTL e LRU por usuário"""
+
+    MAX_PER_USER = 32
+
+    def __init__(self, ttl_s: float, max_per_user: int = MAX_PER_USER):
+        self.ttl_s = ttl_s
+        self.max_per_user = max_per_user
+        self._entries: Dict[str, "OrderedDict[Tuple[str, int], Tuple[float, str]]"] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, user_id: str) -> int:
+        """Número de invalidações do usuário (ler antes da busca, passar ao put)"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, user_id: str, key: Tuple[str, int]) -> Optional[str]:
+        with self._lock:
+            entries = self._entries.get(user_id)
+            item = entries.get(key) if entries else None
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return item[1]
+
+    def put(self, user_id: str, key: Tuple[str, int], value: str,
+            generation: Optional[int] = None) -> bool:
+        """Grava o resultado; False se o usuário foi invalidado desde generation"""
+        with self._lock:
+            if generation is not None and self._generations.get(user_id, 0) != generation:
+                return False
+            entries = self._entries.setdefault(user_id, OrderedDict())
+            entries[key] = (time.monotonic() + self.ttl_s, value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_per_user:
+                entries.popitem(last=False)
+            return True
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+class LocalMemoryStore:
+    """
+    Substituto local de mem0.Memory (add/search/get_all) para testes
+
+    Cada mensagem do usuário vira uma memória; a busca é cosseno sobre
+    contagem de termos. latency_s simula a latência do serviço remoto.
+    """
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self._memories: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self.calls = {"add": 0, "search": 0, "get_all": 0}
+
+    @staticmethod
+    def _terms(text: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for term in _normalize_query(text).split():
+            counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def add(self, messages: List[Dict], user_id: str, **kwargs) -> Dict:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        added = []
+        with self._lock:
+            self.calls["add"] += 1
+            memories = self._memories.setdefault(user_id, [])
+            for message in messages:
+                if message.get("role") == "user" and message.get("content"):
+                    memory = {"id": str(len(memories)), "memory": message["content"],
+                              "terms": self._terms(message["content"])}
+                    memories.append(memory)
+                    added.append({"id": memory["id"], "memory": memory["memory"], "event": "ADD"})
+        return {"results": added}
+
+    def search(self, query: str, user_id: str, limit: int = 10, **kwargs) -> Dict:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        query_terms = self._terms(query)
+        query_norm = sum(v * v for v in query_terms.values()) ** 0.5
+        with self._lock:
+            self.calls["search"] += 1
+            memories = list(self._memories.get(user_id, []))
+        scored = []
+        for memory in memories:
+            dot = sum(count * memory["terms"].get(term, 0) for term, count in query_terms.items())
+            if dot:
+                norm = sum(v * v for v in memory["terms"].values()) ** 0.5
+                scored.append({"id": memory["id"], "memory": memory["memory"],
+                               "score": dot / (query_norm * norm)})
+        scored.sort(key=lambda m: m["score"], reverse=True)
+        return {"results": scored[:limit]}
+
+    def get_all(self, user_id: str, **kwargs) -> Dict:
+        with self._lock:
+            self.calls["get_all"] += 1
+            return {"results": [{"id": m["id"], "memory": m["memory"]} for m in self._memories.get(user_id, [])]}
+
+
+@dataclass(order=True)
+class _PendingExchange:
+    not_before: float
+    seq: int
+    user_id: str = field(compare=False)
+    messages: List[Dict] = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
 class Mem0MemoryAdapter:
     """
     Interface unificada entre jung_core.py e mem0 + Qdrant Cloud.
 
     Substitui: build_rich_context(), flush_if_needed(), LLMFactExtractor.
+
+    Args:
+        memory: objeto com add/search/get_all (None = mem0.Memory com Qdrant Cloud)
+        async_writes: add_exchange enfileira para o worker em lote
+        context_ttl_s: TTL do cache de get_context (0 = sem cache)
     """
 
-    def __init__(self):
-        from mem0 import Memory
-        config = _build_mem0_config()
-        self.mem = Memory.from_config(config)
-        logger.info("✅ [MEM0] Adaptador inicializado (Qdrant Cloud)")
+    BATCH_SIZE = 20
+    FLUSH_INTERVAL_S = 2.0
+    MAX_QUEUE = 5000
+    MAX_RETRIES = 5
+    RETRY_BASE_S = 1.0
+    RETRY_MAX_S = 60.0
+    CONTEXT_TTL_S = 60.0
+
+    def __init__(self, memory=None, async_writes: bool = False, batch_size: int = BATCH_SIZE,
+                 flush_interval_s: float = FLUSH_INTERVAL_S, max_retries: int = MAX_RETRIES,
+                 context_ttl_s: float = 0.0):
+        if memory is None:
+            from mem0 import Memory
+            memory = Memory.from_config(_build_mem0_config())
+        self.mem = memory
+        self.async_writes = async_writes
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+        self.cache = ContextCache(context_ttl_s) if context_ttl_s > 0 else None
+
+        self.stats = {
+            "queued": 0, "sent": 0, "add_calls": 0, "retries": 0, "dropped": 0,
+            "cache_hits": 0, "cache_misses": 0,
+        }
+        self._queue: deque = deque()
+        self._delayed: List[_PendingExchange] = []  # heap por not_before (retentativas)
+        self._in_flight = 0
+        self._seq = 0
+        self._closing = False
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+        if async_writes:
+            self._worker = threading.Thread(target=self._run_worker, name="mem0-sync", daemon=True)
+            self._worker.start()
+            atexit.register(self.close)
+
+        logger.info(
+            f"✅ [MEM0] Adaptador inicializado ({type(memory).__name__}, "
+            f"gravação {'assíncrona em lote' if async_writes else 'síncrona'}, "
+            f"cache {f'{context_ttl_s:.0f}s' if self.cache else 'desligado'})"
+        )
 
     def get_context(self, user_id: str, query: str, limit: int = 10) -> str:
         """
         Retorna contexto formatado para injeção no system prompt.
         Substitui build_rich_context().
         """
+        cache_key = (_normalize_query(query), limit)
+        generation = None
+        if self.cache is not None:
+            cached = self.cache.get(user_id, cache_key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            self.stats["cache_misses"] += 1
+            # Um envio durante a busca invalida o usuário: o resultado não vai para o cache
+            generation = self.cache.generation(user_id)
+
         try:
             results = self.mem.search(query=query, user_id=user_id, limit=limit)
             memories = results.get("results", []) if isinstance(results, dict) else results
@@ -109,6 +320,8 @@ class Mem0MemoryAdapter:
 
             context = "\n".join(lines)
             logger.info(f"✅ [MEM0] Contexto recuperado: {len(context)} chars ({len(memories)} memórias)")
+            if self.cache is not None:
+                self.cache.put(user_id, cache_key, context, generation)
             return context
 
         except Exception as e:
@@ -119,13 +332,27 @@ class Mem0MemoryAdapter:
         """
         Persiste um par (usuário, assistente) no mem0.
         mem0 extrai fatos automaticamente via LLM.
+
+        Com async_writes só enfileira; o worker envia em lote.
         """
+        messages = [
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": ai_response},
+        ]
+        if self.async_writes and not self._closing:
+            with self._cond:
+                if len(self._queue) + len(self._delayed) < self.MAX_QUEUE:
+                    self._seq += 1
+                    self._queue.append(_PendingExchange(time.monotonic(), self._seq, user_id, messages))
+                    self.stats["queued"] += 1
+                    self._cond.notify()
+                    return
+            logger.warning("⚠️ [MEM0] Fila de sincronização cheia - gravando de forma síncrona")
+
         try:
-            messages = [
-                {"role": "user", "content": user_input},
-                {"role": "assistant", "content": ai_response},
-            ]
             result = self.mem.add(messages=messages, user_id=user_id)
+            if self.cache is not None:
+                self.cache.invalidate(user_id)
 
             n_added = 0
             if isinstance(result, dict):
@@ -137,6 +364,117 @@ class Mem0MemoryAdapter:
         except Exception as e:
             logger.warning(f"⚠️ [MEM0] Erro ao persistir troca: {e}")
 
+    # ------------------------------------------------------------------
+    # Worker de sincronização em lote
+    # ------------------------------------------------------------------
+
+    def _next_batch(self) -> Optional[List[_PendingExchange]]:
+        """Bloqueia até haver um lote pronto; None quando fechado e vazio"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and (self._delayed[0].not_before <= now or self._closing):
+                    self._queue.append(heapq.heappop(self._delayed))
+
+                if self._queue:
+                    # Espera o lote encher até o item mais antigo completar o intervalo
+                    wait = self._queue[0].not_before + self.flush_interval_s - now
+                    if (len(self._queue) >= self.batch_size or wait <= 0
+                            or self._closing or self._flush_requested):
+                        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                        self._in_flight += len(batch)
+                        return batch
+                elif self._closing:
+                    return None
+                else:
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    wait = self._delayed[0].not_before - now if self._delayed else None
+
+                self._cond.wait(wait)
+
+    def _run_worker(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._send_batch(batch)
+            finally:
+                with self._cond:
+                    self._in_flight -= len(batch)
+                    self._cond.notify_all()
+
+    def _send_batch(self, batch: List[_PendingExchange]) -> None:
+        """Um mem.add por usuário do lote, com as trocas concatenadas em ordem"""
+        by_user: Dict[str, List[_PendingExchange]] = {}
+        for item in batch:
+            by_user.setdefault(item.user_id, []).append(item)
+
+        for user_id, items in by_user.items():
+            messages = [message for item in items for message in item.messages]
+            try:
+                self.mem.add(messages=messages, user_id=user_id)
+                self.stats["add_calls"] += 1
+                self.stats["sent"] += len(items)
+                if self.cache is not None:
+                    self.cache.invalidate(user_id)
+            except Exception as e:
+                self._retry_later(items, e)
+
+        logger.info(f"✅ [MEM0] Lote sincronizado: {len(batch)} trocas, {len(by_user)} usuários")
+
+    def _retry_later(self, items: List[_PendingExchange], error: Exception) -> None:
+        with self._cond:
+            for item in items:
+                item.attempts += 1
+                # No desligamento não há backoff: uma tentativa extra e descarta
+                if item.attempts > self.max_retries or (self._closing and item.attempts > 1):
+                    self.stats["dropped"] += 1
+                    logger.error(f"❌ [MEM0] Troca descartada após {self.max_retries} tentativas "
+                                 f"(user={item.user_id[:8]}): {error}")
+                    continue
+                delay = min(self.RETRY_MAX_S, self.RETRY_BASE_S * 2 ** (item.attempts - 1))
+                item.not_before = time.monotonic() + delay
+                heapq.heappush(self._delayed, item)
+                self.stats["retries"] += 1
+            self._cond.notify_all()
+        logger.warning(f"⚠️ [MEM0] Falha ao sincronizar {len(items)} trocas, nova tentativa com backoff: {error}")
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue) + len(self._delayed) + self._in_flight
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Envia já o que está na fila e espera terminar (retentativas com
+        backoff ainda agendadas não são antecipadas); retorna se esvaziou
+        """
+        if self._worker is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Drena a fila (inclusive retentativas, sem backoff) e encerra o worker"""
+        if self._worker is None or self._closing:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        left = self.pending()
+        if left:
+            logger.warning(f"⚠️ [MEM0] {left} trocas não sincronizadas no desligamento")
+
     def get_all_facts(self, user_id: str) -> str:
         """Retorna todos os fatos do usuário como texto."""
         try:
@@ -167,12 +505,21 @@ def create_mem0_adapter() -> Optional[Mem0MemoryAdapter]:
     Factory: cria Mem0MemoryAdapter se QDRANT_URL estiver configurado.
     Retorna None em caso de falha (fallback SQLite/ChromaDB ativo).
     """
+    options = {
+        "async_writes": os.getenv("MEM0_ASYNC_WRITES", "true").lower() == "true",
+        "context_ttl_s": float(os.getenv("MEM0_CONTEXT_TTL_S", str(Mem0MemoryAdapter.CONTEXT_TTL_S))),
+    }
+
+    if os.getenv("MEM0_BACKEND", "").lower() == "local":
+        logger.info("ℹ️ [MEM0] MEM0_BACKEND=local — LocalMemoryStore em memória (sem Qdrant)")
+        return Mem0MemoryAdapter(memory=LocalMemoryStore(), **options)
+
     if not os.getenv("QDRANT_URL"):
         logger.info("ℹ️ [MEM0] QDRANT_URL ausente — usando sistema ChromaDB/SQLite existente")
         return None
 
     try:
-        return Mem0MemoryAdapter()
+        return Mem0MemoryAdapter(**options)
     except ImportError:
         logger.warning("⚠️ [MEM0] mem0ai não instalado — usando ChromaDB/SQLite")
         return None
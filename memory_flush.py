@@ -13,10 +13,14 @@ Uso:
 import logging
 from typing import List, Dict, Optional
 
+from context_packer import ContextPacker, ContextSegment, truncate_to_tokens
+
 logger = logging.getLogger(__name__)
 
 FLUSH_THRESHOLD = 20          # mensagens no chat_history antes de disparar flush
 KEEP_RECENT = 12              # quantas mensagens manter após flush
+FLUSH_BLOCK_TOKEN_BUDGET = 1500   # trecho enviado ao LLM de extração
+FLUSH_MESSAGE_MAX_TOKENS = 120    # por mensagem (antes: 300 caracteres)
 
 
 def flush_if_needed(
@@ -60,10 +64,15 @@ def _extract_and_persist(
     os persiste em user_facts_v2 e no log diário.
     """
     # Montar texto das mensagens para o LLM analisar
-    text_block = "\n".join(
-        f"{'Usuário' if m['role'] == 'user' else 'Jung'}: {m['content'][:300]}"
-        for m in messages
-    )
+    # Mensagens mais recentes têm prioridade se o trecho exceder o orçamento
+    text_block = ContextPacker(FLUSH_BLOCK_TOKEN_BUDGET).pack([ContextSegment(
+        name="flush", priority=0, keep_tail=True,
+        items=[
+            f"{'Usuário' if m['role'] == 'user' else 'Jung'}: "
+            f"{truncate_to_tokens(m['content'], FLUSH_MESSAGE_MAX_TOKENS)}"
+            for m in messages
+        ]
+    )]).text
 
     prompt = (
         "Analise o trecho de conversa abaixo e extraia APENAS os fragmentos "
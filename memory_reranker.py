@@ -0,0 +1,192 @@
+"""
+memory_reranker.py - Reranking Vetorizado das Memórias do ChromaDB
+==================================================================
+
+_rerank_memories rodava, para cada candidato do broad retrieval (até 36
+por mensagem), duas regex com DOTALL sobre page_content para recuperar
+input/resposta, quebrava topics/mentions_people em sets, montava um dict
+grande e logava cada hit em INFO.
+
+Agora:
+- input/resposta vêm dos metadados input_preview/response_preview
+  (gravados em _index_conversation_vector); a regex só roda para
+  documentos antigos sem esses campos, e só no top-k
+- os seis boosts são calculados como arrays NumPy sobre todos os
+  candidatos; dicts só são montados para os top_k finais
+- topics/mentions_people viram frozensets memoizados por string
+- detalhes por hit vão para DEBUG
+
+As regras dos boosts são as mesmas de antes (inclusive a faixa de
+intensidade emocional > 2.5, que nunca foi alcançada e segue assim).
+"""
+
+import re
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_CHARS = 1000
+
+# Boost temporal por modo: (limites em dias, valores); valores[i] vale até limites[i],
+# o último vale acima do maior limite. Mesma tabela de calculate_temporal_boost.
+TEMPORAL_BOOST_STEPS = {
+    "recent_focused": ((7, 30, 90), (1.5, 1.2, 1.0, 0.7)),
+    "balanced": ((30, 90), (1.2, 1.0, 0.9)),
+    "archeological": ((30, 90), (1.0, 1.1, 1.3)),
+}
+
+_INPUT_RE = re.compile(r"Input:\s*(.+?)(?:\n|Resposta:|$)", re.DOTALL)
+_RESPONSE_RE = re.compile(r"Resposta:\s*(.+?)(?:\n|===|$)", re.DOTALL)
+
+
+def first_line_preview(text: str) -> str:
+    """Primeira linha do texto (o que a regex extraía de page_content), limitada"""
+    return (text or "").split("\n", 1)[0].strip()[:PREVIEW_CHARS]
+
+
+def temporal_boost_for_days(days_ago: int, mode: str) -> float:
+    steps = TEMPORAL_BOOST_STEPS.get(mode)
+    if steps is None:
+        return 1.0
+    limits, values = steps
+    for limit, value in zip(limits, values):
+        if days_ago <= limit:
+            return value
+    return values[-1]
+
+
+def _temporal_boosts(days_ago: np.ndarray, valid: np.ndarray, mode: str) -> np.ndarray:
+    steps = TEMPORAL_BOOST_STEPS.get(mode)
+    if steps is None:
+        return np.ones(len(days_ago))
+    limits, values = steps
+    boosts = np.asarray(values)[np.searchsorted(np.asarray(limits), days_ago, side="left")]
+    return np.where(valid, boosts, 1.0)
+
+
+@lru_cache(maxsize=4096)
+def _split_set(value: str) -> FrozenSet[str]:
+    """'a, b,,c' → {'a', 'b', 'c'} (memoizado: as mesmas listas se repetem entre hits)"""
+    return frozenset(item.strip() for item in str(value).split(",") if item.strip())
+
+
+def _content(metadata: Dict, page_content: str, field: str, pattern: "re.Pattern") -> str:
+    preview = metadata.get(field)
+    if preview is not None:
+        return preview
+    # Documento anterior aos previews nos metadados
+    match = pattern.search(page_content)
+    return match.group(1).strip() if match else ""
+
+
+def rerank(results: List[tuple], user_id: str, query_names: Iterable[str], query_topics: Iterable[str],
+           temporal_mode: str = "balanced", top_k: Optional[int] = None,
+           now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Ordena (Document, distância) pelo score combinado e materializa o top_k
+
+    Args:
+        results: saída de similarity_search_with_score
+        query_names / query_topics: pessoas e tópicos detectados na consulta
+        temporal_mode: modo do boost temporal ("neutral" = sem boost)
+        top_k: quantas memórias montar (None = todas)
+
+    Returns:
+        Lista de memórias (mesmo formato de antes) por final_score decrescente
+    """
+    now = now or datetime.now()
+    user_id = str(user_id)
+    query_names = set(query_names)
+    query_topics = set(query_topics)
+
+    docs, metadatas, distances = [], [], []
+    for doc, distance in results:
+        metadata = doc.metadata or {}
+        # Validação extra: descartar documento de outro usuário
+        if str(metadata.get("user_id", "")) != user_id:
+            logger.error(f"🚨 Removendo doc com user_id='{metadata.get('user_id')}' (esperado='{user_id}')")
+            continue
+        docs.append(doc)
+        metadatas.append(metadata)
+        distances.append(distance)
+
+    n = len(docs)
+    if n == 0:
+        return []
+
+    # Uma passada em Python só para ler os metadados; a conta é em arrays
+    days_ago, emotional, depth, conflicts, topic_overlap, person_match = [], [], [], [], [], []
+    valid_time = []
+    for metadata in metadatas:
+        try:
+            days_ago.append((now - datetime.fromisoformat(metadata.get("timestamp", ""))).days)
+            valid_time.append(True)
+        except (TypeError, ValueError):
+            days_ago.append(0)
+            valid_time.append(False)
+        emotional.append(metadata.get("emotional_intensity") or 0.0)
+        depth.append(metadata.get("existential_depth") or 0.0)
+        conflicts.append(bool(metadata.get("has_conflicts", False)))
+        topics = metadata.get("topics")
+        topic_overlap.append(len(query_topics & _split_set(topics)) if query_topics and topics else 0)
+        people = metadata.get("mentions_people")
+        person_match.append(bool(query_names & _split_set(people)) if query_names and people else False)
+
+    days_ago = np.asarray(days_ago)
+    valid_time = np.asarray(valid_time)
+    emotional = np.asarray(emotional, dtype=np.float64)
+    depth = np.asarray(depth, dtype=np.float64)
+    conflicts = np.asarray(conflicts)
+    topic_overlap = np.asarray(topic_overlap, dtype=np.float64)
+    person_match = np.asarray(person_match)
+
+    similarity = 1.0 - np.asarray(distances, dtype=np.float64)
+    temporal_boost = _temporal_boosts(days_ago, valid_time, temporal_mode)
+    emotional_boost = np.where(emotional > 1.5, 1.3, 1.0)
+    topic_boost = np.where(topic_overlap > 0, 1.2 + topic_overlap * 0.1, 1.0)
+    person_boost = np.where(person_match, 1.5, 1.0)
+    depth_boost = np.where(depth > 0.7, 1.15, 1.0)
+    conflict_boost = np.where(conflicts, 1.1, 1.0)
+
+    final = similarity * temporal_boost * emotional_boost * topic_boost * person_boost * depth_boost * conflict_boost
+
+    order = np.argsort(-final, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+
+    reranked = []
+    for i in order:
+        metadata = metadatas[i]
+        page_content = docs[i].page_content
+        reranked.append({
+            "conversation_id": metadata.get("conversation_id"),
+            "user_input": _content(metadata, page_content, "input_preview", _INPUT_RE),
+            "ai_response": _content(metadata, page_content, "response_preview", _RESPONSE_RE),
+            "timestamp": metadata.get("timestamp", ""),
+            "base_score": distances[i],
+            "similarity_score": float(similarity[i]),
+            "final_score": float(final[i]),
+            "boosts": {
+                "temporal": round(float(temporal_boost[i]), 2),
+                "emotional": round(float(emotional_boost[i]), 2),
+                "topic": round(float(topic_boost[i]), 2),
+                "person": round(float(person_boost[i]), 2),
+                "depth": round(float(depth_boost[i]), 2),
+                "conflict": round(float(conflict_boost[i]), 2),
+            },
+            "metadata": metadata,
+            "full_document": page_content,
+            "keywords": metadata.get("keywords", "").split(","),
+            "tension_level": metadata.get("tension_level", 0.0),
+        })
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for rank, mem in enumerate(reranked[:3], 1):
+            logger.debug(f"   {rank}. base={mem['base_score']:.3f}, similarity={mem['similarity_score']:.3f}, "
+                         f"final={mem['final_score']:.3f} boosts={mem['boosts']} input={mem['user_input'][:60]}")
+    return reranked
@@ -32,9 +32,15 @@ logger = logging.getLogger(__name__)
 class PsychometricPDFGenerator:
     """Gerador de relatórios PDF psicométricos profissionais"""
 
+    # Folha de estilos montada uma vez por processo (só é lida na geração)
+    _shared_styles = None
+
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
+        if PsychometricPDFGenerator._shared_styles is None:
+            self.styles = getSampleStyleSheet()
+            self._setup_custom_styles()
+            PsychometricPDFGenerator._shared_styles = self.styles
+        self.styles = PsychometricPDFGenerator._shared_styles
 
     def _setup_custom_styles(self):
         """Cria estilos customizados para o PDF"""
@@ -586,3 +592,32 @@ def generate_psychometric_pdf(
         vark=vark,
         values=values
     )
+
+
+def render_psychometric_pdf_file(output_path: str, **report) -> int:
+    """
+    Gera o PDF direto em disco (usado pelo worker `python -m pdf_generator` do report_cache)
+
+    Escreve num arquivo temporário e renomeia, para que leitores nunca vejam
+    um PDF parcial.
+
+    Returns:
+        Tamanho do arquivo em bytes
+    """
+    import os
+
+    buffer = generate_psychometric_pdf(**report)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getbuffer())
+    os.replace(tmp_path, output_path)
+    return os.path.getsize(output_path)
+
+
+if __name__ == "__main__":
+    # Worker de renderização (report_cache): JSON {output_path, report} via stdin
+    import sys
+    import json
+
+    job = json.load(sys.stdin)
+    render_psychometric_pdf_file(job["output_path"], **job["report"])
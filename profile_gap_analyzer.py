@@ -78,12 +78,14 @@ class ProfileGapAnalyzer:
         ]
     }
 
-    def __init__(self, db):
+    def __init__(self, db, item_selector=None):
         """
         Args:
             db: DatabaseManager instance
+            item_selector: irt_engine.AdaptiveItemSelector (opcional)
         """
         self.db = db
+        self.item_selector = item_selector
 
     def analyze_gaps(self, user_id: str) -> Dict:
         """
@@ -442,16 +444,40 @@ class ProfileGapAnalyzer:
         """
         Retorna a próxima dimensão que deve receber pergunta estratégica
 
-        Método rápido para integração com sistema proativo
+        Método rápido para integração com sistema proativo. Com item_selector,
+        usa a seleção adaptativa TRI (maior redução de SE); senão, a análise
+        de gaps por palavras-chave.
 
         Returns:
             str: "openness", "conscientiousness", etc.
             None: Se perfil está completo
         """
 
+        item = self.get_next_strategic_item(user_id)
+        if item:
+            return item["domain"]
+
         gaps = self.analyze_gaps(user_id)
 
         if gaps["priority_questions"]:
             return gaps["priority_questions"][0]["dimension"]
 
         return None
+
+    def get_next_strategic_item(self, user_id: str) -> Optional[Dict]:
+        """
+        Retorna o fragmento TRI de maior informação esperada para o usuário
+
+        Returns:
+            Dict do AdaptiveItemSelector (domain, facet_code, fragment_id, ...)
+            None: Sem seletor, sem banco de itens ou todos os domínios confiáveis
+        """
+
+        if not self.item_selector:
+            return None
+
+        try:
+            return self.item_selector.select_next(user_id)
+        except Exception as e:
+            logger.warning(f"⚠️  Seleção adaptativa indisponível: {e}")
+            return None
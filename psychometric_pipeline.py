@@ -0,0 +1,379 @@
+"""
+psychometric_pipeline.py - Pipeline Psicométrico em Lote
+=========================================================
+
+Gera Big Five, VARK e Valores de Schwartz numa única chamada ao LLM e
+reaproveita a mesma janela de conversas na extração de evidências.
+
+A janela (conversas + transcrições formatadas + índice por ID) é montada
+uma única vez e fica em cache por (usuário, última conversa): enquanto o
+usuário não conversar de novo, regenerar análises ou evidências não
+precisa reler nem reformatar o histórico.
+
+Seções que faltarem na resposta em lote caem para os métodos individuais
+do HybridDatabaseManager (analyze_big_five, analyze_learning_style,
+analyze_personal_values), preservando o comportamento anterior.
+
+Autor: Sistema Jung
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from evidence_extractor import EvidenceExtractor, Evidence
+
+logger = logging.getLogger(__name__)
+
+
+BIG_FIVE_DIMENSIONS = ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']
+
+SCHWARTZ_VALUES = [
+    'self_direction', 'stimulation', 'hedonism', 'achievement', 'power',
+    'security', 'conformity', 'tradition', 'benevolence', 'universalism'
+]
+
+
+@dataclass
+class ConversationWindow:
+    """Janela de conversas de um usuário, formatada uma única vez"""
+    user_id: str
+    last_conversation_id: int
+    conversations: List[Dict]
+    by_id: Dict[int, Dict]
+    analysis_transcript: str  # Big Five / VARK / Schwartz
+    evidence_transcript: str  # EvidenceExtractor (com IDs e timestamps)
+
+
+class PsychometricPipeline:
+    """Análises psicométricas e evidências com o mínimo de chamadas ao LLM"""
+
+    # Mesmo tamanho de janela usado por analyze_big_five / extração de evidências
+    WINDOW_LIMIT = 50
+    # Conversas enviadas na análise (analyze_big_five usava as últimas 30)
+    ANALYSIS_CONVERSATIONS = 30
+    # Janelas mantidas em memória (LRU)
+    WINDOW_CACHE_SIZE = 64
+
+    def __init__(self, db_manager, llm_provider=None):
+        """
+        Args:
+            db_manager: Instância do HybridDatabaseManager (jung_core)
+            llm_provider: Provider de LLM; se None, cria "claude" sob demanda
+        """
+        self.db = db_manager
+        self._llm = llm_provider
+        self._windows: "OrderedDict[Tuple, ConversationWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "window_hits": 0,
+            "window_misses": 0,
+            "llm_calls": 0,
+            "fallbacks": 0
+        }
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from llm_providers import create_llm_provider
+            self._llm = create_llm_provider("claude")
+        return self._llm
+
+    # ============================================================
+    # JANELA DE CONVERSAS
+    # ============================================================
+
+    def _window_key(self, user_id: str) -> Tuple:
+        """(usuário, última conversa, total) - muda sempre que o histórico muda"""
+        cursor = self.db.conn.cursor()
+        cursor.execute("""
+            SELECT MAX(id), COUNT(*) FROM conversations
+            WHERE user_id = ?
+              AND (platform IS NULL OR platform NOT IN ('proactive', 'proactive_rumination'))
+        """, (user_id,))
+        row = cursor.fetchone()
+        return (user_id, row[0] or 0, row[1] or 0)
+
+    def get_window(self, user_id: str) -> ConversationWindow:
+        """Retorna a janela de conversas do usuário (cacheada pela última conversa)"""
+        key = self._window_key(user_id)
+
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None:
+                self._windows.move_to_end(key)
+                self.stats["window_hits"] += 1
+                return window
+
+        conversations = self.db.get_user_conversations(user_id, limit=self.WINDOW_LIMIT)
+
+        convo_texts = []
+        for c in conversations[:self.ANALYSIS_CONVERSATIONS]:
+            convo_texts.append(f"Usuário: {c['user_input']}")
+            convo_texts.append(f"Resposta: {(c['ai_response'] or '')[:200]}")
+
+        window = ConversationWindow(
+            user_id=user_id,
+            last_conversation_id=key[1],
+            conversations=conversations,
+            by_id={c['id']: c for c in conversations},
+            analysis_transcript="\n\n".join(convo_texts),
+            evidence_transcript=EvidenceExtractor._format_conversations_with_ids(conversations)
+        )
+
+        with self._lock:
+            self.stats["window_misses"] += 1
+            # Versões antigas da janela deste usuário não serão mais usadas
+            for stale in [k for k in self._windows if k[0] == user_id]:
+                del self._windows[stale]
+            self._windows[key] = window
+            while len(self._windows) > self.WINDOW_CACHE_SIZE:
+                self._windows.popitem(last=False)
+
+        return window
+
+    def invalidate(self, user_id: str) -> None:
+        """Remove a janela em cache de um usuário"""
+        with self._lock:
+            for stale in [k for k in self._windows if k[0] == user_id]:
+                del self._windows[stale]
+
+    # ============================================================
+    # ANÁLISES EM LOTE
+    # ============================================================
+
+    def run_analyses(self, user_id: str, min_conversations: int = 20) -> Dict[str, Dict]:
+        """
+        Gera as 4 análises psicométricas
+
+        Big Five, VARK e Schwartz (quando não há valores suficientes em
+        user_facts) saem de uma única chamada ao LLM; EQ não usa LLM.
+
+        Returns:
+            Dict com chaves 'big_five', 'eq', 'vark', 'values' no mesmo
+            formato dos métodos analyze_* do HybridDatabaseManager
+        """
+        window = self.get_window(user_id)
+
+        if len(window.conversations) < min_conversations:
+            # Sem dados suficientes: os métodos individuais retornam o erro sem chamar o LLM
+            return {
+                "big_five": self.db.analyze_big_five(user_id, min_conversations=min_conversations),
+                "eq": self.db.analyze_emotional_intelligence(user_id),
+                "vark": self.db.analyze_learning_style(user_id, min_conversations=min_conversations),
+                "values": self.db.analyze_personal_values(user_id, min_conversations=min_conversations)
+            }
+
+        include_values = self._count_value_facts(user_id) < 3
+
+        logger.info(f"🧪 Análise psicométrica em lote para {user_id} "
+                    f"({len(window.conversations)} conversas, valores={'LLM' if include_values else 'user_facts'})")
+
+        sections = self._analyze_batched(window, include_values)
+
+        big_five = sections.get("big_five")
+        if big_five is None:
+            self.stats["fallbacks"] += 1
+            big_five = self.db.analyze_big_five(user_id, min_conversations=min_conversations)
+
+        vark = sections.get("vark")
+        if vark is None:
+            self.stats["fallbacks"] += 1
+            vark = self.db.analyze_learning_style(user_id, min_conversations=min_conversations)
+
+        values = sections.get("values")
+        if values is None:
+            if include_values:
+                self.stats["fallbacks"] += 1
+            values = self.db.analyze_personal_values(user_id, min_conversations=min_conversations)
+
+        return {
+            "big_five": big_five,
+            "eq": self.db.analyze_emotional_intelligence(user_id),
+            "vark": vark,
+            "values": values
+        }
+
+    def _count_value_facts(self, user_id: str) -> int:
+        cursor = self.db.conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM user_facts
+            WHERE user_id = ? AND fact_category = 'values' AND is_current = 1
+        """, (user_id,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _analyze_batched(self, window: ConversationWindow, include_values: bool) -> Dict[str, Dict]:
+        """
+        Uma chamada ao LLM com seções big_five / vark / values
+
+        Returns:
+            Dict apenas com as seções válidas (vazio em caso de erro)
+        """
+        prompt = self._create_batched_prompt(window, include_values)
+
+        try:
+            self.stats["llm_calls"] += 1
+            response = self.llm.get_response(prompt, temperature=0.5, max_tokens=4500)
+            data = self.db._parse_json_response(response)
+        except Exception as e:
+            logger.warning(f"⚠️ Análise em lote falhou, usando análises individuais: {e}")
+            return {}
+
+        metadata = {
+            "conversations_analyzed": len(window.conversations),
+            "analysis_date": datetime.now().isoformat(),
+            "model_used": self.llm.get_model_name()
+        }
+
+        sections = {}
+
+        big_five = data.get("big_five")
+        if self._valid_big_five(big_five):
+            big_five.update(metadata)
+            sections["big_five"] = big_five
+            logger.info(f"✅ Big Five (lote): O={big_five['openness']['score']}, C={big_five['conscientiousness']['score']}, "
+                        f"E={big_five['extraversion']['score']}, A={big_five['agreeableness']['score']}, "
+                        f"N={big_five['neuroticism']['score']}")
+
+        vark = data.get("vark")
+        if isinstance(vark, dict) and "dominant_style" in vark and all(
+            k in vark for k in ("visual", "auditory", "reading", "kinesthetic")
+        ):
+            vark.update(metadata)
+            sections["vark"] = vark
+            logger.info(f"✅ VARK (lote): Dominante={vark['dominant_style']}")
+
+        values = data.get("values")
+        if include_values and isinstance(values, dict) and "top_3_values" in values and all(
+            isinstance(values.get(k), dict) for k in SCHWARTZ_VALUES
+        ):
+            values.update(metadata)
+            values["source"] = "claude_inference"
+            sections["values"] = values
+            logger.info(f"✅ Valores (lote): Top 3={values['top_3_values']}")
+
+        return sections
+
+    @staticmethod
+    def _valid_big_five(big_five) -> bool:
+        if not isinstance(big_five, dict):
+            return False
+        return all(
+            isinstance(big_five.get(d), dict) and "score" in big_five[d]
+            for d in BIG_FIVE_DIMENSIONS
+        )
+
+    def _create_batched_prompt(self, window: ConversationWindow, include_values: bool) -> str:
+        """Prompt único com as seções Big Five, VARK e (opcional) Schwartz"""
+
+        values_task = ""
+        values_schema = ""
+        if include_values:
+            values_task = """
+3. VALORES DE SCHWARTZ (seção "values") - com base nas mensagens do usuário:
+   AUTODIREÇÃO (independência, criatividade), ESTIMULAÇÃO (novidade, desafios),
+   HEDONISMO (prazer), REALIZAÇÃO (sucesso, competência), PODER (status, controle),
+   SEGURANÇA (estabilidade, ordem), CONFORMIDADE (normas sociais, autodisciplina),
+   TRADIÇÃO (costumes, humildade), BENEVOLÊNCIA (bem-estar de próximos),
+   UNIVERSALISMO (tolerância, justiça social).
+   Identifique os 3 valores MAIS FORTES.
+"""
+            values_schema = """,
+    "values": {
+        "self_direction": {"score": 0-100, "evidences": ["evidência 1", "evidência 2"]},
+        "stimulation": {"score": 0-100, "evidences": []},
+        "hedonism": {"score": 0-100, "evidences": []},
+        "achievement": {"score": 0-100, "evidences": []},
+        "power": {"score": 0-100, "evidences": []},
+        "security": {"score": 0-100, "evidences": []},
+        "conformity": {"score": 0-100, "evidences": []},
+        "tradition": {"score": 0-100, "evidences": []},
+        "benevolence": {"score": 0-100, "evidences": []},
+        "universalism": {"score": 0-100, "evidences": []},
+        "top_3_values": ["Valor 1", "Valor 2", "Valor 3"],
+        "cultural_fit": "Descrição de ambientes/culturas onde este perfil prospera",
+        "retention_risk": "Baixo/Médio/Alto - baseado em alinhamento de valores"
+    }"""
+
+        return f"""Analise as conversas abaixo e produza um perfil psicométrico do usuário.
+
+CONVERSAS:
+{window.analysis_transcript}
+
+TAREFAS:
+
+1. BIG FIVE (seção "big_five") - score 0-100 e justificativa em 2-3 frases para cada dimensão:
+   OPENNESS (criatividade, curiosidade), CONSCIENTIOUSNESS (organização, autodisciplina),
+   EXTRAVERSION (sociabilidade, assertividade), AGREEABLENESS (empatia, cooperação),
+   NEUROTICISM (ansiedade, instabilidade emocional).
+   Considere temas abordados, estrutura da comunicação, tom emocional e menções a relações sociais.
+
+2. VARK (seção "vark") - estilo de aprendizagem, olhando apenas as mensagens do usuário:
+   VISUAL ("vejo", "imagem", gráficos), AUDITIVO ("ouço", "soa", podcasts),
+   LEITURA/ESCRITA (mensagens longas e estruturadas, livros, artigos),
+   CINESTÉSICO ("sinto", "prática", fazer, experimentar).
+   Os 4 scores devem somar aproximadamente 100.
+{values_task}
+Responda APENAS em JSON válido (sem markdown):
+{{
+    "big_five": {{
+        "openness": {{"score": 0-100, "level": "Muito Baixo/Baixo/Médio/Alto/Muito Alto", "description": "..."}},
+        "conscientiousness": {{"score": 0-100, "level": "...", "description": "..."}},
+        "extraversion": {{"score": 0-100, "level": "...", "description": "..."}},
+        "agreeableness": {{"score": 0-100, "level": "...", "description": "..."}},
+        "neuroticism": {{"score": 0-100, "level": "...", "description": "..."}},
+        "confidence": 0-100,
+        "interpretation": "Resumo do perfil em 2-3 frases para RH"
+    }},
+    "vark": {{
+        "visual": 0-100,
+        "auditory": 0-100,
+        "reading": 0-100,
+        "kinesthetic": 0-100,
+        "dominant_style": "Visual/Auditivo/Leitura/Cinestésico",
+        "recommended_training": "Sugestão de formato de treinamento ideal para este perfil"
+    }}{values_schema}
+}}
+"""
+
+    # ============================================================
+    # EVIDÊNCIAS
+    # ============================================================
+
+    def extract_evidence(
+        self,
+        user_id: str,
+        psychometric_version: int,
+        big_five_scores: Dict,
+        extractor: Optional[EvidenceExtractor] = None
+    ) -> Dict[str, List[Evidence]]:
+        """Extrai evidências das 5 dimensões reaproveitando a janela em cache"""
+        window = self.get_window(user_id)
+        extractor = extractor or EvidenceExtractor(self.db, self.llm)
+
+        return extractor.extract_evidence_for_user(
+            user_id=user_id,
+            psychometric_version=psychometric_version,
+            conversations=window.conversations,
+            big_five_scores=big_five_scores,
+            conversations_formatted=window.evidence_transcript
+        )
+
+
+# Singleton por processo (a janela em cache é compartilhada entre rotas)
+_pipeline: Optional[PsychometricPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_psychometric_pipeline(db_manager) -> PsychometricPipeline:
+    """Retorna o pipeline compartilhado para este DatabaseManager"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None or _pipeline.db is not db_manager:
+            _pipeline = PsychometricPipeline(db_manager)
+        return _pipeline
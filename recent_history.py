@@ -0,0 +1,235 @@
+"""
+recent_history.py - Histórico Recente em Memória (Ring Buffer por Usuário)
+==========================================================================
+
+Mantém as últimas N trocas de cada usuário ativo em memória, para que
+handle_message não precise reler o SQLite (SELECT * + parse de keywords)
+nem reconverter a lista para chat_history a cada mensagem.
+
+- Carregado do SQLite no primeiro acesso do usuário
+- Atualizado por save_conversation (inclui proativas e ruminações)
+- Usuários menos recentes são descartados (LRU) acima de max_users
+- Linhas do prompt já renderizadas (mesmo formato de _generate_response)
+- Com vários processos (modo webhook), version_probe compara o MAX(id) do
+  banco com o buffer e recarrega quando outro processo gravou/apagou
+
+Autor: Sistema Jung
+"""
+
+import re
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+from context_packer import (
+    ContextPacker, ContextSegment, PRIORITY_CONVERSATION, count_tokens, truncate_to_tokens
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Marcadores gravados como user_input pelo sistema proativo (não são falas do usuário)
+SYSTEM_MARKERS = frozenset({
+    "[SISTEMA PROATIVO INICIOU CONTATO]",
+    "[INSIGHT RUMINADO - SISTEMA PROATIVO]"
+})
+
+# Tamanho máximo de cada mensagem no histórico do prompt (_generate_response),
+# em tokens do context_packer (~400 caracteres em português)
+PROMPT_LINE_MAX_TOKENS = 100
+
+# Início de cada mensagem renderizada (mensagens podem ter quebras de linha)
+_LINE_START = re.compile(r"\n(?=(?:Usuário|Jung): )")
+
+
+def render_history_line(role: str, content: str) -> str:
+    """Formata uma mensagem como linha do histórico do prompt (cortada em fronteira de token)"""
+    speaker = "Usuário" if role == "user" else "Jung"
+    content = content or ""
+    if count_tokens(content) > PROMPT_LINE_MAX_TOKENS:
+        content = truncate_to_tokens(content, PROMPT_LINE_MAX_TOKENS) + "…"
+    return f"{speaker}: {content}\n"
+
+
+def fit_history(history_text: str, max_tokens: int) -> str:
+    """
+    Encaixa o histórico renderizado no orçamento de tokens
+
+    Mantém as mensagens mais recentes inteiras (ContextPacker com keep_tail);
+    as mais antigas saem primeiro.
+    """
+    if not history_text or count_tokens(history_text) <= max_tokens:
+        return history_text
+    segment = ContextSegment(
+        name="history",
+        priority=PRIORITY_CONVERSATION,
+        items=_LINE_START.split(history_text.rstrip("\n")),
+        keep_tail=True
+    )
+    text = ContextPacker(max_tokens).pack([segment]).text
+    return f"{text}\n" if text else ""
+
+
+class HistoryTurn:
+    """Uma troca (usuário → Jung) com mensagens e linhas já renderizadas"""
+
+    __slots__ = ("conversation_id", "platform", "messages", "lines")
+
+    def __init__(self, conversation_id: Optional[int], user_input: str,
+                 ai_response: str, platform: Optional[str] = None):
+        self.conversation_id = conversation_id
+        self.platform = platform
+
+        messages = []
+        if user_input not in SYSTEM_MARKERS:
+            messages.append({"role": "user", "content": user_input or ""})
+        if ai_response:
+            messages.append({"role": "assistant", "content": ai_response})
+
+        self.messages = tuple(messages)
+        self.lines = tuple(render_history_line(m["role"], m["content"]) for m in messages)
+
+    @classmethod
+    def from_conversation(cls, conv: Dict) -> "HistoryTurn":
+        return cls(
+            conversation_id=conv.get('id'),
+            user_input=conv.get('user_input', ''),
+            ai_response=conv.get('ai_response', ''),
+            platform=conv.get('platform')
+        )
+
+
+class UserHistoryBuffer:
+    """Ring buffer das últimas trocas de um usuário"""
+
+    __slots__ = ("turns", "_messages", "_lines")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self._messages = None
+        self._lines = None
+
+    def append(self, turn: HistoryTurn) -> None:
+        self.turns.append(turn)
+        self._messages = None
+        self._lines = None
+
+    def latest_conversation_id(self) -> Optional[int]:
+        ids = [t.conversation_id for t in self.turns if t.conversation_id is not None]
+        return max(ids) if ids else None
+
+    def _flatten(self) -> None:
+        messages = []
+        lines = []
+        for turn in self.turns:
+            messages.extend(turn.messages)
+            lines.extend(turn.lines)
+        self._messages = messages
+        self._lines = lines
+
+    def chat_history(self) -> List[Dict]:
+        """
+        Histórico em ordem cronológica no formato chat_history
+
+        Retorna uma lista nova (o chamador pode anexar a mensagem atual);
+        os dicts de mensagem são compartilhados e não devem ser alterados.
+        """
+        if self._messages is None:
+            self._flatten()
+        return list(self._messages)
+
+    def history_text(self, max_messages: int = 10) -> str:
+        """Últimas max_messages mensagens já formatadas para o prompt"""
+        if self._lines is None:
+            self._flatten()
+        if max_messages <= 0:
+            return ""
+        return "".join(self._lines[-max_messages:])
+
+
+class RecentHistoryCache:
+    """
+    Cache LRU de UserHistoryBuffer por usuário
+
+    Args:
+        loader: função (user_id, limit) -> conversas em ordem DESC (SQLite)
+        max_turns: trocas mantidas por usuário
+        max_users: usuários mantidos em memória
+        version_probe: função opcional (user_id) -> MAX(id) das conversas no
+            banco; se diferente do buffer, o buffer é recarregado
+    """
+
+    def __init__(self, loader: Callable[[str, int], List[Dict]],
+                 max_turns: int = 10, max_users: int = 256,
+                 version_probe: Optional[Callable[[str], Optional[int]]] = None):
+        self._loader = loader
+        self._version_probe = version_probe
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self._buffers: "OrderedDict[str, UserHistoryBuffer]" = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.stats = {"hits": 0, "loads": 0, "appends": 0, "evictions": 0, "stale": 0}
+
+    def get(self, user_id: str) -> UserHistoryBuffer:
+        """Retorna o buffer do usuário, carregando do SQLite no primeiro acesso"""
+        user_id = str(user_id)
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is not None and self._version_probe is not None:
+                if self._version_probe(user_id) != buffer.latest_conversation_id():
+                    self.stats["stale"] += 1
+                    buffer = None
+            if buffer is not None:
+                self._buffers.move_to_end(user_id)
+                self.stats["hits"] += 1
+                return buffer
+
+            # Carregar sob o lock: um save_conversation concorrente não pode
+            # anexar a um buffer que ainda não contém o histórico do banco
+            buffer = UserHistoryBuffer(self.max_turns)
+            for conv in reversed(self._loader(user_id, self.max_turns)):
+                buffer.append(HistoryTurn.from_conversation(conv))
+
+            self._buffers[user_id] = buffer
+            self.stats["loads"] += 1
+
+            while len(self._buffers) > self.max_users:
+                self._buffers.popitem(last=False)
+                self.stats["evictions"] += 1
+
+            return buffer
+
+    def append(self, user_id: str, conversation_id: Optional[int], user_input: str,
+               ai_response: str, platform: Optional[str] = None) -> None:
+        """
+        Registra uma troca recém-salva
+
+        Usuários sem buffer são ignorados: o primeiro get() lê do banco,
+        que já contém a troca.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                return
+            buffer.append(HistoryTurn(conversation_id, user_input, ai_response, platform))
+            self.stats["appends"] += 1
+
+    def chat_history(self, user_id: str) -> List[Dict]:
+        with self._lock:
+            return self.get(user_id).chat_history()
+
+    def history_text(self, user_id: str, max_messages: int = 10) -> str:
+        with self._lock:
+            return self.get(user_id).history_text(max_messages)
+
+    def invalidate(self, user_id: str) -> None:
+        """Descarta o buffer do usuário (ex.: após /reset)"""
+        with self._lock:
+            self._buffers.pop(str(user_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffers.clear()
@@ -0,0 +1,235 @@
+"""
+report_cache.py - Cache em Disco de Relatórios Psicométricos (PDF)
+==================================================================
+
+Cada versão de user_psychometrics é imutável (save_psychometrics sempre cria
+uma nova versão), então o PDF de (user_id, versão) pode ser gerado uma vez
+e servido do disco nas próximas requisições.
+
+- Renderização (ReportLab) roda em processos separados (`python -m
+  pdf_generator`), no máximo PDF_RENDER_WORKERS por vez, fora do event loop
+  compartilhado com o bot do Telegram. Não usamos multiprocessing/spawn:
+  o Procfile roda `python main.py`, e cada worker reimportaria main.py
+  (e construiria o BotState)
+- Requisições simultâneas do mesmo relatório aguardam a mesma renderização;
+  se a requisição dona for cancelada (cliente desconectou), o processo de
+  renderização é encerrado e quem estava aguardando renderiza de novo
+- Ao gerar uma versão nova, os PDFs de versões anteriores do usuário são
+  removidos; /reset (exclusão de dados) chama invalidate()
+- O ETag deriva das entradas do relatório; a rota responde 304 quando o
+  cliente já tem a versão (If-None-Match)
+
+Configuração (env):
+- REPORT_CACHE_DIR: diretório dos PDFs (padrão: <DATA_DIR>/report_cache)
+- PDF_RENDER_WORKERS: processos de renderização simultâneos (padrão: 2)
+
+Autor: Sistema Jung
+"""
+
+import os
+import re
+import sys
+import json
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDER_WORKERS = 2
+RENDER_TIMEOUT_S = 120
+REPO_ROOT = Path(__file__).resolve().parent
+
+
+class RenderCancelled(RuntimeError):
+    """A requisição que estava renderizando foi cancelada antes de terminar"""
+
+
+def _default_cache_dir() -> Path:
+    data_dir = os.getenv("RAILWAY_VOLUME_MOUNT_PATH", "./data")
+    return Path(os.getenv("REPORT_CACHE_DIR", os.path.join(data_dir, "report_cache")))
+
+
+def report_etag(user_id: str, version: int, report: Dict) -> str:
+    """ETag forte: hash das entradas do relatório (dados da versão + nome/contagem)"""
+    payload = json.dumps(
+        {"user_id": user_id, "version": version, "report": report},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara um cabeçalho If-None-Match (lista, '*' ou W/) com o ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+class PsychometricReportCache:
+    """
+    Artefatos PDF por (user_id, versão) em disco
+
+    Args:
+        cache_dir: diretório dos arquivos
+        max_workers: processos de renderização simultâneos
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_workers: Optional[int] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else _default_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or int(os.getenv("PDF_RENDER_WORKERS", DEFAULT_RENDER_WORKERS))
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.stats = {"hits": 0, "renders": 0, "joined": 0, "fallbacks": 0}
+
+    # ------------------------------------------------------------------
+    # Caminhos
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _safe(user_id: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_-]", "_", str(user_id))
+
+    def path_for(self, user_id: str, version: int, etag: str) -> Path:
+        return self.cache_dir / f"{self._safe(user_id)}_v{version}_{etag}.pdf"
+
+    def invalidate(self, user_id: str) -> int:
+        """Remove todos os PDFs do usuário (ex.: exclusão de dados/LGPD)"""
+        removed = 0
+        for path in self.cache_dir.glob(f"{self._safe(user_id)}_v*.pdf"):
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _remove_stale(self, user_id: str, keep: Path) -> None:
+        """Remove os outros PDFs do usuário (versões anteriores ou ETag antigo)"""
+        for path in self.cache_dir.glob(f"{self._safe(user_id)}_v*.pdf"):
+            if path != keep:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # Renderização
+    # ------------------------------------------------------------------
+
+    async def _render(self, path: Path, report: Dict) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        payload = json.dumps(
+            {"output_path": str(path), "report": report},
+            ensure_ascii=False, default=str
+        ).encode("utf-8")
+
+        async with self._semaphore:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "pdf_generator",
+                    cwd=str(REPO_ROOT),
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except OSError as e:
+                # Sem processos disponíveis: renderizar numa thread
+                logger.warning(f"⚠️ Processo de renderização indisponível, usando thread: {e}")
+                self.stats["fallbacks"] += 1
+                from pdf_generator import render_psychometric_pdf_file
+                await asyncio.to_thread(render_psychometric_pdf_file, str(path), **report)
+                return
+
+            try:
+                _, stderr = await asyncio.wait_for(proc.communicate(payload), RENDER_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"Renderização do PDF excedeu {RENDER_TIMEOUT_S}s")
+            finally:
+                # Timeout ou cancelamento: não deixar o worker rodando
+                if proc.returncode is None:
+                    try:
+                        proc.kill()
+                    except ProcessLookupError:
+                        pass
+                    await proc.wait()
+                    for tmp_path in self.cache_dir.glob(f"{path.name}.*.tmp"):
+                        tmp_path.unlink(missing_ok=True)
+
+            if proc.returncode != 0 or not path.exists():
+                detail = stderr.decode("utf-8", "replace").strip().splitlines()
+                raise RuntimeError(detail[-1] if detail else f"worker saiu com código {proc.returncode}")
+
+    async def get_or_render(self, user_id: str, version: int, report: Dict,
+                            etag: Optional[str] = None) -> Tuple[Path, str]:
+        """
+        Retorna (caminho do PDF, ETag), renderizando se ainda não existir
+
+        Args:
+            report: argumentos de generate_psychometric_pdf
+        """
+        etag = etag or report_etag(user_id, version, report)
+        path = self.path_for(user_id, version, etag)
+
+        if path.exists():
+            self.stats["hits"] += 1
+            return path, etag
+
+        key = path.name
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["joined"] += 1
+            try:
+                await asyncio.shield(future)
+            except RenderCancelled:
+                # A requisição dona desistiu; esta segue e renderiza
+                return await self.get_or_render(user_id, version, report, etag=etag)
+            return path, etag
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            await self._render(path, report)
+            self._remove_stale(user_id, keep=path)
+            self.stats["renders"] += 1
+            logger.info(f"📄 Relatório psicométrico em cache: {path.name}")
+            future.set_result(path)
+        except BaseException as e:
+            # CancelledError é BaseException: sem isto, quem aguarda ficaria preso
+            if isinstance(e, asyncio.CancelledError):
+                future.set_exception(RenderCancelled(f"renderização de {key} cancelada"))
+            else:
+                future.set_exception(e)
+            # Evitar "exception was never retrieved" quando ninguém aguardou
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        return path, etag
+
+
+# Singleton
+_report_cache: Optional[PsychometricReportCache] = None
+
+
+def get_report_cache() -> PsychometricReportCache:
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = PsychometricReportCache()
+    return _report_cache
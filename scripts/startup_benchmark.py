@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark de cold start do bot (importação + construção do BotState)
+
+Roda `python -X importtime -c "import telegram_bot"` num subprocesso limpo,
+com FAST_STARTUP ligado e desligado, e reporta:
+- tempo de parede até o bot estar importado (BotState pronto para polling)
+- tempo até a recuperação semântica ficar pronta (ChromaDB/embeddings/mem0)
+- módulos mais caros segundo -X importtime (tempo cumulativo)
+
+Uso: python scripts/startup_benchmark.py [--top 15] [--mode fast|eager|both] [--json saida.json]
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Executado no subprocesso: importa o bot e mede até a prontidão da recuperação
+PROBE = r"""
+import time, json
+t0 = time.perf_counter()
+import telegram_bot
+t_import = time.perf_counter() - t0
+state = telegram_bot.bot_state
+state.db.wait_until_ready()
+t_ready = time.perf_counter() - t0
+print("@@RESULT@@" + json.dumps({
+    "import_s": round(t_import, 3),
+    "retrieval_ready_s": round(t_ready, 3),
+    "readiness": {k: bool(v) for k, v in state.readiness.items()},
+}))
+"""
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str):
+    """Extrai (módulo, self_us, cumulativo_us, profundidade) das linhas de -X importtime"""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def run_probe(fast_startup: bool, top: int) -> dict:
+    env = dict(os.environ)
+    env["FAST_STARTUP"] = "true" if fast_startup else "false"
+    env.setdefault("TELEGRAM_BOT_TOKEN", "0:benchmark")  # telegram_bot exige o token na importação
+    env["ANONYMIZED_TELEMETRY"] = "False"
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=str(REPO_ROOT), env=env, capture_output=True, text=True
+    )
+
+    result = {"mode": "fast" if fast_startup else "eager", "returncode": proc.returncode}
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@RESULT@@"):
+            result.update(json.loads(line[len("@@RESULT@@"):]))
+
+    rows = parse_importtime(proc.stderr)
+    top_level = [r for r in rows if r[3] == 0]
+    result["import_total_s"] = round(sum(r[2] for r in top_level) / 1e6, 3)
+    result["top_modules"] = [
+        {"module": m, "cumulative_ms": round(c / 1000, 1), "self_ms": round(s / 1000, 1)}
+        for m, s, c, _ in sorted(top_level, key=lambda r: r[2], reverse=True)[:top]
+    ]
+
+    if proc.returncode != 0:
+        result["error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "erro desconhecido"
+    return result
+
+
+def print_report(result: dict) -> None:
+    print(f"\n=== Modo {result['mode'].upper()} ===")
+    if "error" in result:
+        print(f"❌ Falhou: {result['error']}")
+    if "import_s" in result:
+        print(f"⏱️  Bot importado (pronto para polling): {result['import_s']:.2f}s")
+        print(f"🔥 Recuperação semântica pronta:       {result['retrieval_ready_s']:.2f}s")
+        print(f"   Prontidão: {result['readiness']}")
+    print(f"📦 Soma de importações de topo (-X importtime): {result['import_total_s']:.2f}s")
+    for row in result["top_modules"]:
+        print(f"   {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cold start do bot")
+    parser.add_argument("--top", type=int, default=15, help="Módulos mais caros a listar")
+    parser.add_argument("--mode", choices=["fast", "eager", "both"], default="both")
+    parser.add_argument("--json", dest="json_path", help="Salvar resultados em JSON")
+    args = parser.parse_args()
+
+    modes = {"fast": [True], "eager": [False], "both": [True, False]}[args.mode]
+    results = [run_probe(fast, args.top) for fast in modes]
+
+    for result in results:
+        print_report(result)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados salvos em {args.json_path}")
+
+    return 0 if all(r["returncode"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,585 @@
+"""
+session_log.py - Logs de Sessão Bufferizados e Arquivados
+=========================================================
+
+Camada de I/O por trás de user_profile_writer.write_session_entry e de
+bm25_search. Antes, cada mensagem fazia os.makedirs + open/close do .md do
+dia, e a pasta sessions/ crescia para sempre com arquivos .md relidos
+inteiros pelo BM25.
+
+Escrita (SessionLogWriter):
+- entradas ficam em buffer por (usuário, dia) e são gravadas em lote:
+  a cada flush_interval_s (thread daemon), acima de max_pending entradas,
+  quando um leitor pede (flush_user) e no desligamento (flush/close, atexit)
+- handles de append ficam abertos num LRU pequeno (max_open_handles);
+  diretórios já criados não passam de novo por os.makedirs
+- o lote de um dia é gravado de uma vez em modo append e com flush logo
+  em seguida, reduzindo o risco de workers do modo webhook intercalarem
+  entradas no mesmo arquivo
+
+Arquivamento (compact_sessions):
+- dias anteriores a hoje saem de sessions/YYYY-MM-DD.md para
+  sessions/archive/YYYY-MM.md.gz, um membro gzip por dia (membros
+  concatenados formam um gzip válido: `zcat` lê o mês inteiro)
+- sidecar sessions/archive/YYYY-MM.idx.json guarda, por dia, o offset e o
+  tamanho do membro comprimido e o intervalo de cada entrada no texto
+  descomprimido: read_day/read_entry fazem seek e descomprimem só um dia
+- roda em background quando o primeiro lote de um novo dia de um usuário
+  é gravado; `python session_log.py compact <base>` faz o backfill
+
+Leitura: iter_session_days percorre arquivos e .md ativos em ordem de
+data; sessions_signature muda quando qualquer um deles muda (cache BM25).
+Leitores listam e leem sob a trava do arquivo em modo compartilhado, então
+a compactação em background não move um dia entre a listagem e a leitura;
+sem flock (ou se o diretório archive/ surgiu no meio), um .md que sumiu
+faz a leitura ser refeita a partir de uma nova listagem.
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import zlib
+import logging
+import weakref
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: compactação sem trava entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIRNAME = "archive"
+DAY_FILE_RE = re.compile(r"^(\d{4}-\d{2})-\d{2}\.md$")
+ENTRY_SPLIT_RE = re.compile(r"\n## \d{2}:\d{2}")
+GZIP_LEVEL = 6
+READ_ATTEMPTS = 3
+
+# Writers vivos do processo (flush_pending)
+_writers: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _archive_paths(sessions_dir: str, month: str) -> Tuple[str, str]:
+    archive_dir = os.path.join(sessions_dir, ARCHIVE_DIRNAME)
+    return (
+        os.path.join(archive_dir, f"{month}.md.gz"),
+        os.path.join(archive_dir, f"{month}.idx.json"),
+    )
+
+
+def _entry_spans(text: str) -> List[List[int]]:
+    """[início, fim) de cada entrada '## HH:MM' no texto do dia (sem o cabeçalho)"""
+    starts = [m.start() for m in ENTRY_SPLIT_RE.finditer(text)]
+    return [[start, starts[i + 1] if i + 1 < len(starts) else len(text)]
+            for i, start in enumerate(starts)]
+
+
+# ============================================================
+# ESCRITA
+# ============================================================
+
+class SessionLogWriter:
+    """
+    Buffer de entradas de sessão com LRU de handles abertos
+
+    Args:
+        base_dir: função que devolve o diretório base (data/users), lida a
+            cada flush para acompanhar overrides de user_profile_writer.DATA_DIR
+        flush_interval_s: idade máxima de uma entrada em buffer
+        max_pending: força o flush acima deste número de entradas
+        max_open_handles: arquivos de dia mantidos abertos para append
+        compact: arquivar dias passados quando um usuário começa um dia novo
+    """
+
+    FLUSH_INTERVAL_S = 2.0
+    MAX_PENDING = 256
+    MAX_OPEN_HANDLES = 32
+
+    def __init__(self, base_dir: Callable[[], str], flush_interval_s: float = FLUSH_INTERVAL_S,
+                 max_pending: int = MAX_PENDING, max_open_handles: int = MAX_OPEN_HANDLES,
+                 compact: bool = True):
+        self._base_dir = base_dir
+        self.flush_interval_s = flush_interval_s
+        self.max_pending = max_pending
+        self.max_open_handles = max_open_handles
+        self.compact = compact
+
+        # (user_id, dia) -> (user_name, [entradas])
+        self._pending: "OrderedDict[Tuple[str, str], Tuple[str, List[str]]]" = OrderedDict()
+        self._pending_count = 0
+        self._handles: "OrderedDict[str, object]" = OrderedDict()
+        self._known_dirs = set()
+
+        # _lock protege o buffer; _io_lock serializa gravações e handles
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {"entries": 0, "flushes": 0, "writes": 0, "opens": 0, "compactions": 0}
+        _writers.add(self)
+
+    def sessions_dir(self, user_id: str) -> str:
+        return os.path.join(self._base_dir(), user_id, "sessions")
+
+    # ------------------------------------------------------------------
+    # Buffer
+    # ------------------------------------------------------------------
+
+    def append(self, user_id: str, user_name: str, entry: str, day: Optional[str] = None) -> None:
+        """Enfileira uma entrada já formatada para o dia (padrão: hoje)"""
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            key = (user_id, day)
+            if key in self._pending:
+                self._pending[key][1].append(entry)
+            else:
+                self._pending[key] = (user_name, [entry])
+            self._pending_count += 1
+            self.stats["entries"] += 1
+            overflow = self._pending_count >= self.max_pending
+            self._ensure_thread()
+        if overflow:
+            self._wake.set()
+
+    def has_pending(self, user_id: str) -> bool:
+        with self._lock:
+            return any(uid == user_id for uid, _ in self._pending)
+
+    def _take(self, user_id: Optional[str] = None) -> List[Tuple[Tuple[str, str], str, List[str]]]:
+        with self._lock:
+            if user_id is None:
+                batch = [(key, name, entries) for key, (name, entries) in self._pending.items()]
+                self._pending.clear()
+                self._pending_count = 0
+            else:
+                batch = [(key, name, entries) for key, (name, entries) in self._pending.items()
+                         if key[0] == user_id]
+                for key, _, entries in batch:
+                    del self._pending[key]
+                    self._pending_count -= len(entries)
+        return batch
+
+    # ------------------------------------------------------------------
+    # Gravação
+    # ------------------------------------------------------------------
+
+    def flush(self) -> int:
+        """Grava todo o buffer; retorna o número de entradas gravadas"""
+        return self._write(self._take())
+
+    def flush_user(self, user_id: str) -> int:
+        """Grava o buffer de um usuário (leitores chamam antes de ler o disco)"""
+        if not self.has_pending(user_id):
+            return 0
+        return self._write(self._take(user_id))
+
+    def _write(self, batch) -> int:
+        if not batch:
+            return 0
+        written = 0
+        new_days = set()
+        with self._io_lock:
+            for (user_id, day), user_name, entries in batch:
+                try:
+                    handle, is_new = self._handle(user_id, day)
+                    payload = "".join(entries)
+                    if is_new:
+                        payload = f"# Sessão {day} — {user_name}\n" + payload
+                        new_days.add(user_id)
+                        logger.info(f"📄 [SESSION LOG] Novo arquivo criado: sessions/{day}.md (user={user_id[:8]})")
+                    handle.write(payload)
+                    handle.flush()
+                    written += len(entries)
+                    self.stats["writes"] += 1
+                except Exception as e:
+                    logger.warning(f"⚠️ session_log: erro ao gravar sessão de {user_id} ({day}): {e}")
+            self.stats["flushes"] += 1
+            self._close_stale_handles()
+
+        if self.compact:
+            for user_id in new_days:
+                self._compact_async(user_id)
+        return written
+
+    def _handle(self, user_id: str, day: str):
+        """Handle de append do dia (LRU); is_new = arquivo acabou de ser criado"""
+        sessions_dir = self.sessions_dir(user_id)
+        path = os.path.join(sessions_dir, f"{day}.md")
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+            return handle, False
+
+        if sessions_dir not in self._known_dirs:
+            os.makedirs(sessions_dir, exist_ok=True)
+            self._known_dirs.add(sessions_dir)
+
+        handle = open(path, "a", encoding="utf-8")
+        self.stats["opens"] += 1
+        self._handles[path] = handle
+        while len(self._handles) > self.max_open_handles:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        return handle, handle.tell() == 0
+
+    def _close_stale_handles(self) -> None:
+        """Fecha handles de dias passados (o arquivo vai ser compactado)"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        for path in [p for p in self._handles if not p.endswith(f"{today}.md")]:
+            self._handles.pop(path).close()
+
+    def _compact_async(self, user_id: str) -> None:
+        sessions_dir = self.sessions_dir(user_id)
+
+        def run():
+            try:
+                archived = compact_sessions(sessions_dir)
+                if archived:
+                    self.stats["compactions"] += 1
+            except Exception as e:
+                logger.warning(f"⚠️ session_log: erro ao compactar sessões de {user_id}: {e}")
+
+        threading.Thread(target=run, name="session-log-compact", daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def _ensure_thread(self) -> None:
+        """Chamado com _lock: inicia o flush periódico na primeira entrada"""
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(target=self._run, name="session-log-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"⚠️ session_log: erro no flush periódico: {e}")
+
+    def close(self) -> None:
+        """Flush final e fechamento dos handles (desligamento)"""
+        self._stopped = True
+        self._wake.set()
+        flushed = self.flush()
+        with self._io_lock:
+            while self._handles:
+                _, handle = self._handles.popitem()
+                handle.close()
+        if flushed:
+            logger.info(f"📄 [SESSION LOG] Flush final: {flushed} entradas")
+
+
+def flush_pending(user_id: str) -> None:
+    """Grava as entradas em buffer do usuário em todos os writers do processo"""
+    for writer in list(_writers):
+        writer.flush_user(user_id)
+
+
+# ============================================================
+# ARQUIVAMENTO
+# ============================================================
+
+class _ArchiveLock:
+    """
+    flock em archive/.lock: um compactador por usuário entre processos
+
+    shared=True (leitores) convive com outros leitores e espera o compactador.
+    """
+
+    def __init__(self, archive_dir: str, shared: bool = False):
+        self.path = os.path.join(archive_dir, ".lock")
+        self.shared = shared
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _load_index(index_path: str) -> Dict:
+    if not os.path.exists(index_path):
+        return {"days": []}
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_index(index_path: str, index: Dict) -> None:
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_path)
+
+
+def compact_sessions(sessions_dir: str, before_day: Optional[str] = None) -> int:
+    """
+    Move os .md de dias anteriores a before_day (padrão: hoje) para os
+    arquivos mensais comprimidos
+
+    Ordem segura contra queda: membro gzip gravado e sincronizado → índice
+    trocado atomicamente → .md removido. Um .md idêntico a um membro já
+    indexado (queda antes da remoção) só é removido; um .md recriado por
+    entradas tardias vira um segundo membro do mesmo dia. Bytes órfãos no
+    fim do .gz são ignorados (o índice manda).
+
+    Returns:
+        Número de dias arquivados
+    """
+    if not os.path.isdir(sessions_dir):
+        return 0
+    before_day = before_day or datetime.now().strftime("%Y-%m-%d")
+    candidates = sorted(
+        name for name in os.listdir(sessions_dir)
+        if DAY_FILE_RE.match(name) and name[:-3] < before_day
+    )
+    if not candidates:
+        return 0
+
+    archive_dir = os.path.join(sessions_dir, ARCHIVE_DIRNAME)
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = 0
+
+    with _ArchiveLock(archive_dir):
+        for name in candidates:
+            day = name[:-3]
+            month = DAY_FILE_RE.match(name).group(1)
+            md_path = os.path.join(sessions_dir, name)
+            gz_path, index_path = _archive_paths(sessions_dir, month)
+            if not os.path.exists(md_path):
+                continue  # outro processo arquivou antes da trava
+
+            with open(md_path, "r", encoding="utf-8") as f:
+                text = f.read()
+            index = _load_index(index_path)
+            if any(d["day"] == day and d["size"] == len(text) for d in index["days"]):
+                os.remove(md_path)  # queda entre o índice e a remoção
+                continue
+
+            member = gzip.compress(text.encode("utf-8"), compresslevel=GZIP_LEVEL)
+
+            with open(gz_path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(member)
+                f.flush()
+                os.fsync(f.fileno())
+
+            index["days"].append({
+                "day": day,
+                "offset": offset,
+                "length": len(member),
+                "size": len(text),
+                "entries": _entry_spans(text),
+            })
+            index["days"].sort(key=lambda d: (d["day"], d["offset"]))
+            _save_index(index_path, index)
+            os.remove(md_path)
+            archived += 1
+
+    if archived:
+        logger.info(f"🗜️ [SESSION LOG] {archived} dia(s) arquivados em {archive_dir}")
+    return archived
+
+
+# ============================================================
+# LEITURA
+# ============================================================
+
+def _read_member(gz_path: str, offset: int, length: int) -> str:
+    with open(gz_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    return zlib.decompress(data, wbits=31).decode("utf-8")
+
+
+def _archived_records(sessions_dir: str, month: str) -> List[Tuple[str, Dict]]:
+    gz_path, index_path = _archive_paths(sessions_dir, month)
+    if not os.path.exists(index_path):
+        return []
+    try:
+        return [(gz_path, record) for record in _load_index(index_path)["days"]]
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ session_log: índice ilegível {index_path}: {e}")
+        return []
+
+
+def _read_sources(sources: List[Tuple[str, Optional[Dict]]]) -> Optional[str]:
+    """
+    Concatena membros arquivados (em ordem) e o .md ativo de um mesmo dia
+
+    FileNotFoundError sobe: o .md foi arquivado depois da listagem e quem
+    chamou refaz a leitura (_consistent_read).
+    """
+    parts = []
+    for path, record in sources:
+        try:
+            if record is None:
+                with open(path, "r", encoding="utf-8") as f:
+                    parts.append(f.read())
+            else:
+                parts.append(_read_member(path, record["offset"], record["length"]))
+        except FileNotFoundError:
+            raise
+        except (OSError, zlib.error, UnicodeDecodeError) as e:
+            logger.warning(f"⚠️ session_log: falha ao ler {os.path.basename(path)}: {e}")
+    return "".join(parts) if parts else None
+
+
+def _consistent_read(sessions_dir: str, read: Callable[[], object], default=None):
+    """
+    Executa read() (listagem + leitura) sob a trava compartilhada do arquivo
+
+    Se um arquivo sumiu no meio (compactação sem flock, ou archive/ criado
+    depois da verificação), refaz com uma listagem nova.
+    """
+    archive_dir = os.path.join(sessions_dir, ARCHIVE_DIRNAME)
+    for attempt in range(READ_ATTEMPTS):
+        try:
+            if os.path.isdir(archive_dir):
+                with _ArchiveLock(archive_dir, shared=True):
+                    return read()
+            return read()
+        except FileNotFoundError as e:
+            if attempt == READ_ATTEMPTS - 1:
+                logger.warning(f"⚠️ session_log: leitura de {sessions_dir} instável após "
+                               f"{READ_ATTEMPTS} tentativas: {e}")
+    return default
+
+
+def _day_sources(sessions_dir: str, day: str) -> List[Tuple[str, Optional[Dict]]]:
+    sources = [(gz_path, record) for gz_path, record in _archived_records(sessions_dir, day[:7])
+               if record["day"] == day]
+    md_path = os.path.join(sessions_dir, f"{day}.md")
+    if os.path.exists(md_path):
+        sources.append((md_path, None))
+    return sources
+
+
+def read_day(sessions_dir: str, day: str) -> Optional[str]:
+    """Texto do dia: membros do arquivo mensal seguidos do .md ativo"""
+    return _consistent_read(sessions_dir, lambda: _read_sources(_day_sources(sessions_dir, day)))
+
+
+def read_entry(sessions_dir: str, day: str, position: int) -> Optional[str]:
+    """
+    Entrada `position` do dia (0 = primeira), incluindo a linha '## HH:MM'
+
+    Dias arquivados num único membro usam os intervalos do índice.
+    """
+    def read() -> Optional[str]:
+        sources = _day_sources(sessions_dir, day)
+        if len(sources) == 1 and sources[0][1] is not None:
+            gz_path, record = sources[0]
+            if not 0 <= position < len(record["entries"]):
+                return None
+            start, end = record["entries"][position]
+            return _read_member(gz_path, record["offset"], record["length"])[start:end]
+
+        text = _read_sources(sources)
+        if text is None:
+            return None
+        spans = _entry_spans(text)
+        if not 0 <= position < len(spans):
+            return None
+        start, end = spans[position]
+        return text[start:end]
+
+    return _consistent_read(sessions_dir, read)
+
+
+def iter_session_days(sessions_dir: str) -> Iterator[Tuple[str, str]]:
+    """
+    (dia, texto) de todos os dias do usuário, arquivados e ativos, em ordem
+
+    Lista e lê tudo numa passada consistente (_consistent_read) antes de
+    devolver: a trava não fica presa enquanto o chamador processa os dias.
+    """
+    if not os.path.isdir(sessions_dir):
+        return
+
+    def read() -> List[Tuple[str, str]]:
+        days: Dict[str, List[Tuple[str, Optional[Dict]]]] = {}
+
+        archive_dir = os.path.join(sessions_dir, ARCHIVE_DIRNAME)
+        if os.path.isdir(archive_dir):
+            for name in sorted(os.listdir(archive_dir)):
+                if name.endswith(".idx.json"):
+                    for gz_path, record in _archived_records(sessions_dir, name[:-len(".idx.json")]):
+                        days.setdefault(record["day"], []).append((gz_path, record))
+
+        for name in os.listdir(sessions_dir):
+            if DAY_FILE_RE.match(name):
+                days.setdefault(name[:-3], []).append((os.path.join(sessions_dir, name), None))
+
+        result = []
+        for day in sorted(days):
+            text = _read_sources(days[day])
+            if text is not None:
+                result.append((day, text))
+        return result
+
+    yield from _consistent_read(sessions_dir, read, default=[])
+
+
+def sessions_signature(sessions_dir: str) -> Optional[str]:
+    """Chave que muda quando qualquer .md ativo ou índice de arquivo muda"""
+    if not os.path.isdir(sessions_dir):
+        return None
+    paths = [os.path.join(sessions_dir, n) for n in os.listdir(sessions_dir) if DAY_FILE_RE.match(n)]
+    archive_dir = os.path.join(sessions_dir, ARCHIVE_DIRNAME)
+    if os.path.isdir(archive_dir):
+        paths += [os.path.join(archive_dir, n) for n in os.listdir(archive_dir) if n.endswith(".idx.json")]
+    if not paths:
+        return None
+    try:
+        latest_mtime = max(os.path.getmtime(p) for p in paths)
+    except OSError:
+        return None
+    return f"{len(paths)}_{latest_mtime}"
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def compact_all(base_dir: str) -> int:
+    """Arquiva os dias passados de todos os usuários em base_dir (data/users)"""
+    total = 0
+    if not os.path.isdir(base_dir):
+        return 0
+    for user_id in sorted(os.listdir(base_dir)):
+        sessions_dir = os.path.join(base_dir, user_id, "sessions")
+        if os.path.isdir(sessions_dir):
+            total += compact_sessions(sessions_dir)
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) >= 2 and sys.argv[1] == "compact":
+        base = sys.argv[2] if len(sys.argv) > 2 else os.path.join(".", "data", "users")
+        start = time.perf_counter()
+        days = compact_all(base)
+        print(f"✅ {days} dia(s) arquivados em {time.perf_counter() - start:.1f}s")
+    else:
+        print("Uso: python session_log.py compact [data/users]")
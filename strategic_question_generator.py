@@ -356,6 +356,46 @@ class StrategicQuestionGenerator:
         ]
     }
 
+    # ============================================================================
+    # TEMPLATES POR FRAGMENTO (SELEÇÃO ADAPTATIVA TRI)
+    # ============================================================================
+    # {behavior}: descrição do fragmento escolhido pelo CAT ("expressa afeto...")
+    # {facet}: nome da faceta ("acolhimento"). Todos usam {behavior}, para que
+    # fragmentos diferentes gerem perguntas diferentes.
+
+    FACET_QUESTION_TEMPLATES = [
+        {
+            "type": "direct_masked",
+            "template": "{name}, fiquei pensando numa coisa... Tem gente que {behavior} com muita naturalidade. Como isso aparece na sua vida?",
+            "tone": "curioso"
+        },
+        {
+            "type": "direct_masked",
+            "template": "Posso te perguntar algo, {name}? Você diria que {behavior}? Em que situações isso fica mais evidente?",
+            "tone": "direto"
+        },
+        {
+            "type": "storytelling",
+            "template": "Jung observava que cada pessoa tem um jeito próprio de viver {facet}... Li sobre alguém que {behavior}, e lembrei de você, {name}. Faz sentido pra você?",
+            "tone": "filosófico"
+        },
+        {
+            "type": "reflection",
+            "template": "Tenho curiosidade, {name}... Quando foi a última vez que você percebeu que {behavior}? Como foi?",
+            "tone": "pessoal"
+        },
+        {
+            "type": "reflection",
+            "template": "{name}, quando penso em {facet}, me vem uma pergunta: no seu dia a dia, com que frequência você {behavior}?",
+            "tone": "exploratório"
+        },
+        {
+            "type": "dilemma",
+            "template": "Uma pergunta rápida, {name}: numa semana típica, você {behavior} mais do que a maioria das pessoas que conhece, ou menos?",
+            "tone": "leve"
+        }
+    ]
+
     # ============================================================================
     # ADAPTIVE TONE RULES
     # ============================================================================
@@ -425,7 +465,8 @@ class StrategicQuestionGenerator:
         target_dimension: str,
         user_id: str,
         user_name: str,
-        context_hint: Optional[str] = None
+        context_hint: Optional[str] = None,
+        target_item: Optional[Dict] = None
     ) -> Dict:
         """
         Gera pergunta estratégica adaptada ao perfil do usuário
@@ -435,6 +476,7 @@ class StrategicQuestionGenerator:
             user_id: ID do usuário
             user_name: Nome do usuário
             context_hint: Contexto sugerido (opcional)
+            target_item: Fragmento TRI escolhido pela seleção adaptativa (opcional)
 
         Returns:
             {
@@ -452,15 +494,19 @@ class StrategicQuestionGenerator:
         # Buscar perfil atual
         psychometrics = self.db.get_psychometrics(user_id)
 
-        # Selecionar template apropriado
+        # Selecionar template apropriado (por fragmento, quando veio da seleção adaptativa)
         template = self._select_best_template(
             dimension=target_dimension,
             psychometrics=psychometrics,
-            context_hint=context_hint
+            context_hint=context_hint,
+            target_item=target_item
         )
 
         # Gerar pergunta a partir do template
-        question_text = template["template"].format(name=user_name)
+        question_text = template["template"].format(
+            name=user_name,
+            **self._facet_fields(target_item)
+        )
 
         result = {
             "question": question_text,
@@ -474,20 +520,64 @@ class StrategicQuestionGenerator:
             }
         }
 
+        if target_item:
+            result["metadata"]["target_facet"] = target_item.get("facet_code")
+            result["metadata"]["target_fragment"] = target_item.get("fragment_id")
+
         logger.info(f"   ✅ Pergunta gerada: {template['type']} / {template['tone']}")
 
         return result
 
+    @staticmethod
+    def _behavior_phrase(description: str) -> str:
+        """
+        Descrição do fragmento como trecho de frase:
+        "Sente-se à vontade em grupos." → "se sente à vontade em grupos"
+        """
+        phrase = (description or "").strip().rstrip(".")
+        if not phrase:
+            return ""
+        first, _, rest = phrase.partition(" ")
+        if not (len(first) > 1 and first.isupper()):
+            first = first[0].lower() + first[1:]
+        if first.endswith("-se"):
+            first = f"se {first[:-3]}"
+        return f"{first} {rest}".strip()
+
+    def _facet_fields(self, target_item: Optional[Dict]) -> Dict[str, str]:
+        """Campos {behavior} e {facet} dos templates por fragmento"""
+        if not target_item:
+            return {}
+        facet = target_item.get("facet_name") or target_item.get("facet_code") or ""
+        return {
+            "behavior": self._behavior_phrase(target_item.get("description", "")),
+            "facet": facet.lower()
+        }
+
     def _select_best_template(
         self,
         dimension: str,
         psychometrics: Optional[Dict],
-        context_hint: Optional[str]
+        context_hint: Optional[str],
+        target_item: Optional[Dict] = None
     ) -> Dict:
         """
         Seleciona melhor template baseado no perfil atual
+
+        Com target_item (fragmento escolhido pelo CAT), usa os templates por
+        fragmento, parametrizados pela descrição e pela faceta do item.
         """
 
+        if target_item and target_item.get("description"):
+            facet_name = target_item.get("facet_name") or target_item.get("facet_code")
+            templates = [
+                dict(t, reveals=[facet_name, target_item["description"]])
+                for t in self.FACET_QUESTION_TEMPLATES
+            ]
+            if psychometrics:
+                templates = self._filter_by_profile(templates, psychometrics) or templates
+            return random.choice(templates)
+
         templates = self.QUESTION_TEMPLATES.get(dimension, [])
 
         if not templates:
@@ -24,6 +24,8 @@ Versão: 4.0.1 - HÍBRIDO PREMIUM + PROATIVO (CORRIGIDO)
 import os
 import logging
 import asyncio
+import threading
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -47,6 +49,7 @@ from jung_core import (
     format_conflict_for_display,
     format_archetype_info
 )
+from recent_history import render_history_line
 
 # ✅ IMPORTAR SISTEMA PROATIVO AVANÇADO
 from jung_proactive_advanced import ProactiveAdvancedSystem
@@ -76,28 +79,93 @@ if not TELEGRAM_BOT_TOKEN:
 # IDs de administradores (opcional)
 ADMIN_IDS = Config.TELEGRAM_ADMIN_IDS
 
+# /reset espera o aquecimento do ChromaDB/mem0 no máximo este tempo
+RESET_WARMUP_TIMEOUT_S = 60
+
 # ============================================================
 # GERENCIADOR DE ESTADO DO BOT
 # ============================================================
 
 class BotState:
-    """Gerencia estado global do bot HÍBRIDO + PROATIVO - VERSÃO JUST-IN-TIME"""
+    """
+    Gerencia estado global do bot HÍBRIDO + PROATIVO - VERSÃO JUST-IN-TIME
+
+    Com Config.FAST_STARTUP, só o SQLite é aberto na importação: JungianEngine
+    e ProactiveAdvancedSystem são construídos sob demanda (ou por warm_up()),
+    e ChromaDB/embeddings/mem0 aquecem numa thread em background.
+    """
 
     def __init__(self):
         # Componentes principais HÍBRIDOS
-        self.db = HybridDatabaseManager()
-        self.jung_engine = JungianEngine(db=self.db)
+        self.db = HybridDatabaseManager(lazy_vector_store=Config.FAST_STARTUP)
 
-        # ✅ Sistema Proativo Avançado
-        self.proactive = ProactiveAdvancedSystem(db=self.db)
+        self._jung_engine = None
+        self._proactive = None
+        self._init_lock = threading.RLock()
+        self._warmup_thread = None
 
         # Estatísticas
         self.total_messages_processed = 0
         self.total_semantic_searches = 0
         self.total_proactive_messages_sent = 0
 
+        if not Config.FAST_STARTUP:
+            self.jung_engine
+            self.proactive
+
         logger.info("✅ BotState HÍBRIDO + PROATIVO (Just-in-Time) inicializado")
 
+    @property
+    def jung_engine(self) -> JungianEngine:
+        if self._jung_engine is None:
+            with self._init_lock:
+                if self._jung_engine is None:
+                    self._jung_engine = JungianEngine(db=self.db)
+        return self._jung_engine
+
+    @property
+    def proactive(self) -> ProactiveAdvancedSystem:
+        # ✅ Sistema Proativo Avançado
+        if self._proactive is None:
+            with self._init_lock:
+                if self._proactive is None:
+                    self._proactive = ProactiveAdvancedSystem(db=self.db)
+        return self._proactive
+
+    @property
+    def readiness(self) -> dict:
+        """Flags de prontidão dos componentes (ver /health)"""
+        return {
+            "database": True,
+            "engine": self._jung_engine is not None,
+            "proactive": self._proactive is not None,
+            "retrieval": self.db.retrieval_ready.is_set(),
+            "chroma": self.db.chroma_enabled,
+            "mem0": self.db.mem0 is not None,
+        }
+
+    def warm_up(self) -> threading.Thread:
+        """Constrói engine/proativo e aquece a recuperação semântica em background"""
+        if self._warmup_thread is None:
+            def _run():
+                self.db.start_warmup()
+                try:
+                    self.jung_engine
+                    self.proactive
+                except Exception as e:
+                    logger.error(f"❌ Erro no aquecimento do BotState: {e}", exc_info=True)
+                self.db.wait_until_ready()
+                logger.info(f"🔥 BotState aquecido: {self.readiness}")
+
+            self._warmup_thread = threading.Thread(target=_run, name="botstate-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        thread = self.warm_up()
+        thread.join(timeout)
+        return not thread.is_alive()
+
     # ❌ REMOVIDO: chat_histories (cache em memória)
     # ❌ REMOVIDO: get_chat_history()
     # ❌ REMOVIDO: add_to_chat_history()
@@ -129,6 +197,13 @@ def ensure_user_in_database(telegram_user, org_slug=None) -> str:
 
     user_id = create_user_hash(username)
 
+    # Caminho rápido: identidade já resolvida (sem convite pendente) - sem SQL/commit
+    registry = bot_state.db.user_registry
+    cached = registry.lookup(telegram_id, username)
+    if cached is not None and cached.org_ids and not org_slug:
+        registry.touch(cached.user_id, platform_id=str(telegram_id))
+        return cached.user_id
+
     # DEBUG: Log detalhes do usuário
     logger.info(f"🔍 ensure_user_in_database - Telegram ID: {telegram_id}, Username: {username}, Nome: {full_name}, Org: {org_slug or 'None'}")
 
@@ -263,6 +338,12 @@ def ensure_user_in_database(telegram_user, org_slug=None) -> str:
         else:
             logger.info(f"ℹ️  Usuário {user_id[:8]} já está em organização(ões), não adicionando novamente")
 
+    # Guardar identidade resolvida (organizações) para as próximas mensagens
+    try:
+        registry.load(telegram_id, username, user_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível registrar usuário no cache: {e}")
+
     return user_id
 
 def format_time_delta(dt: datetime) -> str:
@@ -967,6 +1048,19 @@ O que você decide?
     # ========== CONFIRMAÇÃO DE RESET ==========
     if context.user_data.get('awaiting_reset_confirmation'):
         if message_text.strip().upper() == 'CONFIRMAR RESET':
+            context.user_data['awaiting_reset_confirmation'] = False
+
+            # Durante o aquecimento chroma_enabled ainda é False e o backlog adiado
+            # reindexaria as conversas apagadas: o reset espera a prontidão
+            ready = await asyncio.to_thread(bot_state.db.wait_until_ready, RESET_WARMUP_TIMEOUT_S)
+            if not ready:
+                logger.warning(f"⚠️ Reset de {user_id} adiado: recuperação semântica ainda aquecendo")
+                await update.message.reply_text(
+                    "⏳ A memória ainda está sendo carregada após a reinicialização.\n\n"
+                    "Nada foi apagado. Envie /reset de novo em alguns instantes."
+                )
+                return
+
             cursor = bot_state.db.conn.cursor()
 
             # Deletar tudo do SQLite
@@ -977,20 +1071,29 @@ O que você decide?
             cursor.execute("DELETE FROM user_milestones WHERE user_id = ?", (user_id,))
 
             bot_state.db.conn.commit()
+            bot_state.db.recent_history.invalidate(user_id)
+
+            # PDFs psicométricos em cache (report_cache)
+            try:
+                from report_cache import get_report_cache
+                get_report_cache().invalidate(user_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao limpar relatórios em cache: {e}")
+
+            # Clusters/resumos da consolidação (antes do ChromaDB: usa a partição do usuário)
+            try:
+                from jung_memory_consolidation import MemoryConsolidator
+                MemoryConsolidator(bot_state.db).forget_user(user_id)
+            except Exception as e:
+                logger.error(f"❌ Erro ao apagar estado de consolidação: {e}")
 
             # Deletar do ChromaDB (se habilitado)
             if bot_state.db.chroma_enabled:
                 try:
-                    # Buscar IDs dos documentos do usuário
-                    results = bot_state.db.vectorstore._collection.get(
-                        where={"user_id": user_id}
-                    )
-
-                    if results and results.get('ids'):
-                        bot_state.db.vectorstore._collection.delete(
-                            ids=results['ids']
-                        )
-                        logger.info(f"🗑️ {len(results['ids'])} documentos removidos do ChromaDB")
+                    # Documentos do usuário na partição dele (e a atribuição)
+                    removed = bot_state.db.vector_partitions.delete_user(user_id)
+                    if removed:
+                        logger.info(f"🗑️ {removed} documentos removidos do ChromaDB")
                 except Exception as e:
                     logger.error(f"❌ Erro ao deletar do ChromaDB: {e}")
 
@@ -1001,7 +1104,6 @@ O que você decide?
                 "Todo o histórico foi apagado (SQLite + ChromaDB).\n"
                 "Podemos começar do zero. O que você gostaria de explorar?"
             )
-            context.user_data['awaiting_reset_confirmation'] = False
             logger.warning(f"Reset CONFIRMADO por {user.first_name}")
             return
         else:
@@ -1014,15 +1116,13 @@ O que você decide?
     await update.message.chat.send_action(action="typing")
 
     try:
-        # 🆕 BUSCAR HISTÓRICO DO BANCO (incluindo proativas) - JUST-IN-TIME
-        conversations = bot_state.db.get_user_conversations(
-            user_id,
-            limit=10,  # Últimas 10 conversas
-            include_proactive=True  # ✅ INCLUIR PROATIVAS
-        )
+        # 🆕 HISTÓRICO RECENTE (incluindo proativas) - ring buffer em memória,
+        # carregado do banco no primeiro acesso e atualizado por save_conversation
+        chat_history = bot_state.db.get_recent_chat_history(user_id)
 
-        # 🆕 CONVERTER PARA FORMATO CHAT_HISTORY
-        chat_history = bot_state.db.conversations_to_chat_history(conversations)
+        # Histórico do prompt já renderizado (últimas 9 + mensagem atual = 10)
+        history_text = bot_state.db.get_recent_history_text(user_id, max_messages=9)
+        history_text += render_history_line("user", message_text)
 
         # Adicionar mensagem atual
         chat_history.append({
@@ -1034,7 +1134,8 @@ O que você decide?
         result = bot_state.jung_engine.process_message(
             user_id=user_id,
             message=message_text,
-            chat_history=chat_history
+            chat_history=chat_history,
+            history_text=history_text
         )
 
         response = result['response']
@@ -1046,23 +1147,17 @@ O que você decide?
             await update.message.reply_text(chunk)
 
         # ✅ TRI: Detectar fragmentos comportamentais Big Five
-        tri_enabled = getattr(bot_state.proactive, 'tri_enabled', False) if bot_state.proactive else False
-        logger.info(f"🧬 TRI: Verificando detecção (habilitado={tri_enabled})")
-
-        if tri_enabled:
+        # Apenas enfileira no FragmentDetectionSink (detecção + gravação em lote no background)
+        if bot_state.proactive and getattr(bot_state.proactive, 'tri_enabled', False):
             try:
-                tri_result = bot_state.proactive.detect_fragments_in_message(
+                bot_state.proactive.submit_fragment_detection(
                     message=message_text,
                     user_id=user_id,
                     message_id=str(update.message.message_id),
                     context={"response": response[:200]}  # Contexto da resposta
                 )
-                if tri_result:
-                    logger.info(f"🧬 TRI: {tri_result['fragments_detected']} fragmentos detectados, {tri_result.get('fragments_saved', 0)} salvos")
-                else:
-                    logger.info(f"🧬 TRI: Nenhum fragmento detectado nesta mensagem")
             except Exception as tri_err:
-                logger.warning(f"⚠️ TRI: Erro na detecção (não crítico): {tri_err}")
+                logger.warning(f"⚠️ TRI: Erro ao enfileirar detecção (não crítico): {tri_err}")
 
         # Detectar padrões periodicamente (em background para não bloquear)
         if bot_state.total_messages_processed % 10 == 0:
@@ -1086,3 +1181,111 @@ O que você decide?
             "Pode tentar novamente?"
         )
 
+
+# ============================================================
+# APLICAÇÃO TELEGRAM (compartilhada por main.py e telegram_worker.py)
+# ============================================================
+
+def build_application(token: str, with_updater: bool = True) -> Application:
+    """
+    Constrói a Application com todos os handlers registrados
+
+    Args:
+        token: token do bot
+        with_updater: False nos workers do modo webhook (updates vêm da fila)
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .connect_timeout(30.0)
+        .read_timeout(30.0)
+        .write_timeout(30.0)
+        .pool_timeout(30.0)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    telegram_app = builder.build()
+
+    # Registrar handlers (apenas comandos essenciais)
+    telegram_app.add_handler(CommandHandler("start", start_command))
+    telegram_app.add_handler(CommandHandler("help", help_command))
+    telegram_app.add_handler(CommandHandler("stats", stats_command))
+    telegram_app.add_handler(CommandHandler("mbti", mbti_command))
+    telegram_app.add_handler(CommandHandler("desenvolvimento", desenvolvimento_command))
+    telegram_app.add_handler(CommandHandler("reset", reset_command))
+    telegram_app.add_handler(CommandHandler("meu_perfil", meu_perfil_command))
+    telegram_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    telegram_app.add_error_handler(_handler_error)
+
+    return telegram_app
+
+
+# Erros de handler do update em processamento pela fila (process_queued_update)
+_handler_errors: ContextVar[Optional[list]] = ContextVar("telegram_handler_errors", default=None)
+
+
+async def _handler_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Error handler da Application
+
+    process_update nunca levanta: o PTB entrega a exceção do handler aos
+    error handlers. Vindo da fila, ela é guardada para process_queued_update
+    relançar; no polling só é registrada no log.
+    """
+    errors = _handler_errors.get()
+    if errors is not None:
+        errors.append(context.error)
+    else:
+        logger.error(f"❌ Erro ao processar update: {context.error}", exc_info=context.error)
+
+
+async def process_queued_update(telegram_app: Application, payload: dict) -> None:
+    """
+    Application.process_update para updates da fila durável (modo webhook)
+
+    Relança o primeiro erro de handler, para o consumidor marcar o update
+    como falho (nova tentativa com backoff) em vez de confirmá-lo.
+    """
+    errors: list = []
+    token = _handler_errors.set(errors)
+    try:
+        await telegram_app.process_update(Update.de_json(payload, telegram_app.bot))
+    finally:
+        _handler_errors.reset(token)
+    if errors:
+        raise errors[0]
+
+
+async def start_fragment_detection_sink():
+    """
+    🧬 TRI: Sink assíncrono de detecções (fora do caminho da mensagem)
+
+    Iniciado quando o aquecimento termina; até lá a detecção usa o modo síncrono.
+
+    Returns:
+        FragmentDetectionSink iniciado, ou None
+    """
+    await asyncio.to_thread(bot_state.wait_until_ready)
+    if not (bot_state.proactive and bot_state.proactive.tri_enabled):
+        return None
+    try:
+        from fragment_detector import FragmentDetectionSink
+        detection_sink = FragmentDetectionSink(
+            detector=bot_state.proactive.fragment_detector,
+            conn=bot_state.db.conn,
+            lock=bot_state.db._lock,
+            estimator=bot_state.proactive.trait_estimator
+        )
+        detection_sink.start()
+        bot_state.proactive.detection_sink = detection_sink
+        return detection_sink
+    except Exception as e:
+        logger.error(f"❌ Erro ao iniciar TRI Sink (usando modo síncrono): {e}")
+        return None
+
+
+async def stop_fragment_detection_sink(detection_sink) -> None:
+    """Flush final das detecções TRI pendentes"""
+    if detection_sink:
+        bot_state.proactive.detection_sink = None
+        await detection_sink.stop()
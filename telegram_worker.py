@@ -0,0 +1,187 @@
+"""
+telegram_worker.py - Worker de Updates do Telegram (modo webhook)
+=================================================================
+
+Processo consumidor da fila durável (update_queue.py). Cada worker é dono
+de uma partição (crc32 do usuário % N), monta a mesma Application do bot
+(sem updater) e entrega cada update a Application.process_update.
+
+Uso (normalmente iniciado por main.py via WebhookWorkerPool):
+    python telegram_worker.py --partition 0 --partitions 4
+
+Cada processo tem seu próprio BotState/HybridDatabaseManager (conexão
+SQLite própria, WAL + busy_timeout). O ChromaDB (PersistentClient) não é
+seguro para escrita simultânea de vários processos: com o ChromaDB local
+disponível, main.py não inicia workers (consome no processo web) e este
+script se recusa a rodar.
+
+Autor: Sistema Jung
+"""
+
+import os
+import sys
+import signal
+import asyncio
+import logging
+import argparse
+from typing import List, Optional
+
+from update_queue import TelegramUpdateQueue, UpdateQueueConsumer
+
+logger = logging.getLogger(__name__)
+
+RESTART_BACKOFF_S = (1, 2, 5, 10, 30)
+STOP_TIMEOUT_S = 30
+
+
+async def run_worker(partition: int, partitions: int, concurrency: int,
+                     queue_path: Optional[str] = None) -> None:
+    """Consome uma partição até receber SIGTERM/SIGINT"""
+    # Importado aqui: constrói o BotState (SQLite) deste processo
+    from telegram_bot import (
+        bot_state, build_application, process_queued_update, start_fragment_detection_sink,
+        stop_fragment_detection_sink, TELEGRAM_BOT_TOKEN
+    )
+    from user_profile_writer import flush_session_log
+
+    bot_state.warm_up()
+
+    telegram_app = build_application(TELEGRAM_BOT_TOKEN, with_updater=False)
+    await telegram_app.initialize()
+    await telegram_app.start()
+
+    sink_task = asyncio.create_task(start_fragment_detection_sink())
+
+    async def process(payload):
+        await process_queued_update(telegram_app, payload)
+
+    queue = TelegramUpdateQueue(queue_path, partitions=partitions)
+    consumer = UpdateQueueConsumer(
+        queue, process, partitions=[partition], concurrency=concurrency,
+        worker_id=f"worker{partition}-pid{os.getpid()}"
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, consumer.stop)
+        except NotImplementedError:
+            pass
+
+    try:
+        await consumer.run()
+    finally:
+        logger.info(f"🛑 Worker {partition}/{partitions} parando: {consumer.stats}")
+        await telegram_app.stop()
+        await telegram_app.shutdown()
+
+        detection_sink = None
+        if sink_task.done() and not sink_task.cancelled():
+            detection_sink = sink_task.result()
+        else:
+            sink_task.cancel()
+        await stop_fragment_detection_sink(detection_sink)
+
+        bot_state.db.user_registry.close()
+        flush_session_log()
+        if bot_state.db.mem0:
+            bot_state.db.mem0.close()
+        queue.close()
+
+
+class WebhookWorkerPool:
+    """
+    Supervisiona N processos telegram_worker.py (um por partição)
+
+    Workers que saem inesperadamente são reiniciados com backoff; a
+    partição é reassumida e os updates em processamento voltam à fila.
+    """
+
+    def __init__(self, partitions: int, concurrency: int, queue_path: Optional[str] = None):
+        self.partitions = partitions
+        self.concurrency = concurrency
+        self.queue_path = queue_path
+
+        self._procs: List[Optional[asyncio.subprocess.Process]] = [None] * partitions
+        self._supervisors: List[asyncio.Task] = []
+        self._stopping = False
+
+    def _command(self, partition: int) -> List[str]:
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--partition", str(partition),
+            "--partitions", str(self.partitions),
+            "--concurrency", str(self.concurrency),
+        ]
+        if self.queue_path:
+            command += ["--queue-path", self.queue_path]
+        return command
+
+    async def _supervise(self, partition: int) -> None:
+        restarts = 0
+        while not self._stopping:
+            proc = await asyncio.create_subprocess_exec(
+                *self._command(partition),
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            self._procs[partition] = proc
+            logger.info(f"👷 Worker {partition}/{self.partitions} iniciado (pid {proc.pid})")
+
+            returncode = await proc.wait()
+            if self._stopping:
+                return
+
+            delay = RESTART_BACKOFF_S[min(restarts, len(RESTART_BACKOFF_S) - 1)]
+            restarts += 1
+            logger.error(f"❌ Worker {partition} saiu com código {returncode}; reiniciando em {delay}s")
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        self._supervisors = [
+            asyncio.create_task(self._supervise(partition))
+            for partition in range(self.partitions)
+        ]
+
+    async def stop(self) -> None:
+        """SIGTERM em todos os workers; SIGKILL após STOP_TIMEOUT_S"""
+        self._stopping = True
+        running = [p for p in self._procs if p is not None and p.returncode is None]
+        for proc in running:
+            proc.terminate()
+        for proc in running:
+            try:
+                await asyncio.wait_for(proc.wait(), STOP_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ Worker pid {proc.pid} não parou em {STOP_TIMEOUT_S}s, encerrando à força")
+                proc.kill()
+                await proc.wait()
+        for task in self._supervisors:
+            task.cancel()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de updates do Telegram (modo webhook)")
+    parser.add_argument("--partition", type=int, required=True)
+    parser.add_argument("--partitions", type=int, required=True)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--queue-path", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format=f'%(asctime)s - worker{args.partition} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+    from jung_core import CHROMADB_AVAILABLE
+    if CHROMADB_AVAILABLE:
+        logger.error("❌ Worker recusado: ChromaDB local não aceita escrita de vários processos "
+                     "(use TELEGRAM_WEBHOOK_WORKERS=0)")
+        sys.exit(2)
+
+    asyncio.run(run_worker(args.partition, args.partitions, args.concurrency, args.queue_path))
+
+
+if __name__ == "__main__":
+    main()
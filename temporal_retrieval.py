@@ -0,0 +1,315 @@
+"""
+temporal_retrieval.py - Busca Semântica em Camadas Temporais
+============================================================
+
+save_conversation grava day_bucket/week_bucket/month_bucket nos metadados
+do ChromaDB, mas semantic_search filtrava só por user_id e aplicava a
+recência depois, no rerank. Para usuários com muito histórico, memórias
+antigas ocupavam o broad_k e cada consulta ANN varria tudo.
+
+Dois mecanismos:
+
+1. Intenção temporal explícita ("semana passada", "ontem", "em março",
+   "há 3 meses", "last week"...) junto de uma pista de lembrança ("lembra",
+   "falamos", "conversamos", "te contei"...): detect_temporal_intent
+   converte a expressão em buckets e a consulta vai direto a eles. Sem a
+   pista ("hoje acordei cansado", "faz 2 anos que trabalho lá") a data
+   descreve o presente, não a conversa procurada, e não restringe a busca.
+
+2. Camadas (sem intenção explícita): recente (≤30 dias, k pequeno) →
+   médio (31-90 dias) → histórico completo (filtro só por user_id, como
+   antes). A busca só alarga quando a camada anterior não trouxe k
+   resultados com similaridade ≥ min_similarity.
+
+recency_tier não serve de filtro: é calculado na gravação e nunca
+atualizado (uma conversa de seis meses atrás continua "recent"). As
+camadas usam day_bucket, que é absoluto.
+
+Documentos sem day_bucket (consolidados, legados) só aparecem na última
+camada, que é a busca original por user_id.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+RECENT_DAYS = 30
+MEDIUM_DAYS = 90
+
+# Intenção "arqueológica": sem buckets, prioriza memórias antigas no rerank
+ARCHEOLOGICAL_PATTERNS = [
+    r"\bha muito tempo\b", r"\bantigamente\b", r"\bla atras\b", r"\bno comeco\b",
+    r"\bquando (a gente|nos) comec", r"\blong ago\b", r"\bat the beginning\b",
+]
+
+MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+}
+
+UNIT_DAYS = {
+    "dia": 1, "dias": 1, "day": 1, "days": 1,
+    "semana": 7, "semanas": 7, "week": 7, "weeks": 7,
+    "mes": 30, "meses": 30, "month": 30, "months": 30,
+}
+
+# Pista de que a mensagem procura uma conversa anterior; precisa estar na
+# mesma frase da expressão temporal, a até RECALL_WINDOW_CHARS caracteres
+RECALL_CUE_RE = re.compile("|".join([
+    r"\blembr\w*", r"\brecorda\w*",
+    r"\b(?:falamos|conversamos|discutimos|comentamos)\b", r"\bnossa conversa\b",
+    r"\bte (?:falei|contei|disse|perguntei|mostrei|mandei)\b",
+    r"\b(?:voce|vc|tu) (?:me )?(?:disse|falou|comentou|mencionou|perguntou|sugeriu)\b",
+    r"\bremember\w*", r"\brecall\b", r"\bwe (?:talked|discussed|spoke)\b",
+    r"\b(?:told|asked) you\b", r"\byou (?:said|told|mentioned|suggested)\b",
+]))
+RECALL_WINDOW_CHARS = 60
+
+NUMBER_WORDS = {
+    "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "quatro": 4, "cinco": 5,
+    "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10,
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+}
+
+
+@dataclass
+class TemporalIntent:
+    """
+    Recorte temporal pedido pela mensagem
+
+    Attributes:
+        label: expressão reconhecida (para log)
+        start, end: intervalo de datas inclusivo (None em intenção arqueológica)
+        temporal_mode: modo de calculate_temporal_boost para o rerank
+    """
+    label: str
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    temporal_mode: str = "neutral"
+
+    @property
+    def has_range(self) -> bool:
+        return self.start is not None and self.end is not None
+
+
+@dataclass
+class SearchTier:
+    """Camada de busca: filtro de metadados + k da consulta ANN"""
+    name: str
+    where: Dict
+    k: int
+    temporal_mode: str = "balanced"
+
+
+@dataclass
+class TieredSearchInfo:
+    tiers_run: List[str] = field(default_factory=list)
+    candidates: int = 0
+
+
+def _fold(text: str) -> str:
+    """minúsculas sem acento ("mês" → "mes")"""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in normalized if not unicodedata.combining(c))
+
+
+def _start_of_week(day: datetime) -> datetime:
+    return (day - timedelta(days=day.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    start = datetime(year, month, 1)
+    next_month = datetime(year + (month == 12), month % 12 + 1, 1)
+    return start, next_month - timedelta(days=1)
+
+
+def _search(pattern: str, text: str) -> Optional[re.Match]:
+    """Primeira ocorrência de pattern com pista de lembrança na mesma frase, por perto"""
+    for match in re.finditer(pattern, text):
+        before = re.split(r"[.!?\n]", text[max(0, match.start() - RECALL_WINDOW_CHARS):match.start()])[-1]
+        after = re.split(r"[.!?\n]", text[match.end():match.end() + RECALL_WINDOW_CHARS])[0]
+        if RECALL_CUE_RE.search(before) or RECALL_CUE_RE.search(after) \
+                or RECALL_CUE_RE.search(match.group(0)):
+            return match
+    return None
+
+
+def detect_temporal_intent(query: str, now: Optional[datetime] = None) -> Optional[TemporalIntent]:
+    """
+    Reconhece referências temporais em português (e inglês) na mensagem
+
+    Só há recorte com pista de lembrança junto da expressão ("lembra o que
+    falamos ontem?"); "hoje estou cansado" não restringe a busca.
+
+    Returns:
+        TemporalIntent ou None se a mensagem não delimita um período
+    """
+    if not query:
+        return None
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    text = _fold(query)
+
+    if not RECALL_CUE_RE.search(text):
+        return _archeological(text)
+
+    if _search(r"\banteontem\b", text):
+        day = today - timedelta(days=2)
+        return TemporalIntent("anteontem", day, day)
+    if _search(r"\bontem\b|\byesterday\b", text):
+        day = today - timedelta(days=1)
+        return TemporalIntent("ontem", day, day)
+    if _search(r"\bhoje\b|\bmais cedo\b|\btoday\b|\bearlier today\b", text):
+        return TemporalIntent("hoje", today, today)
+
+    if _search(r"\bsemana passada\b|\bultima semana\b|\blast week\b", text):
+        start = _start_of_week(today) - timedelta(days=7)
+        return TemporalIntent("semana passada", start, start + timedelta(days=6))
+    if _search(r"\b(esta|essa|nesta|nessa) semana\b|\bthis week\b", text):
+        return TemporalIntent("esta semana", _start_of_week(today), today)
+
+    if _search(r"\bmes passado\b|\bultimo mes\b|\blast month\b", text):
+        first_this_month = today.replace(day=1)
+        last_month_end = first_this_month - timedelta(days=1)
+        return TemporalIntent("mês passado", *_month_range(last_month_end.year, last_month_end.month))
+    if _search(r"\b(este|esse|neste|nesse) mes\b|\bthis month\b", text):
+        return TemporalIntent("este mês", today.replace(day=1), today)
+
+    # "nos últimos 10 dias", "in the last 2 weeks"
+    match = _search(r"\b(?:nos|nas|in the|over the) (?:ultim[oa]s|last|past) (\d+|\w+) (\w+)\b", text)
+    if match and match.group(2) in UNIT_DAYS:
+        amount = int(match.group(1)) if match.group(1).isdigit() else NUMBER_WORDS.get(match.group(1))
+        if amount:
+            days = amount * UNIT_DAYS[match.group(2)]
+            return TemporalIntent(f"últimos {days} dias", today - timedelta(days=days), today)
+
+    # "há 3 semanas", "ha uns dois meses", "3 weeks ago"
+    match = (_search(r"\b(?:ha|faz) (?:uns |umas |cerca de )?(\d+|\w+) (\w+)\b", text)
+             or _search(r"\b(\d+|\w+) (\w+) ago\b", text))
+    if match and match.group(2) in UNIT_DAYS:
+        amount = int(match.group(1)) if match.group(1).isdigit() else NUMBER_WORDS.get(match.group(1))
+        if amount:
+            days = amount * UNIT_DAYS[match.group(2)]
+            # Janela de ±metade da unidade em torno do ponto (mínimo ±2 dias)
+            slack = max(2, UNIT_DAYS[match.group(2)] // 2)
+            center = today - timedelta(days=days)
+            return TemporalIntent(f"há {days} dias", center - timedelta(days=slack),
+                                  min(today, center + timedelta(days=slack)))
+
+    # "em março", "em março de 2025", "in january"
+    match = _search(r"\b(?:em|no mes de|in) (" + "|".join(MONTHS) + r")(?: de (\d{4}))?\b", text)
+    if match:
+        month = MONTHS[match.group(1)]
+        year = int(match.group(2)) if match.group(2) else (now.year if month <= now.month else now.year - 1)
+        return TemporalIntent(f"{match.group(1)}/{year}", *_month_range(year, month))
+
+    if _search(r"\bano passado\b|\blast year\b", text):
+        return TemporalIntent("ano passado", datetime(now.year - 1, 1, 1), datetime(now.year - 1, 12, 31))
+
+    return _archeological(text)
+
+
+def _archeological(text: str) -> Optional[TemporalIntent]:
+    # Sem recorte de buckets (só muda o rerank): dispensa pista de lembrança
+    if any(re.search(pattern, text) for pattern in ARCHEOLOGICAL_PATTERNS):
+        return TemporalIntent("passado distante", temporal_mode="archeological")
+    return None
+
+
+def day_buckets(start: datetime, end: datetime) -> List[str]:
+    """day_bucket ("YYYY-MM-DD") de cada dia do intervalo inclusivo"""
+    days = (end.date() - start.date()).days
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days + 1)]
+
+
+def month_buckets(start: datetime, end: datetime) -> List[str]:
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = year + (month == 12), month % 12 + 1
+    return months
+
+
+def bucket_clause(start: datetime, end: datetime) -> Dict:
+    """Filtro por day_bucket (até ~2 meses) ou month_bucket (períodos longos)"""
+    if (end - start).days <= 62:
+        return {"day_bucket": {"$in": day_buckets(start, end)}}
+    return {"month_bucket": {"$in": month_buckets(start, end)}}
+
+
+def build_tiers(user_id: str, k: int, broad_k: int, intent: Optional[TemporalIntent] = None,
+                now: Optional[datetime] = None) -> List[SearchTier]:
+    """
+    Plano de camadas para uma consulta
+
+    Com intenção de período: os buckets do período e, se vier fraco, o
+    histórico completo. Sem intenção: recente → médio → completo.
+    """
+    user_clause = {"user_id": user_id}
+    everything = SearchTier("completo", user_clause, broad_k)
+
+    if intent is not None and intent.has_range:
+        scoped = {"$and": [user_clause, bucket_clause(intent.start, intent.end)]}
+        return [
+            SearchTier(f"período:{intent.label}", scoped, broad_k, temporal_mode=intent.temporal_mode),
+            everything,
+        ]
+    if intent is not None:
+        everything.temporal_mode = intent.temporal_mode
+        return [everything]
+
+    today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    recent = day_buckets(today - timedelta(days=RECENT_DAYS), today)
+    medium = day_buckets(today - timedelta(days=MEDIUM_DAYS), today - timedelta(days=RECENT_DAYS + 1))
+    return [
+        SearchTier("recente", {"$and": [user_clause, {"day_bucket": {"$in": recent}}]}, max(k, 4)),
+        SearchTier("médio", {"$and": [user_clause, {"day_bucket": {"$in": medium}}]}, max(k + 2, 6)),
+        everything,
+    ]
+
+
+def _doc_key(doc) -> str:
+    metadata = getattr(doc, "metadata", None) or {}
+    conversation_id = metadata.get("conversation_id")
+    if conversation_id is not None:
+        return f"conv:{conversation_id}"
+    return f"text:{hash(getattr(doc, 'page_content', ''))}"
+
+
+def tiered_search(search: Callable[[str, int, Dict], List[tuple]], query: str, tiers: List[SearchTier],
+                  k: int, min_similarity: float) -> Tuple[List[tuple], str, TieredSearchInfo]:
+    """
+    Executa as camadas até ter k resultados fortes
+
+    Args:
+        search: (query, k, where) → [(Document, distância)] (similarity_search_with_score)
+        min_similarity: 1 - distância mínima para um resultado contar como forte
+
+    Returns:
+        (resultados sem duplicatas, modo temporal do rerank, info)
+    """
+    info = TieredSearchInfo()
+    merged: Dict[str, tuple] = {}
+    temporal_mode = "balanced"
+
+    for tier in tiers:
+        results = search(query, tier.k, tier.where)
+        info.tiers_run.append(f"{tier.name}={len(results)}")
+        temporal_mode = tier.temporal_mode
+        for doc, score in results:
+            key = _doc_key(doc)
+            if key not in merged or score < merged[key][1]:
+                merged[key] = (doc, score)
+
+        strong = sum(1 for _, score in merged.values() if 1 - score >= min_similarity)
+        if strong >= k:
+            break
+
+    info.candidates = len(merged)
+    ordered = sorted(merged.values(), key=lambda item: item[1])
+    return ordered, temporal_mode, info
@@ -0,0 +1,108 @@
+"""
+test_embedding_backends.py
+
+Script de teste: backend ONNX int8 vs baseline PyTorch (all-MiniLM-L6-v2)
+
+Os vetores já indexados no ChromaDB/Qdrant vieram do PyTorch; o backend
+ONNX só pode substituí-lo se cair no mesmo espaço vetorial. Mede o
+cosseno texto a texto entre os dois backends e a latência de cada um.
+"""
+
+import sys
+import time
+import logging
+
+import numpy as np
+
+from embedding_backends import BACKEND_ONNX, BACKEND_TORCH, cosine_agreement, create_embeddings
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MIN_COSINE = 0.98  # pior texto
+MIN_MEAN_COSINE = 0.99
+
+SAMPLE_TEXTS = [
+    "ok",
+    "Hoje conversei com minha mãe sobre o trabalho e fiquei ansioso o resto do dia.",
+    "Sonhei que estava num labirinto escuro e não encontrava a saída.",
+    "A Ana disse que vai viajar para Lisboa em março, e eu não sei se vou junto.",
+    "Qual o sentido da vida quando tudo parece repetitivo?",
+    "Me sinto travado no projeto, não consigo começar nada e isso me irrita.",
+    "Meu pai nunca aprovou minhas escolhas; talvez eu ainda procure essa aprovação.",
+    "I keep dreaming about the ocean and a house I have never seen.",
+    "Input: tenho medo de falhar de novo\nResposta: o medo de falhar costuma guardar um desejo antigo.",
+    " ".join(["Falamos sobre sombra, persona e o que escondo dos outros."] * 20),  # acima de 256 tokens
+]
+
+_backends = None
+
+
+def _load_backends():
+    """(PyTorch, ONNX) carregados uma vez e compartilhados pelos testes"""
+    global _backends
+    if _backends is None:
+        _backends = (create_embeddings(BACKEND_TORCH), create_embeddings(BACKEND_ONNX))
+    return _backends
+
+
+def test_cosine_agreement():
+    """Cosseno por texto entre PyTorch e ONNX int8"""
+
+    logger.info("=" * 60)
+    logger.info("TESTE 1: Concordância PyTorch x ONNX int8")
+    logger.info("=" * 60)
+
+    torch_backend, onnx_backend = _load_backends()
+
+    cosines = cosine_agreement(SAMPLE_TEXTS, torch_backend, onnx_backend)
+    for text, cosine in zip(SAMPLE_TEXTS, cosines):
+        logger.info(f"   {cosine:.4f}  {text[:60]!r}")
+
+    logger.info(f"\n   mínimo={cosines.min():.4f} (limite {MIN_COSINE}), "
+                f"média={cosines.mean():.4f} (limite {MIN_MEAN_COSINE})")
+    assert cosines.min() >= MIN_COSINE, f"cosseno mínimo {cosines.min():.4f} < {MIN_COSINE}"
+    assert cosines.mean() >= MIN_MEAN_COSINE, f"cosseno médio {cosines.mean():.4f} < {MIN_MEAN_COSINE}"
+
+    # Mesma ordem de vizinhos: a busca no índice antigo devolve os mesmos documentos
+    query = "estou com medo de fracassar no trabalho"
+    torch_rank = np.argsort(-np.asarray(torch_backend.embed_documents(SAMPLE_TEXTS)) @ torch_backend.embed_query(query))
+    onnx_rank = np.argsort(-np.asarray(onnx_backend.embed_documents(SAMPLE_TEXTS)) @ onnx_backend.embed_query(query))
+    logger.info(f"   top-3 PyTorch={torch_rank[:3].tolist()} ONNX={onnx_rank[:3].tolist()}")
+    assert torch_rank[:3].tolist() == onnx_rank[:3].tolist(), "top-3 diferente entre backends"
+
+
+def test_latency():
+    """Latência de embed_query (caminho da mensagem) e embed_documents em lote"""
+
+    logger.info("\n" + "=" * 60)
+    logger.info("TESTE 2: Latência")
+    logger.info("=" * 60)
+
+    torch_backend, onnx_backend = _load_backends()
+    for name, backend in ((BACKEND_TORCH, torch_backend), (BACKEND_ONNX, onnx_backend)):
+        backend.embed_query("aquecimento")
+
+        started = time.perf_counter()
+        for text in SAMPLE_TEXTS:
+            backend.embed_query(text)
+        per_query = (time.perf_counter() - started) * 1000 / len(SAMPLE_TEXTS)
+
+        batch = SAMPLE_TEXTS * 10
+        started = time.perf_counter()
+        backend.embed_documents(batch)
+        per_doc = (time.perf_counter() - started) * 1000 / len(batch)
+
+        logger.info(f"   {name:5s}: embed_query {per_query:.1f}ms | embed_documents {per_doc:.1f}ms/texto")
+
+
+if __name__ == "__main__":
+    try:
+        test_cosine_agreement()
+        test_latency()
+        logger.info("\n✅ TODOS OS TESTES PASSARAM")
+    except Exception as e:
+        logger.error(f"\n❌ ERRO NO TESTE: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        sys.exit(1)
@@ -0,0 +1,201 @@
+"""
+test_mem0_sync.py
+
+Script de teste: gravação assíncrona em lote e cache de get_context do
+Mem0MemoryAdapter, sobre LocalMemoryStore (sem Qdrant/LLM)
+"""
+
+import time
+import logging
+
+from mem0_memory_adapter import LocalMemoryStore, Mem0MemoryAdapter
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _FailingStore(LocalMemoryStore):
+    """LocalMemoryStore cujo add falha nas primeiras `failures` chamadas (-1 = sempre)"""
+
+    def __init__(self, failures: int = -1, latency_s: float = 0.0):
+        super().__init__(latency_s)
+        self.failures = failures
+
+    def add(self, messages, user_id, **kwargs):
+        if self.failures:
+            if self.failures > 0:
+                self.failures -= 1
+            raise ConnectionError("Qdrant indisponível")
+        return super().add(messages, user_id, **kwargs)
+
+
+class _WriteDuringSearchStore(LocalMemoryStore):
+    """Uma troca do usuário chega enquanto a busca dele está em andamento"""
+
+    def __init__(self):
+        super().__init__()
+        self.adapter = None
+        self.interleave = False
+
+    def search(self, query, user_id, limit=10, **kwargs):
+        result = super().search(query, user_id, limit, **kwargs)
+        if self.interleave:
+            self.interleave = False
+            self.adapter.add_exchange(user_id, "Minha irmã Clara mudou para Lisboa", "Como você se sente?")
+        return result
+
+
+def _adapter(store, **kwargs) -> Mem0MemoryAdapter:
+    adapter = Mem0MemoryAdapter(memory=store, **kwargs)
+    # Backoff curto: o teste não espera os segundos de produção
+    adapter.RETRY_BASE_S = 0.01
+    adapter.RETRY_MAX_S = 0.05
+    return adapter
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_batching():
+    """Trocas enfileiradas viram um mem.add por usuário por lote"""
+
+    logger.info("=" * 60)
+    logger.info("TESTE 1: Envio em lote")
+    logger.info("=" * 60)
+
+    store = LocalMemoryStore()
+    adapter = _adapter(store, async_writes=True, batch_size=10, flush_interval_s=30.0)
+    for i in range(20):
+        adapter.add_exchange(f"user_{i % 2}", f"mensagem {i} sobre meu trabalho", "resposta")
+
+    assert adapter.flush(timeout=5.0), "flush não esvaziou a fila"
+    adapter.close()
+
+    logger.info(f"   stats={adapter.stats} calls={store.calls}")
+    assert adapter.stats["sent"] == 20
+    assert adapter.stats["add_calls"] == store.calls["add"] == 4, store.calls  # 2 lotes x 2 usuários
+    for user_id in ("user_0", "user_1"):
+        memories = [m["memory"] for m in store.get_all(user_id=user_id)["results"]]
+        assert len(memories) == 10, memories
+        assert memories[0].startswith(f"mensagem {user_id[-1]} "), memories  # ordem preservada
+
+
+def test_backoff_and_drop():
+    """Falha transitória é reenviada com backoff; falha persistente é descartada após max_retries"""
+
+    logger.info("\n" + "=" * 60)
+    logger.info("TESTE 2: Backoff e descarte")
+    logger.info("=" * 60)
+
+    flaky = _FailingStore(failures=2)
+    adapter = _adapter(flaky, async_writes=True, batch_size=5, flush_interval_s=0.01, max_retries=3)
+    adapter.add_exchange("user_flaky", "sonhei com o mar", "resposta")
+    assert _wait_until(lambda: adapter.pending() == 0), adapter.stats
+    adapter.close()
+    logger.info(f"   transitória: {adapter.stats}")
+    assert adapter.stats["retries"] == 2 and adapter.stats["sent"] == 1 and adapter.stats["dropped"] == 0
+    assert len(flaky.get_all(user_id="user_flaky")["results"]) == 1
+
+    broken = _FailingStore()
+    adapter = _adapter(broken, async_writes=True, batch_size=5, flush_interval_s=0.01, max_retries=2)
+    for i in range(3):
+        adapter.add_exchange("user_broken", f"mensagem {i}", "resposta")
+    assert _wait_until(lambda: adapter.pending() == 0), adapter.stats
+    adapter.close()
+    logger.info(f"   persistente: {adapter.stats}")
+    assert adapter.stats["dropped"] == 3 and adapter.stats["sent"] == 0
+    assert adapter.stats["retries"] == 3 * 2
+
+
+def test_close_drains_queue():
+    """close() envia o que está na fila sem esperar o intervalo e não espera backoff"""
+
+    logger.info("\n" + "=" * 60)
+    logger.info("TESTE 3: close() drena a fila")
+    logger.info("=" * 60)
+
+    store = LocalMemoryStore(latency_s=0.02)
+    adapter = _adapter(store, async_writes=True, batch_size=4, flush_interval_s=60.0)
+    for i in range(10):
+        adapter.add_exchange("user_close", f"mensagem {i}", "resposta")
+    started = time.monotonic()
+    adapter.close(timeout=5.0)
+    logger.info(f"   drenado em {time.monotonic() - started:.2f}s: {adapter.stats}")
+    assert adapter.pending() == 0
+    assert len(store.get_all(user_id="user_close")["results"]) == 10
+
+    # Depois de fechado, add_exchange grava direto
+    adapter.add_exchange("user_close", "mensagem tardia", "resposta")
+    assert len(store.get_all(user_id="user_close")["results"]) == 11
+
+    broken = _FailingStore()
+    adapter = _adapter(broken, async_writes=True, batch_size=4, flush_interval_s=60.0, max_retries=5)
+    adapter.RETRY_BASE_S = adapter.RETRY_MAX_S = 30.0  # backoff que o desligamento não pode esperar
+    adapter.add_exchange("user_broken", "mensagem", "resposta")
+    started = time.monotonic()
+    adapter.close(timeout=5.0)
+    elapsed = time.monotonic() - started
+    logger.info(f"   com falha: {elapsed:.2f}s {adapter.stats}")
+    assert elapsed < 5.0 and adapter.pending() == 0 and adapter.stats["dropped"] == 1
+
+
+def test_cache_invalidation():
+    """Envio para o usuário invalida o cache; busca concorrente a um envio não grava resultado velho"""
+
+    logger.info("\n" + "=" * 60)
+    logger.info("TESTE 4: Invalidação do cache de get_context")
+    logger.info("=" * 60)
+
+    store = LocalMemoryStore()
+    adapter = _adapter(store, async_writes=True, flush_interval_s=0.01, context_ttl_s=60.0)
+    adapter.add_exchange("user_cache", "Meu irmão Pedro trabalha em Lisboa", "resposta")
+    adapter.add_exchange("user_other", "Gosto de Lisboa", "resposta")
+    assert adapter.flush(timeout=5.0)
+
+    first = adapter.get_context("user_cache", "Lisboa")
+    assert adapter.get_context("user_cache", "  lisboa! ") == first
+    assert adapter.stats["cache_hits"] == 1
+    adapter.get_context("user_other", "Lisboa")
+
+    adapter.add_exchange("user_cache", "Minha mãe também mora em Lisboa", "resposta")
+    assert adapter.flush(timeout=5.0)
+    second = adapter.get_context("user_cache", "Lisboa")
+    logger.info(f"   depois do envio: {second!r}")
+    assert second != first and "mãe" in second
+    assert adapter.stats["cache_hits"] == 1
+    adapter.get_context("user_other", "Lisboa")
+    assert adapter.stats["cache_hits"] == 2, "invalidação de um usuário não afeta os outros"
+    adapter.close()
+
+    racing = _WriteDuringSearchStore()
+    adapter = _adapter(racing, context_ttl_s=60.0)
+    racing.adapter = adapter
+    adapter.add_exchange("user_race", "Trabalho em Lisboa", "resposta")
+    racing.interleave = True
+    stale = adapter.get_context("user_race", "Lisboa")
+    fresh = adapter.get_context("user_race", "Lisboa")
+    logger.info(f"   busca concorrente: {stale!r} → {fresh!r}")
+    assert "Clara" not in stale and "Clara" in fresh
+    assert adapter.stats["cache_hits"] == 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    try:
+        test_batching()
+        test_backoff_and_drop()
+        test_close_drains_queue()
+        test_cache_invalidation()
+        logger.info("\n✅ TODOS OS TESTES PASSARAM")
+    except Exception as e:
+        logger.error(f"\n❌ ERRO NO TESTE: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        sys.exit(1)
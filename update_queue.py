@@ -0,0 +1,362 @@
+"""
+update_queue.py - Fila Durável de Updates do Telegram (modo webhook)
+====================================================================
+
+No modo webhook (TELEGRAM_MODE=webhook) a rota /telegram/webhook apenas
+grava o update recebido nesta fila (SQLite próprio, WAL) e responde 200.
+Workers (processos `python telegram_worker.py`) consomem a fila:
+
+- Particionamento por hash do usuário: partition = crc32(user_key) % N.
+  Cada worker é dono de uma partição, então todos os updates de um
+  usuário passam sempre pelo mesmo processo (caches por usuário em
+  memória continuam válidos)
+- Ordem por usuário: um update só é reivindicado quando não há outro do
+  mesmo usuário em processamento, sempre o de menor update_id
+- Usuários diferentes da mesma partição são processados em paralelo
+  (WEBHOOK_WORKER_CONCURRENCY)
+- Durável: updates 'processing' de um worker que morreu voltam para
+  'pending' quando a partição é reassumida; update_id é a chave primária,
+  então reenvios do Telegram são ignorados
+
+Autor: Sistema Jung
+"""
+
+import os
+import json
+import time
+import zlib
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+DONE_RETENTION_HOURS = 24
+
+
+def default_queue_path() -> str:
+    data_dir = os.getenv("RAILWAY_VOLUME_MOUNT_PATH", "./data")
+    return os.getenv("TELEGRAM_QUEUE_PATH", os.path.join(data_dir, "telegram_updates.db"))
+
+
+def update_user_key(update: Dict) -> str:
+    """
+    Chave de ordenação do update: usuário remetente (ou chat, se não houver)
+
+    Trabalha sobre o JSON cru, sem desserializar o Update.
+    """
+    for field in ("message", "edited_message", "callback_query", "inline_query",
+                  "chosen_inline_result", "my_chat_member", "chat_member",
+                  "chat_join_request", "pre_checkout_query", "shipping_query",
+                  "poll_answer", "channel_post", "edited_channel_post"):
+        payload = update.get(field)
+        if not isinstance(payload, dict):
+            continue
+        sender = payload.get("from") or payload.get("user")
+        if isinstance(sender, dict) and sender.get("id") is not None:
+            return f"u{sender['id']}"
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and chat.get("id") is not None:
+            return f"c{chat['id']}"
+    return "global"
+
+
+def partition_for(user_key: str, partitions: int) -> int:
+    """Hash estável (crc32) - hash() do Python muda entre processos"""
+    return zlib.crc32(user_key.encode("utf-8")) % max(1, partitions)
+
+
+class TelegramUpdateQueue:
+    """
+    Fila SQLite de updates (um arquivo separado do banco principal)
+
+    Cada instância abre sua própria conexão; a fila é compartilhada entre
+    o processo web (produtor) e os workers (consumidores).
+    """
+
+    def __init__(self, path: Optional[str] = None, partitions: int = 1):
+        self.path = path or default_queue_path()
+        self.partitions = max(1, partitions)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS telegram_update_queue (
+                    update_id INTEGER PRIMARY KEY,
+                    partition INTEGER NOT NULL,
+                    user_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    claimed_by TEXT,
+                    enqueued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    claimed_at DATETIME,
+                    processed_at DATETIME,
+                    error TEXT
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_update_queue_claim
+                ON telegram_update_queue(partition, status, update_id)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_update_queue_user
+                ON telegram_update_queue(user_key, status)
+            """)
+            self.conn.commit()
+
+    # ------------------------------------------------------------------
+    # Produtor
+    # ------------------------------------------------------------------
+
+    def enqueue(self, update: Dict) -> bool:
+        """
+        Grava o update (JSON do Telegram) na partição do usuário
+
+        Returns:
+            False se o update_id já estava na fila (reenvio do Telegram)
+        """
+        update_id = update.get("update_id")
+        if update_id is None:
+            raise ValueError("update sem update_id")
+
+        user_key = update_user_key(update)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                INSERT OR IGNORE INTO telegram_update_queue
+                    (update_id, partition, user_key, payload)
+                VALUES (?, ?, ?, ?)
+            """, (update_id, partition_for(user_key, self.partitions), user_key,
+                  json.dumps(update, ensure_ascii=False)))
+            self.conn.commit()
+            return cursor.rowcount == 1
+
+    def repartition(self) -> int:
+        """
+        Recalcula a partição dos updates não concluídos
+
+        Chamado na inicialização, antes dos workers: se o número de
+        partições mudou, updates pendentes continuam com dono.
+        """
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT update_id, user_key, partition FROM telegram_update_queue
+                WHERE status IN ('pending', 'processing')
+            """)
+            moves = [
+                (partition_for(user_key, self.partitions), update_id)
+                for update_id, user_key, partition in cursor.fetchall()
+                if partition_for(user_key, self.partitions) != partition
+            ]
+            if moves:
+                cursor.executemany(
+                    "UPDATE telegram_update_queue SET partition = ? WHERE update_id = ?", moves
+                )
+            self.conn.commit()
+            return len(moves)
+
+    # ------------------------------------------------------------------
+    # Consumidor
+    # ------------------------------------------------------------------
+
+    def recover(self, partitions: Iterable[int]) -> int:
+        """Devolve para 'pending' o que ficou em processamento (worker anterior morreu)"""
+        partitions = list(partitions)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(f"""
+                UPDATE telegram_update_queue
+                SET status = 'pending', claimed_by = NULL
+                WHERE status = 'processing'
+                  AND partition IN ({",".join("?" * len(partitions))})
+            """, partitions)
+            self.conn.commit()
+            return cursor.rowcount
+
+    def claim(self, partitions: Iterable[int], busy_users: Set[str], worker_id: str) -> Optional[sqlite3.Row]:
+        """
+        Reivindica o próximo update de um usuário sem update em andamento
+
+        O menor update_id entre usuários livres é necessariamente o mais
+        antigo pendente daquele usuário, o que preserva a ordem por usuário.
+        """
+        partitions = list(partitions)
+        busy = list(busy_users)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute(f"""
+                    SELECT update_id, user_key, payload, attempts
+                    FROM telegram_update_queue
+                    WHERE status = 'pending'
+                      AND partition IN ({",".join("?" * len(partitions))})
+                      {f"AND user_key NOT IN ({','.join('?' * len(busy))})" if busy else ""}
+                    ORDER BY update_id
+                    LIMIT 1
+                """, partitions + busy)
+                row = cursor.fetchone()
+                if row is not None:
+                    cursor.execute("""
+                        UPDATE telegram_update_queue
+                        SET status = 'processing', claimed_by = ?,
+                            claimed_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+                        WHERE update_id = ?
+                    """, (worker_id, row["update_id"]))
+                self.conn.commit()
+                return row
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def ack(self, update_id: int) -> None:
+        with self._lock:
+            self.conn.execute("""
+                UPDATE telegram_update_queue
+                SET status = 'done', processed_at = CURRENT_TIMESTAMP, error = NULL
+                WHERE update_id = ?
+            """, (update_id,))
+            self.conn.commit()
+
+    def fail(self, update_id: int, error: str, attempts: int) -> None:
+        """Volta para 'pending' até MAX_ATTEMPTS; depois fica 'failed'"""
+        status = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+        with self._lock:
+            self.conn.execute("""
+                UPDATE telegram_update_queue
+                SET status = ?, error = ?, claimed_by = NULL, processed_at = CURRENT_TIMESTAMP
+                WHERE update_id = ?
+            """, (status, error[:500], update_id))
+            self.conn.commit()
+
+    def purge_done(self, older_than_hours: int = DONE_RETENTION_HOURS) -> int:
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                DELETE FROM telegram_update_queue
+                WHERE status = 'done'
+                  AND processed_at < datetime('now', ?)
+            """, (f"-{int(older_than_hours)} hours",))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT partition, status, COUNT(*)
+                FROM telegram_update_queue
+                GROUP BY partition, status
+            """)
+            by_partition: Dict[int, Dict[str, int]] = {}
+            for partition, status, count in cursor.fetchall():
+                by_partition.setdefault(partition, {})[status] = count
+        return {"partitions": self.partitions, "by_partition": by_partition}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+class UpdateQueueConsumer:
+    """
+    Loop de consumo de uma ou mais partições
+
+    Args:
+        queue: TelegramUpdateQueue
+        process_update: coroutine que recebe o JSON do update e levanta em
+            caso de falha (telegram_bot.process_queued_update: o
+            Application.process_update puro nunca levanta)
+        partitions: partições atendidas por este consumidor
+        concurrency: usuários processados em paralelo
+        poll_interval_s: espera quando a fila está vazia
+    """
+
+    def __init__(self, queue: TelegramUpdateQueue,
+                 process_update: Callable[[Dict], "asyncio.Future"],
+                 partitions: List[int], concurrency: int = 4,
+                 poll_interval_s: float = 0.2, worker_id: Optional[str] = None):
+        self.queue = queue
+        self.process_update = process_update
+        self.partitions = list(partitions)
+        self.concurrency = max(1, concurrency)
+        self.poll_interval_s = poll_interval_s
+        self.worker_id = worker_id or f"pid{os.getpid()}"
+
+        self._busy_users: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+
+        self.stats = {"processed": 0, "failed": 0}
+
+    def notify(self) -> None:
+        """Acorda o loop (produtor no mesmo processo)"""
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        recovered = await asyncio.to_thread(self.queue.recover, self.partitions)
+        if recovered:
+            logger.warning(f"♻️ {recovered} update(s) reassumidos nas partições {self.partitions}")
+        logger.info(f"📥 Consumidor {self.worker_id} atendendo partições {self.partitions} (concorrência {self.concurrency})")
+
+        last_purge = time.monotonic()
+        while not self._stopping.is_set():
+            if len(self._tasks) >= self.concurrency:
+                await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            row = await asyncio.to_thread(
+                self.queue.claim, self.partitions, set(self._busy_users), self.worker_id
+            )
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval_s)
+                except asyncio.TimeoutError:
+                    pass
+                if time.monotonic() - last_purge > 3600:
+                    await asyncio.to_thread(self.queue.purge_done)
+                    last_purge = time.monotonic()
+                continue
+
+            self._busy_users.add(row["user_key"])
+            task = asyncio.create_task(self._handle(row))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _handle(self, row) -> None:
+        update_id = row["update_id"]
+        try:
+            await self.process_update(json.loads(row["payload"]))
+            await asyncio.to_thread(self.queue.ack, update_id)
+            self.stats["processed"] += 1
+        except Exception as e:
+            logger.error(f"❌ Erro ao processar update {update_id}: {e}", exc_info=True)
+            self.stats["failed"] += 1
+            await asyncio.to_thread(self.queue.fail, update_id, str(e), row["attempts"] + 1)
+        finally:
+            self._busy_users.discard(row["user_key"])
+            # Próximo update do mesmo usuário pode ser reivindicado
+            self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
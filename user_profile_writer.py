@@ -4,13 +4,20 @@ user_profile_writer.py - Camada de memória textual do JungAgent
 Mantém dois níveis de memória em arquivos .md:
   data/users/{user_id}/sessions/YYYY-MM-DD.md  ← log bruto do dia (append-only)
   data/users/{user_id}/profile.md              ← perfil psicológico consolidado
+
+O log de sessão é bufferizado e os dias passados são arquivados em
+sessions/archive/YYYY-MM.md.gz (ver session_log.py); flush_session_log()
+deve ser chamado no desligamento.
 """
 
 import os
+import atexit
 import logging
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from session_log import SessionLogWriter
+
 logger = logging.getLogger(__name__)
 
 DATA_DIR = os.path.join(".", "data", "users")  # mesmo base que jung_core.py usa (./data → /data no Railway)
@@ -23,6 +30,24 @@ def _user_dir(user_id: str) -> str:
     return path
 
 
+_session_log: Optional[SessionLogWriter] = None
+
+
+def get_session_log() -> SessionLogWriter:
+    """Writer bufferizado do processo (criado na primeira entrada)"""
+    global _session_log
+    if _session_log is None:
+        _session_log = SessionLogWriter(base_dir=lambda: DATA_DIR)
+        atexit.register(flush_session_log)
+    return _session_log
+
+
+def flush_session_log() -> None:
+    """Grava as entradas pendentes e fecha os arquivos (desligamento)"""
+    if _session_log is not None:
+        _session_log.close()
+
+
 def write_session_entry(
     user_id: str,
     user_name: str,
@@ -34,31 +59,26 @@ def write_session_entry(
     """
     Appenda uma entrada de conversa no log diário do usuário.
     tag: string opcional ex. '[FLUSH]' para marcar entradas de flush de contexto.
+
+    A entrada vai para o buffer de session_log e chega ao disco em até
+    SessionLogWriter.FLUSH_INTERVAL_S (bm25_search força o flush do usuário).
     """
     try:
-        today = datetime.now().strftime("%Y-%m-%d")
-        session_path = os.path.join(_user_dir(user_id), "sessions", f"{today}.md")
-
+        now = datetime.now()
         meta = metadata or {}
         tension = meta.get("tension_level", 0.0)
         charge = meta.get("affective_charge", 0.0)
-        ts = datetime.now().strftime("%H:%M")
 
         tag_str = f" {tag}" if tag else ""
         entry = (
-            f"\n## {ts}{tag_str}\n"
+            f"\n## {now:%H:%M}{tag_str}\n"
             f"**Usuário:** {user_input}\n\n"
             f"**Jung:** {ai_response}\n\n"
             f"_tensão={tension:.1f} | carga_afetiva={charge:.1f}_\n"
         )
 
-        is_new_file = not os.path.exists(session_path)
-        with open(session_path, "a", encoding="utf-8") as f:
-            if is_new_file:
-                f.write(f"# Sessão {today} — {user_name}\n")
-                logger.info(f"📄 [SESSION LOG] Novo arquivo criado: sessions/{today}.md (user={user_id[:8]})")
-            f.write(entry)
-        logger.debug(f"📄 [SESSION LOG] Entrada gravada em sessions/{today}.md (tag='{tag or '-'}')")
+        get_session_log().append(user_id, user_name, entry, day=now.strftime("%Y-%m-%d"))
+        logger.debug(f"📄 [SESSION LOG] Entrada em buffer para sessions/{now:%Y-%m-%d}.md (tag='{tag or '-'}')")
 
     except Exception as e:
         logger.warning(f"⚠️ user_profile_writer: erro ao gravar sessão de {user_id}: {e}")
@@ -0,0 +1,234 @@
+"""
+user_registry.py - Cache de Identidade/Organização de Usuários Telegram
+=======================================================================
+
+ensure_user_in_database roda a cada mensagem. Sem cache, cada mensagem
+fazia lookup do usuário, UPDATE users (last_seen) + commit, consulta a
+user_organization_mapping e, em reset_timer, outro UPDATE + commit.
+
+Este registro guarda, por Telegram ID, o user_id e as organizações
+ativas. Atualizações de last_seen são acumuladas em memória e gravadas em
+lote (um único commit) quando o pendente mais antigo passa de
+flush_interval_s ou quando há muitas pendentes. Uma thread de flush grava
+o que sobrou quando o tráfego para (o dashboard, a lista de usuários e
+os outros processos leem last_seen direto do banco); close() faz o flush
+final. get_user() sobrepõe o last_seen pendente, então quem lê o usuário
+neste processo (proativo, ruminação) vê o valor atual.
+
+Rotas de organização/admin que alteram vínculos devem chamar
+invalidate_org() / clear(). No modo webhook essas rotas rodam em outro
+processo; entradas expiram após entry_ttl_s e são relidas do banco.
+
+Autor: Sistema Jung
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RegisteredUser:
+    """Identidade resolvida de um usuário Telegram"""
+
+    __slots__ = ("telegram_id", "username", "user_id", "org_ids", "loaded_at")
+
+    def __init__(self, telegram_id: int, username: str, user_id: str, org_ids: Tuple[str, ...]):
+        self.telegram_id = telegram_id
+        self.username = username
+        self.user_id = user_id
+        self.org_ids = org_ids
+        self.loaded_at = time.monotonic()
+
+
+def _utc_timestamp() -> str:
+    """Mesmo formato de CURRENT_TIMESTAMP do SQLite (UTC, sem fração)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class UserRegistryCache:
+    """
+    Cache de RegisteredUser por Telegram ID com last_seen coalescido
+
+    Args:
+        db_manager: HybridDatabaseManager (usa conn e _lock)
+        flush_interval_s: idade máxima de um last_seen pendente (também o período da thread de flush)
+        max_pending: força o flush acima deste número de usuários pendentes
+        entry_ttl_s: idade máxima de uma identidade em cache (None = sem expiração)
+    """
+
+    FLUSH_INTERVAL_S = 30.0
+    MAX_PENDING = 200
+    MULTI_PROCESS_TTL_S = 60.0
+
+    def __init__(self, db_manager, flush_interval_s: float = FLUSH_INTERVAL_S,
+                 max_pending: int = MAX_PENDING, entry_ttl_s: Optional[float] = None):
+        self.db = db_manager
+        self.flush_interval_s = flush_interval_s
+        self.max_pending = max_pending
+        self.entry_ttl_s = entry_ttl_s
+
+        self._entries: Dict[int, RegisteredUser] = {}
+        # user_id -> (last_seen, platform_id ou None)
+        self._pending: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._oldest_pending: Optional[float] = None  # monotonic do primeiro toque pendente
+        self._lock = threading.Lock()
+
+        # Thread de flush por tempo (iniciada no primeiro touch)
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.stats = {"hits": 0, "misses": 0, "flushes": 0, "rows_flushed": 0}
+
+    # ------------------------------------------------------------------
+    # Identidade
+    # ------------------------------------------------------------------
+
+    def lookup(self, telegram_id: int, username: str) -> Optional[RegisteredUser]:
+        """
+        Retorna a identidade em cache, ou None se precisar resolver no banco
+
+        O user_id deriva do username; se o username mudou (ou a entrada
+        expirou), a entrada é descartada.
+        """
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is not None and (
+                entry.username != username
+                or (self.entry_ttl_s is not None
+                    and time.monotonic() - entry.loaded_at > self.entry_ttl_s)
+            ):
+                del self._entries[telegram_id]
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+            return entry
+
+    def load(self, telegram_id: int, username: str, user_id: str) -> RegisteredUser:
+        """Resolve as organizações no banco e guarda no cache"""
+        cursor = self.db.conn.cursor()
+        cursor.execute("""
+            SELECT org_id FROM user_organization_mapping
+            WHERE user_id = ? AND status = 'active'
+        """, (user_id,))
+        org_ids = tuple(row[0] for row in cursor.fetchall())
+
+        entry = RegisteredUser(telegram_id, username, user_id, org_ids)
+        with self._lock:
+            self._entries[telegram_id] = entry
+        return entry
+
+    def invalidate(self, telegram_id: Optional[int] = None, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            if telegram_id is not None:
+                self._entries.pop(telegram_id, None)
+            if user_id is not None:
+                for key in [k for k, e in self._entries.items() if e.user_id == user_id]:
+                    del self._entries[key]
+
+    def invalidate_org(self, org_id: str) -> None:
+        """Descarta usuários vinculados à organização (edição/desativação/vínculos)"""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if org_id in e.org_ids]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # ------------------------------------------------------------------
+    # last_seen coalescido
+    # ------------------------------------------------------------------
+
+    def touch(self, user_id: str, platform_id: Optional[str] = None) -> None:
+        """Registra atividade do usuário; grava em lote quando o pendente mais antigo vence"""
+        now = time.monotonic()
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if platform_id is None and previous is not None:
+                platform_id = previous[1]
+            self._pending[user_id] = (_utc_timestamp(), platform_id)
+            if self._oldest_pending is None:
+                self._oldest_pending = now
+            due = (
+                len(self._pending) >= self.max_pending
+                or now - self._oldest_pending >= self.flush_interval_s
+            )
+            if self._flusher is None and not self._stop.is_set():
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="user-registry-flush", daemon=True
+                )
+                self._flusher.start()
+
+        if due:
+            self.flush()
+
+    def _flush_loop(self) -> None:
+        """Grava pendentes que passaram de flush_interval_s mesmo sem novo tráfego"""
+        while not self._stop.wait(self.flush_interval_s / 2):
+            with self._lock:
+                oldest = self._oldest_pending
+            if oldest is not None and time.monotonic() - oldest >= self.flush_interval_s:
+                self.flush()
+
+    def close(self) -> int:
+        """Para a thread de flush e grava o que estiver pendente (shutdown)"""
+        self._stop.set()
+        flusher = self._flusher
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join(timeout=5)
+        return self.flush()
+
+    def pending_last_seen(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            pending = self._pending.get(user_id)
+        return pending[0] if pending else None
+
+    def flush(self) -> int:
+        """Grava todos os last_seen pendentes numa única transação"""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._oldest_pending = None
+
+        if not pending:
+            return 0
+
+        with_platform = [(ts, pid, uid) for uid, (ts, pid) in pending.items() if pid is not None]
+        without_platform = [(ts, uid) for uid, (ts, pid) in pending.items() if pid is None]
+
+        try:
+            with self.db._lock:
+                cursor = self.db.conn.cursor()
+                if with_platform:
+                    cursor.executemany("""
+                        UPDATE users
+                        SET last_seen = ?, platform_id = ?
+                        WHERE user_id = ?
+                    """, with_platform)
+                if without_platform:
+                    cursor.executemany("""
+                        UPDATE users
+                        SET last_seen = ?
+                        WHERE user_id = ?
+                    """, without_platform)
+                self.db.conn.commit()
+        except Exception as e:
+            logger.error(f"❌ Erro ao gravar last_seen em lote: {e}")
+            # Devolver ao buffer sem sobrescrever toques mais novos
+            with self._lock:
+                for uid, value in pending.items():
+                    self._pending.setdefault(uid, value)
+                if self._pending:
+                    self._oldest_pending = time.monotonic()
+            return 0
+
+        self.stats["flushes"] += 1
+        self.stats["rows_flushed"] += len(pending)
+        logger.debug(f"💾 last_seen gravado em lote para {len(pending)} usuário(s)")
+        return len(pending)
@@ -0,0 +1,390 @@
+"""
+vector_partitions.py - Coleções ChromaDB Particionadas por Usuário/Organização
+==============================================================================
+
+Todas as conversas ficavam numa única coleção (Config.CHROMA_COLLECTION_NAME)
+e cada busca dependia de where={"user_id": ...} sobre um índice HNSW global:
+a busca filtrada piora com o tamanho total do corpus, mesmo para usuários
+com poucas memórias, e o índice inteiro precisa estar em memória.
+
+Modos (Config.CHROMA_PARTITION_MODE):
+
+- "single": comportamento anterior, uma coleção para todos
+- "shard": coleção por shard de hash do user_id
+  ({base}_s000 .. {base}_sNNN, Config.CHROMA_PARTITION_SHARDS)
+- "organization": coleção por organização ativa do usuário
+  ({base}_org_<slug>); usuários sem organização caem num shard
+
+PartitionRouter decide a coleção de cada usuário e grava a escolha em
+vector_partitions: a atribuição é fixa (mudar o número de shards ou a
+organização do usuário não "perde" documentos já gravados). Para mover
+um usuário, rode a migração de novo depois de apagar a linha dele.
+
+PartitionedVectorStore abre as partições sob demanda sobre um único
+PersistentClient e mantém no máximo max_open wrappers abertos (LRU). Os
+wrappers são leves; a memória está nos segmentos do Chroma, que ficam no
+cliente. Por isso a política LRU de segmentos vem ligada por padrão
+(segment_cache_mb, 1024 MB): acima do limite o Chroma descarrega os
+índices HNSW de partições frias. segment_cache_mb=0 desliga o limite.
+
+Migração da coleção única: python vector_partitions.py migrate
+(copia embeddings já calculados, sem re-embutir; idempotente).
+"""
+
+import re
+import sys
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODE_SINGLE = "single"
+MODE_SHARD = "shard"
+MODE_ORGANIZATION = "organization"
+MODES = (MODE_SINGLE, MODE_SHARD, MODE_ORGANIZATION)
+
+
+def _slug(value: str, max_len: int = 24) -> str:
+    """Fragmento válido para nome de coleção Chroma ([a-zA-Z0-9_-])"""
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "-", str(value)).strip("-_").lower()[:max_len]
+    digest = hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:6]
+    return f"{slug}-{digest}" if slug else digest
+
+
+class PartitionRouter:
+    """
+    user_id → nome da coleção, com atribuição persistida no SQLite
+
+    Args:
+        db_manager: HybridDatabaseManager (conn e _lock)
+        mode: "single" | "shard" | "organization"
+        base_name: nome da coleção única (prefixo das partições)
+        shards: número de shards de hash
+    """
+
+    def __init__(self, db_manager, mode: str, base_name: str, shards: int = 16):
+        if mode not in MODES:
+            raise ValueError(f"CHROMA_PARTITION_MODE inválido: {mode} (use {', '.join(MODES)})")
+        self.db = db_manager
+        self.mode = mode
+        self.base_name = base_name
+        self.shards = max(1, shards)
+        self._assignments: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if mode != MODE_SINGLE:
+            self._create_table()
+
+    def _create_table(self) -> None:
+        with self.db._lock:
+            cursor = self.db.conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS vector_partitions (
+                    user_id TEXT PRIMARY KEY,
+                    collection_name TEXT NOT NULL,
+                    assigned_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.db.conn.commit()
+
+    def shard_name(self, user_id: str) -> str:
+        index = int(hashlib.sha1(str(user_id).encode("utf-8")).hexdigest(), 16) % self.shards
+        return f"{self.base_name}_s{index:03d}"
+
+    def _organization_of(self, user_id: str) -> Optional[str]:
+        cursor = self.db.conn.cursor()
+        cursor.execute("""
+            SELECT org_id FROM user_organization_mapping
+            WHERE user_id = ? AND status = 'active'
+            ORDER BY org_id LIMIT 1
+        """, (user_id,))
+        row = cursor.fetchone()
+        return str(row[0]) if row else None
+
+    def _choose(self, user_id: str) -> str:
+        if self.mode == MODE_ORGANIZATION:
+            try:
+                org_id = self._organization_of(user_id)
+            except Exception:
+                # Tabela de organizações ausente (instalação sem multi-tenant)
+                org_id = None
+            if org_id:
+                return f"{self.base_name}_org_{_slug(org_id)}"
+        return self.shard_name(user_id)
+
+    def partition_for(self, user_id: str) -> str:
+        if self.mode == MODE_SINGLE:
+            return self.base_name
+
+        user_id = str(user_id)
+        with self._lock:
+            cached = self._assignments.get(user_id)
+        if cached:
+            return cached
+
+        with self.db._lock:
+            cursor = self.db.conn.cursor()
+            cursor.execute("SELECT collection_name FROM vector_partitions WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            if row is None:
+                # INSERT OR IGNORE + releitura: outro processo pode ter atribuído antes
+                cursor.execute(
+                    "INSERT OR IGNORE INTO vector_partitions (user_id, collection_name) VALUES (?, ?)",
+                    (user_id, self._choose(user_id))
+                )
+                self.db.conn.commit()
+                cursor.execute("SELECT collection_name FROM vector_partitions WHERE user_id = ?", (user_id,))
+                row = cursor.fetchone()
+
+        with self._lock:
+            self._assignments[user_id] = row[0]
+        return row[0]
+
+    def forget(self, user_id: str) -> None:
+        """Remove a atribuição (reset do usuário); a próxima gravação escolhe de novo"""
+        if self.mode == MODE_SINGLE:
+            return
+        with self._lock:
+            self._assignments.pop(str(user_id), None)
+        with self.db._lock:
+            self.db.conn.execute("DELETE FROM vector_partitions WHERE user_id = ?", (str(user_id),))
+            self.db.conn.commit()
+
+
+class PartitionedVectorStore:
+    """
+    Partições Chroma abertas sob demanda sobre um PersistentClient compartilhado
+
+    Args:
+        chroma_cls: classe Chroma do LangChain (carregada por _load_vector_backend)
+        embeddings: função de embeddings comum a todas as partições
+        persist_directory: Config.CHROMA_PATH
+        router: PartitionRouter
+        max_open: wrappers abertos ao mesmo tempo (LRU)
+        segment_cache_mb: limite de memória dos segmentos Chroma (0 = sem limite)
+    """
+
+    MAX_OPEN = 64
+    SEGMENT_CACHE_MB = 1024
+
+    def __init__(self, chroma_cls, embeddings, persist_directory: str, router: PartitionRouter,
+                 max_open: int = MAX_OPEN, segment_cache_mb: int = SEGMENT_CACHE_MB):
+        import chromadb
+        from chromadb.config import Settings
+
+        settings = {"anonymized_telemetry": False}
+        if segment_cache_mb > 0:
+            settings["chroma_segment_cache_policy"] = "LRU"
+            settings["chroma_memory_limit_bytes"] = segment_cache_mb * 1024 * 1024
+
+        self.client = chromadb.PersistentClient(path=persist_directory, settings=Settings(**settings))
+        self.chroma_cls = chroma_cls
+        self.embeddings = embeddings
+        self.router = router
+        self.max_open = max(1, max_open)
+
+        self._open: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "evicted": 0}
+
+    @property
+    def base_name(self) -> str:
+        return self.router.base_name
+
+    @property
+    def partitioned(self) -> bool:
+        return self.router.mode != MODE_SINGLE
+
+    def open(self, collection_name: str):
+        """Wrapper LangChain da coleção (cria se não existir)"""
+        with self._lock:
+            store = self._open.get(collection_name)
+            if store is not None:
+                self._open.move_to_end(collection_name)
+                return store
+
+        store = self.chroma_cls(
+            collection_name=collection_name,
+            embedding_function=self.embeddings,
+            client=self.client,
+        )
+        with self._lock:
+            current = self._open.setdefault(collection_name, store)
+            self._open.move_to_end(collection_name)
+            if current is store:
+                self.stats["opened"] += 1
+            while len(self._open) > self.max_open:
+                cold, _ = self._open.popitem(last=False)
+                self.stats["evicted"] += 1
+                logger.debug(f"   Partição fria fechada: {cold}")
+        return current
+
+    def for_user(self, user_id: str):
+        return self.open(self.router.partition_for(user_id))
+
+    @property
+    def legacy(self):
+        """Coleção única original (no modo single, a única partição)"""
+        return self.open(self.base_name)
+
+    def collection_names(self) -> List[str]:
+        """Coleções deste armazenamento existentes no disco (base + partições)"""
+        names = []
+        for collection in self.client.list_collections():
+            # chromadb < 0.6 devolve objetos Collection, >= 0.6 devolve nomes
+            name = getattr(collection, "name", collection)
+            if name == self.base_name or name.startswith(f"{self.base_name}_s") \
+                    or name.startswith(f"{self.base_name}_org_"):
+                names.append(name)
+        return sorted(names)
+
+    def _search_collections(self) -> Iterable:
+        for name in self.collection_names():
+            if self.partitioned and name == self.base_name:
+                # Coleção única fica só como origem da migração
+                continue
+            yield self.client.get_collection(name)
+
+    def count(self) -> int:
+        return sum(collection.count() for collection in self._search_collections())
+
+    def get(self, where: Optional[Dict] = None, include: Optional[List[str]] = None) -> Dict:
+        """collection.get() agregado sobre todas as partições (rotas admin/métricas globais)"""
+        merged = {"ids": [], "metadatas": [], "documents": []}
+        kwargs = {"where": where} if where else {}
+        if include is not None:
+            kwargs["include"] = include
+        for collection in self._search_collections():
+            result = collection.get(**kwargs)
+            for key in ("ids", "metadatas", "documents"):
+                merged[key].extend(result.get(key) or [])
+        return merged
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Apaga todos os documentos do usuário e a atribuição de partição
+
+        Particionado, apaga também da coleção única: sem isso uma migração
+        posterior copiaria os documentos de volta para a partição.
+        """
+        collections = [self.for_user(user_id)._collection]
+        if self.partitioned and self.base_name in self.collection_names():
+            collections.append(self.client.get_collection(self.base_name))
+
+        deleted = 0
+        for collection in collections:
+            ids = collection.get(where={"user_id": str(user_id)}).get("ids", [])
+            if ids:
+                collection.delete(ids=ids)
+                deleted += len(ids)
+        self.router.forget(user_id)
+        return deleted
+
+    def legacy_count(self) -> int:
+        """Documentos ainda na coleção única (pendentes de migração)"""
+        if self.base_name not in self.collection_names():
+            return 0
+        return self.client.get_collection(self.base_name).count()
+
+
+def migrate_collection(store: PartitionedVectorStore, batch_size: int = 500,
+                       delete_source: bool = False, dry_run: bool = False) -> Dict:
+    """
+    Copia a coleção única para as partições do roteador
+
+    Lê a origem em páginas com embeddings e faz upsert na partição de cada
+    documento: sem re-embutir e idempotente (pode ser interrompida e
+    repetida). Com delete_source, apaga da origem só depois da cópia toda.
+
+    Returns:
+        {"documents", "copied", "orphans", "partitions", "elapsed_s"}
+    """
+    stats = {"documents": 0, "copied": 0, "orphans": 0, "partitions": {}, "elapsed_s": 0.0}
+    if not store.partitioned:
+        logger.warning("⚠️ CHROMA_PARTITION_MODE=single: nada a migrar")
+        return stats
+    if store.base_name not in store.collection_names():
+        logger.info("✅ Coleção única inexistente: nada a migrar")
+        return stats
+
+    started = time.monotonic()
+    source = store.client.get_collection(store.base_name)
+    total = source.count()
+    migrated_ids: List[str] = []
+
+    for offset in range(0, total, batch_size):
+        page = source.get(
+            include=["embeddings", "metadatas", "documents"],
+            limit=batch_size, offset=offset
+        )
+        groups: Dict[str, Dict[str, list]] = {}
+        for doc_id, embedding, metadata, document in zip(
+            page["ids"], page["embeddings"], page["metadatas"], page["documents"]
+        ):
+            stats["documents"] += 1
+            user_id = (metadata or {}).get("user_id")
+            if not user_id:
+                stats["orphans"] += 1
+                continue
+            target = store.router.partition_for(user_id)
+            group = groups.setdefault(target, {"ids": [], "embeddings": [], "metadatas": [], "documents": []})
+            group["ids"].append(doc_id)
+            group["embeddings"].append(embedding)
+            group["metadatas"].append(metadata)
+            group["documents"].append(document)
+
+        for target, group in groups.items():
+            stats["partitions"][target] = stats["partitions"].get(target, 0) + len(group["ids"])
+            if not dry_run:
+                store.open(target)._collection.upsert(**group)
+            stats["copied"] += len(group["ids"])
+            migrated_ids.extend(group["ids"])
+
+        logger.info(f"   Migração: {min(offset + batch_size, total)}/{total} documentos")
+
+    if delete_source and not dry_run:
+        for i in range(0, len(migrated_ids), batch_size):
+            source.delete(ids=migrated_ids[i:i + batch_size])
+        logger.info(f"🗑️ {len(migrated_ids)} documentos removidos da coleção única")
+
+    stats["elapsed_s"] = round(time.monotonic() - started, 1)
+    logger.info(
+        f"✅ Migração {'(simulada) ' if dry_run else ''}concluída: {stats['copied']} documentos em "
+        f"{len(stats['partitions'])} partições, {stats['orphans']} sem user_id ({stats['elapsed_s']}s)"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command not in ("migrate", "status"):
+        print("Uso: python vector_partitions.py migrate [--delete-source] [--dry-run] [--batch N]\n"
+              "     python vector_partitions.py status")
+        sys.exit(1)
+
+    from jung_core import HybridDatabaseManager
+
+    db = HybridDatabaseManager()
+    if not db.chroma_enabled or db.vector_partitions is None:
+        print("❌ ChromaDB desabilitado")
+        sys.exit(1)
+    partitions = db.vector_partitions
+
+    if command == "status":
+        print(f"Modo: {partitions.router.mode}")
+        print(f"Pendentes na coleção única: {partitions.legacy_count() if partitions.partitioned else 0}")
+        for name in partitions.collection_names():
+            print(f"  {name:<48} {partitions.client.get_collection(name).count():>8} docs")
+    else:
+        batch = int(sys.argv[sys.argv.index("--batch") + 1]) if "--batch" in sys.argv else 500
+        result = migrate_collection(
+            partitions, batch_size=batch,
+            delete_source="--delete-source" in sys.argv,
+            dry_run="--dry-run" in sys.argv,
+        )
+        for name, count in sorted(result["partitions"].items()):
+            print(f"  {name:<48} {count:>8} docs")